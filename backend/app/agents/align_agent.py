@@ -1,15 +1,17 @@
 import logging
-from typing import Optional
+from typing import Awaitable, Callable, Optional
 from pydantic import BaseModel, Field
 from app.agents.common import (
     client, settings, ARCHETYPES, SPHERES, MATRIX_DATA,
     SPHERE_AGENT_STYLES, LEVEL_METHODOLOGIES, LEVEL_GOALS
 )
 from app.agents.hawkins_agent import get_hawkins_agent_level
+from app.services.streaming import JsonFieldStream
 
 logger = logging.getLogger(__name__)
 
 class AlignmentResponse(BaseModel):
+    # ai_response stays first: structured outputs follow schema order, so it is the first thing streamed
     ai_response: str = Field(description="Ответ пользователю согласно текущему протоколу (2-4 предложения).")
     is_depth_sufficient: bool = Field(description="True, если пользователь показал проработку на уровне чувств/тела. False, если ответ формальный, 'от ума' (байпасинг), или слишком короткий.")
     hawkins_score_estimation: int = Field(description="Оценка текущего состояния по шкале Хокинса (от 20 до 1000) на основе последней реплики.")
@@ -28,9 +30,14 @@ async def alignment_session_message(
     history_context: str = "",
     is_deepening: bool = False,
     recurring_symbol: str = "",
-    memory_context: str = ""
+    memory_context: str = "",
+    on_delta: Optional[Callable[[str], Awaitable[None]]] = None,
 ) -> dict:
-    """Generate AI response for an alignment session stage using Structured JSON Outputs."""
+    """
+    Generate AI response for an alignment session stage using Structured JSON Outputs.
+    With on_delta, the completion is streamed and on_delta receives the
+    ai_response text as it is generated; the returned dict is the same.
+    """
     archetype = ARCHETYPES.get(archetype_id, {})
     sphere_data = SPHERES.get(sphere, {})
     agent_level = get_hawkins_agent_level(hawkins_score)
@@ -79,6 +86,8 @@ async def alignment_session_message(
 КЛЮЧЕВОЙ ОБРАЗ (СИМВОЛ) ИЗ СИНХРОНИЗАЦИИ: {recurring_symbol if recurring_symbol else "Не определен"}
 АКТУАЛЬНЫЙ ЖИЗНЕННЫЙ КОНТЕКСТ:
 {memory_context if memory_context else "Нет данных о последних событиях."}
+ИСТОРИЯ РАБОТЫ С КАРТОЙ:
+{history_context if history_context else "Это первая сессия по карте."}
 
 ИНСТРУКЦИЯ (СТРОГО):
 - Ты ведешь пользователя через 3 протокола развития.
@@ -104,17 +113,35 @@ async def alignment_session_message(
     if user_message.strip():
         messages.append({"role": "user", "content": user_message})
 
+    response_format = {
+        "type": "json_schema", 
+        "json_schema": {"name": "alignment_schema", "schema": AlignmentResponse.model_json_schema()}
+    }
     try:
-        response = await client.chat.completions.create(
-            model=settings.OPENAI_MODEL_FAST, # Идеально для частых JSON-ответов
-            messages=messages,
-            response_format={
-                "type": "json_schema", 
-                "json_schema": {"name": "alignment_schema", "schema": AlignmentResponse.model_json_schema()}
-            }
-        )
+        if on_delta is None:
+            response = await client.chat.completions.create(
+                model=settings.OPENAI_MODEL_FAST, # Идеально для частых JSON-ответов
+                messages=messages,
+                response_format=response_format,
+            )
+            content = response.choices[0].message.content
+        else:
+            reply = JsonFieldStream("ai_response")
+
+            async def on_text(chunk: str):
+                text = reply.feed(chunk)
+                if text:
+                    await on_delta(text)
+
+            streamed = await client.stream_chat_completion(
+                model=settings.OPENAI_MODEL_FAST,
+                messages=messages,
+                response_format=response_format,
+                on_text=on_text,
+            )
+            content = streamed.content
         
-        result_data = AlignmentResponse.model_validate_json(response.choices[0].message.content)
+        result_data = AlignmentResponse.model_validate_json(content)
         return result_data.model_dump()
         
     except Exception as e:
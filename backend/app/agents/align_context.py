@@ -0,0 +1,136 @@
+"""
+Prompt context for alignment sessions, assembled incrementally.
+
+The card's history (the last sync and earlier alignments) is packed into
+ALIGN_HISTORY_TOKEN_BUDGET instead of re-stringifying every transcript:
+each finished alignment is summarized once by the fast model (job
+align.summarize, app/routers/session.py) and the summary is cached on
+AlignSession.context_summary, so later sessions only read it. A row still
+without one is shown through fallback_summary().
+The running chat is kept by AlignmentDialogue, which appends each turn's
+delta with its token count and drops the oldest messages beyond
+ALIGN_DIALOGUE_TOKEN_BUDGET.
+"""
+import logging
+from typing import Optional
+
+from app.agents.common import client, settings
+
+logger = logging.getLogger(__name__)
+
+CHARS_PER_TOKEN = 3  # Russian text averages ~3 chars per token
+SYNC_TRANSCRIPT_MESSAGES = 6
+SUMMARY_TRANSCRIPT_CHARS = 8000
+
+SUMMARY_PROMPT = """Ты сжимаешь завершённую сессию выравнивания для следующих сессий той же карты.
+Напиши 2-3 предложения: с каким телесным напряжением и паттерном работали, что сдвинулось,
+к какому инсайту и микро-действию пришли. Только факты из диалога, без оценок и советов."""
+
+
+def count_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+
+class AlignmentDialogue:
+    """Chat of the current session; window() is what the next prompt carries."""
+
+    def __init__(self, budget: Optional[int] = None):
+        self.budget = settings.ALIGN_DIALOGUE_TOKEN_BUDGET if budget is None else budget
+        self.messages: list[dict] = []
+        self.window_tokens = 0
+        self._tokens: list[int] = []
+        self._start = 0
+
+    def append(self, role: str, content: str) -> None:
+        tokens = count_tokens(content)
+        self.messages.append({"role": role, "content": content})
+        self._tokens.append(tokens)
+        self.window_tokens += tokens
+        # The newest message always stays, even alone over the budget
+        while self.window_tokens > self.budget and self._start < len(self.messages) - 1:
+            self.window_tokens -= self._tokens[self._start]
+            self._start += 1
+
+    def window(self) -> list[dict]:
+        return self.messages[self._start:]
+
+
+def _sync_block(last_sync) -> str:
+    if not last_sync:
+        return ""
+    lines = [
+        f"--- СИНХРОНИЗАЦИЯ ({last_sync.created_at.strftime('%Y-%m-%d %H:%M')}) ---",
+        f"Итог: Хокинс {last_sync.hawkins_score} ({last_sync.hawkins_level})",
+        f"Ядро: {last_sync.extracted_core_belief}",
+        f"Тень: {last_sync.extracted_shadow_pattern}",
+    ]
+    if last_sync.session_transcript:
+        lines.append("Диалог:")
+        for m in last_sync.session_transcript[-SYNC_TRANSCRIPT_MESSAGES:]:
+            lines.append(f"{m['role']}: {m['content']}")
+    return "\n".join(lines)
+
+
+def fallback_summary(align) -> str:
+    """Summary from the row's own fields, used until the model summary is written (not cached)."""
+    parts = []
+    if align.new_belief:
+        parts.append(f"Инсайт: {align.new_belief}")
+    if align.integration_plan:
+        parts.append(f"План: {align.integration_plan}")
+    return " ".join(parts) or "Итоги сессии не сохранены."
+
+
+def build_history_context(last_sync, prev_aligns: list, budget: Optional[int] = None) -> str:
+    """
+    Sync block + summaries of earlier alignments (oldest first), newest ones
+    kept when the budget runs out. prev_aligns are ordered by created_at.
+    """
+    budget = settings.ALIGN_HISTORY_TOKEN_BUDGET if budget is None else budget
+    sync = _sync_block(last_sync)
+    used = count_tokens(sync) if sync else 0
+
+    picked = []
+    for index in range(len(prev_aligns), 0, -1):
+        prev = prev_aligns[index - 1]
+        block = (
+            f"\n--- СЕССИЯ ВЫРАВНИВАНИЯ #{index} ({prev.created_at.strftime('%Y-%m-%d %H:%M')}) ---\n"
+            f"Хокинс: вход {prev.hawkins_entry} -> пик {prev.hawkins_peak}\n"
+            f"Итог: {prev.context_summary or fallback_summary(prev)}"
+        )
+        tokens = count_tokens(block)
+        if used + tokens > budget:
+            break
+        picked.append(block)
+        used += tokens
+
+    lines = [sync] if sync else []
+    skipped = len(prev_aligns) - len(picked)
+    if skipped:
+        lines.append(f"\n(Более ранних сессий выравнивания: {skipped})")
+    lines.extend(reversed(picked))
+    return "\n".join(lines)
+
+
+async def summarize_alignment(
+    messages: list[dict],
+    hawkins_entry: int,
+    hawkins_peak: int,
+    final_insight: Optional[str] = None,
+    integration_plan: Optional[str] = None,
+) -> Optional[str]:
+    transcript = "\n".join(f"{m.get('role')}: {m.get('content')}" for m in messages)[-SUMMARY_TRANSCRIPT_CHARS:]
+    content = (
+        f"Хокинс: вход {hawkins_entry} -> пик {hawkins_peak}\n"
+        f"Инсайт: {final_insight or '-'}\nПлан: {integration_plan or '-'}\n\nДиалог:\n{transcript}"
+    )
+    try:
+        response = await client.chat.completions.create(
+            model=settings.OPENAI_MODEL_FAST,
+            messages=[{"role": "system", "content": SUMMARY_PROMPT}, {"role": "user", "content": content}],
+        )
+        return (response.choices[0].message.content or "").strip() or None
+    except Exception as e:
+        logger.error(f"Alignment Summary Error: {e}")
+        return None
+
@@ -16,6 +16,8 @@ from app.models import (
     UserMemory, CardProgress, CardStatus, NatalChart, 
     UserPortrait
 )
+from app.services.embeddings import embed, embed_many
+from app.services.vector_index import nearest_in_scope
 # from app.rro.ocean.hub import OceanService
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
@@ -111,14 +113,12 @@ async def autonomous_reasoning(user_message: str, context: str) -> Dict[str, Any
 async def search_user_memory(db: AsyncSession, user_id: int, query: str, limit: int = 5) -> str:
     """Searches long-term user memory for relevant insights."""
     try:
-        from app.core.astrology.vector_matcher import _get_embedding
-        query_embedding = await _get_embedding(query)
+        query_embedding = await embed(query)
         
-        stmt = select(UserMemory).where(
-            UserMemory.user_id == user_id
-        ).order_by(
-            UserMemory.embedding.cosine_distance(query_embedding)
-        ).limit(limit)
+        stmt = nearest_in_scope(
+            [UserMemory.content], UserMemory.embedding, query_embedding,
+            scope=[UserMemory.user_id == user_id], limit=limit,
+        )
         
         result = await db.execute(stmt)
         memories = result.scalars().all()
@@ -127,8 +127,8 @@ async def search_user_memory(db: AsyncSession, user_id: int, query: str, limit:
             return ""
             
         context = "\nВАШИ ПРОШЛЫЕ ИНСАЙТЫ:\n"
-        for m in memories:
-            context += f"- {m.content}\n"
+        for content in memories:
+            context += f"- {content}\n"
         return context
     except Exception as e:
         logger.error(f"Memory Search Error: {e}")
@@ -163,12 +163,10 @@ async def extract_and_save_insights(db: AsyncSession, user_id: int, chat_history
         insights_text = response.choices[0].message.content.strip()
         if "НЕТ" in insights_text: return
         
-        from app.core.astrology.vector_matcher import _get_embedding
-        for line in insights_text.split("\n"):
-            line = line.strip()
-            if not line: continue
-            
-            emb = await _get_embedding(line)
+        lines = [line.strip() for line in insights_text.split("\n") if line.strip()]
+        # One embedding call for all insights of the dialogue
+        embeddings = await embed_many(lines)
+        for line, emb in zip(lines, embeddings):
             memory = UserMemory(
                 user_id=user_id,
                 content=line,
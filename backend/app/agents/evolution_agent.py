@@ -3,6 +3,7 @@ import random
 from typing import List, Optional
 from sqlalchemy import select, update, func
 from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import undefer
 
 from pydantic import BaseModel, Field
 from app.database import Base
@@ -10,6 +11,7 @@ from app.models.data_architecture import UserBehaviorProfileV2
 from app.models.text_diagnostics import TextScene, SceneStats, Sphere, Archetype, SceneInteraction
 from app.agents.common import client, settings
 from app.agents.sync_agent import get_embedding
+from app.core.scene_index import record_scene_reward
 
 # --- Pydantic Models for Structured Output (High Standard) ---
 class Interpretation(BaseModel):
@@ -50,6 +52,8 @@ class EvolutionAgent:
     ):
         """
         Analyzes a completed textual diagnostic session and updates scene effectiveness.
+        The sync.log_interaction job records every answer as it is logged; this
+        re-records a whole session (sessions logged before that).
         """
         # Fetch interactions for this session
         result = await db.execute(
@@ -60,33 +64,10 @@ class EvolutionAgent:
             return
 
         for interaction in interactions:
-            # 1. Update views/stats for the scene
-            stats_result = await db.execute(
-                select(SceneStats).where(SceneStats.scene_id == interaction.scene_id)
+            # Views, rolling metrics and diagnostic power of the scene
+            await record_scene_reward(
+                db, interaction.scene_id, interaction.reading_time, interaction.response_length
             )
-            stats = stats_result.scalar_one_or_none()
-            if not stats:
-                stats = SceneStats(scene_id=interaction.scene_id)
-                db.add(stats)
-                await db.flush()
-
-            stats.times_shown += 1
-            
-            # 2. Update rolling metrics
-            n = stats.times_shown
-            stats.avg_reading_time = (stats.avg_reading_time * (n-1) + interaction.reading_time) / n
-            stats.avg_response_length = (stats.avg_response_length * (n-1) + interaction.response_length) / n
-            
-            # 3. Diagnostic Power Calculation
-            # Effective scene = moderate reading time (reflection) + healthy response length
-            # Too fast + too short = low power. Too long + too short = low power.
-            ideal_time = 15.0 # seconds
-            time_factor = max(0.2, 1.0 - abs(interaction.reading_time - ideal_time) / 30.0)
-            length_factor = min(1.0, interaction.response_length / 200.0)
-            
-            current_power = time_factor * length_factor
-            # Rolling average power
-            stats.diagnostic_power_score = (stats.diagnostic_power_score * 0.8) + (current_power * 0.2)
 
         await db.commit()
 
@@ -132,7 +113,11 @@ class DatasetBuilder:
         """
         Exports scene + interaction -> effectiveness labels.
         """
-        stmt = select(SceneInteraction, TextScene).join(TextScene)
+        stmt = (
+            select(SceneInteraction, TextScene)
+            .join(TextScene)
+            .options(undefer(SceneInteraction.response_embedding))  # deferred by default
+        )
         result = await db.execute(stmt)
         rows = result.all()
         
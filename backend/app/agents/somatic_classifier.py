@@ -0,0 +1,227 @@
+"""
+Local somatic/abstract classifier for sync answers.
+
+Every sync phase has to know whether the user's answer describes the body
+or the surroundings of the scene (somatic) or stays in thoughts (abstract).
+The answer is tokenized once and every word is run through StemAutomaton, a
+trie compiled from the Russian stem lists in LEXICON. Words are matched from
+their first letter and the longest stem wins, so "руководитель" is not a
+hand and "много" is not a leg. The automaton counts hits per category
+(negated ones apart), and a logistic model over those counts gives
+P(somatic).
+
+The confidence of a verdict is max(p, 1 - p). sync_agent.autonomous_somatic_check
+only asks the LLM when it is below settings.SOMATIC_CONFIDENCE.
+DEFAULT_WEIGHTS are fitted on data/somatic_seed.jsonl. Weights fitted on
+exported sessions (scripts/eval_somatic_classifier.py fit) replace them when
+settings.SOMATIC_MODEL_PATH exists.
+"""
+import json
+import logging
+import math
+import os
+import re
+from functools import lru_cache
+from typing import Iterable, Optional
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Stems match words starting with them; "=word" matches the word form only.
+# "stop" stems shadow shorter stems of other categories (longest match wins).
+LEXICON: dict[str, str] = {
+    "body": """
+        груд живот горл рук ног спин плеч голов солнечн сплетени дыхан дыш сердц сердечн
+        =тело =тела =телу =телом =теле телесн мышц колен =стопа =стопы =стопе =стопу =стопами
+        ступн пальц =палец ладон =лицо =лица =лицу =лицом =лице глаз =кожа =кожи =коже =кожу =кожей
+        =шея =шеи =шее =шею затыл =лоб =лба =лбу =лбом виск челюст зуб желуд поясниц бедр пятк
+        локт =локоть запяст кулак =губы =губ =губах позвоноч ребр лопатк пульс вздох выдох вдох
+        =ком =комок =нос =носу =носом =уши =ухо =ушах кист ресниц брюш
+    """,
+    "sensation": """
+        ощущ тепл горяч =жар =жарко жжен жжет жгет холод холодн озноб мурашк дрож =дрожит
+        тряс покалыв =колет =колоть =колется щекот =зуд чешет тяжест тяжел легкост =давит давлен
+        сдавл сжима сжат сжим стиснут напряж напряг расслаб онеме немеет пульсир =стучит колот
+        сводит свело =ноет ноющ =боль =боли =болью =болит =болят болезнен тошн подташн головокруж
+        кружит слабост зажат зажим =пот потею потеют вспоте красне =тесно распира скрути стянут
+        мерзн мерзнут замерз знобит пересох щиплет =горит окамен одеревен ватн липк влажн мокр
+    """,
+    "perception": """
+        =вижу =видно =виден =видна видне =слышу =слышно пахн запах =звук =звуки звуком шорох =шум
+        шумит шуршит тишин =эхо =вкус касаюсь касани прикас прикосн трога смотр оборачива
+        светл темн =темно блест мелька скрип хруст капает =капли
+    """,
+    "place": """
+        стен =пол =пола =полу =полом =полы потол двер окн окон туман =свет =света =свету =светом
+        светит светится тьм камн камен дерев =вода =воды =воде =воду =водой водн =песок песк
+        =стол =стола =столу =столом =столе =столы стул предмет =вещь =вещи объект пустот вокруг
+        рядом =даль вдал горизонт =небо =неба =небе =небом земл трав =ветер ветр дорог тропинк троп
+        =лес =леса =лесу лесн мост стекл зеркал лестниц ступен улиц комнат =дом =доме =домом
+        город рынок рынк прилав монет =часы башн площад берег =море =моря =морю =морем морск
+        =волна =волны =волну =волной =волнах =огонь огн =дым =дымом облак солнц =луна =луну =луной звезд =горы =гора =гору
+        =горой =горах скал пещер =сад =саду крыш ворот забор =поле =поля =полю холм =снег снег
+        дожд луж =тень =тени =тенью =угол =углу ковер пыль пылин ламп ключ реки =река =реку
+        =кора =коры =кору =ветки ветк ручк =мостовой мостов воздух босиком
+    """,
+    "thought": """
+        =думаю =думал =думала =думать подума =дума =думы кажет наверн возможн вероятн =понял
+        =поняла =понятно поним счита мысл размышл смысл значит означа символ метафор олицетвор
+        отража ассоциац анализ проанализ логичн логик вывод =идея =идеи концепц принцип жизн судьб
+        =знаю =знаешь уверен =потому =вообще =целом =будто похоже напомина вспомина =образ
+        паттерн работ отношен деньг денег карьер проект =муж =мужем =жена =женой =маму =мама =мамой
+        семь детств руковод начальн коллег разобра причин =пожалуй скорее =тема =темы =тему
+        абстрактн =план =планы =дела =делах =цели =цель
+    """,
+    "emotion": """
+        страх страшн боюсь =боится тревож тревог радост раду грусть грустн печал =злость злюсь
+        =злит =злой обид стыд стыдн =вина спокойств спокоен спокойн интерес любопыт скучн
+        =скучно безнадеж завид одобрени волную волнени
+    """,
+    "negation": "=не =нет =ни =ничего =никак =без =нету",
+    # Longer words that start with a stem above but mean something else
+    "stop": """
+        рукопис рукодель рукав голосов телефон телевиз тепличн дорогой =дорогая =дорогие
+        столиц столько ключев стенд животн
+    """,
+}
+
+CATEGORIES = ("body", "sensation", "perception", "place", "thought", "emotion")
+FEATURES = ("bias", *CATEGORIES, "negated", "words", "short")
+
+# Fitted on data/somatic_seed.jsonl by `scripts/eval_somatic_classifier.py fit`
+DEFAULT_WEIGHTS: dict[str, float] = {
+    "bias": -2.7157, "body": 3.316, "sensation": 3.3401, "perception": 2.1747, "place": 3.0837,
+    "thought": -1.7401, "emotion": -0.5746, "negated": 0.2345, "words": 0.3571, "short": -0.5913,
+}
+
+_TOKEN = re.compile(r"[а-яa-z]+|[.,!?;:—]")
+_CLAUSE_BREAK = frozenset(".,!?;:—")
+NEGATION_WINDOW = 3  # words after "не"/"нет"/... that a negation covers
+
+
+class StemAutomaton:
+    """Trie over stems; match() walks a word once and returns the longest stem's category."""
+
+    _EXACT = "$"
+    _PREFIX = "*"
+
+    def __init__(self, lexicon: dict[str, str]):
+        self.root: dict = {}
+        for category, entries in lexicon.items():
+            for entry in entries.split():
+                exact = entry.startswith("=")
+                self._add(entry.lstrip("=").replace("ё", "е"), category, exact)
+
+    def _add(self, stem: str, category: str, exact: bool) -> None:
+        node = self.root
+        for char in stem:
+            node = node.setdefault(char, {})
+        node[self._EXACT if exact else self._PREFIX] = category
+
+    def match(self, word: str) -> Optional[str]:
+        node = self.root
+        found = None
+        for char in word:
+            node = node.get(char)
+            if node is None:
+                return found
+            found = node.get(self._PREFIX, found)
+        return node.get(self._EXACT, found)
+
+
+@lru_cache()
+def get_automaton() -> StemAutomaton:
+    return StemAutomaton(LEXICON)
+
+
+def tokenize(text: str) -> list[str]:
+    return _TOKEN.findall(text.lower().replace("ё", "е"))
+
+
+def response_features(text: str) -> dict:
+    """Category hit counts of an answer; somatic hits right after a negation count as negated."""
+    automaton = get_automaton()
+    counts = dict.fromkeys((*CATEGORIES, "negated"), 0)
+    words = 0
+    negation_left = 0
+    for token in tokenize(text or ""):
+        if token in _CLAUSE_BREAK:
+            negation_left = 0
+            continue
+        words += 1
+        category = automaton.match(token)
+        if category == "negation":
+            negation_left = NEGATION_WINDOW
+            continue
+        if category in ("body", "sensation", "perception") and negation_left:
+            counts["negated"] += 1
+        elif category in counts:
+            counts[category] += 1
+        negation_left = max(negation_left - 1, 0)
+    counts["words"] = words
+    return counts
+
+
+def feature_vector(counts: dict) -> np.ndarray:
+    values = {name: math.log1p(counts[name]) for name in (*CATEGORIES, "negated", "words")}
+    values["bias"] = 1.0
+    values["short"] = 1.0 if counts["words"] <= 2 else 0.0
+    return np.array([values[name] for name in FEATURES])
+
+
+class SomaticClassifier:
+    def __init__(self, weights: dict[str, float]):
+        self.weights = np.array([weights.get(name, 0.0) for name in FEATURES])
+
+    def probability(self, counts: dict) -> float:
+        return 1.0 / (1.0 + math.exp(-float(feature_vector(counts) @ self.weights)))
+
+    def classify(self, text: str) -> dict:
+        """Same keys as the LLM check (is_somatic, has_body, has_objects, reason) plus probability and confidence."""
+        counts = response_features(text)
+        p = self.probability(counts)
+        hits = ", ".join(f"{name} {counts[name]}" for name in (*CATEGORIES, "negated") if counts[name])
+        return {
+            "is_somatic": p >= 0.5,
+            "has_body": counts["body"] + counts["sensation"] > 0,
+            "has_objects": counts["place"] + counts["perception"] > 0,
+            "probability": round(p, 4),
+            "confidence": round(max(p, 1.0 - p), 4),
+            "reason": f"local: {hits or 'no markers'}",
+        }
+
+
+def fit_weights(texts: Iterable[str], labels: Iterable[bool], l2: float = 0.003, epochs: int = 3000) -> dict[str, float]:
+    """L2-regularized logistic regression (full-batch gradient descent) over response_features()."""
+    x = np.array([feature_vector(response_features(text)) for text in texts])
+    y = np.array([1.0 if label else 0.0 for label in labels])
+    w = np.zeros(len(FEATURES))
+    penalty = np.ones(len(FEATURES))
+    penalty[FEATURES.index("bias")] = 0.0
+    for _ in range(epochs):
+        p = 1.0 / (1.0 + np.exp(-(x @ w)))
+        w -= 0.5 * ((x.T @ (p - y)) / len(y) + l2 * penalty * w)
+    return {name: round(float(value), 4) for name, value in zip(FEATURES, w)}
+
+
+def load_weights(path: str) -> Optional[dict[str, float]]:
+    if not path or not os.path.exists(path):
+        return None
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)["weights"]
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"Somatic model {path} is unreadable, using built-in weights: {e}")
+        return None
+
+
+@lru_cache()
+def get_classifier() -> SomaticClassifier:
+    return SomaticClassifier(load_weights(settings.SOMATIC_MODEL_PATH) or DEFAULT_WEIGHTS)
+
+
+def classify_response(text: str) -> dict:
+    return get_classifier().classify(text)
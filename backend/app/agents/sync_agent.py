@@ -1,34 +1,31 @@
+import asyncio
 import random
 import json
+from collections import Counter
 from app.agents.common import client, settings, ARCHETYPES, SPHERES, MATRIX_DATA
 from sqlalchemy import select, func
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models.text_diagnostics import TextScene, SceneSet, SceneSetItem, SceneInteraction
+from app.models.text_diagnostics import SceneSet, SceneSetItem, SceneInteraction
+from app.services.embeddings import embed
+from app.agents.somatic_classifier import classify_response, response_features
+from app.core.scene_index import SET_SIZE, get_scene_index, seen_scene_ids
 
 def get_response_metrics(text: str) -> dict:
     """
     Extract metrics from user response: length, body words, space objects.
+    Words are matched against the stem lexicon of app/agents/somatic_classifier.py.
     """
     if not text:
         return {"length": 0, "has_body": False, "has_objects": False}
-    
-    text_lower = text.lower()
-    
-    # Body parts keywords (Russian)
-    body_parts = ["грудь", "живот", "горло", "рук", "ног", "спин", "плеч", "голов", "солнечн", "дыхани", "сердц", "тело", "мышц", "колен", "стоп", "пальц", "ладон", "лицо", "глаз", "кожа", "ощущ", "вздох", "пульс"]
-    has_body = any(bp in text_lower for bp in body_parts)
-    
-    # Space objects / environment keywords (Russian)
-    space_objects = ["стена", "пол", "потолок", "дверь", "окно", "туман", "свет", "тьма", "камень", "дерево", "вода", "песок", "стол", "стул", "предмет", "вещь", "объект", "пустот", "вокруг", "рядом", "даль", "горизонт"]
-    has_objects = any(obj in text_lower for obj in space_objects)
-    
+
+    counts = response_features(text)
     return {
         "length": len(text),
-        "has_body": has_body,
-        "has_objects": has_objects
+        "has_body": counts["body"] + counts["sensation"] > 0,
+        "has_objects": counts["place"] + counts["perception"] > 0,
     }
 
-async def autonomous_somatic_check(user_message: str, scene_context: str) -> dict:
+async def llm_somatic_check(user_message: str, scene_context: str) -> dict:
     """
     Uses LLM to detect if the user's response is somatic (body/environment) or abstract (thinking).
     """
@@ -48,17 +45,37 @@ async def autonomous_somatic_check(user_message: str, scene_context: str) -> dic
   "reason": "краткое пояснение (почему не соматика)"
 }}
 """
+    response = await client.chat.completions.create(
+        model=settings.OPENAI_MODEL_FAST,
+        messages=[{"role": "user", "content": prompt}],
+        response_format={"type": "json_object"}
+    )
+    return json.loads(response.choices[0].message.content)
+
+async def autonomous_somatic_check(user_message: str, scene_context: str) -> dict:
+    """
+    Somatic (body/environment) or abstract (thinking) verdict on the user's response.
+    The local classifier decides when it is confident; the LLM is asked in the
+    uncertain band and for a SOMATIC_LLM_SAMPLE_RATE sample of the rest.
+    "source" tells which one decided ("local" / "llm"), "confidence" is the local one.
+    """
+    local = classify_response(user_message)
+    if local["confidence"] >= settings.SOMATIC_CONFIDENCE and random.random() >= settings.SOMATIC_LLM_SAMPLE_RATE:
+        return {**local, "source": "local"}
     try:
-        response = await client.chat.completions.create(
-            model=settings.OPENAI_MODEL_FAST,
-            messages=[{"role": "user", "content": prompt}],
-            response_format={"type": "json_object"}
-        )
-        return json.loads(response.choices[0].message.content)
+        verdict = await llm_somatic_check(user_message, scene_context)
     except Exception:
-        # Fallback to simple metrics if LLM fails
-        m = get_response_metrics(user_message)
-        return {"is_somatic": not (m["length"] < 10 or (not m["has_body"] and not m["has_objects"])), "has_body": m["has_body"], "has_objects": m["has_objects"], "reason": "fallback"}
+        # Fallback to the local verdict if LLM fails
+        return {**local, "source": "local", "reason": "fallback"}
+    return {
+        "is_somatic": bool(verdict.get("is_somatic", False)),
+        "has_body": bool(verdict.get("has_body", False)),
+        "has_objects": bool(verdict.get("has_objects", False)),
+        "reason": verdict.get("reason"),
+        "probability": local["probability"],
+        "confidence": local["confidence"],
+        "source": "llm",
+    }
 
 def is_abstract_response(text: str) -> bool:
     """Legacy wrapper for backward compatibility."""
@@ -66,35 +83,22 @@ def is_abstract_response(text: str) -> bool:
     return m["length"] < 10 or (not m["has_body"] and not m["has_objects"])
 
 async def get_embedding(text: str) -> list[float]:
-    """Get embedding for a text string."""
+    """Get embedding for a text string (zero vector if it cannot be embedded)."""
     try:
-        resp = await client.embeddings.create(
-            input=text,
-            model="text-embedding-3-small"
-        )
-        return resp.data[0].embedding
+        return await embed(text)
     except Exception:
-        return [0.0] * 1536
+        return [0.0] * settings.EMBEDDING_DIMENSIONS
 
-async def select_scene_set(db: AsyncSession, session_id: int, sphere_id: int, archetype_id: int):
+async def select_scene_set(db: AsyncSession, session_id: int, sphere_id: int, archetype_id: int, user_id: int = None):
     """
-    Stimulus Engine: Selects 5 scenes for a session from the library.
+    Stimulus Engine: Selects 5 scenes for a session from the library
+    (app/core/scene_index.py: bandit over scene rewards, diverse, unseen first).
     """
-    # 1. Fetch available scenes for this sphere/archetype
-    # (In a real system, we might pick different archetypes for different layers)
-    result = await db.execute(
-        select(TextScene).where(TextScene.sphere_id == sphere_id).where(TextScene.is_active == True)
-    )
-    scenes = result.scalars().all()
-    
-    if len(scenes) < 5:
-        # Fallback to random if not enough in this sphere
-        result = await db.execute(select(TextScene).where(TextScene.is_active == True).limit(20))
-        scenes = result.scalars().all()
-    
-    selected_scenes = random.sample(scenes, min(len(scenes), 5))
+    index = await get_scene_index(db)
+    seen = await seen_scene_ids(db, user_id) if user_id is not None else ()
+    selected_scenes = index.select(sphere_id, k=SET_SIZE, seen=seen)
     
-    # 2. Save SceneSet
+    # Save SceneSet
     new_set = SceneSet(session_id=session_id)
     db.add(new_set)
     await db.flush()
@@ -327,3 +331,38 @@ async def run_avatar_layer(
         import logging
         logging.getLogger(__name__).error(f"Sync OpenAI Error: {e}")
         return "Произошла ошибка при генерации ответа. Попробуйте нажать кнопку 'Далее' ещё раз."
+
+
+# committed / discarded speculative layers; "wasted" — discarded after the LLM call had started
+speculation_stats: Counter = Counter()
+
+class SpeculativeLayer:
+    """
+    A layer generated before the somatic verdict that decides whether it is shown.
+    commit() returns it; discard() cancels it. A verdict from the local classifier
+    arrives without yielding to the event loop, so a layer discarded after it
+    never starts and costs no LLM call: the overlap only happens when the
+    check waits for the LLM.
+    """
+
+    def __init__(self, **layer_kwargs):
+        self.started = False
+        self.task = asyncio.ensure_future(self._generate(layer_kwargs))
+
+    async def _generate(self, layer_kwargs: dict) -> str:
+        self.started = True
+        return await run_avatar_layer(**layer_kwargs)
+
+    async def commit(self) -> str:
+        speculation_stats["committed"] += 1
+        return await self.task
+
+    def discard(self) -> None:
+        # A layer that finished before the verdict is discarded too, and wasted in full
+        speculation_stats["discarded"] += 1
+        if self.started:
+            speculation_stats["wasted"] += 1
+        if not self.task.done():
+            self.task.cancel()
+        elif not self.task.cancelled():
+            self.task.exception()  # retrieved, so a failed layer is not reported as unhandled
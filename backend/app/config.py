@@ -9,6 +9,22 @@ class Settings(BaseSettings):
     DATA_DIR: str = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data")
     EPHE_PATH: str = os.path.join(DATA_DIR, "ephe")
 
+    # Precomputed ephemeris table (scripts/build_ephemeris_table.py).
+    # Lookups whose interpolation error exceeds the tolerances use pyswisseph.
+    EPHEMERIS_TABLE_ENABLED: bool = False
+    EPHEMERIS_TABLE_TOLERANCE: float = 5e-5        # degrees
+    EPHEMERIS_TABLE_SPEED_TOLERANCE: float = 1e-4  # degrees/day
+
+    # Offline gazetteer for geocode_place (scripts/build_gazetteer.py).
+    # Nominatim is only asked on a miss; its answers go to GEOCODE_CACHE_PATH.
+    GAZETTEER_ENABLED: bool = True
+    GAZETTEER_PATH: str = os.path.join(DATA_DIR, "gazetteer")
+    GEOCODE_CACHE_PATH: str = os.path.join(DATA_DIR, "gazetteer", "geocode_cache.jsonl")
+
+    # AvatarCard vectors for archetype matching (app/core/astrology/card_index.py),
+    # written by scripts/sync_vector_db.py; without it they are loaded from the table.
+    CARD_INDEX_PATH: str = os.path.join(DATA_DIR, "card_index")
+
     DATABASE_URL: str
     BOT_TOKEN: str
     OPENAI_API_KEY: str
@@ -29,12 +45,82 @@ class Settings(BaseSettings):
     OPENAI_MODEL: str = "o3-mini"
     OPENAI_MODEL_FAST: str = "gpt-5-mini"
 
+    # Outgoing LLM calls (app/services/llm_scheduler.py): budget per model.
+    # LLM_MODEL_BUDGETS overrides it for single models, e.g.
+    # {"o3-mini": {"max_concurrency": 8, "tokens_per_minute": 150000}}
+    LLM_MAX_CONCURRENCY: int = 16
+    LLM_REQUESTS_PER_MINUTE: int = 500
+    LLM_TOKENS_PER_MINUTE: int = 400_000
+    LLM_MODEL_BUDGETS: dict[str, dict[str, int]] = {}
+    LLM_MAX_RETRIES: int = 4
+    # The budgets above are the account's. Every process (the API and each of
+    # the JOB_WORKER_PROCESSES workers) schedules its own calls and gets this
+    # share of them; 0 splits them evenly, 1 / (JOB_WORKER_PROCESSES + 1)
+    LLM_PROCESS_SHARE: float = 0.0
+
+    # Background jobs (app/services/jobs.py), run by `python -m app.worker`.
+    # JOB_CONCURRENCY overrides the cross-worker limit of single job types, e.g.
+    # {"dsb.generate_portrait": 2}
+    JOB_WORKER_PROCESSES: int = 2
+    JOB_WORKER_SLOTS: int = 8          # jobs one worker process runs at once
+    JOB_POLL_INTERVAL: float = 5.0     # seconds; NOTIFY wakes workers earlier
+    JOB_CONCURRENCY: dict[str, int] = {}
+    JOB_RETRY_BASE_DELAY: float = 10.0
+    JOB_RETRY_MAX_DELAY: float = 900.0
+    JOB_SHUTDOWN_GRACE: float = 30.0   # running jobs get this long to finish on SIGTERM
+    JOB_RETENTION_HOURS: int = 72      # done jobs are purged after this
+    JOB_INLINE_WORKER: bool = False    # development: run one worker inside the API process
+
+    # Embeddings (app/services/embeddings.py): one model for every vector column.
+    # EMBEDDING_BACKEND "local" gives deterministic offline vectors (tests, no API key)
+    EMBEDDING_BACKEND: str = "openai"
+    EMBEDDING_MODEL: str = "text-embedding-3-small"
+    EMBEDDING_DIMENSIONS: int = 1536
+    EMBEDDING_BATCH_WINDOW_MS: float = 10.0  # concurrent single texts wait this long to share a call
+    EMBEDDING_MAX_BATCH: int = 256           # texts per API call
+    EMBEDDING_MEMORY_CACHE_SIZE: int = 2048  # vectors kept in process
+    EMBEDDING_PERSISTENT_CACHE: bool = True  # table embedding_cache
+
+    # Somatic check of sync answers (app/agents/somatic_classifier.py): the local
+    # verdict stands at or above SOMATIC_CONFIDENCE, the LLM decides below it.
+    # SOMATIC_LLM_SAMPLE_RATE of confident answers go to the LLM as well, so that
+    # exported sessions keep unbiased labels for refitting SOMATIC_MODEL_PATH
+    SOMATIC_CONFIDENCE: float = 0.85
+    SOMATIC_LLM_SAMPLE_RATE: float = 0.02
+    SOMATIC_MODEL_PATH: str = os.path.join(DATA_DIR, "somatic_model.json")
+
+    # Sync phases: generate the next layer while the somatic check runs
+    # (app/agents/sync_agent.py SpeculativeLayer)
+    SYNC_SPECULATION: bool = True
+    # Folded event logs of running sync sessions kept per process (app/core/sync_log.py)
+    SYNC_LOG_CACHE_SIZE: int = 2048
+    # Post-sync analytics (app/core/sync_analytics.py): a completion waits
+    # SYNC_ANALYTICS_WINDOW seconds for the user's next ones, a job folds at
+    # most SYNC_ANALYTICS_BATCH sessions per transaction
+    SYNC_ANALYTICS_WINDOW: float = 15.0
+    SYNC_ANALYTICS_BATCH: int = 200
+
+    # Scene selection of sync sessions (app/core/scene_index.py). The active
+    # library is kept in process; stats are re-read every SCENE_INDEX_REFRESH
+    # seconds, the scenes when the library changed. SCENE_POLICY is "thompson",
+    # "ucb" or "random"; SCENE_DIVERSITY is the penalty on cosine similarity to
+    # the scenes already in the set
+    SCENE_INDEX_REFRESH: float = 30.0
+    SCENE_POLICY: str = "thompson"
+    SCENE_DIVERSITY: float = 0.3
+    SCENE_UCB_C: float = 0.5
+
     # Token budgets (hidden from user)
     TOKEN_BUDGET_REFLECTION: int = 800
     TOKEN_BUDGET_MINI_SESSION: int = 2500
     TOKEN_BUDGET_SYNC: int = 12000
     TOKEN_BUDGET_DEEP_SESSION: int = 4000
 
+    # Alignment prompt context (app/agents/align_context.py): history of the
+    # card (sync + summaries of earlier alignments) and the dialogue window
+    ALIGN_HISTORY_TOKEN_BUDGET: int = 1200
+    ALIGN_DIALOGUE_TOKEN_BUDGET: int = 3000
+
     # Energy costs
     ENERGY_COST_SYNC: int = 35
     ENERGY_COST_ALIGNMENT: int = 20
@@ -0,0 +1,225 @@
+"""
+In-process nearest-neighbour index over the AvatarCard embeddings.
+
+avatar_cards is a static table (22 archetypes x 12 spheres) rewritten only by
+scripts/sync_vector_db.py, so instead of one pgvector `ORDER BY
+cosine_distance` query per lookup the vectors are kept as one contiguous
+float32 matrix with unit-length rows. A batch of query vectors is answered
+by a single matrix multiply (cosine similarity of every query with every
+card) and an argpartition per row; a lookup restricted to one sphere masks
+the other cards out.
+
+sync_vector_db.py writes the matrix to settings.CARD_INDEX_PATH, from where
+it is memory-mapped if it was built with the current embedding model and
+dimensions; otherwise the index is loaded from the table on first use. A
+process keeps its index until restart or reset_card_index().
+"""
+import json
+import logging
+import os
+from typing import Collection, Iterable, NamedTuple, Optional, Sequence, Union
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.avatar_card import AvatarCard
+
+logger = logging.getLogger(__name__)
+
+VECTORS_FILE = "card_index_vectors.npy"
+META_FILE = "card_index.json"
+
+
+# One sphere, several spheres, or None for all cards
+SphereFilter = Union[str, Collection[str], None]
+
+# MMR candidates per requested result: enough to find diverse cards, small enough to stay cheap
+MMR_POOL_FACTOR = 4
+
+
+class CardMatch(NamedTuple):
+    archetype_id: int
+    sphere: str
+    score: float  # cosine similarity, higher is closer
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class CardIndex:
+    def __init__(
+        self,
+        vectors: np.ndarray,
+        archetype_ids: Sequence[int],
+        spheres: Sequence[str],
+        model: str,
+        dimensions: int,
+    ):
+        self.vectors = vectors  # (cards, dimensions) float32, unit rows
+        self.archetype_ids = np.asarray(archetype_ids, dtype=np.int32)
+        self.spheres = list(spheres)
+        self.model = model
+        self.dimensions = dimensions
+        self._sphere_masks = {sphere: np.array([s == sphere for s in self.spheres]) for sphere in set(self.spheres)}
+
+    @classmethod
+    def build(cls, rows: Iterable[tuple[int, str, Sequence[float]]], model: str, dimensions: int) -> "CardIndex":
+        """rows: (archetype_id, sphere, embedding)."""
+        rows = list(rows)
+        vectors = np.array([embedding for _, _, embedding in rows], dtype=np.float32).reshape(len(rows), dimensions)
+        return cls(
+            np.ascontiguousarray(_unit_rows(vectors)),
+            [archetype_id for archetype_id, _, _ in rows],
+            [sphere for _, sphere, _ in rows],
+            model,
+            dimensions,
+        )
+
+    @classmethod
+    async def from_db(cls, db: AsyncSession) -> "CardIndex":
+        result = await db.execute(
+            select(AvatarCard.archetype_id, AvatarCard.sphere, AvatarCard.embedding)
+            .where(AvatarCard.embedding.is_not(None))
+            .order_by(AvatarCard.id)
+        )
+        return cls.build(result.all(), settings.EMBEDDING_MODEL, settings.EMBEDDING_DIMENSIONS)
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, VECTORS_FILE), self.vectors)
+        with open(os.path.join(directory, META_FILE), "w", encoding="utf-8") as f:
+            json.dump({
+                "model": self.model,
+                "dimensions": self.dimensions,
+                "archetype_ids": self.archetype_ids.tolist(),
+                "spheres": self.spheres,
+            }, f)
+
+    @classmethod
+    def load(cls, directory: str) -> "CardIndex":
+        """Memory-map an index written by save()."""
+        with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        vectors = np.load(os.path.join(directory, VECTORS_FILE), mmap_mode="r")
+        return cls(vectors, meta["archetype_ids"], meta["spheres"], meta["model"], meta["dimensions"])
+
+    def __len__(self) -> int:
+        return len(self.spheres)
+
+    def _mask(self, spheres: SphereFilter) -> Optional[np.ndarray]:
+        """Boolean mask of the cards in `spheres`; None when all cards are allowed."""
+        if spheres is None:
+            return None
+        if isinstance(spheres, str):
+            spheres = (spheres,)
+        mask = np.zeros(len(self), dtype=bool)
+        for sphere in spheres:
+            sphere_mask = self._sphere_masks.get(sphere)
+            if sphere_mask is not None:
+                mask |= sphere_mask
+        return mask
+
+    def search(
+        self,
+        queries,
+        k: int = 5,
+        spheres: Optional[Sequence[SphereFilter]] = None,
+        diversity: float = 0.0,
+    ) -> list[list[CardMatch]]:
+        """
+        Top-k cards for every query vector. spheres[i] restricts query i to
+        one sphere or a collection of spheres (None: all cards); unknown
+        spheres find nothing.
+
+        diversity > 0 reranks the best MMR_POOL_FACTOR * k candidates by
+        maximal marginal relevance: each next card maximizes
+        (1 - diversity) * similarity to the query - diversity * similarity to
+        the closest card already chosen, so near-duplicates (the same
+        archetype in neighbouring spheres) give way to other archetypes.
+        Results come in selection order; scores stay the cosine similarity
+        to the query. Without diversity results are sorted by score.
+        """
+        queries = np.asarray(queries, dtype=np.float32)
+        if queries.ndim == 1:
+            queries = queries[None, :]
+        if not len(queries):
+            return []
+        if not len(self) or k <= 0:
+            return [[] for _ in queries]
+
+        scores = _unit_rows(queries) @ self.vectors.T
+        if spheres is not None:
+            for row, selector in enumerate(spheres):
+                mask = self._mask(selector)
+                if mask is not None:
+                    scores[row, ~mask] = -np.inf
+
+        pool = min(k * MMR_POOL_FACTOR if diversity > 0 else k, len(self))
+        top = np.argpartition(-scores, pool - 1, axis=1)[:, :pool]
+        matches = []
+        for row, candidates in enumerate(top):
+            candidates = candidates[np.argsort(-scores[row, candidates])]
+            candidates = candidates[scores[row, candidates] != -np.inf]
+            if diversity > 0:
+                candidates = self._mmr(scores[row], candidates, k, diversity)
+            matches.append([
+                CardMatch(int(self.archetype_ids[i]), self.spheres[i], float(scores[row, i]))
+                for i in candidates[:k]
+            ])
+        return matches
+
+    def _mmr(self, relevance: np.ndarray, candidates: np.ndarray, k: int, diversity: float) -> np.ndarray:
+        if len(candidates) <= 1:
+            return candidates
+        pairwise = self.vectors[candidates] @ self.vectors[candidates].T
+        chosen = [0]  # candidates are sorted: the most relevant card always comes first
+        closest = pairwise[0].copy()  # similarity of every candidate to its closest chosen card
+        available = np.ones(len(candidates), dtype=bool)
+        available[0] = False
+        while len(chosen) < min(k, len(candidates)):
+            value = (1 - diversity) * relevance[candidates] - diversity * closest
+            value[~available] = -np.inf
+            best = int(np.argmax(value))
+            chosen.append(best)
+            available[best] = False
+            closest = np.maximum(closest, pairwise[best])
+        return candidates[chosen]
+
+
+_index: Optional[CardIndex] = None
+
+
+def _load_file() -> Optional[CardIndex]:
+    if not os.path.exists(os.path.join(settings.CARD_INDEX_PATH, META_FILE)):
+        return None
+    try:
+        index = CardIndex.load(settings.CARD_INDEX_PATH)
+    except Exception as e:
+        logger.warning(f"[CardIndex] Cannot load {settings.CARD_INDEX_PATH}: {e}")
+        return None
+    if (index.model, index.dimensions) != (settings.EMBEDDING_MODEL, settings.EMBEDDING_DIMENSIONS):
+        logger.warning(f"[CardIndex] {settings.CARD_INDEX_PATH} was built with {index.model}/{index.dimensions}, "
+                       f"loading from the database")
+        return None
+    return index
+
+
+async def get_card_index(db: AsyncSession) -> CardIndex:
+    global _index
+    if _index is None:
+        index = _load_file() or await CardIndex.from_db(db)
+        if not len(index):
+            return index  # cards not synced yet: look again next time
+        logger.info(f"[CardIndex] {len(index)} cards loaded")
+        _index = index
+    return _index
+
+
+def reset_card_index() -> None:
+    global _index
+    _index = None
@@ -0,0 +1,152 @@
+"""
+Precomputed ephemeris table with cubic Hermite interpolation.
+
+scripts/build_ephemeris_table.py samples every body of PLANET_CODES once per
+step (daily by default) with pyswisseph and stores longitude + speed in a
+memory-mapped .npy under settings.EPHE_PATH. Positions between samples are
+interpolated from the two neighbouring (longitude, speed) pairs.
+
+The build also records, per interval, the worst interpolation error against
+pyswisseph. A lookup is only served from the table when that error is within
+EPHEMERIS_TABLE_TOLERANCE / EPHEMERIS_TABLE_SPEED_TOLERANCE; everything else
+(out of range, too fast-moving, table missing or disabled) goes to swe.calc_ut.
+"""
+import json
+import logging
+import os
+
+import numpy as np
+import swisseph as swe
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+TABLE_PATH = os.path.join(settings.EPHE_PATH, "ephemeris_table.npy")
+META_PATH = os.path.join(settings.EPHE_PATH, "ephemeris_table.json")
+
+CALC_FLAGS = swe.FLG_SWIEPH | swe.FLG_SPEED
+
+# Last axis of the table
+LON, SPEED, LON_ERR, SPEED_ERR = range(4)
+
+
+def hermite(p0, m0, p1, m1, t, h):
+    """
+    Cubic Hermite interpolation on [x0, x0 + h] at fraction t.
+    p = value, m = derivative per unit x. Returns (value, derivative).
+    Works element-wise on floats or NumPy arrays.
+    """
+    t2 = t * t
+    t3 = t2 * t
+    value = (
+        (2 * t3 - 3 * t2 + 1) * p0
+        + (t3 - 2 * t2 + t) * h * m0
+        + (-2 * t3 + 3 * t2) * p1
+        + (t3 - t2) * h * m1
+    )
+    derivative = (
+        (6 * t2 - 6 * t) * p0
+        + (3 * t2 - 4 * t + 1) * h * m0
+        + (-6 * t2 + 6 * t) * p1
+        + (3 * t2 - 2 * t) * h * m1
+    ) / h
+    return value, derivative
+
+
+class EphemerisTable:
+    """Read-only view of a built table (memory-mapped, shared by all callers)."""
+
+    def __init__(self, table_path: str = TABLE_PATH, meta_path: str = META_PATH):
+        with open(meta_path, encoding="utf-8") as f:
+            self.meta = json.load(f)
+        # (n_samples, n_bodies, 4): LON (unwrapped), SPEED, LON_ERR, SPEED_ERR.
+        # Plain ndarray view of the memmap: same pages, much cheaper indexing.
+        self.data = np.asarray(np.load(table_path, mmap_mode="r"))
+        self.jd_start: float = self.meta["jd_start"]
+        self.step: float = self.meta["step"]
+        self.codes: list[int] = self.meta["body_codes"]
+        self._column = {code: i for i, code in enumerate(self.codes)}
+        self.jd_end = self.jd_start + self.step * (self.data.shape[0] - 1)
+
+    def has_body(self, planet_code: int) -> bool:
+        return planet_code in self._column
+
+    def lookup(
+        self,
+        jds: np.ndarray,
+        tolerance: float,
+        speed_tolerance: float,
+    ) -> tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Interpolate every table body at every jd.
+        Returns (longitude % 360, speed, ok) with shape (N, n_bodies);
+        ok is False where the caller must fall back to pyswisseph.
+        """
+        jds = np.asarray(jds, dtype=np.float64)
+        pos = (jds - self.jd_start) / self.step
+        in_range = (pos >= 0) & (pos < self.data.shape[0] - 1)
+        idx = np.where(in_range, np.floor(pos), 0).astype(np.int64)
+        t = (pos - idx)[:, None]
+
+        lo = self.data[idx]
+        hi = self.data[idx + 1]
+        lon, speed = hermite(lo[..., LON], lo[..., SPEED], hi[..., LON], hi[..., SPEED], t, self.step)
+
+        ok = (
+            in_range[:, None]
+            & (lo[..., LON_ERR] <= tolerance)
+            & (lo[..., SPEED_ERR] <= speed_tolerance)
+        )
+        return lon % 360, speed, ok
+
+    def calc(self, jd: float, planet_code: int, tolerance: float, speed_tolerance: float) -> tuple[float, float] | None:
+        """Single-body lookup; None when the table cannot answer within tolerance."""
+        column = self._column.get(planet_code)
+        pos = (jd - self.jd_start) / self.step
+        if column is None or not 0 <= pos < self.data.shape[0] - 1:
+            return None
+        i = int(pos)
+        lo, hi = self.data[i:i + 2, column].tolist()
+        if lo[LON_ERR] > tolerance or lo[SPEED_ERR] > speed_tolerance:
+            return None
+        lon, speed = hermite(lo[LON], lo[SPEED], hi[LON], hi[SPEED], pos - i, self.step)
+        return lon % 360, speed
+
+
+_table: EphemerisTable | None = None
+_table_loaded = False
+
+
+def get_ephemeris_table() -> EphemerisTable | None:
+    """The process-wide table, or None when disabled or not built."""
+    global _table, _table_loaded
+    if not _table_loaded:
+        _table_loaded = True
+        if settings.EPHEMERIS_TABLE_ENABLED:
+            try:
+                _table = EphemerisTable()
+                logger.info(
+                    f"Ephemeris table loaded: JD {_table.jd_start}..{_table.jd_end}, "
+                    f"{len(_table.codes)} bodies"
+                )
+            except FileNotFoundError:
+                logger.warning(f"EPHEMERIS_TABLE_ENABLED but {TABLE_PATH} is missing; using pyswisseph")
+    return _table
+
+
+def calc_position(jd: float, planet_code: int) -> tuple[float, float]:
+    """
+    Ecliptic longitude and speed of one body, like swe.calc_ut(...)[0][0] / [3].
+    Served from the table when possible, otherwise from pyswisseph.
+    """
+    table = get_ephemeris_table()
+    if table is not None:
+        hit = table.calc(
+            jd, planet_code,
+            settings.EPHEMERIS_TABLE_TOLERANCE, settings.EPHEMERIS_TABLE_SPEED_TOLERANCE,
+        )
+        if hit is not None:
+            return hit
+    pos, _ = swe.calc_ut(jd, planet_code, CALC_FLAGS)
+    return pos[0], pos[3]
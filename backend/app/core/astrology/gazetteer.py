@@ -0,0 +1,388 @@
+"""
+Offline gazetteer: place name -> (lat, lon, timezone) without a network call.
+
+The index is a sorted array of normalized name keys (every Russian and Latin
+alias is transliterated to the same Latin form, so "Москва", "Moskva" and
+"moskva" share one key) plus a parallel array of place rows. It is built by
+scripts/build_gazetteer.py into settings.GAZETTEER_PATH and memory-mapped at
+runtime; without a built index the bundled places_sample.tsv is indexed in
+memory instead.
+
+Lookup order used by geocode_place:
+  1. GeocodeCache - earlier Nominatim answers, keyed by normalized query
+  2. exact key match (most populous place wins)
+  3. word-boundary prefix match ("нижний" -> "nizhny novgorod")
+  4. fuzzy match within a small edit distance ("Екатиринбург")
+Only a miss on all of them goes to Nominatim, whose answer is appended to
+the cache file.
+
+Comma parts after the name ("Moscow, Idaho", "Париж, Франция") are
+qualifiers: every one must name the place's country (countries.tsv) or its
+first-level region, else the gazetteer misses and Nominatim answers.
+"""
+import json
+import logging
+import os
+import threading
+import unicodedata
+from typing import Iterable, NamedTuple
+
+import numpy as np
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+KEYS_FILE = "gazetteer_keys.npy"
+KEY_PLACES_FILE = "gazetteer_key_places.npy"
+PLACES_FILE = "gazetteer_places.npy"
+META_FILE = "gazetteer.json"
+SAMPLE_SOURCE = os.path.join(settings.DATA_DIR, "gazetteer", "places_sample.tsv")
+COUNTRIES_SOURCE = os.path.join(settings.DATA_DIR, "gazetteer", "countries.tsv")
+
+# Keys are stored as fixed-width UTF-8 bytes; longer names are truncated
+# (identically for queries, so they still match).
+KEY_BYTES = 48
+PLACE_DTYPE = np.dtype([
+    ("lat", "<f8"),
+    ("lon", "<f8"),
+    ("tz", "<u2"),
+    ("population", "<u4"),
+    ("country", "S2"),
+    ("admin", "<u4"),  # index into Gazetteer.admins
+])
+
+MIN_PREFIX_LEN = 4
+MAX_CANDIDATES = 256
+
+_CYRILLIC_TO_LATIN = {
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e",
+    "ж": "zh", "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m",
+    "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "kh", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "shch",
+    "ъ": "", "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+    # Ukrainian, Belarusian, Kazakh
+    "і": "i", "ї": "yi", "є": "ye", "ґ": "g", "ў": "u",
+    "ә": "a", "ғ": "g", "қ": "k", "ң": "n", "ө": "o", "ұ": "u", "ү": "u", "һ": "h",
+}
+_TRANSLIT = str.maketrans(_CYRILLIC_TO_LATIN)
+
+
+def normalize_place(name: str) -> str:
+    """
+    Canonical lookup key: lowercase, Cyrillic transliterated, diacritics
+    stripped, punctuation collapsed to single spaces.
+    """
+    text = unicodedata.normalize("NFC", name.lower()).translate(_TRANSLIT)
+    text = "".join(
+        ch for ch in unicodedata.normalize("NFKD", text)
+        if not unicodedata.combining(ch)
+    )
+    return " ".join("".join(ch if ch.isalnum() else " " for ch in text).split())
+
+
+def _encode_key(key: str) -> bytes:
+    return key.encode("utf-8")[:KEY_BYTES]
+
+
+def split_query(place: str) -> tuple[str, tuple[str, ...]]:
+    """Name key and qualifier keys of a free-form query: "Moscow, Idaho" -> ("moscow", ("idaho",))."""
+    name, *rest = place.split(",")
+    return normalize_place(name), tuple(q for q in map(normalize_place, rest) if q)
+
+
+def read_countries_tsv(path: str) -> dict[str, str]:
+    """Normalized country names and codes -> ISO code, from countries.tsv (code, |-separated names)."""
+    names = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            code, _, aliases = line.rstrip("\n").partition("\t")
+            for alias in (code, *aliases.split("|")):
+                key = normalize_place(alias)
+                if key:
+                    names[key] = code
+    return names
+
+
+def edit_distance(a: str, b: str, limit: int) -> int:
+    """Levenshtein distance, giving up (returns limit + 1) once it exceeds limit."""
+    if abs(len(a) - len(b)) > limit:
+        return limit + 1
+    previous = list(range(len(b) + 1))
+    for i, ca in enumerate(a, 1):
+        current = [i]
+        for j, cb in enumerate(b, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + (ca != cb)))
+        if min(current) > limit:
+            return limit + 1
+        previous = current
+    return previous[-1]
+
+
+def _max_distance(key: str) -> int:
+    if len(key) < 4:
+        return 0
+    return 1 if len(key) < 8 else 2
+
+
+class PlaceRow(NamedTuple):
+    """One gazetteer entry before indexing."""
+    name: str
+    country: str
+    lat: float
+    lon: float
+    timezone: str
+    population: int
+    aliases: tuple[str, ...] = ()
+    admin: tuple[str, ...] = ()  # names and codes of the first-level region ("Idaho", "ID")
+
+
+class Place(NamedTuple):
+    lat: float
+    lon: float
+    timezone: str
+    population: int
+    match: str  # cache | exact | prefix | fuzzy | nominatim
+
+
+def read_places_tsv(path: str) -> list[PlaceRow]:
+    """Parse the bundled TSV format (see the header of places_sample.tsv)."""
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            if not line.strip() or line.startswith("#"):
+                continue
+            name, country, lat, lon, tz, population, *rest = line.rstrip("\n").split("\t")
+            aliases, admin = [tuple(a for a in (rest[i].split("|") if len(rest) > i else []) if a) for i in (0, 1)]
+            rows.append(PlaceRow(name, country, float(lat), float(lon), tz, int(population), aliases, admin))
+    return rows
+
+
+class Gazetteer:
+    """Sorted-key index over place rows; see module docstring for lookup order."""
+
+    def __init__(self, keys: np.ndarray, key_places: np.ndarray, places: np.ndarray, timezones: list[str],
+                 admins: list[list[str]] | None = None, countries: dict[str, str] | None = None):
+        self.keys = keys
+        self.key_places = key_places
+        self.places = places
+        self.timezones = timezones
+        self.admins = [frozenset(names) for names in admins or [[]]]
+        self.countries = countries if countries is not None else read_countries_tsv(COUNTRIES_SOURCE)
+
+    @classmethod
+    def build(cls, rows: Iterable[PlaceRow]) -> "Gazetteer":
+        timezones: list[str] = []
+        tz_index: dict[str, int] = {}
+        admins: list[list[str]] = [[]]
+        admin_index: dict[tuple[str, ...], int] = {(): 0}
+        places = []
+        entries: dict[tuple[bytes, int], None] = {}
+        for row in rows:
+            if row.timezone not in tz_index:
+                tz_index[row.timezone] = len(timezones)
+                timezones.append(row.timezone)
+            admin = tuple(sorted({k for k in map(normalize_place, row.admin) if k}))
+            if admin not in admin_index:
+                admin_index[admin] = len(admins)
+                admins.append(list(admin))
+            place_id = len(places)
+            places.append((row.lat, row.lon, tz_index[row.timezone], row.population,
+                           row.country.encode("ascii", "ignore")[:2], admin_index[admin]))
+            for alias in (row.name, *row.aliases):
+                key = normalize_place(alias)
+                if key:
+                    entries[(_encode_key(key), place_id)] = None
+
+        places_arr = np.array(places, dtype=PLACE_DTYPE)
+        pairs = list(entries)
+        # Same key: most populous place first, so the left-most hit is the answer
+        pairs.sort(key=lambda p: (p[0], -int(places_arr["population"][p[1]])))
+        keys = np.array([k for k, _ in pairs], dtype=f"S{KEY_BYTES}")
+        key_places = np.array([p for _, p in pairs], dtype=np.int32)
+        return cls(keys, key_places, places_arr, timezones, admins)
+
+    def save(self, directory: str) -> None:
+        os.makedirs(directory, exist_ok=True)
+        np.save(os.path.join(directory, KEYS_FILE), self.keys)
+        np.save(os.path.join(directory, KEY_PLACES_FILE), self.key_places)
+        np.save(os.path.join(directory, PLACES_FILE), self.places)
+        with open(os.path.join(directory, META_FILE), "w", encoding="utf-8") as f:
+            json.dump({"timezones": self.timezones, "admins": [sorted(a) for a in self.admins],
+                       "keys": len(self.keys), "places": len(self.places)}, f)
+
+    @classmethod
+    def load(cls, directory: str) -> "Gazetteer":
+        """Memory-map an index written by save()."""
+        def mmap(name):
+            return np.asarray(np.load(os.path.join(directory, name), mmap_mode="r"))
+
+        with open(os.path.join(directory, META_FILE), encoding="utf-8") as f:
+            meta = json.load(f)
+        return cls(mmap(KEYS_FILE), mmap(KEY_PLACES_FILE), mmap(PLACES_FILE), meta["timezones"], meta.get("admins"))
+
+    def __len__(self) -> int:
+        return len(self.places)
+
+    def _place(self, place_id: int, match: str) -> Place:
+        row = self.places[place_id]
+        return Place(float(row["lat"]), float(row["lon"]), self.timezones[int(row["tz"])], int(row["population"]), match)
+
+    def _qualified(self, place_id: int, qualifiers: tuple[str, ...]) -> bool:
+        """Every qualifier names the country or the region of the place."""
+        if not qualifiers:
+            return True
+        if "country" not in (self.places.dtype.names or ()):
+            return False  # index built before countries were stored
+        row = self.places[place_id]
+        country = row["country"].decode("ascii")
+        admin = self.admins[int(row["admin"])]
+        return all(self.countries.get(q) == country or q in admin for q in qualifiers)
+
+    def _range(self, prefix: bytes) -> tuple[int, int]:
+        lo = int(np.searchsorted(self.keys, prefix, side="left"))
+        hi = int(np.searchsorted(self.keys, prefix + b"\xff", side="left"))
+        return lo, hi
+
+    def _best(self, indices: Iterable[int], qualifiers: tuple[str, ...] = ()) -> int | None:
+        """Most populous candidate key index whose place fits the qualifiers."""
+        fitting = [i for i in indices if self._qualified(int(self.key_places[i]), qualifiers)]
+        if not fitting:
+            return None
+        return max(fitting, key=lambda i: int(self.places["population"][self.key_places[i]]))
+
+    def exact(self, key: str, qualifiers: tuple[str, ...] = ()) -> Place | None:
+        encoded = _encode_key(key)
+        lo = int(np.searchsorted(self.keys, encoded, side="left"))
+        hi = int(np.searchsorted(self.keys, encoded, side="right"))
+        # Same key is ordered by population, so the first place that fits is the answer
+        for i in range(lo, min(hi, lo + MAX_CANDIDATES)):
+            if self._qualified(int(self.key_places[i]), qualifiers):
+                return self._place(int(self.key_places[i]), "exact")
+        return None
+
+    def prefix(self, key: str, qualifiers: tuple[str, ...] = ()) -> Place | None:
+        """Names that start with key followed by a word boundary."""
+        if len(key) < MIN_PREFIX_LEN:
+            return None
+        lo, hi = self._range(_encode_key(key + " "))
+        best = self._best(range(lo, min(hi, lo + MAX_CANDIDATES)), qualifiers)
+        if best is None:
+            return None
+        return self._place(int(self.key_places[best]), "prefix")
+
+    def fuzzy(self, key: str, qualifiers: tuple[str, ...] = ()) -> Place | None:
+        """Closest key within a length-dependent edit distance, sharing the first two characters."""
+        limit = _max_distance(key)
+        if not limit:
+            return None
+        lo, hi = self._range(_encode_key(key[:2]))
+        hi = min(hi, lo + MAX_CANDIDATES * 8)
+        scored = []
+        for offset, candidate in enumerate(self.keys[lo:hi].tolist()):
+            distance = edit_distance(key, candidate.decode("utf-8", "ignore"), limit)
+            if distance <= limit:
+                scored.append((distance, lo + offset))
+        if not scored:
+            return None
+        for distance in sorted({d for d, _ in scored}):
+            best = self._best((i for d, i in scored if d == distance), qualifiers)
+            if best is not None:
+                return self._place(int(self.key_places[best]), "fuzzy")
+        return None
+
+    def lookup(self, place: str, fuzzy: bool = True) -> Place | None:
+        """
+        Name, then qualifiers: "Moscow, Idaho" is the Moscow in Idaho or a
+        miss, never the most populous Moscow.
+        """
+        key, qualifiers = split_query(place)
+        if not key:
+            return None
+        return (
+            self.exact(key, qualifiers)
+            or self.prefix(key, qualifiers)
+            or (self.fuzzy(key, qualifiers) if fuzzy else None)
+        )
+
+
+class GeocodeCache:
+    """
+    Persistent answers from the online geocoder, one JSON object per line.
+    Loaded into a dict once; new answers are appended.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: dict[str, Place] = {}
+        self._lock = threading.Lock()
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                        self._entries[item["key"]] = Place(item["lat"], item["lon"], item["timezone"], 0, "cache")
+                    except (ValueError, KeyError):
+                        continue  # torn write from a crashed process
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, place: str) -> Place | None:
+        # The whole query only: a cached "Moscow" must not answer "Moscow, Idaho"
+        return self._entries.get(normalize_place(place))
+
+    def put(self, place: str, lat: float, lon: float, timezone: str) -> None:
+        key = normalize_place(place)
+        if not key:
+            return
+        item = {"key": key, "query": place, "lat": lat, "lon": lon, "timezone": timezone}
+        with self._lock:
+            self._entries[key] = Place(lat, lon, timezone, 0, "cache")
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(item, ensure_ascii=False) + "\n")
+
+
+_gazetteer: Gazetteer | None = None
+_cache: GeocodeCache | None = None
+_init_lock = threading.Lock()
+
+
+def get_gazetteer() -> Gazetteer:
+    """Process-wide index: the built one if present, else the bundled sample."""
+    global _gazetteer
+    if _gazetteer is None:
+        with _init_lock:
+            if _gazetteer is None:
+                if os.path.exists(os.path.join(settings.GAZETTEER_PATH, KEYS_FILE)):
+                    _gazetteer = Gazetteer.load(settings.GAZETTEER_PATH)
+                else:
+                    _gazetteer = Gazetteer.build(read_places_tsv(SAMPLE_SOURCE))
+                    logger.info("Gazetteer index not built; using bundled sample")
+                logger.info(f"Gazetteer: {len(_gazetteer)} places, {len(_gazetteer.keys)} keys")
+    return _gazetteer
+
+
+def get_geocode_cache() -> GeocodeCache:
+    global _cache
+    if _cache is None:
+        with _init_lock:
+            if _cache is None:
+                _cache = GeocodeCache(settings.GEOCODE_CACHE_PATH)
+    return _cache
+
+
+def resolve_place(place: str) -> Place | None:
+    """Offline resolution (cache, then gazetteer); None means ask Nominatim."""
+    if not settings.GAZETTEER_ENABLED:
+        return None
+    return get_geocode_cache().get(place) or get_gazetteer().lookup(place)
+
+
+def remember_place(place: str, lat: float, lon: float, timezone: str) -> None:
+    """Write an online geocoder answer back so the next request stays offline."""
+    if settings.GAZETTEER_ENABLED:
+        get_geocode_cache().put(place, lat, lon, timezone)
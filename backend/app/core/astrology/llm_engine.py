@@ -1,8 +1,9 @@
 import json
 from openai import AsyncOpenAI
 from app.config import settings
+from app.services.llm_scheduler import ScheduledOpenAI, llm_scheduler
 
-client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+client = ScheduledOpenAI(AsyncOpenAI(api_key=settings.OPENAI_API_KEY), llm_scheduler)
 
 DEEP_SPHERE_PROMPT = """
 РОЛЬ:
@@ -3,15 +3,21 @@ Natal chart calculation engine using pyswisseph.
 Computes planet positions, signs, houses, and retrograde status.
 """
 import json
+import logging
 import os
+from collections import Counter
 from dataclasses import dataclass, field
 import swisseph as swe
 from geopy.geocoders import Nominatim
-from timezonefinder import TimezoneFinder
 from datetime import datetime
-from typing import Any
-import pytz
+from typing import Any, Iterable, NamedTuple
+import numpy as np
 from app.config import settings
+from app.core.astrology.ephemeris_table import calc_position, get_ephemeris_table
+from app.core.astrology.gazetteer import remember_place, resolve_place
+from app.core.astrology.timezones import timezone_at, to_utc, to_utc_many
+
+logger = logging.getLogger(__name__)
 
 DATA_DIR = settings.DATA_DIR
 EPHE_PATH = settings.EPHE_PATH
@@ -242,11 +248,26 @@ def calculate_dispositor_chains(planets: list[PlanetPosition]) -> dict[str, Any]
 
 import anyio
 
+_geolocator: Nominatim | None = None
+
+
 async def geocode_place(place: str) -> tuple[float, float, str]:
-    """Get latitude, longitude and timezone from place name."""
+    """
+    Get latitude, longitude and timezone from place name.
+    Resolved offline (geocode cache, gazetteer) when possible; Nominatim is
+    only used on a miss and its answer is cached for next time.
+    """
+    global _geolocator
+    hit = resolve_place(place)
+    if hit:
+        logger.debug("Geocoded offline (%s): %s", hit.match, place)
+        return hit.lat, hit.lon, hit.timezone
+
     print(f"DEBUG: Geocoding started for place: {place}")
     try:
-        geolocator = Nominatim(user_agent="avatar_app")
+        if _geolocator is None:
+            _geolocator = Nominatim(user_agent="avatar_app")
+        geolocator = _geolocator
         # Run synchronous geocode in a thread to keep the event loop responsive
         location = await anyio.to_thread.run_sync(lambda: geolocator.geocode(place, timeout=10))
         print(f"DEBUG: Geocoder returned: {location}")
@@ -255,55 +276,47 @@ async def geocode_place(place: str) -> tuple[float, float, str]:
             print(f"DEBUG: Location NOT FOUND for: {place}")
             raise ValueError(f"Cannot geocode place: {place}")
 
-        tf = TimezoneFinder()
-        # TimezoneFinder also has a non-async lookup, but it's very fast. Still, good practice to keep it clean.
-        tz_name = await anyio.to_thread.run_sync(lambda: tf.timezone_at(lng=location.longitude, lat=location.latitude))
+        # The shared finder loads its polygon data on first use, so keep it off the event loop
+        tz_name = await anyio.to_thread.run_sync(timezone_at, location.latitude, location.longitude)
         print(f"DEBUG: Timezone found: {tz_name}")
-        return location.latitude, location.longitude, tz_name or "UTC"
+        tz_name = tz_name or "UTC"
+        await anyio.to_thread.run_sync(remember_place, place, location.latitude, location.longitude, tz_name)
+        return location.latitude, location.longitude, tz_name
     except Exception as e:
         print(f"DEBUG: Geocoding error in geocode_place: {e}")
         raise e
 
 
-def calculate_natal_chart(
-    birth_date: datetime,
-    birth_time_str: str,
-    lat: float,
-    lon: float,
-    tz_name: str,
-) -> NatalChartData:
-    """
-    Main function: calculate full natal chart.
-    Returns NatalChartData with planet positions and house info.
-    """
-    # Parse time
+def _local_datetime(birth_date: datetime, birth_time_str: str) -> datetime:
+    """Naive local birth datetime from the date and an "HH:MM" string."""
     hour, minute = map(int, birth_time_str.split(":"))
+    return datetime(birth_date.year, birth_date.month, birth_date.day, hour, minute)
 
-    # Convert local time to UTC
-    tz = pytz.timezone(tz_name)
-    local_dt = tz.localize(datetime(
-        birth_date.year, birth_date.month, birth_date.day, hour, minute
-    ))
-    utc_dt = local_dt.astimezone(pytz.utc)
 
-    # Julian Day
-    jd = swe.julday(
+def _julday(utc_dt: datetime) -> float:
+    return swe.julday(
         utc_dt.year, utc_dt.month, utc_dt.day,
         utc_dt.hour + utc_dt.minute / 60.0
     )
 
-    # Calculate houses (Placidus with Whole Sign fallback)
+
+def _julian_day_ut(birth_date: datetime, birth_time_str: str, tz_name: str) -> float:
+    """Convert local birth date/time in tz_name to a UT Julian Day."""
+    return _julday(to_utc(_local_datetime(birth_date, birth_time_str), tz_name))
+
+
+def _calc_houses(jd: float, lat: float, lon: float) -> tuple[list[float], tuple]:
+    """House cusps and ascmc (Placidus with Whole Sign fallback)."""
     try:
         cusps_raw, ascmc = swe.houses(jd, lat, lon, b"P")
     except Exception as e:
         print(f"Placidus calculation failed or skewed (e.g. extreme latitude): {e}. Falling back to Whole Sign.")
         cusps_raw, ascmc = swe.houses(jd, lat, lon, b"W")
+    return list(cusps_raw), ascmc
 
-    cusps = list(cusps_raw)
-
-    ascendant_degree = ascmc[0]
-    mc_degree = ascmc[1]
 
+def _new_chart_data(cusps: list[float], ascendant_degree: float, mc_degree: float) -> NatalChartData:
+    """NatalChartData with ascendant, MC, cusps and house rulers filled in."""
     asc_sign_en, asc_sign_ru, _ = degree_to_sign(ascendant_degree)
 
     # Calculate house rulers
@@ -316,7 +329,7 @@ def calculate_natal_chart(
     # Get ascendant ruler
     asc_ruler = SIGN_RULERS.get(asc_sign_en, "Sun")
 
-    result = NatalChartData(
+    return NatalChartData(
         ascendant_degree=ascendant_degree,
         ascendant_sign=asc_sign_en,
         ascendant_sign_ru=asc_sign_ru,
@@ -327,12 +340,29 @@ def calculate_natal_chart(
     )
 
 
+def calculate_natal_chart(
+    birth_date: datetime,
+    birth_time_str: str,
+    lat: float,
+    lon: float,
+    tz_name: str,
+) -> NatalChartData:
+    """
+    Main function: calculate full natal chart.
+    Returns NatalChartData with planet positions and house info.
+    """
+    jd = _julian_day_ut(birth_date, birth_time_str, tz_name)
+
+    cusps, ascmc = _calc_houses(jd, lat, lon)
+
+    ascendant_degree = ascmc[0]
+    result = _new_chart_data(cusps, ascendant_degree, ascmc[1])
+
     # Calculate planet positions
     for planet_name, planet_code in PLANET_CODES.items():
         try:
-            pos, flags = swe.calc_ut(jd, planet_code, swe.FLG_SWIEPH | swe.FLG_SPEED)
-            degree = pos[0] % 360
-            speed = pos[3]  # negative = retrograde
+            longitude, speed = calc_position(jd, planet_code)  # negative speed = retrograde
+            degree = longitude % 360
             retrograde = speed < 0
             is_stationary = abs(speed) < 0.03
 
@@ -439,6 +469,289 @@ def calculate_natal_chart(
     return result
 
 
+# ─── Batch engine ────────────────────────────────────────────────────────────
+# Column layout of every (N, B) array in NatalChartBatch: the Swiss Ephemeris
+# bodies in PLANET_CODES order, then the two derived points.
+BODY_NAMES: list[str] = [*PLANET_CODES, "SouthNode", "PartFortune"]
+SOUTH_NODE_IDX = len(PLANET_CODES)
+FORTUNE_IDX = SOUTH_NODE_IDX + 1
+_TRUE_NODE_IDX = BODY_NAMES.index("TrueNode")
+_SUN_IDX = BODY_NAMES.index("Sun")
+_MOON_IDX = BODY_NAMES.index("Moon")
+
+DIGNITY_NAMES: list[str] = ["neutral", "domicile", "exaltation", "detriment", "fall"]
+
+# (body, sign) lookup tables built from calculate_dignity so both paths agree
+_DIGNITY_CODES = np.array(
+    [[DIGNITY_NAMES.index(calculate_dignity(b, s)[0]) for s in ZODIAC_SIGNS] for b in BODY_NAMES],
+    dtype=np.int8,
+)
+_DIGNITY_SCORES = np.array(
+    [[calculate_dignity(b, s)[1] for s in ZODIAC_SIGNS] for b in BODY_NAMES],
+    dtype=np.int8,
+)
+
+# Fixed attributes of the derived points (see calculate_natal_chart)
+_DERIVED_POINTS = {
+    "SouthNode": {"name": "Южный узел", "archetype_id": 12, "priority": "additional"},
+    "PartFortune": {"name": "Колесо Фортуны", "archetype_id": 10, "priority": "high"},
+}
+
+
+class BirthRecord(NamedTuple):
+    """Arguments of calculate_natal_chart for a single birth."""
+    birth_date: datetime
+    birth_time_str: str
+    lat: float
+    lon: float
+    tz_name: str
+
+
+def assign_houses(degrees: np.ndarray, cusps: np.ndarray) -> np.ndarray:
+    """
+    Vectorized get_house: house numbers (1-12) for degrees of one chart
+    (degrees (B,), cusps (12,)) or of many charts (degrees (N, B), cusps (N, 12)).
+
+    Each chart's cusps are sorted and all degrees are placed with a single
+    np.searchsorted; to search every chart at once, values are replaced by their
+    exact rank and offset per row. Degrees outside every non-wrapping house get
+    get_house's fallback.
+    """
+    degrees = np.asarray(degrees, dtype=np.float64)
+    cusps = np.asarray(cusps, dtype=np.float64)
+    single = cusps.ndim == 1
+    degrees = np.atleast_2d(degrees)
+    cusps = np.atleast_2d(cusps)
+    n, n_degrees = degrees.shape
+
+    order = np.argsort(cusps, axis=1, kind="stable")
+    sorted_cusps = np.take_along_axis(cusps, order, axis=1)
+
+    values, ranks = np.unique(np.concatenate([sorted_cusps.ravel(), degrees.ravel()]), return_inverse=True)
+    row_base = np.arange(n)[:, None] * len(values)
+    cusp_keys = ranks[:n * 12].reshape(n, 12) + row_base
+    degree_keys = ranks[n * 12:].reshape(n, n_degrees) + row_base
+
+    idx = np.searchsorted(cusp_keys.ravel(), degree_keys, side="right") - np.arange(n)[:, None] * 12 - 1
+    start = np.take_along_axis(order, np.maximum(idx, 0), axis=1)
+    end = np.take_along_axis(cusps, (start + 1) % 12, axis=1)
+    matched = (idx >= 0) & (degrees < end)
+
+    fallback = np.where((degrees >= cusps[:, 11:12]) | (degrees < cusps[:, 0:1]), 12, 1)
+    houses = np.where(matched, start + 1, fallback).astype(np.int8)
+    return houses[0] if single else houses
+
+
+def _round_array(values: np.ndarray, ndigits: int) -> np.ndarray:
+    """Element-wise built-in round() (np.round may differ in the last digit)."""
+    rounded = [round(v, ndigits) for v in values.ravel().tolist()]
+    return np.array(rounded, dtype=np.float64).reshape(values.shape)
+
+
+@dataclass
+class NatalChartBatch:
+    """
+    Array-backed natal charts for N births.
+    Row i is birth i, column j is BODY_NAMES[j]; values match the
+    PlanetPosition fields produced by calculate_natal_chart.
+    """
+    degrees: np.ndarray         # (N, B) float64, rounded to 4 digits
+    speeds: np.ndarray          # (N, B) float64, rounded to 6 digits
+    signs: np.ndarray           # (N, B) int8, index into ZODIAC_SIGNS
+    houses: np.ndarray          # (N, B) int8, 1-12
+    dignities: np.ndarray       # (N, B) int8, index into DIGNITY_NAMES
+    dignity_scores: np.ndarray  # (N, B) int8
+    retrograde: np.ndarray      # (N, B) bool
+    stationary: np.ndarray      # (N, B) bool
+    present: np.ndarray         # (N, B) bool, False where the body could not be calculated
+    cusps: np.ndarray           # (N, 12) float64
+    ascendant: np.ndarray       # (N,) float64
+    mc: np.ndarray              # (N,) float64
+    south_node: np.ndarray      # (N,) float64, unrounded like NatalChartData.south_node_degree
+    errors: list[str | None] = field(default_factory=list)  # per birth, None if calculated
+
+    def __len__(self) -> int:
+        return len(self.errors)
+
+    def chart(self, i: int) -> NatalChartData:
+        """Materialize row i as the NatalChartData calculate_natal_chart returns."""
+        if self.errors[i] is not None:
+            raise ValueError(self.errors[i])
+
+        result = _new_chart_data(self.cusps[i].tolist(), self.ascendant[i].item(), self.mc[i].item())
+
+        degrees = self.degrees[i].tolist()
+        speeds = self.speeds[i].tolist()
+        signs = self.signs[i].tolist()
+        houses = self.houses[i].tolist()
+        dignities = self.dignities[i].tolist()
+        scores = self.dignity_scores[i].tolist()
+        retrograde = self.retrograde[i].tolist()
+        stationary = self.stationary[i].tolist()
+
+        for j in np.flatnonzero(self.present[i]).tolist():
+            name_en = BODY_NAMES[j]
+            planet_data = _DERIVED_POINTS.get(name_en) or PLANET_ARCHETYPE_MAP.get(name_en, {})
+            result.planets.append(PlanetPosition(
+                name=planet_data.get("name", name_en),
+                name_en=name_en,
+                degree=degrees[j],
+                sign=ZODIAC_SIGNS[signs[j]],
+                sign_ru=ZODIAC_SIGNS_RU[signs[j]],
+                house=houses[j],
+                retrograde=retrograde[j],
+                is_stationary=stationary[j],
+                speed=speeds[j],
+                archetype_id=planet_data.get("archetype_id", 0),
+                sign_primary_archetype=0,
+                sign_secondary_archetype=0,
+                decan_ruler="",
+                decan_ruler_archetype=0,
+                priority=planet_data.get("priority", "medium"),
+                dignity=DIGNITY_NAMES[dignities[j]],
+                dignity_score=scores[j],
+            ))
+
+        if self.present[i, SOUTH_NODE_IDX]:
+            result.south_node_degree = self.south_node[i].item()
+            result.south_node_sign = ZODIAC_SIGNS[signs[SOUTH_NODE_IDX]]
+            result.south_node_sign_ru = ZODIAC_SIGNS_RU[signs[SOUTH_NODE_IDX]]
+
+        result.dispositor_chains = calculate_dispositor_chains(result.planets)
+        return result
+
+    def charts(self) -> list[NatalChartData | None]:
+        """All charts as NatalChartData (None for births that failed)."""
+        return [self.chart(i) if err is None else None for i, err in enumerate(self.errors)]
+
+
+def calculate_natal_charts_batch(births: Iterable[BirthRecord | tuple]) -> NatalChartBatch:
+    """
+    Calculate N natal charts at once.
+
+    Swiss Ephemeris is still called per body, but signs, houses, dignities,
+    derived points and retrograde flags are computed over the whole batch.
+    A birth that cannot be converted to UT is recorded in `errors` instead
+    of aborting the batch.
+    """
+    births = [BirthRecord(*b) for b in births]
+    n, n_bodies, n_planets = len(births), len(BODY_NAMES), len(PLANET_CODES)
+    planet_codes = list(PLANET_CODES.values())
+
+    raw_degrees = np.zeros((n, n_bodies))
+    degrees = np.zeros((n, n_bodies))
+    raw_speeds = np.zeros((n, n_bodies))
+    speeds = np.zeros((n, n_bodies))
+    present = np.zeros((n, n_bodies), dtype=bool)
+    cusps = np.zeros((n, 12))
+    ascendant = np.zeros(n)
+    mc = np.zeros(n)
+    errors: list[str | None] = [None] * n
+
+    jds = np.zeros(n)
+
+    # 1. Julian days and houses
+    local_dts: list[datetime | None] = [None] * n
+    for i, birth in enumerate(births):
+        try:
+            local_dts[i] = _local_datetime(birth.birth_date, birth.birth_time_str)
+        except Exception as e:
+            errors[i] = f"Cannot convert birth time: {e}"
+    utc_dts, utc_errors = to_utc_many(local_dts, [birth.tz_name for birth in births])
+
+    for i, birth in enumerate(births):
+        if utc_errors[i] is not None:
+            errors[i] = f"Cannot convert birth time: {utc_errors[i]}"
+        if errors[i] is not None:
+            continue
+        jds[i] = _julday(utc_dts[i])
+        chart_cusps, ascmc = _calc_houses(jds[i], birth.lat, birth.lon)
+        cusps[i] = chart_cusps
+        ascendant[i] = ascmc[0]
+        mc[i] = ascmc[1]
+
+    # 2. Ephemeris: interpolated table for the whole batch, pyswisseph for the rest
+    from_table = np.zeros((n, n_planets), dtype=bool)
+    table = get_ephemeris_table()
+    if table is not None and n:
+        columns = [j for j, code in enumerate(planet_codes) if table.has_body(code)]
+        table_cols = [table.codes.index(planet_codes[j]) for j in columns]
+        lon, speed, ok = table.lookup(
+            jds, settings.EPHEMERIS_TABLE_TOLERANCE, settings.EPHEMERIS_TABLE_SPEED_TOLERANCE
+        )
+        raw_degrees[:, columns] = lon[:, table_cols]
+        raw_speeds[:, columns] = speed[:, table_cols]
+        from_table[:, columns] = ok[:, table_cols]
+
+    # A body that fails usually fails for every row (e.g. a missing ephemeris
+    # file): logged once per batch with the count and the first error
+    failed: Counter = Counter()
+    first_error: dict[int, Exception] = {}
+    for i in range(n):
+        if errors[i] is not None:
+            continue
+        for j, planet_code in enumerate(planet_codes):
+            if not from_table[i, j]:
+                try:
+                    pos, _ = swe.calc_ut(jds[i], planet_code, swe.FLG_SWIEPH | swe.FLG_SPEED)
+                except Exception as e:
+                    failed[j] += 1
+                    first_error.setdefault(j, e)
+                    continue
+                raw_degrees[i, j] = pos[0]
+                raw_speeds[i, j] = pos[3]
+            present[i, j] = True
+    for j, count in failed.items():
+        logger.error("Error calculating %s for %d of %d charts: %s", BODY_NAMES[j], count, n, first_error[j])
+
+    raw_degrees[:, :n_planets] %= 360
+    degrees[:, :n_planets] = _round_array(raw_degrees[:, :n_planets], 4)
+    speeds[:, :n_planets] = _round_array(raw_speeds[:, :n_planets], 6)
+
+    # 3. Derived points from the rounded positions, as in the scalar path
+    present[:, SOUTH_NODE_IDX] = present[:, _TRUE_NODE_IDX]
+    south_node = (degrees[:, _TRUE_NODE_IDX] + 180) % 360
+    raw_degrees[:, SOUTH_NODE_IDX] = south_node
+
+    present[:, FORTUNE_IDX] = present[:, _SUN_IDX] & present[:, _MOON_IDX]
+    sun, moon = degrees[:, _SUN_IDX], degrees[:, _MOON_IDX]
+    is_day = assign_houses(sun[:, None], cusps)[:, 0] > 6
+    raw_degrees[:, FORTUNE_IDX] = np.where(
+        is_day,
+        (ascendant + moon - sun) % 360,
+        (ascendant + sun - moon) % 360,
+    )
+    degrees[:, n_planets:] = _round_array(raw_degrees[:, n_planets:], 4)
+
+    # 4. Signs, houses and dignities for the whole batch
+    signs = (raw_degrees / 30).astype(np.int8)
+    houses = assign_houses(raw_degrees, cusps)
+    body_idx = np.arange(n_bodies)[None, :]
+    dignities = _DIGNITY_CODES[body_idx, signs]
+    dignity_scores = _DIGNITY_SCORES[body_idx, signs]
+
+    retrograde = raw_speeds < 0
+    stationary = np.abs(raw_speeds) < 0.03
+    stationary[:, n_planets:] = False  # derived points carry no motion
+
+    return NatalChartBatch(
+        degrees=degrees,
+        speeds=speeds,
+        signs=signs,
+        houses=houses,
+        dignities=dignities,
+        dignity_scores=dignity_scores,
+        retrograde=retrograde,
+        stationary=stationary,
+        present=present,
+        cusps=cusps,
+        ascendant=ascendant,
+        mc=mc,
+        south_node=south_node,
+        errors=errors,
+    )
+
+
 def to_dict(chart: NatalChartData) -> dict:
     """Serialize NatalChartData to JSON-serializable dict."""
     return {
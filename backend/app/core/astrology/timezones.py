@@ -0,0 +1,87 @@
+"""
+Timezone service shared by the chart engine and geocoding.
+
+- One lazily created TimezoneFinder per process (construction loads the
+  polygon data and is by far the slowest step of a cold geocode).
+- UTC offsets memoized per (tz_name, local datetime) with an LRU, matching
+  pytz `localize()` semantics exactly (ambiguous/non-existent local times
+  resolve with is_dst=False).
+- `to_utc_many` converts a whole batch, resolving each distinct
+  (tz_name, local datetime) pair once.
+"""
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Sequence
+
+import pytz
+from timezonefinder import TimezoneFinder
+
+logger = logging.getLogger(__name__)
+
+OFFSET_CACHE_SIZE = 65536
+
+_finder: TimezoneFinder | None = None
+_finder_lock = threading.Lock()
+finder_init_seconds: float | None = None
+
+
+def get_timezone_finder() -> TimezoneFinder:
+    """The process-wide TimezoneFinder, created on first use."""
+    global _finder, finder_init_seconds
+    if _finder is None:
+        with _finder_lock:
+            if _finder is None:
+                started = time.perf_counter()
+                _finder = TimezoneFinder()
+                finder_init_seconds = time.perf_counter() - started
+                logger.info(f"TimezoneFinder initialized in {finder_init_seconds * 1000:.0f} ms")
+    return _finder
+
+
+def timezone_at(lat: float, lon: float) -> str | None:
+    """IANA timezone name at a coordinate, or None (e.g. open sea)."""
+    return get_timezone_finder().timezone_at(lng=lon, lat=lat)
+
+
+@lru_cache(maxsize=OFFSET_CACHE_SIZE)
+def utc_offset(tz_name: str, local_dt: datetime) -> timedelta:
+    """Offset of naive local_dt in tz_name, as pytz.timezone(tz_name).localize() sees it."""
+    return pytz.timezone(tz_name).localize(local_dt).utcoffset()
+
+
+def to_utc(local_dt: datetime, tz_name: str) -> datetime:
+    """Naive local time in tz_name -> naive UTC time."""
+    return local_dt - utc_offset(tz_name, local_dt)
+
+
+def to_utc_many(
+    local_dts: Sequence[datetime | None],
+    tz_names: Sequence[str],
+) -> tuple[list[datetime | None], list[str | None]]:
+    """
+    Batch to_utc. Returns (utc datetimes, error messages) aligned with the
+    input; entries whose local_dt is None are skipped, a failing entry gets
+    None plus its error and does not affect the rest.
+    """
+    results: list[datetime | None] = [None] * len(local_dts)
+    errors: list[str | None] = [None] * len(local_dts)
+    resolved: dict[tuple[str, datetime], timedelta | Exception] = {}
+    for i, (local_dt, tz_name) in enumerate(zip(local_dts, tz_names)):
+        if local_dt is None:
+            continue
+        key = (tz_name, local_dt)
+        offset = resolved.get(key)
+        if offset is None:
+            try:
+                offset = utc_offset(tz_name, local_dt)
+            except Exception as e:
+                offset = e
+            resolved[key] = offset
+        if isinstance(offset, Exception):
+            errors[i] = str(offset)
+        else:
+            results[i] = local_dt - offset
+    return results, errors
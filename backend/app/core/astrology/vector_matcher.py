@@ -1,24 +1,13 @@
-import asyncio
 import logging
 from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
-from openai import AsyncOpenAI
 
-from app.config import settings
-from app.models.avatar_card import AvatarCard
+from app.core.astrology.card_index import SphereFilter, get_card_index
+from app.services.embeddings import embed_many
 from pydantic import BaseModel
 
-client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
 logger = logging.getLogger(__name__)
 
-async def _get_embedding(text: str) -> list[float]:
-    response = await client.embeddings.create(
-        input=text,
-        model="text-embedding-3-small"
-    )
-    return response.data[0].embedding
-
 class RecommendedCard(BaseModel):
     archetype_id: int
     sphere: str
@@ -72,45 +61,28 @@ async def match_archetypes_to_spheres(
     if not all_texts:
         return []
 
-    # 2. Batch Embedding (1 request instead of 36)
+    # 2. Batch Embedding (1 request instead of 36), same model as the card vectors
     try:
-        response = await client.embeddings.create(
-            input=all_texts,
-            model="text-embedding-3-large", # Upgrade to Large for high precision
-            dimensions=1536  # Clip to 1536 to match current DB schema
-        )
-        embeddings = [d.embedding for d in response.data]
+        embeddings = await embed_many(all_texts)
 
     except Exception as e:
         logger.error(f"Batch embedding failed: {e}")
         return []
 
-    # 3. Parallel DB Queries (asyncio.gather)
-    async def _query_sphere(sphere, emb, weight, s_type):
-        try:
-            stmt = select(AvatarCard).where(
-                AvatarCard.sphere == sphere
-            ).order_by(
-                AvatarCard.embedding.cosine_distance(emb)
-            ).limit(2) # Get top 2 candidates per vector
-            
-            result = await db.execute(stmt)
-            cards = result.scalars().all()
-            return [(card.archetype_id, weight, s_type) for card in cards]
-        except Exception as e:
-            logger.error(f"Query error for {sphere}: {e}")
-            return []
-
-    # Prepare concurrent tasks
-    db_tasks = []
+    # 3. One matrix multiply over the in-process card index: top 2 cards of the sphere per vector
+    try:
+        index = await get_card_index(db)
+        hits = index.search(embeddings, k=2, spheres=[sphere for sphere, _ in sphere_tasks])
+    except Exception as e:
+        logger.error(f"Card index search failed: {e}")
+        return []
+
     weights = {"shadow": 0.4, "light": 0.4, "insight": 0.2, "unified": 1.0}
-    
-    for (sphere, s_type), emb in zip(sphere_tasks, embeddings):
-        db_tasks.append(_query_sphere(sphere, emb, weights.get(s_type, 1.0), s_type))
+    results = [
+        [(match.archetype_id, weights.get(s_type, 1.0), s_type) for match in matches]
+        for (_, s_type), matches in zip(sphere_tasks, hits)
+    ]
 
-    # Execute all queries in PARALLEL
-    results = await asyncio.gather(*db_tasks)
-    
     # 4. Weighted Aggregation
     # sphere -> {archetype_id: total_score}
     aggregated = {}
@@ -142,38 +114,52 @@ async def match_archetypes_to_spheres(
             
     return recommended_cards
 
+async def match_texts_to_archetypes(
+    db: AsyncSession,
+    texts: list[str],
+    top_k: int = 5,
+    spheres: SphereFilter = None,
+    diversity: float = 0.0,
+) -> list[list[tuple[int, str, float]]]:
+    """
+    Batched match_text_to_archetypes: one embedding call and one index
+    lookup for all texts. Returns one list of (archetype_id, sphere, score)
+    per text (empty for blank texts), best first.
+    spheres: only cards of this sphere or these spheres.
+    diversity: 0 ranks by similarity alone; towards 1 the MMR rerank
+    prefers cards unlike the ones already chosen (see CardIndex.search).
+    """
+    wanted = [i for i, text in enumerate(texts) if text.strip()]
+    results: list[list[tuple[int, str, float]]] = [[] for _ in texts]
+    if not wanted:
+        return results
+
+    embeddings = await embed_many([texts[i] for i in wanted])
+    index = await get_card_index(db)
+    hits = index.search(embeddings, k=top_k, spheres=[spheres] * len(wanted), diversity=diversity)
+    for i, matches in zip(wanted, hits):
+        results[i] = [tuple(match) for match in matches]
+    return results
+
+
 async def match_text_to_archetypes(
     db: AsyncSession, 
     text: str,
-    top_k: int = 5
+    top_k: int = 5,
+    spheres: SphereFilter = None,
+    diversity: float = 0.0,
 ) -> list[tuple[int, str, float]]:
     """
-    Matches any text to the nearest 5 archetypes across all spheres.
-    Returns list of (archetype_id, sphere, score).
-    Score is 1.0 - cosine_distance (higher is better).
+    Matches any text to the nearest 5 archetypes across all spheres
+    (or within `spheres`; see match_texts_to_archetypes for `diversity`).
+    Returns list of (archetype_id, sphere, score), best first.
+    Score is the cosine similarity, i.e. 1.0 - cosine_distance (higher is better).
     """
     if not text.strip():
         return []
 
     try:
-        query_embedding = await _get_embedding(text)
-        
-        # Query top_k closest cards across ALL spheres
-        stmt = select(AvatarCard).order_by(
-            AvatarCard.embedding.cosine_distance(query_embedding)
-        ).limit(top_k)
-        
-        result = await db.execute(stmt)
-        top_cards = result.scalars().all()
-        
-        matches = []
-        for card in top_cards:
-            # Note: PostgreSQL pgvector returns distance. 
-            # In a more advanced version, we would fetch the distance directly in the first query.
-            # For now, let's keep it simple and approximate score if we can't easily get it from 'select'.
-            matches.append((card.archetype_id, card.sphere, 0.8)) # Standard match score
-            
-        return matches
+        return (await match_texts_to_archetypes(db, [text], top_k, spheres, diversity))[0]
     except Exception as e:
         print(f"Error in match_text_to_archetypes: {e}")
         return []
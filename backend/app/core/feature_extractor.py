@@ -2,6 +2,8 @@ from typing import List, Dict, Any
 import numpy as np
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.orm import undefer
 
 from app.models.data_architecture import Event, SessionFeatures, UserBehaviorProfileV2
 from app.models.text_diagnostics import SceneInteraction, Sphere, Archetype
@@ -17,15 +19,68 @@ class FeatureExtractor:
         Processes textual diagnostic data from a sync session.
         Merges timing metrics with structured narrative features.
         """
+        await FeatureExtractor.fold_sync_sessions(db, user_id, [session_id])
+        await db.commit()
+
+    @staticmethod
+    async def fold_sync_sessions(db: AsyncSession, user_id: int, session_ids: List[int]) -> int:
+        """
+        Folds completed sync sessions, in the given order, into SessionFeatures
+        rows and the user's behavior profile: one query for the interactions of
+        all of them, one insert, one profile update. Sessions that already have
+        features are skipped, so a retried job never folds a session twice.
+        Runs in the caller's transaction; returns how many sessions were folded.
+        """
         # 1. Fetch interactions
         result = await db.execute(
-            select(SceneInteraction).where(SceneInteraction.session_id == session_id).order_by(SceneInteraction.layer_index)
+            select(SceneInteraction)
+            .options(undefer(SceneInteraction.response_embedding))  # deferred by default
+            .where(SceneInteraction.session_id.in_(session_ids))
+            .order_by(SceneInteraction.session_id, SceneInteraction.layer_index)
         )
-        interactions = result.scalars().all()
-        if not interactions:
-            return
+        by_session: Dict[int, list] = {}
+        for interaction in result.scalars().all():
+            by_session.setdefault(interaction.session_id, []).append(interaction)
+
+        rows = [
+            {"session_id": session_id, "user_id": user_id, **FeatureExtractor.session_features(by_session[session_id])}
+            for session_id in session_ids if by_session.get(session_id)
+        ]
+        if not rows:
+            return 0
 
-        # 2. Extract Narrative & Semantic Features
+        # 2. Store Session Summaries
+        inserted = set((await db.execute(
+            insert(SessionFeatures).values(rows)
+            .on_conflict_do_nothing(index_elements=[SessionFeatures.session_id])
+            .returning(SessionFeatures.session_id)
+        )).scalars())
+        if not inserted:
+            return 0
+
+        # 3. Update Global User Profile
+        profile_res = await db.execute(select(UserBehaviorProfileV2).where(UserBehaviorProfileV2.user_id == user_id))
+        profile = profile_res.scalar_one_or_none()
+        
+        if not profile:
+            profile = UserBehaviorProfileV2(user_id=user_id)
+            db.add(profile)
+
+        alpha = 0.25 # Smoothing factor
+        for row in rows:
+            if row["session_id"] not in inserted:
+                continue
+            profile.avg_semantic_shift = (1-alpha)*(profile.avg_semantic_shift or 0.0) + alpha*row["semantic_shift"]
+            profile.avg_narrative_depth = (1-alpha)*(profile.avg_narrative_depth or 0.0) + alpha*row["narrative_depth"]
+            profile.emotional_stability_index = (1-alpha)*(profile.emotional_stability_index or 0.5) + alpha*(1.0 - row["emotional_volatility"])
+            profile.hesitation_score = (1-alpha)*(profile.hesitation_score or 0.0) + alpha*row["hesitation_score"]
+            profile.avg_decision_speed = (1-alpha)*(profile.avg_decision_speed or 0.5) + alpha*(1.0 - row["hesitation_score"])
+        return len(inserted)
+
+    @staticmethod
+    def session_features(interactions: list) -> Dict[str, float]:
+        """SessionFeatures values of one session from its interactions, in layer order."""
+        # Extract Narrative & Semantic Features
         # - Semantic Shift: Distance between Layer 1 and Layer 5
         semantic_shift = 0.0
         if len(interactions) >= 2:
@@ -37,8 +92,9 @@ class FeatureExtractor:
                 semantic_shift = float(np.linalg.norm(v1 - v5))
 
         # - Timing & Depth
-        avg_reading_time = np.mean([i.reading_time for i in interactions if i.reading_time]) if interactions else 0
-        avg_resp_len = np.mean([len(i.response_text) for i in interactions]) if interactions else 0
+        reading_times = [i.reading_time for i in interactions if i.reading_time]
+        avg_reading_time = float(np.mean(reading_times)) if reading_times else 0.0
+        avg_resp_len = np.mean([len(i.response_text or "") for i in interactions]) if interactions else 0
         narrative_depth = float(avg_resp_len / 500) # Simple normalization
         
         # - Emotional Volatility (from extracted_features)
@@ -52,40 +108,18 @@ class FeatureExtractor:
             if all_vals:
                 volatility = float(np.var(all_vals))
 
-        # 3. Decision Metrics (Hesitation / Entropy)
+        # Decision Metrics (Hesitation / Entropy)
         # Higher reading time + mid-length responses = higher reflection
         # Very short responses + high speed = impulsivity
         hesitation_score = float(np.clip(avg_reading_time / 15.0, 0, 1)) # Normalize to 15s
 
-        # 4. Update Global User Profile
-        profile_res = await db.execute(select(UserBehaviorProfileV2).where(UserBehaviorProfileV2.user_id == user_id))
-        profile = profile_res.scalar_one_or_none()
-        
-        if not profile:
-            profile = UserBehaviorProfileV2(user_id=user_id)
-            db.add(profile)
-            await db.flush()
-
-        alpha = 0.25 # Smoothing factor
-        profile.avg_semantic_shift = (1-alpha)*(profile.avg_semantic_shift or 0.0) + alpha*semantic_shift
-        profile.avg_narrative_depth = (1-alpha)*(profile.avg_narrative_depth or 0.0) + alpha*narrative_depth
-        profile.emotional_stability_index = (1-alpha)*(profile.emotional_stability_index or 0.5) + alpha*(1.0 - volatility)
-        profile.hesitation_score = (1-alpha)*(profile.hesitation_score or 0.0) + alpha*hesitation_score
-        profile.avg_decision_speed = (1-alpha)*(profile.avg_decision_speed or 0.5) + alpha*(1.0 - hesitation_score)
-
-        # 5. Store Session Summary
-        session_feat = SessionFeatures(
-            session_id=session_id,
-            user_id=user_id,
-            avg_reaction_time=avg_reading_time,
-            semantic_shift=semantic_shift,
-            narrative_depth=narrative_depth,
-            emotional_volatility=volatility,
-            hesitation_score=hesitation_score
-        )
-        db.add(session_feat)
-        
-        await db.commit()
+        return {
+            "avg_reaction_time": avg_reading_time,
+            "semantic_shift": semantic_shift,
+            "narrative_depth": narrative_depth,
+            "emotional_volatility": volatility,
+            "hesitation_score": hesitation_score,
+        }
 
     @staticmethod
     async def process_session(db: AsyncSession, session_id: int, user_id: int):
@@ -13,6 +13,40 @@ from app.models import (
 from app.agents.common import SPHERES
 
 
+def session_card_entry(session: SyncSession) -> dict:
+    """cards_data entry of one completed sync session."""
+    return {
+        "archetype_id": session.archetype_id,
+        "date": session.created_at.isoformat() if session.created_at else None,
+        "core_belief": session.extracted_core_belief or "",
+        "shadow_pattern": session.extracted_shadow_pattern or "",
+        "body_anchor": session.extracted_body_anchor or "",
+        "dominant_emotion": session.extracted_dominant_emotion or "",
+        "hawkins": session.hawkins_score,
+        "thinking": session.mental_thinking or "",
+        "reactions": session.mental_reactions or "",
+        "patterns": session.mental_patterns or "",
+        "aspirations": session.mental_aspirations or "",
+    }
+
+
+def session_timeline_entry(session: SyncSession) -> dict:
+    return {
+        "date": session.created_at.date().isoformat() if session.created_at else None,
+        "score": session.hawkins_score,
+        "archetype_id": session.archetype_id,
+    }
+
+
+def sphere_patterns(tag_counts) -> list[dict]:
+    """Cross-sphere patterns of a sphere: its tags appearing ≥2 times, top 10."""
+    return [
+        {"tag": tag, "count": count, "strength": min(count, 10)}
+        for tag, count in Counter(tag_counts).most_common(10)
+        if count >= 2
+    ]
+
+
 async def build_portrait_for_sphere(
     db: AsyncSession,
     user_id: int,
@@ -32,12 +66,15 @@ async def build_portrait_for_sphere(
     )
     cards = cards_result.scalars().all()
 
-    # Load all sync sessions for this sphere
+    # Load all sync sessions for this sphere. Sessions post-sync analytics have
+    # not reached yet are left to it (app/core/sync_analytics.py), which folds
+    # them into the running aggregates set below
     sync_result = await db.execute(
         select(SyncSession).where(
             SyncSession.user_id == user_id,
             SyncSession.sphere == sphere,
             SyncSession.is_complete == True,
+            SyncSession.analyzed_at.is_not(None),
         ).order_by(SyncSession.created_at)
     )
     sync_sessions = sync_result.scalars().all()
@@ -53,20 +90,7 @@ async def build_portrait_for_sphere(
     hawkins_timeline = []
 
     for session in sync_sessions:
-        card_entry = {
-            "archetype_id": session.archetype_id,
-            "date": session.created_at.isoformat() if session.created_at else None,
-            "core_belief": session.extracted_core_belief or "",
-            "shadow_pattern": session.extracted_shadow_pattern or "",
-            "body_anchor": session.extracted_body_anchor or "",
-            "dominant_emotion": session.extracted_dominant_emotion or "",
-            "hawkins": session.hawkins_score,
-            "thinking": session.mental_thinking or "",
-            "reactions": session.mental_reactions or "",
-            "patterns": session.mental_patterns or "",
-            "aspirations": session.mental_aspirations or "",
-        }
-        cards_data.append(card_entry)
+        cards_data.append(session_card_entry(session))
 
         # Collect tags
         if session.extracted_tags:
@@ -79,11 +103,7 @@ async def build_portrait_for_sphere(
 
         # Hawkins timeline
         if session.hawkins_score:
-            hawkins_timeline.append({
-                "date": session.created_at.date().isoformat() if session.created_at else None,
-                "score": session.hawkins_score,
-                "archetype_id": session.archetype_id,
-            })
+            hawkins_timeline.append(session_timeline_entry(session))
 
     # Compute stats
     hawkins_scores = [s.hawkins_score for s in sync_sessions if s.hawkins_score]
@@ -92,11 +112,7 @@ async def build_portrait_for_sphere(
 
     # Detect cross-sphere patterns (tags appearing ≥2 times)
     tag_counts = Counter(all_tags)
-    patterns = [
-        {"tag": tag, "count": count, "strength": min(count, 10)}
-        for tag, count in tag_counts.most_common(10)
-        if count >= 2
-    ]
+    patterns = sphere_patterns(tag_counts)
 
     # Update or create UserPortrait
     portrait = await _get_or_create_portrait(db, user_id, sphere)
@@ -106,6 +122,11 @@ async def build_portrait_for_sphere(
     portrait.avg_hawkins = avg_hawkins
     portrait.min_hawkins = min_hawkins
     portrait.hawkins_timeline = hawkins_timeline
+    # The running aggregates post-sync analytics continue from
+    portrait.sessions_count = len(sync_sessions)
+    portrait.hawkins_sum = sum(hawkins_scores)
+    portrait.hawkins_count = len(hawkins_scores)
+    portrait.tag_counts = dict(tag_counts)
     db.add(portrait)
 
     # Update Pattern table (global user patterns)
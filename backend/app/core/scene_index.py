@@ -0,0 +1,276 @@
+"""
+In-process index of the sync scene library and the policy that picks the
+scenes of a session.
+
+Every sync session shows five TextScene rows of its sphere. Instead of
+loading the active scenes of the sphere on each start and sampling five at
+random, the process keeps them in a SceneIndex: metadata in lists, the
+embeddings as one float32 matrix with unit-length rows, sorted by sphere so
+that the scenes of a sphere are a contiguous slice, and the SceneStats
+counters (times_shown, reward_sum) in two float arrays.
+
+A scene earns a reward in [0, 1] for every answer given to it
+(scene_reward: reading time near 15 s, answers up to 200 characters; the
+same score EvolutionAgent keeps as diagnostic_power_score). The policy
+treats scenes as arms of a bandit:
+
+- thompson: a draw from Beta(1 + reward_sum, 1 + times_shown - reward_sum)
+- ucb: the posterior mean plus SCENE_UCB_C * sqrt(2 ln N / (n + 1))
+- random: uniform, the old behaviour
+
+and fills the set greedily: each next scene maximizes its score minus
+SCENE_DIVERSITY times its cosine similarity to the closest scene already in
+the set. Scenes the user has answered before are taken only when the sphere
+runs out of others; scenes of other spheres only when the sphere has fewer
+than five.
+
+get_scene_index() reloads the stats every SCENE_INDEX_REFRESH seconds and
+the scenes themselves when the active library changed (count, max id or
+versions), so the worker's reward updates and new scenes of the evolution
+agent reach every API process.
+"""
+import asyncio
+import logging
+import math
+import time
+from typing import Any, Collection, NamedTuple, Optional
+
+import numpy as np
+from sqlalchemy import func, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.text_diagnostics import SceneInteraction, SceneStats, TextScene
+
+logger = logging.getLogger(__name__)
+
+SET_SIZE = 5
+POLICIES = ("thompson", "ucb", "random")
+
+IDEAL_READING_TIME = 15.0  # seconds
+POWER_DECAY = 0.8  # diagnostic_power_score keeps this share of the previous value
+
+
+class IndexedScene(NamedTuple):
+    id: int
+    sphere_id: int
+    archetype_id: Optional[int]
+    text: str
+    meta_data: Any
+
+
+def scene_reward(reading_time: Optional[float], response_length: Optional[int]) -> float:
+    """
+    Diagnostic power of one answer: moderate reading time (reflection) and a
+    healthy answer length. Too fast or too slow, or too short, is low power.
+    """
+    time_factor = max(0.2, 1.0 - abs((reading_time or 0.0) - IDEAL_READING_TIME) / 30.0)
+    length_factor = min(1.0, (response_length or 0) / 200.0)
+    return time_factor * length_factor
+
+
+async def record_scene_reward(
+    db: AsyncSession, scene_id: int, reading_time: Optional[float], response_length: Optional[int]
+) -> float:
+    """Adds one shown answer to the SceneStats of the scene (one atomic upsert); the caller commits."""
+    reward = scene_reward(reading_time, response_length)
+    reading_time, response_length = reading_time or 0.0, response_length or 0
+    stats = SceneStats.__table__
+    stmt = insert(stats).values(
+        scene_id=scene_id, times_shown=1, times_selected=0, avg_reading_time=reading_time,
+        avg_response_length=response_length, response_entropy=0.0,
+        diagnostic_power_score=POWER_DECAY + (1 - POWER_DECAY) * reward, reward_sum=reward,
+    )
+    shown = func.coalesce(stats.c.times_shown, 0)
+    await db.execute(stmt.on_conflict_do_update(
+        index_elements=[stats.c.scene_id],
+        set_={
+            "times_shown": shown + 1,
+            "avg_reading_time": func.coalesce(stats.c.avg_reading_time, 0.0)
+            + (reading_time - func.coalesce(stats.c.avg_reading_time, 0.0)) / (shown + 1),
+            "avg_response_length": func.coalesce(stats.c.avg_response_length, 0.0)
+            + (response_length - func.coalesce(stats.c.avg_response_length, 0.0)) / (shown + 1),
+            "diagnostic_power_score": func.coalesce(stats.c.diagnostic_power_score, 1.0) * POWER_DECAY
+            + reward * (1 - POWER_DECAY),
+            "reward_sum": func.coalesce(stats.c.reward_sum, 0.0) + reward,
+        },
+    ))
+    return reward
+
+
+def _unit_rows(matrix: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class SceneIndex:
+    def __init__(self, scenes: list[IndexedScene], vectors: np.ndarray):
+        """scenes sorted by sphere_id; vectors: (scenes, dimensions) float32 unit rows, zero without an embedding."""
+        self.scenes = scenes
+        self.vectors = vectors
+        self.ids = np.array([scene.id for scene in scenes], dtype=np.int64)
+        self.shown = np.zeros(len(scenes))
+        self.reward = np.zeros(len(scenes))
+        self._rows = {scene.id: row for row, scene in enumerate(scenes)}
+        self._spheres: dict[int, slice] = {}
+        for row, scene in enumerate(scenes):
+            start = self._spheres.get(scene.sphere_id, slice(row, row)).start
+            self._spheres[scene.sphere_id] = slice(start, row + 1)
+
+    @classmethod
+    def build(cls, rows, dimensions: int) -> "SceneIndex":
+        """rows: (id, sphere_id, archetype_id, scene_text, meta_data, embedding or None)."""
+        rows = sorted(rows, key=lambda r: (-1 if r[1] is None else r[1], r[0]))
+        vectors = np.zeros((len(rows), dimensions), dtype=np.float32)
+        for row, r in enumerate(rows):
+            if r[5] is not None:
+                vectors[row] = np.asarray(r[5], dtype=np.float32)
+        scenes = [IndexedScene(r[0], r[1], r[2], r[3] or "", r[4]) for r in rows]
+        return cls(scenes, np.ascontiguousarray(_unit_rows(vectors)))
+
+    @classmethod
+    async def from_db(cls, db: AsyncSession) -> "SceneIndex":
+        result = await db.execute(
+            select(
+                TextScene.id, TextScene.sphere_id, TextScene.archetype_id, TextScene.scene_text,
+                TextScene.meta_data, TextScene.scene_embedding,
+            ).where(TextScene.is_active == True)
+        )
+        index = cls.build(result.all(), settings.EMBEDDING_DIMENSIONS)
+        await index.load_stats(db)
+        return index
+
+    async def load_stats(self, db: AsyncSession) -> None:
+        result = await db.execute(select(SceneStats.scene_id, SceneStats.times_shown, SceneStats.reward_sum))
+        shown, reward = np.zeros(len(self)), np.zeros(len(self))
+        for scene_id, times_shown, reward_sum in result.all():
+            row = self._rows.get(scene_id)
+            if row is not None:
+                shown[row] = times_shown or 0
+                reward[row] = min(reward_sum or 0.0, shown[row])
+        self.shown, self.reward = shown, reward
+
+    def observe(self, scene_id: int, reward: float) -> None:
+        """One shown answer, counted in process until the next load_stats()."""
+        row = self._rows.get(scene_id)
+        if row is not None:
+            self.shown[row] += 1
+            self.reward[row] += reward
+
+    def __len__(self) -> int:
+        return len(self.scenes)
+
+    def scores(self, rows: np.ndarray, policy: str, rng: np.random.Generator) -> np.ndarray:
+        shown, reward = self.shown[rows], self.reward[rows]
+        if policy == "thompson":
+            return rng.beta(1.0 + reward, 1.0 + shown - reward)
+        if policy == "ucb":
+            total = max(float(shown.sum()), 1.0)
+            return (reward + 1.0) / (shown + 2.0) + settings.SCENE_UCB_C * np.sqrt(2.0 * math.log(total + 1.0) / (shown + 1.0))
+        if policy == "random":
+            return rng.random(len(rows))
+        raise ValueError(f"Unknown scene policy {policy!r}, expected one of {POLICIES}")
+
+    def select(
+        self,
+        sphere_id: Optional[int],
+        k: int = SET_SIZE,
+        seen: Collection[int] = (),
+        policy: Optional[str] = None,
+        diversity: Optional[float] = None,
+        rng: Optional[np.random.Generator] = None,
+    ) -> list[IndexedScene]:
+        """
+        k scenes for a session in sphere_id, in layer order. Candidates come in
+        tiers: unseen scenes of the sphere, then seen ones, then unseen scenes
+        of other spheres; a tier is only opened when the previous ones run out.
+        """
+        policy = policy or settings.SCENE_POLICY
+        diversity = settings.SCENE_DIVERSITY if diversity is None else diversity
+        rng = rng or _rng
+        if not len(self) or k <= 0:
+            return []
+
+        sphere = self._spheres.get(sphere_id, slice(0, 0))
+        is_seen = np.isin(self.ids, np.fromiter(seen, dtype=np.int64)) if seen else np.zeros(len(self), dtype=bool)
+        in_sphere = np.zeros(len(self), dtype=bool)
+        in_sphere[sphere] = True
+        tiers = [in_sphere & ~is_seen, in_sphere & is_seen, ~in_sphere & ~is_seen]
+
+        chosen: list[int] = []
+        for tier in tiers:
+            rows = np.flatnonzero(tier)
+            if not len(rows):
+                continue
+            chosen += self._fill(rows, k - len(chosen), chosen, policy, diversity, rng)
+            if len(chosen) >= k:
+                break
+        return [self.scenes[row] for row in chosen]
+
+    def _fill(self, rows, k, chosen, policy, diversity, rng) -> list[int]:
+        scores = self.scores(rows, policy, rng)
+        if diversity <= 0 or k <= 1 and not chosen:
+            return rows[np.argsort(-scores)[:k]].tolist()
+        vectors = self.vectors[rows]
+        # Similarity of every candidate to its closest scene already in the set
+        closest = np.zeros(len(rows), dtype=np.float32)
+        for row in chosen:
+            closest = np.maximum(closest, vectors @ self.vectors[row])
+        available = np.ones(len(rows), dtype=bool)
+        picked = []
+        while len(picked) < min(k, len(rows)):
+            value = scores - diversity * closest
+            value[~available] = -np.inf
+            best = int(np.argmax(value))
+            picked.append(int(rows[best]))
+            available[best] = False
+            closest = np.maximum(closest, vectors @ vectors[best])
+        return picked
+
+
+_rng = np.random.default_rng()
+_index: Optional[SceneIndex] = None
+_signature: Optional[tuple] = None
+_checked_at = 0.0
+_lock = asyncio.Lock()
+
+
+async def _library_signature(db: AsyncSession) -> tuple:
+    result = await db.execute(
+        select(func.count(), func.max(TextScene.id), func.coalesce(func.sum(TextScene.version), 0))
+        .where(TextScene.is_active == True)
+    )
+    return tuple(result.one())
+
+
+async def get_scene_index(db: AsyncSession) -> SceneIndex:
+    global _index, _signature, _checked_at
+    if _index is not None and time.monotonic() - _checked_at < settings.SCENE_INDEX_REFRESH:
+        return _index
+    async with _lock:
+        if _index is not None and time.monotonic() - _checked_at < settings.SCENE_INDEX_REFRESH:
+            return _index
+        signature = await _library_signature(db)
+        if _index is None or signature != _signature:
+            index = await SceneIndex.from_db(db)
+            logger.info(f"[SceneIndex] {len(index)} active scenes loaded")
+            _index, _signature = index, signature
+        else:
+            await _index.load_stats(db)
+        _checked_at = time.monotonic()
+    return _index
+
+
+def reset_scene_index() -> None:
+    global _index, _signature, _checked_at
+    _index, _signature, _checked_at = None, None, 0.0
+
+
+async def seen_scene_ids(db: AsyncSession, user_id: int) -> set[int]:
+    """Scenes the user has answered in earlier sessions."""
+    result = await db.execute(
+        select(SceneInteraction.scene_id).where(SceneInteraction.user_id == user_id).distinct()
+    )
+    return {scene_id for scene_id in result.scalars() if scene_id is not None}
@@ -0,0 +1,228 @@
+"""
+Incremental post-sync analytics.
+
+Each completed sync session used to get its own job that rebuilt the
+user's knowledge from scratch: _aggregate_knowledge re-read every completed
+session of the sphere and every SphereKnowledge row of the user,
+build_portrait_for_sphere re-read the sessions and cards of the sphere
+again, FeatureExtractor folded the session into the behavior profile and
+update_user_portrait issued a SELECT per pattern tag, each step committing
+on its own.
+
+A completion now enqueues a sync.analytics job for the user, delayed by
+SYNC_ANALYTICS_WINDOW and coalesced with the user's job still waiting (see
+enqueue(coalesce=True)), so sessions completed within the window are
+handled together. fold_completed_sessions() takes the completed sessions of
+the user that are not analyzed yet (sync_sessions.analyzed_at), under an
+advisory lock per user, and folds them one by one into running aggregates,
+all in the caller's transaction:
+
+- UserPortrait of the sphere: cards_data, hawkins_timeline and body_map_json
+  are appended to; sessions_count, hawkins_sum / hawkins_count and
+  tag_counts give avg/min Hawkins and patterns_json without the history.
+- SphereKnowledge and UserWorldKnowledge, from the portrait counters and the
+  user's sphere rows (one per sphere at most).
+- Pattern: the core pattern tags of the whole batch in one INSERT ... ON CONFLICT.
+- SessionFeatures and the behavior profile: FeatureExtractor.fold_sync_sessions().
+- Portrait recommendations of the spheres touched: one UPDATE.
+
+A session is folded only once its answers are logged: while a
+sync.log_interaction job of the session is queued or running, its
+SceneInteraction rows (embeddings, extracted features) are incomplete and
+SessionFeatures would be computed from part of them and then kept. Such
+sessions stay pending; the job comes back after SYNC_ANALYTICS_WINDOW (see
+pending_sessions()), and the last interaction job of a completed session
+enqueues it too. The sessions are marked analyzed in the same transaction,
+so a retried job never counts a session twice. build_portrait_for_sphere() remains the full
+rebuild and resets the running aggregates to what it computes.
+"""
+import json
+from collections import Counter
+from typing import Optional
+
+from sqlalchemy import exists, func, select, text, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.core.feature_extractor import FeatureExtractor
+from app.core.portrait_service import session_card_entry, session_timeline_entry, sphere_patterns
+from app.models import SphereKnowledge, SyncSession, UserPortrait, UserWorldKnowledge
+from app.models.background_job import BackgroundJob
+
+SPHERE_PATTERN_PARTS = 3  # core patterns shown in SphereKnowledge.sphere_pattern
+
+_UPSERT_PATTERNS_SQL = text("""
+    INSERT INTO patterns (user_id, tag, occurrences, strength, cards_json)
+    SELECT :user_id, t.tag, t.n, LEAST(t.n, 10), t.cards
+    FROM jsonb_to_recordset(CAST(:rows AS jsonb)) AS t(tag text, n int, cards jsonb)
+    ON CONFLICT (user_id, tag) DO UPDATE SET
+        occurrences = COALESCE(patterns.occurrences, 0) + EXCLUDED.occurrences,
+        strength = LEAST(COALESCE(patterns.occurrences, 0) + EXCLUDED.occurrences, 10),
+        cards_json = COALESCE(patterns.cards_json, '[]'::jsonb) || COALESCE((
+            SELECT jsonb_agg(card) FROM jsonb_array_elements(EXCLUDED.cards_json) AS card
+            WHERE NOT COALESCE(patterns.cards_json, '[]'::jsonb)
+                @> jsonb_build_array(jsonb_build_object('archetype_id', card->'archetype_id'))
+        ), '[]'::jsonb),
+        updated_at = now()
+""")
+
+# Top 3 un-synced cards of each sphere by astro priority, as _update_portrait_recommendations
+_RECOMMEND_CARDS_SQL = text("""
+    UPDATE card_progress SET is_recommended_portrait = true
+    WHERE id IN (
+        SELECT id FROM (
+            SELECT id, row_number() OVER (
+                PARTITION BY sphere
+                ORDER BY CASE astro_priority WHEN 'critical' THEN 0 WHEN 'high' THEN 1
+                    WHEN 'medium' THEN 2 WHEN 'additional' THEN 3 ELSE 4 END, id
+            ) AS rank
+            FROM card_progress
+            WHERE user_id = :user_id AND sphere = ANY(:spheres) AND sync_sessions_count = 0
+        ) ranked
+        WHERE rank <= 3
+    )
+""")
+
+
+def logging_interactions():
+    """The session (a SyncSession row of the query) still has answers waiting in sync.log_interaction jobs."""
+    return exists().where(
+        BackgroundJob.job_type == "sync.log_interaction",
+        BackgroundJob.status.in_(("queued", "running")),
+        BackgroundJob.payload["session_id"].as_integer() == SyncSession.id,
+    )
+
+
+def core_pattern_tags(core_pattern: Optional[str]) -> list[str]:
+    """Pattern tags of a session: the words of its core pattern longer than three letters."""
+    if not core_pattern:
+        return []
+    return [t.strip().lower() for t in core_pattern.replace(",", " ").split() if len(t) > 3]
+
+
+def fold_into_portrait(portrait: UserPortrait, session: SyncSession) -> None:
+    """One completed session into the portrait of its sphere."""
+    card = session_card_entry(session)
+    # Listed already by a rebuild before its answers were all logged: counters only
+    listed = card in (portrait.cards_data or [])
+    if not listed:
+        portrait.cards_data = [*(portrait.cards_data or []), card]
+
+    tag_counts = Counter(portrait.tag_counts or {})
+    tag_counts.update(session.extracted_tags or [])
+    portrait.tag_counts = dict(tag_counts)
+    portrait.patterns_json = sphere_patterns(tag_counts)
+
+    anchor = session.extracted_body_anchor or ""
+    if anchor and not listed:
+        body_map = dict(portrait.body_map_json or {})
+        body_map[anchor] = [*body_map.get(anchor, []), session.archetype_id]
+        portrait.body_map_json = body_map
+
+    score = session.hawkins_score or 0
+    portrait.sessions_count = (portrait.sessions_count or 0) + 1
+    portrait.hawkins_sum = (portrait.hawkins_sum or 0) + score
+    if score:
+        if not listed:
+            portrait.hawkins_timeline = [*(portrait.hawkins_timeline or []), session_timeline_entry(session)]
+        portrait.min_hawkins = min(portrait.min_hawkins, score) if portrait.hawkins_count else score
+        portrait.hawkins_count = (portrait.hawkins_count or 0) + 1
+        portrait.avg_hawkins = int(portrait.hawkins_sum / portrait.hawkins_count)
+
+
+def fold_into_sphere_knowledge(knowledge: SphereKnowledge, portrait: UserPortrait, session: SyncSession) -> None:
+    """Level 2 cell of the sphere after fold_into_portrait() took the session."""
+    knowledge.sphere_picture = f"Сводная картина по {portrait.sessions_count} архетипам."
+    knowledge.sphere_hawkins = int(portrait.hawkins_sum / portrait.sessions_count)
+    parts = [part for part in (knowledge.sphere_pattern or "").split(" / ") if part]
+    if session.core_pattern and len(parts) < SPHERE_PATTERN_PARTS:
+        knowledge.sphere_pattern = " / ".join([*parts, session.core_pattern])
+    if session.archetype_id not in (knowledge.cards_completed or []):
+        knowledge.cards_completed = [*(knowledge.cards_completed or []), session.archetype_id]
+
+
+async def fold_completed_sessions(db: AsyncSession, user_id: int, limit: Optional[int] = None) -> int:
+    """
+    Folds up to `limit` (SYNC_ANALYTICS_BATCH) completed, not yet analyzed
+    sessions of the user into the aggregates, oldest first, and marks them
+    analyzed. Sessions whose answers are still being logged are left for a
+    later run. The caller commits; returns how many sessions were folded.
+    """
+    # Jobs of the same user (a retry, a second window) wait for each other
+    await db.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": f"sync.analytics:{user_id}"})
+    result = await db.execute(
+        select(SyncSession).where(
+            SyncSession.user_id == user_id,
+            SyncSession.is_complete == True,
+            SyncSession.analyzed_at.is_(None),
+            ~logging_interactions(),
+        ).order_by(SyncSession.created_at, SyncSession.id).limit(limit or settings.SYNC_ANALYTICS_BATCH)
+    )
+    sessions = result.scalars().all()
+    if not sessions:
+        return 0
+    session_ids = [s.id for s in sessions]
+
+    await FeatureExtractor.fold_sync_sessions(db, user_id, session_ids)
+
+    spheres = list(dict.fromkeys(s.sphere for s in sessions))
+    portraits_res = await db.execute(
+        select(UserPortrait).where(UserPortrait.user_id == user_id, UserPortrait.sphere.in_(spheres))
+    )
+    portraits = {p.sphere: p for p in portraits_res.scalars().all()}
+    knowledge_res = await db.execute(
+        select(SphereKnowledge).where(SphereKnowledge.user_id == user_id).order_by(SphereKnowledge.id)
+    )
+    knowledge = {sk.sphere: sk for sk in knowledge_res.scalars().all()}
+
+    tags: Counter = Counter()
+    tag_cards: dict[str, list] = {}
+    for session in sessions:
+        portrait = portraits.get(session.sphere)
+        if portrait is None:
+            portrait = portraits[session.sphere] = UserPortrait(user_id=user_id, sphere=session.sphere)
+            db.add(portrait)
+        fold_into_portrait(portrait, session)
+
+        sk = knowledge.get(session.sphere)
+        if sk is None:
+            sk = knowledge[session.sphere] = SphereKnowledge(user_id=user_id, sphere=session.sphere)
+            db.add(sk)
+        fold_into_sphere_knowledge(sk, portrait, session)
+
+        for tag in core_pattern_tags(session.core_pattern):
+            tags[tag] += 1
+            cards = tag_cards.setdefault(tag, [])
+            if session.archetype_id not in [c["archetype_id"] for c in cards]:
+                cards.append({"archetype_id": session.archetype_id, "sphere": session.sphere, "strength": 1})
+
+    # Level 1 (World) from the sphere cells
+    world_res = await db.execute(select(UserWorldKnowledge).where(UserWorldKnowledge.user_id == user_id))
+    world = world_res.scalar_one_or_none()
+    if world is None:
+        world = UserWorldKnowledge(user_id=user_id)
+        db.add(world)
+    world.hawkins_baseline = int(sum(sk.sphere_hawkins or 0 for sk in knowledge.values()) / len(knowledge))
+    world.spheres_completed = list(knowledge)
+    world.overall_pattern = "Комплексный паттерн развития."
+
+    if tags:
+        rows = [{"tag": tag, "n": n, "cards": tag_cards[tag]} for tag, n in tags.items()]
+        await db.execute(_UPSERT_PATTERNS_SQL, {"user_id": user_id, "rows": json.dumps(rows, ensure_ascii=False)})
+    await db.execute(_RECOMMEND_CARDS_SQL, {"user_id": user_id, "spheres": spheres})
+    await db.execute(
+        update(SyncSession).where(SyncSession.id.in_(session_ids)).values(analyzed_at=func.now())
+        .execution_options(synchronize_session=False)
+    )
+    return len(sessions)
+
+
+async def pending_sessions(db: AsyncSession, user_id: int) -> bool:
+    """Completed sessions of the user are left unfolded (their answers were still being logged)."""
+    return bool(await db.scalar(
+        select(exists().where(
+            SyncSession.user_id == user_id,
+            SyncSession.is_complete == True,
+            SyncSession.analyzed_at.is_(None),
+        ))
+    ))
@@ -0,0 +1,183 @@
+"""
+Append-only event log of sync sessions.
+
+A sync session used to keep its transcript and phase state in two JSONB
+blobs on sync_sessions, which every phase copied, extended and wrote back
+whole: the row grew with the session, each phase rewrote (and re-TOASTed)
+all of it, and two requests for the same session silently overwrote each
+other's turns. Now a phase appends its turns to sync_events and moves
+sync_sessions.event_seq forward. The kinds of events are:
+
+- user       an answer: {role, content, created_at, layer, sub_phase}
+- assistant  a reply opening layer/sub_phase: {role, content, created_at, layer, sub_phase}
+- state      keys merged into the phase state (metrics of a layer, the
+             portrait context of sessions started before it was kept)
+
+The transcript and phase state of a session are its row (phase_data from
+start_sync; session_transcript of sessions started before the log) with the
+events folded over it, see load_session_log(). Folding restores phase_data
+as the phases used to write it: timing from the created_at of the turns,
+metrics per layer, current_layer / sub_phase from the last reply. Each
+process keeps the folded log of recent sessions (SYNC_LOG_CACHE_SIZE),
+valid while event_seq is unchanged, so a phase served by the process that
+served the previous one reads no events at all.
+
+append_events() makes phase transitions optimistic: the session row only
+moves when event_seq is still the one the phase was computed from, else it
+raises SessionConflict and the caller rolls back. Once a session completes,
+the folded transcript and state are written to the row, so readers of
+finished sessions (mirror analysis, alignment context, post-sync jobs) keep
+reading session_transcript and phase_data.
+"""
+import copy
+from collections import OrderedDict
+from dataclasses import dataclass, field
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config import settings
+from app.models.sync_event import SyncEvent
+from app.models.sync_session import SyncSession
+
+EVENT_KINDS = ("user", "assistant", "state")
+
+
+class SessionConflict(Exception):
+    """The session moved on (another phase appended first) since its log was loaded."""
+
+    def __init__(self, session_id: int, expected_seq: int):
+        super().__init__(f"sync session {session_id} is past event {expected_seq}")
+        self.session_id = session_id
+        self.expected_seq = expected_seq
+
+
+def apply_event(transcript: list, state: dict, kind: str, payload: dict) -> None:
+    """Folds one event into transcript and state, in place."""
+    if kind == "state":
+        for key, value in payload.items():
+            if isinstance(value, dict) and isinstance(state.get(key), dict):
+                state[key] = {**state[key], **value}
+            else:
+                state[key] = value
+        return
+    if kind not in EVENT_KINDS:
+        raise ValueError(f"Unknown sync event kind {kind!r}")
+
+    message = {"role": payload["role"], "content": str(payload["content"])}
+    if payload.get("created_at"):
+        message["created_at"] = payload["created_at"]
+    transcript.append(message)
+
+    layer = payload.get("layer")
+    if layer is None:
+        return
+    sub_phase = payload.get("sub_phase", 0)
+    if payload.get("created_at"):
+        key = f"{layer}_{sub_phase}" + ("_user" if kind == "user" else "")
+        state["timing"] = {**state.get("timing", {}), key: payload["created_at"]}
+    if kind == "assistant":
+        state["current_layer"] = layer
+        state["sub_phase"] = sub_phase
+
+
+@dataclass
+class SessionLog:
+    """Folded transcript and state of a session up to event seq, plus the events not yet written."""
+    seq: int
+    transcript: list
+    state: dict
+    pending: list = field(default_factory=list)
+
+    def add(self, kind: str, payload: dict) -> None:
+        apply_event(self.transcript, self.state, kind, payload)
+        self.pending.append((kind, payload))
+
+    def copy(self) -> "SessionLog":
+        return SessionLog(self.seq, copy.deepcopy(self.transcript), copy.deepcopy(self.state), list(self.pending))
+
+
+def base_log(session: SyncSession) -> SessionLog:
+    """What the row itself holds: complete sessions and sessions before the log."""
+    transcript = []
+    for m in session.session_transcript or []:
+        if isinstance(m, dict) and m.get("role") and m.get("content") is not None:
+            message = {"role": m["role"], "content": str(m["content"])}
+            if m.get("created_at"):
+                message["created_at"] = m["created_at"]
+            transcript.append(message)
+    state = copy.deepcopy(session.phase_data) if session.phase_data else {"current_layer": "intro", "sub_phase": 0}
+    return SessionLog(session.event_seq or 0, transcript, state)
+
+
+_cache: "OrderedDict[int, SessionLog]" = OrderedDict()
+
+
+def remember_session_log(session_id: int, log: SessionLog) -> None:
+    """Keeps a committed log for the next phase of the session; call after the commit."""
+    if settings.SYNC_LOG_CACHE_SIZE <= 0 or log.pending:
+        return
+    _cache[session_id] = log.copy()
+    _cache.move_to_end(session_id)
+    while len(_cache) > settings.SYNC_LOG_CACHE_SIZE:
+        _cache.popitem(last=False)
+
+
+def forget_session_log(session_id: int) -> None:
+    _cache.pop(session_id, None)
+
+
+def reset_session_logs() -> None:
+    _cache.clear()
+
+
+async def load_session_log(db: AsyncSession, session: SyncSession) -> SessionLog:
+    """Transcript and phase state of the session as of session.event_seq, as a private copy."""
+    seq = session.event_seq or 0
+    cached = _cache.get(session.id)
+    if cached is not None and cached.seq == seq:
+        _cache.move_to_end(session.id)
+        return cached.copy()
+
+    log = base_log(session)
+    # A complete session has the folded log in its row already
+    if seq and not session.is_complete:
+        result = await db.execute(
+            select(SyncEvent.kind, SyncEvent.payload)
+            .where(SyncEvent.session_id == session.id, SyncEvent.seq <= seq)
+            .order_by(SyncEvent.seq)
+        )
+        for kind, payload in result.all():
+            apply_event(log.transcript, log.state, kind, payload)
+    if not session.is_complete:
+        remember_session_log(session.id, log)
+    return log
+
+
+async def append_events(db: AsyncSession, session_id: int, log: SessionLog, **values) -> None:
+    """
+    Writes the pending events of log after log.seq and moves the session row
+    to the new seq, with values (other sync_sessions columns) in the same
+    UPDATE. Raises SessionConflict when the row is no longer at log.seq; the
+    caller commits, then hands the log to remember_session_log().
+    """
+    expected = log.seq
+    events = [
+        {"session_id": session_id, "seq": expected + n, "kind": kind, "payload": payload}
+        for n, (kind, payload) in enumerate(log.pending, start=1)
+    ]
+    # The row lock taken here orders concurrent phases: the later one re-checks
+    # event_seq after the first commits and matches nothing
+    result = await db.execute(
+        update(SyncSession)
+        .where(SyncSession.id == session_id, SyncSession.event_seq == expected)
+        .values(event_seq=expected + len(events), **values)
+        .execution_options(synchronize_session=False)
+    )
+    if result.rowcount != 1:
+        forget_session_log(session_id)
+        raise SessionConflict(session_id, expected)
+    if events:
+        await db.execute(insert(SyncEvent), events)
+    log.seq = expected + len(events)
+    log.pending = []
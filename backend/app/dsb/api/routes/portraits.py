@@ -6,22 +6,30 @@ DSB API Routes — FastAPI endpoints для Digital Soul Blueprint.
 Монтируется на /api/dsb/
 """
 
-import asyncio
 import logging
 import datetime
 from typing import Optional
 
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException, Request, Response
 from pydantic import BaseModel, Field
 from sqlalchemy.ext.asyncio import AsyncSession
 
 from app.database import get_db
 from app.dsb.calculators.base import BirthData
-from app.dsb.config import SYSTEM_REGISTRY, ACTIVE_SYSTEMS, SPHERE_NAMES
+from app.dsb.calculators.cache import calculator_cache
+from app.dsb.llm.client import llm_client
+from app.dsb.config import SYSTEM_REGISTRY, ACTIVE_SYSTEMS
+from app.dsb.pipeline.checkpoints import summarize_progress
 from app.dsb.pipeline.orchestrator import PortraitOrchestrator
+from app.dsb.storage.documents import (
+    SECTION_BRIEF, SECTION_PORTRAIT, decode_document, etag_matches, portrait_documents,
+    section_etag, sphere_payload, sphere_section_name,
+)
 from app.dsb.storage.repository import PortraitRepository
 from app.dsb.storage.search import semantic_search
 from app.core.astrology.natal_chart import geocode_place
+from app.services.jobs import enqueue
+from app.services.llm_scheduler import Priority, llm_scheduler
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -59,13 +67,12 @@ class SearchRequest(BaseModel):
 @router.post("/portraits/generate", summary="Запустить генерацию портрета")
 async def generate_portrait(
     request: GeneratePortraitRequest,
-    background_tasks: BackgroundTasks,
     session: AsyncSession = Depends(get_db),
-    orchestrator: PortraitOrchestrator = Depends(get_orchestrator),
 ):
     """
     Запускает полный DSB пайплайн генерации портрета.
-    Возвращает portrait_id немедленно, генерация идёт в фоне.
+    Возвращает portrait_id немедленно, генерация идёт задачей очереди
+    (python -m app.worker).
     """
     # Геокодирование
     try:
@@ -83,93 +90,21 @@ async def generate_portrait(
         full_name=request.full_name,
     )
 
-    # Создаём запись и запускаем в фоне
+    # Запись портрета и задача пайплайна — одной транзакцией
     repo = PortraitRepository(session)
     portrait_id = await repo.create_portrait(
         user_id=request.user_id,
         birth_data=birth_data.model_dump(mode="json"),
         systems_used=ACTIVE_SYSTEMS,
     )
+    await enqueue(session, "dsb.generate_portrait", {
+        "portrait_id": portrait_id,
+        "user_id": request.user_id,
+        "birth_data": birth_data.model_dump(mode="json"),
+        "priority": Priority.ONBOARDING,
+    }, priority=Priority.ONBOARDING)
     await session.commit()
 
-    async def run_pipeline():
-        from app.database import AsyncSessionLocal
-        async with AsyncSessionLocal() as bg_session:
-            try:
-                # Используем оркестратор без повторного create_portrait
-                merger_orchestrator = PortraitOrchestrator()
-                from app.dsb.storage.repository import PortraitRepository as Repo
-                bg_repo = Repo(bg_session)
-
-                # Layer 1 — calculators
-                raw_results = await asyncio.gather(*[
-                    calc.calculate(birth_data)
-                    for _, calc in merger_orchestrator._all_calculators
-                ], return_exceptions=True)
-
-                # Layer 2 — active agents
-                from app.dsb.interpreters.schemas import UniversalInsightSchema
-                active_raw = []
-                for (name, _), result in zip(merger_orchestrator._all_calculators, raw_results):
-                    if name in merger_orchestrator._active_system_names:
-                        active_raw.append(
-                            result if not isinstance(result, Exception) else None
-                        )
-
-                interpretations = await asyncio.gather(*[
-                    agent.interpret((active_raw[i] or {}).get("raw_data", {}))
-                    for i, (_, agent) in enumerate(merger_orchestrator._active_agents)
-                ], return_exceptions=True)
-
-                all_insights: list[UniversalInsightSchema] = []
-                for result in interpretations:
-                    if not isinstance(result, Exception):
-                        all_insights.extend(result)
-
-                await bg_repo.save_facts(portrait_id, all_insights)
-                await bg_session.commit()
-
-                # Layer 3 — Synthesis
-                from app.dsb.synthesis.merger import Merger
-                from app.dsb.synthesis.sphere_agent import SphereAgent
-                from app.dsb.synthesis.meta_agent import MetaAgent
-                from app.dsb.synthesis.compressor import Compressor
-
-                spheres_data = Merger().merge([all_insights])
-                sphere_agent = SphereAgent()
-                sphere_portraits = await asyncio.gather(*[
-                    sphere_agent.synthesize(i, spheres_data.get(f"sphere_{i}", []),
-                                            merger_orchestrator._active_system_names)
-                    for i in range(1, 13)
-                ])
-
-                for sp in sphere_portraits:
-                    await bg_repo.save_sphere_synthesis(portrait_id, sp)
-                await bg_session.commit()
-
-                meta = await MetaAgent().find_patterns(list(sphere_portraits))
-                await bg_repo.save_meta_patterns(portrait_id, meta)
-
-                brief = await Compressor().compress(list(sphere_portraits), meta)
-                await bg_repo.save_summaries(portrait_id, brief)
-
-                # Generate embeddings for search
-                await bg_repo.generate_all_embeddings(portrait_id)
-
-                await bg_repo.update_status(portrait_id, "ready")
-                await bg_session.commit()
-                logger.info(f"[API] Portrait {portrait_id} ready")
-
-            except Exception as e:
-                logger.exception(f"[API] Background pipeline failed: {e}")
-                from app.database import AsyncSessionLocal as sf
-                async with sf() as err_session:
-                    err_repo = Repo(err_session)
-                    await err_repo.update_status(portrait_id, "error")
-                    await err_session.commit()
-
-    background_tasks.add_task(run_pipeline)
-
     return {
         "portrait_id": portrait_id,
         "status": "generating",
@@ -182,187 +117,109 @@ async def generate_portrait(
 async def get_portrait_status(
     portrait_id: str,
     session: AsyncSession = Depends(get_db),
+    orchestrator: PortraitOrchestrator = Depends(get_orchestrator),
 ):
     repo = PortraitRepository(session)
     portrait = await repo.get_portrait(portrait_id)
     if not portrait:
         raise HTTPException(status_code=404, detail="Portrait not found")
 
+    checkpoints = await repo.get_checkpoints(portrait_id, with_payload=False)
     return {
         "portrait_id": portrait_id,
         "status": portrait.status,
         "systems_used": portrait.systems_used,
         "version": portrait.version,
         "created_at": portrait.created_at.isoformat(),
+        "progress": summarize_progress(checkpoints, orchestrator.layer_totals()),
     }
 
 
+async def _serve_section(
+    repo: PortraitRepository,
+    portrait_id: str,
+    etag: str | None,
+    section: str,
+    request: Request,
+) -> Response:
+    """
+    Отдаёт секцию материализованного документа готового портрета.
+    If-None-Match совпал — 304 без чтения тела; тело берётся из LRU процесса
+    по etag, при промахе — один SELECT документа.
+    """
+    if etag is None:
+        # Портрет готов, но документа нет (сгенерирован до read model) — собрать при первом чтении
+        etag, sections = await repo.materialize_document(portrait_id)
+        await repo.session.commit()
+        portrait_documents.put(portrait_id, etag, sections)
+
+    headers = {"ETag": section_etag(etag, section), "Cache-Control": "private, no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+
+    sections = portrait_documents.get(portrait_id, etag)
+    if sections is None:
+        document = await repo.get_document(portrait_id)
+        sections = decode_document(document.body)
+        portrait_documents.put(portrait_id, document.etag, sections)
+        headers["ETag"] = section_etag(document.etag, section)
+    return Response(content=sections[section], media_type="application/json", headers=headers)
+
+
 @router.get("/portraits/{portrait_id}", summary="Полный портрет")
 async def get_portrait(
     portrait_id: str,
+    request: Request,
     session: AsyncSession = Depends(get_db),
 ):
     repo = PortraitRepository(session)
-    portrait = await repo.get_portrait(portrait_id)
-    if not portrait:
+    state = await repo.get_document_state(portrait_id)
+    if not state:
         raise HTTPException(status_code=404, detail="Portrait not found")
-    if portrait.status != "ready":
+    status, etag = state
+    if status != "ready":
         raise HTTPException(
             status_code=202,
-            detail=f"Portrait is {portrait.status}. Try again later.",
+            detail=f"Portrait is {status}. Try again later.",
         )
-
-    # Собираем все факты по сферам
-    from sqlalchemy import select
-    from app.dsb.storage.models import (
-        PortraitFact, PortraitAspectChain, PortraitPattern,
-        PortraitRecommendation, PortraitShadowAudit, PortraitMetaPattern,
-        PortraitSummary
-    )
-
-    async def load(model, portrait_id=portrait_id):
-        result = await session.execute(
-            select(model).where(model.portrait_id == portrait_id)
-        )
-        return result.scalars().all()
-
-    facts = await load(PortraitFact)
-    chains = await load(PortraitAspectChain)
-    patterns = await load(PortraitPattern)
-    recs = await load(PortraitRecommendation)
-    shadows = await load(PortraitShadowAudit)
-    metas = await load(PortraitMetaPattern)
-    summaries = await load(PortraitSummary)
-
-    # Structure by sphere
-    spheres = {}
-    for i in range(1, 13):
-        spheres[str(i)] = {
-            "name": SPHERE_NAMES[i],
-            "layer1_facts": [
-                {"position": f.position, "source": f.source_system,
-                 "influence": f.influence_level, "light": f.light_aspect,
-                 "shadow": f.shadow_aspect, "core_theme": f.core_theme}
-                for f in facts if f.sphere_primary == i
-            ],
-            "layer2_chains": [
-                {"name": c.chain_name, "convergence": c.convergence_score,
-                 "description": c.description}
-                for c in chains if c.sphere == i
-            ],
-            "layer3_patterns": [
-                {"name": p.pattern_name, "formula": p.formula,
-                 "description": p.description, "convergence": p.convergence_score}
-                for p in patterns if p.sphere == i
-            ],
-            "layer4_recommendations": [
-                {"text": r.recommendation, "influence": r.influence_level,
-                 "category": r.category}
-                for r in recs if r.sphere == i
-            ],
-            "layer5_shadow_audit": [
-                {"risk": s.risk_name, "description": s.description,
-                 "antidote": s.antidote, "convergence": s.convergence_score}
-                for s in shadows if s.sphere == i
-            ],
-        }
-
-    return {
-        "portrait_id": portrait_id,
-        "status": portrait.status,
-        "systems_used": portrait.systems_used,
-        "birth_data": portrait.birth_data,
-        "spheres": spheres,
-        "meta_patterns": [
-            {"name": m.pattern_name, "spheres": m.spheres_involved,
-             "description": m.description, "convergence": m.convergence_score}
-            for m in metas
-        ],
-    }
+    return await _serve_section(repo, portrait_id, etag, SECTION_PORTRAIT, request)
 
 
 @router.get("/portraits/{portrait_id}/sphere/{sphere_num}", summary="Данные одной сферы")
 async def get_sphere(
     portrait_id: str,
     sphere_num: int,
+    request: Request,
     session: AsyncSession = Depends(get_db),
 ):
     if sphere_num < 1 or sphere_num > 12:
         raise HTTPException(status_code=422, detail="Sphere must be 1-12")
 
     repo = PortraitRepository(session)
-    portrait = await repo.get_portrait(portrait_id)
-    if not portrait:
+    state = await repo.get_document_state(portrait_id)
+    if not state:
         raise HTTPException(status_code=404, detail="Portrait not found")
+    status, etag = state
+    if status == "ready":
+        return await _serve_section(repo, portrait_id, etag, sphere_section_name(sphere_num), request)
 
-    # Собираем все слои для сферы
-    facts = await repo.get_facts_for_sphere(portrait_id, sphere_num)
-    patterns = await repo.get_patterns_for_sphere(portrait_id, sphere_num)
-    recommendations = await repo.get_recommendations_for_sphere(portrait_id, sphere_num)
-    shadows = await repo.get_shadows_for_sphere(portrait_id, sphere_num)
-    
-    # Краткий бриф сферы
+    # Портрет ещё генерируется — то, что уже записано, из таблиц слоёв
     summaries = await repo.get_brief_portrait(portrait_id)
-    brief = summaries.get(f"sphere_{sphere_num}_brief", "")
-
-    return {
-        "sphere": sphere_num,
-        "name": SPHERE_NAMES[sphere_num],
-        "brief": brief,
-        "factors": [
-            {
-                "id": str(f.id),
-                "position": f.position,
-                "source_system": f.source_system,
-                "influence_level": f.influence_level,
-                "core_theme": f.core_theme,
-                "light_aspect": f.light_aspect,
-                "shadow_aspect": f.shadow_aspect,
-                "energy_description": f.energy_description,
-                "developmental_task": f.developmental_task,
-                "integration_key": f.integration_key,
-                "triggers": f.triggers,
-                "timing": f.timing,
-                "spheres_affected": f.spheres_affected or [],
-            }
-            for f in facts
-        ],
-        "patterns": [
-            {
-                "id": str(p.id),
-                "pattern_name": p.pattern_name,
-                "formula": p.formula,
-                "influence_level": p.influence_level,
-                "convergence_score": p.convergence_score,
-                "description": p.description,
-            }
-            for p in patterns
-        ],
-        "recommendations": [
-            {
-                "id": str(r.id),
-                "recommendation": r.recommendation,
-                "influence_level": r.influence_level,
-            }
-            for r in recommendations
-        ],
-        "shadows": [
-            {
-                "id": str(s.id),
-                "risk_name": s.risk_name,
-                "description": s.description,
-                "convergence_score": s.convergence_score,
-                "antidote": s.antidote,
-            }
-            for s in shadows
-        ],
-    }
+    return sphere_payload(
+        sphere_num,
+        await repo.get_facts_for_sphere(portrait_id, sphere_num),
+        await repo.get_patterns_for_sphere(portrait_id, sphere_num),
+        await repo.get_recommendations_for_sphere(portrait_id, sphere_num),
+        await repo.get_shadows_for_sphere(portrait_id, sphere_num),
+        summaries.get(f"sphere_{sphere_num}_brief", ""),
+    )
 
 
 @router.get("/portraits/user/{user_id}/sphere/{sphere_num}", summary="Одна сфера по ID пользователя")
 async def get_sphere_by_user(
     user_id: int,
     sphere_num: int,
+    request: Request,
     session: AsyncSession = Depends(get_db),
 ):
     """Находит последний готовый портрет пользователя и возвращает данные сферы."""
@@ -372,19 +229,24 @@ async def get_sphere_by_user(
         # Если портрета нет, возвращаем пустую структуру чтобы фронтенд не падал
         return {"sphere": sphere_num, "factors": [], "patterns": [], "recommendations": [], "shadows": []}
     
-    return await get_sphere(portrait_id, sphere_num, session)
+    return await get_sphere(portrait_id, sphere_num, request, session)
 
 
 @router.get("/portraits/{portrait_id}/brief", summary="Краткий формат портрета")
 async def get_brief_portrait(
     portrait_id: str,
+    request: Request,
     session: AsyncSession = Depends(get_db),
 ):
     repo = PortraitRepository(session)
-    portrait = await repo.get_portrait(portrait_id)
-    if not portrait:
+    state = await repo.get_document_state(portrait_id)
+    if not state:
         raise HTTPException(status_code=404, detail="Portrait not found")
+    status, etag = state
+    if status == "ready":
+        return await _serve_section(repo, portrait_id, etag, SECTION_BRIEF, request)
 
+    portrait = await repo.get_portrait(portrait_id)
     brief = await repo.get_brief_portrait(portrait_id)
     return {
         "portrait_id": portrait_id,
@@ -411,6 +273,7 @@ async def search_portrait(
         top_k=request.top_k,
         spheres_filter=request.spheres_filter,
         influence_filter=request.influence_filter,
+        version=portrait.updated_at.isoformat() if portrait.updated_at else None,
     )
 
     return {
@@ -431,24 +294,58 @@ async def get_systems():
     }
 
 
+@router.get("/calculators/cache", summary="Статистика кэша калькуляторов")
+async def get_calculator_cache_stats():
+    return calculator_cache.stats()
+
+
+@router.get("/llm/stats", summary="Статистика LLM-вызовов (кэш, склейка, токены, очередь)")
+async def get_llm_stats():
+    return {**llm_client.stats(), "scheduler": llm_scheduler.stats()}
+
+
+@router.delete("/calculators/cache/{system_name}", summary="Инвалидация кэша калькулятора")
+async def invalidate_calculator_cache(
+    system_name: str,
+    version: Optional[str] = None,
+    session: AsyncSession = Depends(get_db),
+):
+    """Удаляет закэшированные результаты учения (все версии или только `version`)."""
+    if system_name not in SYSTEM_REGISTRY:
+        raise HTTPException(status_code=404, detail="Unknown system")
+    removed = await calculator_cache.invalidate(system_name, version, session)
+    await session.commit()
+    return {"system_name": system_name, "version": version, "removed": removed}
+
+
 @router.post("/portraits/{portrait_id}/regenerate", summary="Перегенерация портрета")
 async def regenerate_portrait(
     portrait_id: str,
-    background_tasks: BackgroundTasks,
+    force: bool = False,
     session: AsyncSession = Depends(get_db),
 ):
-    """Перезапускает пайплайн — используется при подключении нового учения."""
+    """
+    Перезапускает пайплайн с сохранёнными birth_data — после сбоя или при
+    подключении нового учения. Готовые юниты берутся из чекпоинтов;
+    force=true сбрасывает чекпоинты и считает всё заново.
+    """
     repo = PortraitRepository(session)
     portrait = await repo.get_portrait(portrait_id)
     if not portrait:
         raise HTTPException(status_code=404, detail="Portrait not found")
 
+    if force:
+        await repo.clear_checkpoints(portrait_id)
     await repo.update_status(portrait_id, "generating")
+    await enqueue(session, "dsb.generate_portrait", {
+        "portrait_id": portrait_id,
+        "user_id": portrait.user_id,
+        "birth_data": portrait.birth_data,
+        "priority": Priority.BACKGROUND,
+    }, priority=Priority.BACKGROUND)
     await session.commit()
-
-    # TODO: реализовать полный rerrun с сохранёнными birth_data
     return {
         "portrait_id": portrait_id,
         "status": "generating",
-        "message": "Перегенерация запущена (TODO: реализовать полный rerrun)",
+        "message": "Перегенерация запущена" + (" с нуля" if force else " с последних чекпоинтов"),
     }
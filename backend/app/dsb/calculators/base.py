@@ -36,9 +36,14 @@ class Calculator(ABC):
     - Реализует calculate(birth_data) → dict в формате из секции 3.2 документа
     - Является идемпотентным: одни входные данные = один и тот же выход
     - Не знает о других калькуляторах
+
+    Благодаря идемпотентности результаты кэшируются (calculators/cache.py).
+    При любом изменении формата или логики выхода — увеличить version,
+    иначе будут отдаваться старые закэшированные результаты.
     """
 
     system_name: str = ""
+    version: str = "1"
 
     @abstractmethod
     async def calculate(self, birth_data: BirthData) -> dict:
@@ -0,0 +1,217 @@
+from __future__ import annotations
+"""
+DSB Calculators — кэш результатов Слоя 1.
+
+Калькуляторы идемпотентны, поэтому результат однозначно определяется ключом
+sha256(system_name, Calculator.version, нормализованные BirthData).
+
+Два уровня:
+  1. In-memory LRU (на процесс) — повторный онбординг / регенерация мгновенно
+  2. Postgres (dsb_calculator_cache) — переживает рестарты, общий для воркеров
+
+Инвалидация: увеличить Calculator.version (старые ключи просто перестают
+совпадать) и при желании вычистить их через invalidate(system_name, version).
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from sqlalchemy import delete, select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.dsb.calculators.base import BirthData, Calculator
+from app.dsb.storage.models import CalculatorCacheEntry
+
+logger = logging.getLogger(__name__)
+
+MEMORY_CACHE_SIZE = 2048
+
+
+def normalize_birth_data(birth_data: BirthData) -> dict:
+    """
+    Каноническая форма входных данных: регистр и пробелы в месте/имени
+    не влияют на ключ, координаты округляются до ~10 см.
+    """
+    data = birth_data.model_dump(mode="json")
+    data["place"] = " ".join(data["place"].split()).casefold()
+    if data.get("full_name"):
+        data["full_name"] = " ".join(data["full_name"].split()).casefold()
+    for coord in ("lat", "lon"):
+        if data.get(coord) is not None:
+            data[coord] = round(data[coord], 6)
+    return data
+
+
+def make_cache_key(calculator: Calculator, birth_data: BirthData) -> str:
+    payload = json.dumps(
+        {
+            "system": calculator.system_name,
+            "version": calculator.version,
+            "birth_data": normalize_birth_data(birth_data),
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CalculatorCache:
+    """Двухуровневый кэш результатов Calculator.calculate()."""
+
+    def __init__(self, memory_size: int = MEMORY_CACHE_SIZE):
+        self.memory_size = memory_size
+        self._memory: OrderedDict[str, tuple[str, str, dict]] = OrderedDict()
+        # key -> (system_name, version, result)
+        self.memory_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    # ─── Memory tier ────────────────────────────────────────────────────────
+
+    def _get_memory(self, key: str) -> dict | None:
+        entry = self._memory.get(key)
+        if entry is None:
+            return None
+        self._memory.move_to_end(key)
+        return entry[2]
+
+    def _put_memory(self, key: str, system_name: str, version: str, result: dict) -> None:
+        self._memory[key] = (system_name, version, result)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    @staticmethod
+    @asynccontextmanager
+    async def _store_session(
+        session: AsyncSession | None,
+        session_factory: async_sessionmaker | None,
+    ) -> AsyncIterator[AsyncSession]:
+        if session is not None:
+            # SAVEPOINT: ошибка кэша не должна ломать транзакцию вызывающего
+            async with session.begin_nested():
+                yield session
+        else:
+            async with session_factory() as own, own.begin():
+                yield own
+
+    # ─── Public API ─────────────────────────────────────────────────────────
+
+    async def calculate_many(
+        self,
+        calculators: list[tuple[str, Calculator]],
+        birth_data: BirthData,
+        session: AsyncSession | None = None,
+        session_factory: async_sessionmaker | None = None,
+    ) -> list[dict | Exception]:
+        """
+        Аналог asyncio.gather(*[calc.calculate(birth_data)], return_exceptions=True)
+        с кэшем. Без session / session_factory работает только in-memory уровень.
+        Все обращения к БД — по одному запросу на чтение и запись, т.к.
+        одну AsyncSession нельзя использовать из параллельных задач.
+        С session_factory чтение и запись идут в отдельных коротких сессиях,
+        и соединение не удерживается, пока считают калькуляторы.
+        Закэшированные dict отдаются без копирования — не мутировать.
+        """
+        keys = [make_cache_key(calc, birth_data) for _, calc in calculators]
+        results: list[dict | Exception | None] = [self._get_memory(key) for key in keys]
+        self.memory_hits += sum(r is not None for r in results)
+
+        use_store = session is not None or session_factory is not None
+        missing = [i for i, r in enumerate(results) if r is None]
+        if missing and use_store:
+            try:
+                async with self._store_session(session, session_factory) as store:
+                    rows = await store.execute(
+                        select(CalculatorCacheEntry.cache_key, CalculatorCacheEntry.result)
+                        .where(CalculatorCacheEntry.cache_key.in_([keys[i] for i in missing]))
+                    )
+                    stored = dict(rows.all())
+            except Exception as e:
+                logger.warning(f"[CalculatorCache] Store lookup failed: {e}")
+                stored = {}
+            for i in missing:
+                if keys[i] in stored:
+                    name, calc = calculators[i]
+                    results[i] = stored[keys[i]]
+                    self._put_memory(keys[i], name, calc.version, results[i])
+                    self.store_hits += 1
+            missing = [i for i in missing if results[i] is None]
+
+        self.misses += len(missing)
+        computed = await asyncio.gather(*[
+            calculators[i][1].calculate(birth_data) for i in missing
+        ], return_exceptions=True)
+
+        new_rows = []
+        for i, result in zip(missing, computed):
+            results[i] = result
+            if isinstance(result, Exception):
+                continue
+            name, calc = calculators[i]
+            self._put_memory(keys[i], name, calc.version, result)
+            new_rows.append({
+                "cache_key": keys[i],
+                "system_name": name,
+                "calculator_version": calc.version,
+                "result": result,
+            })
+
+        if new_rows and use_store:
+            try:
+                async with self._store_session(session, session_factory) as store:
+                    await store.execute(
+                        insert(CalculatorCacheEntry).values(new_rows).on_conflict_do_nothing()
+                    )
+            except Exception as e:
+                logger.warning(f"[CalculatorCache] Store write failed: {e}")
+
+        return results
+
+    async def invalidate(
+        self,
+        system_name: str,
+        version: str | None = None,
+        session: AsyncSession | None = None,
+    ) -> int:
+        """
+        Удаляет записи учения (только указанной версии, если задана).
+        Возвращает число удалённых записей из памяти и БД.
+        """
+        stale = [
+            key for key, (name, ver, _) in self._memory.items()
+            if name == system_name and (version is None or ver == version)
+        ]
+        for key in stale:
+            del self._memory[key]
+        removed = len(stale)
+
+        if session is not None:
+            stmt = delete(CalculatorCacheEntry).where(CalculatorCacheEntry.system_name == system_name)
+            if version is not None:
+                stmt = stmt.where(CalculatorCacheEntry.calculator_version == version)
+            result = await session.execute(stmt)
+            removed += result.rowcount or 0
+
+        logger.info(f"[CalculatorCache] Invalidated {system_name} v{version or '*'}: {removed} entries")
+        return removed
+
+    def stats(self) -> dict:
+        lookups = self.memory_hits + self.store_hits + self.misses
+        return {
+            "memory_hits": self.memory_hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.memory_hits + self.store_hits) / lookups, 4) if lookups else 0.0,
+            "memory_entries": len(self._memory),
+        }
+
+
+# Единственный экземпляр на процесс
+calculator_cache = CalculatorCache()
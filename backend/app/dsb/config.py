@@ -5,6 +5,10 @@ ACTIVE_SYSTEMS определяет, какие учения передают д
 Все калькуляторы запускаются всегда (для сбора сырых данных).
 """
 
+import os
+
+from app.config import settings
+
 # ─── Активные учения (данные передаются в Слой 2) ───────────────────────────
 # На старте только западная астрология, остальные только считают, не интерпретируют
 ACTIVE_SYSTEMS: list[str] = ["western_astrology"]
@@ -82,6 +86,23 @@ DSB_MAX_TOKENS_SPHERE: int = 12000
 DSB_MAX_TOKENS_META: int = 6000
 DSB_MAX_TOKENS_COMPRESSOR: int = 4000
 
+# ─── LLM-слой (dsb/llm/) ────────────────────────────────────────────────────
+# Кэш ответов по (model, messages, params): регенерация с теми же данными
+# не платит за повторные промпты. Отключить — если нужна новая "выборка".
+DSB_LLM_CACHE_ENABLED: bool = True
+DSB_LLM_CACHE_PATH: str = os.path.join(settings.DATA_DIR, "dsb_llm_cache.sqlite3")
+DSB_LLM_CACHE_MEMORY_SIZE: int = 512
+
+# ─── Материализованный документ портрета (dsb/storage/documents.py) ────────
+# Документов в LRU процесса (~50-100 КБ каждый в разобранном виде)
+DSB_PORTRAIT_DOCUMENT_CACHE_SIZE: int = 256
+
+# ─── Семантический поиск (dsb/storage/search.py) ────────────────────────────
+# Портрет, который ищут DSB_SEARCH_HOT_AFTER раз, держится в памяти процесса
+# (~300 векторов, ~2 МБ); 0 портретов — всегда SQL
+DSB_SEARCH_INDEX_SIZE: int = 32
+DSB_SEARCH_HOT_AFTER: int = 3
+
 # ─── 12 Сфер ────────────────────────────────────────────────────────────────
 SPHERE_NAMES: dict[int, str] = {
     1:  "Идентичность / Я",
@@ -7,12 +7,12 @@ Interpretation Engine — базовый класс агента-интерпр
 """
 
 from abc import ABC, abstractmethod
-from openai import AsyncOpenAI
 import json
 import logging
 
 from app.dsb.interpreters.schemas import UniversalInsightSchema
 from app.dsb.config import DSB_MODEL_FAST, DSB_TEMPERATURE_INTERPRETATION, DSB_MAX_TOKENS_INTERPRETATION
+from app.dsb.llm.client import llm_client
 
 logger = logging.getLogger(__name__)
 
@@ -36,7 +36,7 @@ class InterpretationAgent(ABC):
     max_tokens: int = DSB_MAX_TOKENS_INTERPRETATION
 
     def __init__(self):
-        self._client = AsyncOpenAI()
+        self._llm = llm_client
 
     @abstractmethod
     def _build_system_prompt(self) -> str:
@@ -64,7 +64,7 @@ class InterpretationAgent(ABC):
         user_prompt = self._build_user_prompt(raw_data)
 
         try:
-            response = await self._client.chat.completions.create(
+            content = await self._llm.complete(
                 model=self.model,
                 temperature=self.temperature,
                 max_tokens=self.max_tokens,
@@ -73,9 +73,9 @@ class InterpretationAgent(ABC):
                     {"role": "user", "content": user_prompt},
                 ],
                 response_format={"type": "json_object"},
+                tag=f"interpret:{self.system_name}",
             )
 
-            content = response.choices[0].message.content
             parsed = json.loads(content)
 
             # Ответ может быть {"insights": [...]} или напрямую [...]
@@ -74,7 +74,7 @@ class WesternAstrologyAgent(InterpretationAgent):
         )
 
         try:
-            response = await self._client.chat.completions.create(
+            content = await self._llm.complete(
                 model=self.model,
                 temperature=self.temperature,
                 max_tokens=self.max_tokens,
@@ -83,9 +83,9 @@ class WesternAstrologyAgent(InterpretationAgent):
                     {"role": "user", "content": user_prompt},
                 ],
                 response_format={"type": "json_object"},
+                tag=f"interpret:{self.system_name}",
             )
 
-            content = response.choices[0].message.content
             parsed = json.loads(content)
             raw_list = parsed if isinstance(parsed, list) else parsed.get("insights", [])
 
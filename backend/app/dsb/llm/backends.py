@@ -0,0 +1,70 @@
+from __future__ import annotations
+"""
+LLM Backends — транспорт для LLMClient.
+
+OpenAIBackend — продакшн (chat.completions, один AsyncOpenAI на процесс).
+FakeLLMBackend — in-process заглушка для тестов: весь пайплайн DSB
+прогоняется офлайн, ответы задаются функцией responder.
+"""
+
+import asyncio
+from abc import ABC, abstractmethod
+from dataclasses import dataclass
+from typing import Callable
+
+from openai import AsyncOpenAI
+
+
+@dataclass
+class LLMResponse:
+    content: str
+    prompt_tokens: int = 0
+    completion_tokens: int = 0
+
+
+class LLMBackend(ABC):
+    """Один вызов модели без кэша и без повторов."""
+
+    @abstractmethod
+    async def complete(self, model: str, messages: list[dict], **params) -> LLMResponse:
+        pass
+
+
+class OpenAIBackend(LLMBackend):
+    def __init__(self):
+        self._client: AsyncOpenAI | None = None
+
+    async def complete(self, model: str, messages: list[dict], **params) -> LLMResponse:
+        if self._client is None:
+            # Повторы делает LLMScheduler — повторы SDK обходили бы бюджет модели
+            self._client = AsyncOpenAI(max_retries=0)
+        response = await self._client.chat.completions.create(model=model, messages=messages, **params)
+        usage = response.usage
+        return LLMResponse(
+            content=response.choices[0].message.content,
+            prompt_tokens=usage.prompt_tokens if usage else 0,
+            completion_tokens=usage.completion_tokens if usage else 0,
+        )
+
+
+class FakeLLMBackend(LLMBackend):
+    """
+    Детерминированный бэкенд для тестов.
+
+    responder(model, messages, params) -> str; по умолчанию "{}" —
+    все агенты DSB корректно обрабатывают пустой JSON-объект.
+    Все вызовы сохраняются в self.calls.
+    """
+
+    def __init__(self, responder: Callable[[str, list[dict], dict], str] | None = None, delay: float = 0.0):
+        self.responder = responder or (lambda model, messages, params: "{}")
+        self.delay = delay
+        self.calls: list[dict] = []
+
+    async def complete(self, model: str, messages: list[dict], **params) -> LLMResponse:
+        self.calls.append({"model": model, "messages": messages, "params": params})
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        content = self.responder(model, messages, params)
+        prompt_chars = sum(len(m.get("content", "")) for m in messages)
+        return LLMResponse(content, prompt_tokens=prompt_chars // 4, completion_tokens=len(content) // 4)
@@ -0,0 +1,106 @@
+from __future__ import annotations
+"""
+LLM Response Cache — локальное хранилище готовых ответов модели.
+
+Ключ — sha256(model, messages, params). Два уровня: LRU в памяти процесса
+и SQLite-файл (переживает рестарты, без отдельного сервиса).
+Обращения к SQLite короткие и выполняются в потоке, чтобы не блокировать loop.
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+
+def make_request_key(model: str, messages: list[dict], params: dict) -> str:
+    payload = json.dumps(
+        {"model": model, "messages": messages, "params": params},
+        sort_keys=True,
+        ensure_ascii=False,
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class LLMResponseCache:
+    def __init__(self, path: str | None, memory_size: int = 512):
+        self.path = path
+        self.memory_size = memory_size
+        self._memory: OrderedDict[str, str] = OrderedDict()
+        self._lock = threading.Lock()
+        self._db: sqlite3.Connection | None = None
+
+    def _connect(self) -> sqlite3.Connection | None:
+        if self.path is None:
+            return None
+        if self._db is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(self.path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                "key TEXT PRIMARY KEY, model TEXT, content TEXT, "
+                "created_at TEXT DEFAULT CURRENT_TIMESTAMP)"
+            )
+        return self._db
+
+    def _remember(self, key: str, content: str) -> None:
+        self._memory[key] = content
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def _load(self, key: str) -> str | None:
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return None
+            row = db.execute("SELECT content FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            return row[0] if row else None
+
+    def _store(self, key: str, model: str, content: str) -> None:
+        with self._lock:
+            db = self._connect()
+            if db is None:
+                return
+            db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, model, content) VALUES (?, ?, ?)",
+                (key, model, content),
+            )
+            db.commit()
+
+    async def get(self, key: str) -> tuple[str | None, str]:
+        """Возвращает (content, уровень: memory | store | miss)."""
+        content = self._memory.get(key)
+        if content is not None:
+            self._memory.move_to_end(key)
+            return content, "memory"
+        try:
+            content = await asyncio.to_thread(self._load, key)
+        except sqlite3.Error as e:
+            logger.warning(f"[LLMCache] Read failed: {e}")
+            content = None
+        if content is None:
+            return None, "miss"
+        self._remember(key, content)
+        return content, "store"
+
+    async def put(self, key: str, model: str, content: str) -> None:
+        self._remember(key, content)
+        try:
+            await asyncio.to_thread(self._store, key, model, content)
+        except sqlite3.Error as e:
+            logger.warning(f"[LLMCache] Write failed: {e}")
+
+    def clear(self) -> None:
+        self._memory.clear()
+        with self._lock:
+            db = self._connect()
+            if db is not None:
+                db.execute("DELETE FROM llm_cache")
+                db.commit()
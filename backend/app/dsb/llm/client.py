@@ -0,0 +1,149 @@
+from __future__ import annotations
+"""
+LLMClient — единая точка вызова модели для агентов DSB.
+
+1. Кэш: одинаковые (model, messages, params) → готовый ответ без вызова API.
+   Промпты интерпретации и синтеза детерминированы входными данными,
+   поэтому регенерация портрета с теми же данными почти бесплатна.
+2. Склейка: одновременные одинаковые запросы ждут один вызов в полёте;
+   если его отменили, ожидающие не отменяются, а повторяют запрос сами.
+3. Статистика: вызовы, попадания, токены, латентность — по тегам агентов.
+4. Планировщик: реальные вызовы API идут через общий LLMScheduler
+   (бюджеты модели, приоритеты, повторы при 429/таймаутах).
+
+Бэкенд подменяется (FakeLLMBackend) — так пайплайн гоняется в тестах офлайн.
+"""
+
+import asyncio
+import json
+import logging
+import time
+from collections import defaultdict
+
+from app.dsb.config import DSB_LLM_CACHE_ENABLED, DSB_LLM_CACHE_MEMORY_SIZE, DSB_LLM_CACHE_PATH
+from app.dsb.llm.backends import LLMBackend, LLMResponse, OpenAIBackend
+from app.dsb.llm.cache import LLMResponseCache, make_request_key
+from app.services.llm_scheduler import LLMScheduler, estimate_tokens, llm_scheduler
+
+logger = logging.getLogger(__name__)
+
+_STAT_FIELDS = (
+    "requests", "api_calls", "memory_hits", "store_hits", "coalesced", "errors",
+    "prompt_tokens", "completion_tokens", "latency_ms",
+)
+
+
+class _LeaderCancelled(Exception):
+    """Вызов, к которому приклеились ожидающие, отменён: они повторяют запрос сами."""
+
+
+class LLMClient:
+    def __init__(
+        self,
+        backend: LLMBackend,
+        cache: LLMResponseCache | None = None,
+        scheduler: LLMScheduler | None = None,
+    ):
+        self.backend = backend
+        self.cache = cache
+        self.scheduler = scheduler
+        self._inflight: dict[str, asyncio.Future] = {}
+        self._stats: dict[str, dict[str, float]] = defaultdict(lambda: dict.fromkeys(_STAT_FIELDS, 0))
+
+    async def complete(self, model: str, messages: list[dict], tag: str = "default", **params) -> str:
+        """
+        Возвращает content ответа модели. params передаются в API как есть
+        (temperature, max_tokens, response_format, ...).
+        Для response_format=json_object в кэш попадают только валидные JSON-ответы.
+        """
+        stats = self._stats[tag]
+        stats["requests"] += 1
+        key = make_request_key(model, messages, params)
+
+        while True:
+            if self.cache is not None:
+                content, level = await self.cache.get(key)
+                if content is not None:
+                    stats[f"{level}_hits"] += 1
+                    return content
+
+            inflight = self._inflight.get(key)
+            if inflight is None:
+                return await self._lead(key, model, messages, params, stats)
+            stats["coalesced"] += 1
+            try:
+                return await asyncio.shield(inflight)
+            except _LeaderCancelled:
+                # Отменён чужой вызов, не наш: первый повторивший становится ведущим
+                continue
+
+    async def _lead(self, key: str, model: str, messages: list[dict], params: dict, stats: dict) -> str:
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            response = await self._call_backend(model, messages, params, stats)
+            stats["prompt_tokens"] += response.prompt_tokens
+            stats["completion_tokens"] += response.completion_tokens
+
+            if self.cache is not None and self._cacheable(response.content, params):
+                await self.cache.put(key, model, response.content)
+            future.set_result(response.content)
+            return response.content
+        except asyncio.CancelledError:
+            # Не future.cancel(): ожидающие получили бы CancelledError, хотя их никто не отменял
+            future.set_exception(_LeaderCancelled())
+            future.exception()
+            raise
+        except Exception as e:
+            stats["errors"] += 1
+            future.set_exception(e)
+            future.exception()  # ожидающих может не быть — не логировать "never retrieved"
+            raise
+        finally:
+            del self._inflight[key]
+
+    async def _call_backend(self, model: str, messages: list[dict], params: dict, stats: dict) -> LLMResponse:
+        async def call() -> LLMResponse:
+            started = time.perf_counter()
+            response = await self.backend.complete(model, messages, **params)
+            stats["latency_ms"] += (time.perf_counter() - started) * 1000
+            stats["api_calls"] += 1
+            return response
+
+        if self.scheduler is None:
+            return await call()
+        return await self.scheduler.run(
+            model, call, estimate_tokens(messages, params),
+            count_tokens=lambda r: r.prompt_tokens + r.completion_tokens,
+        )
+
+    @staticmethod
+    def _cacheable(content: str | None, params: dict) -> bool:
+        if not content:
+            return False
+        if (params.get("response_format") or {}).get("type") == "json_object":
+            try:
+                json.loads(content)
+            except ValueError:
+                return False
+        return True
+
+    def stats(self) -> dict:
+        """Итоги и разбивка по тегам; latency_ms — суммарная по реальным вызовам API."""
+        total = dict.fromkeys(_STAT_FIELDS, 0)
+        for tag_stats in self._stats.values():
+            for field, value in tag_stats.items():
+                total[field] += value
+        return {"total": total, "by_tag": {tag: dict(s) for tag, s in self._stats.items()}}
+
+    def reset_stats(self) -> None:
+        self._stats.clear()
+
+
+def _build_default_client() -> LLMClient:
+    cache = LLMResponseCache(DSB_LLM_CACHE_PATH, DSB_LLM_CACHE_MEMORY_SIZE) if DSB_LLM_CACHE_ENABLED else None
+    return LLMClient(OpenAIBackend(), cache, llm_scheduler)
+
+
+# Единственный экземпляр на процесс; в тестах подменяется backend / cache
+llm_client = _build_default_client()
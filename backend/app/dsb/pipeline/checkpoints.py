@@ -0,0 +1,161 @@
+from __future__ import annotations
+"""
+Чекпоинты пайплайна DSB — возобновление генерации с места сбоя.
+
+Юнит = (слой, единица): калькулятор учения, интерпретация учения,
+каждая из 12 сфер, meta, compressor. Для юнита хранится sha256 его входов:
+готовый чекпоинт переиспользуется, только пока входы совпадают. Поэтому
+перезапуск после сбоя пересчитывает лишь упавшие юниты, а подключение
+нового учения — только то, что от него зависит.
+"""
+
+import hashlib
+import json
+import logging
+from typing import Awaitable, Callable
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+
+from app.dsb.storage.models import PortraitCheckpoint
+from app.dsb.storage.repository import PortraitRepository
+
+logger = logging.getLogger(__name__)
+
+LAYERS = ("calculators", "interpretation", "spheres", "meta", "compressor")
+
+
+def input_hash(*parts) -> str:
+    payload = json.dumps(parts, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class CheckpointStore:
+    """Чекпоинты одного портрета: снимок в памяти + запись короткими транзакциями."""
+
+    def __init__(self, portrait_id: str, session_factory: async_sessionmaker, checkpoints: list[PortraitCheckpoint]):
+        self.portrait_id = portrait_id
+        self.session_factory = session_factory
+        self._done = {
+            (c.layer, c.unit): (c.input_hash, c.payload)
+            for c in checkpoints if c.status == "done"
+        }
+        self._pending: dict[str, list[tuple]] = {}
+        self.reused = 0
+        self.computed = 0
+
+    @classmethod
+    async def load(cls, portrait_id: str, session_factory: async_sessionmaker) -> CheckpointStore:
+        async with session_factory() as session:
+            checkpoints = await PortraitRepository(session).get_checkpoints(portrait_id)
+        return cls(portrait_id, session_factory, checkpoints)
+
+    def get(self, layer: str, unit: str, inputs: str) -> dict | None:
+        """payload готового юнита с теми же входами, иначе None."""
+        entry = self._done.get((layer, unit))
+        if entry is None or entry[0] != inputs:
+            return None
+        return entry[1]
+
+    async def save_many(
+        self,
+        layer: str,
+        entries: list[tuple[str, str, dict | None, str | None]],
+        session: AsyncSession | None = None,
+    ) -> None:
+        """entries: (unit, input_hash, payload, error); error != None → статус error."""
+        await self._write({layer: entries}, session)
+
+    async def _write(self, by_layer: dict[str, list[tuple]], session: AsyncSession | None) -> None:
+        if session is not None:
+            # В транзакции вызывающего: записывается вместе с его данными
+            await self._write_rows(PortraitRepository(session), by_layer)
+        else:
+            try:
+                async with self.session_factory() as own, own.begin():
+                    await self._write_rows(PortraitRepository(own), by_layer)
+            except Exception as e:
+                # Чекпоинт — оптимизация: сбой записи не должен ронять генерацию
+                logger.warning(f"[Checkpoints] Failed to save {', '.join(by_layer)} for portrait {self.portrait_id}: {e}")
+                return
+        for layer, entries in by_layer.items():
+            for unit, inputs, payload, error in entries:
+                if error is None:
+                    self._done[(layer, unit)] = (inputs, payload)
+                else:
+                    self._done.pop((layer, unit), None)
+
+    async def _write_rows(self, repo: PortraitRepository, by_layer: dict[str, list[tuple]]) -> None:
+        await repo.save_checkpoints(self.portrait_id, [
+            {
+                "layer": layer, "unit": unit,
+                "status": "error" if error is not None else "done",
+                "input_hash": inputs, "payload": payload, "error": error,
+            }
+            for layer, entries in by_layer.items()
+            for unit, inputs, payload, error in entries
+        ])
+
+    def defer(self, layer: str, entries: list[tuple[str, str, dict | None, str | None]]) -> None:
+        """Как save_many, но запись откладывается до flush()."""
+        self._pending.setdefault(layer, []).extend(entries)
+
+    async def run(
+        self,
+        layer: str,
+        unit: str,
+        inputs: str,
+        compute: Callable[[], Awaitable[dict]],
+        check: Callable[[dict], str | None] | None = None,
+        batch: bool = False,
+    ) -> dict:
+        """
+        Возвращает payload из чекпоинта или считает юнит и сохраняет результат.
+        Агенты при сбое LLM отдают заглушку вместо исключения: check(payload)
+        возвращает текст ошибки для такой заглушки — она уходит в пайплайн как есть,
+        но чекпоинт пишется со статусом error, и перезапуск пересчитает юнит.
+        batch=True откладывает запись до flush(): параллельные юниты слоя
+        (и соседние слои) пишутся одной транзакцией.
+        """
+        payload = self.get(layer, unit, inputs)
+        if payload is not None:
+            self.reused += 1
+            return payload
+        self.computed += 1
+        try:
+            payload = await compute()
+        except Exception as e:
+            await self._record(layer, (unit, inputs, None, f"{type(e).__name__}: {e}"), batch)
+            raise
+        error = check(payload) if check is not None else None
+        await self._record(layer, (unit, inputs, None if error else payload, error), batch)
+        return payload
+
+    async def _record(self, layer: str, entry: tuple, batch: bool) -> None:
+        if batch:
+            self.defer(layer, [entry])
+        else:
+            await self.save_many(layer, [entry])
+
+    async def flush(self, session: AsyncSession | None = None) -> None:
+        """Пишет отложенные чекпоинты всех слоёв одной транзакцией (или в session вызывающего)."""
+        pending, self._pending = self._pending, {}
+        if pending:
+            await self._write(pending, session)
+
+
+def summarize_progress(checkpoints: list[PortraitCheckpoint], totals: dict[str, int]) -> dict:
+    """Прогресс по слоям для /portraits/{id}/status."""
+    progress = {
+        layer: {"total": totals.get(layer, 0), "done": 0, "error": 0, "failed_units": []}
+        for layer in LAYERS
+    }
+    for c in checkpoints:
+        layer = progress.get(c.layer)
+        if layer is None:
+            continue
+        if c.status == "done":
+            layer["done"] += 1
+        else:
+            layer["error"] += 1
+            layer["failed_units"].append({"unit": c.unit, "error": c.error})
+    return progress
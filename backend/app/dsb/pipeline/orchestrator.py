@@ -11,20 +11,28 @@ PortraitOrchestrator — главный пайплайн Digital Soul Blueprint.
 import asyncio
 import importlib
 import logging
-from sqlalchemy.ext.asyncio import AsyncSession
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
 from sqlalchemy import select
 
 from app.dsb.calculators.base import BirthData, Calculator
+from app.dsb.calculators.cache import calculator_cache, make_cache_key
 from app.dsb.interpreters.base import InterpretationAgent
 from app.dsb.interpreters.schemas import UniversalInsightSchema
 from app.dsb.synthesis.merger import Merger
 from app.dsb.synthesis.sphere_agent import SphereAgent
 from app.dsb.synthesis.meta_agent import MetaAgent
 from app.dsb.synthesis.compressor import Compressor
+from app.dsb.pipeline.checkpoints import CheckpointStore, input_hash
 from app.dsb.storage.repository import PortraitRepository
 from app.dsb.config import SYSTEM_REGISTRY, ACTIVE_SYSTEMS, SPHERE_NAMES
 from app.models.natal_chart import NatalChart
 from app.models.card_progress import CardProgress, CardStatus
+from app.services.jobs import PermanentJobError, job_handler
+from app.services.llm_scheduler import Priority, priority_scope
 
 logger = logging.getLogger(__name__)
 
@@ -36,6 +44,15 @@ def _import_class(dotted_path: str):
     return getattr(module, class_name)
 
 
+@asynccontextmanager
+async def _db_phase(session_factory: async_sessionmaker, name: str) -> AsyncIterator[AsyncSession]:
+    """Короткая фаза записи: своя сессия и транзакция, соединение сразу возвращается в пул."""
+    started = time.perf_counter()
+    async with session_factory() as session, session.begin():
+        yield session
+    logger.info(f"[Orchestrator] DB phase {name}: {(time.perf_counter() - started) * 1000:.0f} ms")
+
+
 class PortraitOrchestrator:
     """
     Оркестрирует полный цикл генерации портрета.
@@ -76,40 +93,75 @@ class PortraitOrchestrator:
         self,
         birth_data: BirthData,
         user_id: int,
-        session: AsyncSession,
+        session_factory: async_sessionmaker,
         portrait_id: str = None,
+        priority: Priority = Priority.ONBOARDING,
+        raise_errors: bool = False,
     ) -> str:
         """
         Запускает полный пайплайн генерации портрета.
         Если portrait_id не передан — создает новый.
+
+        priority — класс LLM-вызовов пайплайна в общем планировщике
+        (app.services.llm_scheduler): онбординг уступает интерактивным
+        sync/align, перегенерация — ещё и онбордингу.
+        raise_errors — после пометки портрета "error" пробросить исключение
+        (задаче очереди, чтобы она повторилась).
         """
-        repo = PortraitRepository(session)
+        with priority_scope(priority):
+            return await self._generate(birth_data, user_id, session_factory, portrait_id, raise_errors)
 
+    async def _generate(
+        self,
+        birth_data: BirthData,
+        user_id: int,
+        session_factory: async_sessionmaker,
+        portrait_id: str | None,
+        raise_errors: bool = False,
+    ) -> str:
+        """
+        Соединение из пула берётся только на короткие фазы работы с БД
+        (создание портрета, кэш калькуляторов, итоговая запись).
+        Калькуляторы и LLM-слои идут без сессии, результаты копятся в памяти
+        и сохраняются одной транзакцией в конце.
+
+        Каждый юнит (учение, сфера, meta, compressor) пишет чекпоинт, поэтому
+        повторный запуск с тем же portrait_id пересчитывает только упавшие
+        или устаревшие юниты (см. app.dsb.pipeline.checkpoints).
+        """
         # ─── Создать запись портрета (если еще нет) ─────────────────────
-        if not portrait_id:
-            portrait_id = await repo.create_portrait(
-                user_id=user_id,
-                birth_data=birth_data.model_dump(mode="json"),
-                systems_used=self._active_system_names,
-            )
-            await session.commit()
+        created = not portrait_id
+        checkpoints: CheckpointStore | None = None
+        if created:
+            async with _db_phase(session_factory, "create_portrait") as session:
+                portrait_id = await PortraitRepository(session).create_portrait(
+                    user_id=user_id,
+                    birth_data=birth_data.model_dump(mode="json"),
+                    systems_used=self._active_system_names,
+                )
             logger.info(f"[Orchestrator] New Portrait {portrait_id} created for user {user_id}")
         else:
             logger.info(f"[Orchestrator] Using existing Portrait {portrait_id} for user {user_id}")
 
         try:
-            # ═══ СЛОЙ 1: Расчёты (все калькуляторы параллельно) ════════
+            if created:
+                checkpoints = CheckpointStore(portrait_id, session_factory, [])
+            else:
+                checkpoints = await CheckpointStore.load(portrait_id, session_factory)
+
+            # ═══ СЛОЙ 1: Расчёты (все калькуляторы параллельно, через кэш) ═
+            # Результаты уже лежат в кэше калькуляторов — чекпоинт только фиксирует
+            # статус и пишется вместе с чекпоинтами Слоя 2
             logger.info(f"[Orchestrator] Layer 1: running {len(self._all_calculators)} calculators...")
-            raw_results = await asyncio.gather(*[
-                calc.calculate(birth_data)
-                for _, calc in self._all_calculators
-            ], return_exceptions=True)
-
-            # Сохранить сырые результаты для всех систем
-            for (name, _), result in zip(self._all_calculators, raw_results):
-                if not isinstance(result, Exception):
-                    await repo.save_raw_results(portrait_id, name, result.get("raw_data", {}))
-            await session.commit()
+            raw_results = await calculator_cache.calculate_many(
+                self._all_calculators, birth_data, session_factory=session_factory
+            )
+            logger.info(f"[Orchestrator] Calculator cache: {calculator_cache.stats()}")
+            checkpoints.defer("calculators", [
+                (name, make_cache_key(calc, birth_data), None,
+                 f"{type(result).__name__}: {result}" if isinstance(result, Exception) else None)
+                for (name, calc), result in zip(self._all_calculators, raw_results)
+            ])
 
             # Оставляем только успешные результаты для активных агентов
             active_raw = []
@@ -123,26 +175,35 @@ class PortraitOrchestrator:
 
             # ═══ СЛОЙ 2: Интерпретация (только активные агенты) ════════
             logger.info(f"[Orchestrator] Layer 2: running {len(self._active_agents)} agents...")
+
+            async def interpret(agent: InterpretationAgent, raw_data: dict) -> dict:
+                insights = await agent.interpret(raw_data)
+                return {"insights": [uis.model_dump(mode="json") for uis in insights]}
+
             interpretation_tasks = []
             for i, (name, agent) in enumerate(self._active_agents):
                 raw = active_raw[i] if i < len(active_raw) and active_raw[i] is not None else {}
-                interpretation_tasks.append(agent.interpret(raw.get("raw_data", {})))
+                raw_data = raw.get("raw_data", {})
+                interpretation_tasks.append(checkpoints.run(
+                    "interpretation", name, input_hash(name, raw_data),
+                    lambda agent=agent, raw_data=raw_data: interpret(agent, raw_data),
+                    # agent.interpret при сбое LLM возвращает пустой список
+                    check=lambda payload: None if payload["insights"] else "No insights generated",
+                    batch=True,
+                ))
 
             interpretations = await asyncio.gather(*interpretation_tasks, return_exceptions=True)
+            await checkpoints.flush()
 
             all_insights: list[UniversalInsightSchema] = []
             for (name, _), result in zip(self._active_agents, interpretations):
                 if isinstance(result, Exception):
                     logger.error(f"[Orchestrator] Agent {name} failed: {result}")
                 else:
-                    all_insights.extend(result)
+                    all_insights.extend(UniversalInsightSchema(**item) for item in result["insights"])
 
             logger.info(f"[Orchestrator] Total UIS objects: {len(all_insights)}")
 
-            # Сохранить факты
-            await repo.save_facts(portrait_id, all_insights)
-            await session.commit()
-
             # ═══ СЛОЙ 3a: Merger ════════════════════════════════════════
             logger.info("[Orchestrator] Layer 3a: Merging by spheres...")
             merger = Merger()
@@ -151,63 +212,135 @@ class PortraitOrchestrator:
             # ═══ СЛОЙ 3b: 12 Sphere Agents (параллельно) ════════════════
             logger.info("[Orchestrator] Layer 3b: Synthesizing 12 spheres (parallel)...")
             sphere_agent = SphereAgent()
-            sphere_tasks = [
-                sphere_agent.synthesize(
-                    sphere_num=i,
-                    insights=spheres_data.get(f"sphere_{i}", []),
-                    active_systems=self._active_system_names,
-                )
-                for i in range(1, 13)
-            ]
-            sphere_portraits = await asyncio.gather(*sphere_tasks)
-
-            # Сохранить синтез каждой сферы
-            for sp in sphere_portraits:
-                await repo.save_sphere_synthesis(portrait_id, sp)
-            await session.commit()
+            sphere_tasks = []
+            for i in range(1, 13):
+                insights = spheres_data.get(f"sphere_{i}", [])
+                sphere_tasks.append(checkpoints.run(
+                    "spheres", str(i),
+                    input_hash(i, [uis.model_dump(mode="json") for uis in insights], self._active_system_names),
+                    lambda i=i, insights=insights: sphere_agent.synthesize(
+                        sphere_num=i, insights=insights, active_systems=self._active_system_names,
+                    ),
+                    # При сбое LLM SphereAgent отдаёт пустую сферу с "error"
+                    check=lambda payload, insights=insights: payload.get("error") if insights else None,
+                    batch=True,
+                ))
+            sphere_results = await asyncio.gather(*sphere_tasks, return_exceptions=True)
+            await checkpoints.flush()
+            failed = [r for r in sphere_results if isinstance(r, Exception)]
+            if failed:
+                raise failed[0]
+            sphere_portraits = list(sphere_results)
 
             # ═══ СЛОЙ 3c: Meta Agent ════════════════════════════════════
             logger.info("[Orchestrator] Layer 3c: Meta Agent (super-patterns)...")
             meta_agent = MetaAgent()
-            meta_patterns = await meta_agent.find_patterns(list(sphere_portraits))
-            await repo.save_meta_patterns(portrait_id, meta_patterns)
-            await session.commit()
+            meta_patterns = await checkpoints.run(
+                "meta", "all", input_hash(sphere_portraits),
+                lambda: meta_agent.find_patterns(list(sphere_portraits)),
+                check=lambda payload: payload.get("error"),
+            )
 
             # ═══ СЛОЙ 3d: Compressor ════════════════════════════════════
             logger.info("[Orchestrator] Layer 3d: Compressor (brief format)...")
             compressor = Compressor()
-            brief = await compressor.compress(list(sphere_portraits), meta_patterns)
-            await repo.save_summaries(portrait_id, brief)
+            brief = await checkpoints.run(
+                "compressor", "all", input_hash(sphere_portraits, meta_patterns),
+                lambda: compressor.compress(list(sphere_portraits), meta_patterns),
+                check=lambda payload: payload.get("error"),
+                batch=True,
+            )
+            logger.info(
+                f"[Orchestrator] Checkpoints: {checkpoints.reused} units reused, "
+                f"{checkpoints.computed} computed"
+            )
 
-            # ═══ Готово ═════════════════════════════════════════════════
-            # Генерируем синтетический UserPrint для старого MasterHubView
+            # ═══ Запись: все слои одной транзакцией ═════════════════════
             from app.dsb.synthesis.master_hub_adapter import generate_user_print_from_dsb
-            await generate_user_print_from_dsb(user_id, session, brief, meta_patterns)
+            from app.models.user import User
 
-            await repo.update_status(portrait_id, "ready")
-            await session.commit()
+            async with _db_phase(session_factory, "persist") as session:
+                repo = PortraitRepository(session)
+                await repo.clear_layers(portrait_id)  # перезапуск: заменить, а не дописать
+                await repo.save_raw_results_many(portrait_id, {
+                    name: result.get("raw_data", {})
+                    for (name, _), result in zip(self._all_calculators, raw_results)
+                    if not isinstance(result, Exception)
+                })
+                await repo.save_facts(portrait_id, all_insights)
+                await repo.save_sphere_syntheses(portrait_id, list(sphere_portraits))
+                await repo.save_meta_patterns(portrait_id, meta_patterns)
+                await repo.save_summaries(portrait_id, brief)
+                # Синтетический UserPrint для старого MasterHubView
+                await generate_user_print_from_dsb(user_id, session, brief, meta_patterns)
+                await repo.update_status(portrait_id, "ready")
+                # Read model для GET /portraits/{id}: собирается из только что записанных слоёв
+                await repo.materialize_document(portrait_id)
+                await checkpoints.flush(session)
+                tg_id = await session.scalar(select(User.tg_id).where(User.id == user_id))
             logger.info(f"[Orchestrator] Portrait {portrait_id} READY")
 
-            # Notification to user
-            from app.models.user import User
-            user_res = await session.execute(select(User).where(User.id == user_id))
-            user_obj = user_res.scalar_one_or_none()
-            if user_obj and user_obj.tg_id:
+            await self._embed_layers(session_factory, portrait_id)
+
+            # Notification to user (соединение уже возвращено в пул)
+            if tg_id:
                 msg = (
                     "✅ <b>Твой DSB Паспорт готов!</b>\n\n"
                     "Расчёт по 12 сферам и теневой компас полностью синтезированы.\n✨ "
                     "Переходи во вкладку «О тебе», чтобы открыть подробности."
                 )
                 from app.services.notification import NotificationService
-                await NotificationService.send_tg_message(user_obj.tg_id, msg)
+                await NotificationService.send_tg_message(tg_id, msg)
 
         except Exception as e:
             logger.exception(f"[Orchestrator] Pipeline failed for portrait {portrait_id}: {e}")
-            await repo.update_status(portrait_id, "error")
-            await session.commit()
+            async with _db_phase(session_factory, "mark_error") as session:
+                await PortraitRepository(session).update_status(portrait_id, "error")
+            if checkpoints is not None:
+                await checkpoints.flush()  # например, compressor при сбое итоговой записи
+            if raise_errors:
+                raise
 
         return portrait_id
 
+    async def _embed_layers(self, session_factory: async_sessionmaker, portrait_id: str) -> None:
+        """
+        Эмбеддинги записей портрета для семантического поиска. Тексты читаются
+        и векторы пишутся короткими фазами, API-вызовы идут без соединения.
+        Неизменившиеся при перегенерации тексты берутся из кэша эмбеддингов.
+        Сбой не портит готовый портрет: записи без вектора лишь не находятся поиском.
+        """
+        from app.dsb.storage.embeddings import generate_embeddings_batch
+
+        try:
+            async with _db_phase(session_factory, "embedding_texts") as session:
+                pending = await PortraitRepository(session).pending_embedding_texts(portrait_id)
+            if not pending:
+                return
+            embeddings = await generate_embeddings_batch([text for _, _, text in pending])
+            items = [
+                (model_cls, record_id, emb)
+                for (model_cls, record_id, _), emb in zip(pending, embeddings)
+                if emb is not None
+            ]
+            async with _db_phase(session_factory, "embeddings") as session:
+                repo = PortraitRepository(session)
+                await repo.save_embeddings(items)
+                await repo.touch(portrait_id)  # индексы поиска в памяти сверяются с updated_at
+            logger.info(f"[Orchestrator] Embedded {len(items)}/{len(pending)} records of portrait {portrait_id}")
+        except Exception as e:
+            logger.error(f"[Orchestrator] Embeddings failed for portrait {portrait_id}: {e}")
+
+    def layer_totals(self) -> dict[str, int]:
+        """Число юнитов в каждом слое — знаменатель прогресса в статусе портрета."""
+        return {
+            "calculators": len(self._all_calculators),
+            "interpretation": len(self._active_agents),
+            "spheres": 12,
+            "meta": 1,
+            "compressor": 1,
+        }
+
     async def initialize_onboarding_layer(
         self,
         birth_data: BirthData,
@@ -227,10 +360,10 @@ class PortraitOrchestrator:
             if name in self._active_system_names
         ]
         
-        results = await asyncio.gather(*[
-            calc.calculate(birth_data)
-            for _, calc in active_calcs
-        ])
+        results = await calculator_cache.calculate_many(active_calcs, birth_data, session)
+        for result in results:
+            if isinstance(result, Exception):
+                raise result
         
         # Берем данные западной астрологии как основные для старого UI
         wa_data = next((res.get("raw_data") for (name, _), res in zip(active_calcs, results) if name == "western_astrology"), None)
@@ -260,9 +393,11 @@ class PortraitOrchestrator:
         else:
             portrait_id = portrait.id
 
-        for (name, _), res in zip(active_calcs, results):
-            if not isinstance(res, Exception):
-                await repo.save_raw_results(portrait_id, name, res.get("raw_data", {}))
+        await repo.save_raw_results_many(portrait_id, {
+            name: res.get("raw_data", {})
+            for (name, _), res in zip(active_calcs, results)
+            if not isinstance(res, Exception)
+        })
 
         # 3. Legacy Sync: NatalChart (чтобы работал Astro Chart на фронте)
         natal_res = await session.execute(select(NatalChart).where(NatalChart.user_id == user_id))
@@ -323,3 +458,28 @@ class PortraitOrchestrator:
                             sphere=sphere,
                             status=CardStatus.LOCKED
                         ))
+
+
+@job_handler("dsb.generate_portrait", concurrency=4, visibility_timeout=300, max_attempts=3)
+async def generate_portrait_job(
+    portrait_id: str,
+    user_id: int,
+    birth_data: dict,
+    priority: int = Priority.ONBOARDING,
+) -> None:
+    """
+    Задача очереди (app.services.jobs): пайплайн для уже созданного портрета.
+    Повтор после сбоя идёт с чекпоинтов, поэтому ошибка пробрасывается в
+    очередь; портрет остаётся "error" только после последней попытки.
+    """
+    from app.database import AsyncSessionLocal
+
+    async with _db_phase(AsyncSessionLocal, "job_start") as session:
+        repo = PortraitRepository(session)
+        if await repo.get_portrait(portrait_id) is None:
+            raise PermanentJobError(f"Portrait {portrait_id} not found")
+        await repo.update_status(portrait_id, "generating")
+
+    await PortraitOrchestrator().generate(
+        BirthData(**birth_data), user_id, AsyncSessionLocal, portrait_id, Priority(priority), raise_errors=True,
+    )
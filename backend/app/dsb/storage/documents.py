@@ -0,0 +1,262 @@
+from __future__ import annotations
+"""
+Материализованный документ портрета — read model для GET /portraits/{id}.
+
+Готовый портрет не меняется до перегенерации, поэтому ответы полного
+портрета, 12 сфер и брифа собираются один раз в конце генерации (в той же
+транзакции, что и слои), сериализуются в JSON и хранятся сжатыми
+в dsb_portrait_documents. Эндпоинты отдают готовые байты секции:
+без семи выборок по слоям и без сборки в Python. Слои читаются
+проекциями (projections.py) — строками без embedding.
+
+Формат тела: gzip от строк "<секция>\\t<json>" — секцию можно отдать
+без повторной сериализации. ETag документа — sha256 несжатого тела,
+в процессе держится LRU разобранных документов, сверяемый по ETag.
+"""
+
+import gzip
+import hashlib
+import json
+from collections import OrderedDict
+
+from app.dsb.config import DSB_PORTRAIT_DOCUMENT_CACHE_SIZE, SPHERE_NAMES
+from app.dsb.storage.models import DigitalPortrait
+from app.dsb.storage.projections import (
+    ChainRow, FactRow, MetaPatternRow, PatternRow, RecommendationRow, ShadowRow, SummaryRow,
+)
+
+SECTION_PORTRAIT = "portrait"
+SECTION_BRIEF = "brief"
+
+
+def sphere_section_name(sphere_num: int) -> str:
+    return f"sphere_{sphere_num}"
+
+
+def brief_dict(summaries: list[SummaryRow]) -> dict:
+    output = {}
+    for s in summaries:
+        if s.is_overall:
+            output["overall_brief"] = s.brief_text
+        else:
+            output[f"sphere_{s.sphere}_brief"] = s.brief_text
+    return output
+
+
+def sphere_payload(
+    sphere_num: int,
+    facts: list[FactRow],
+    patterns: list[PatternRow],
+    recommendations: list[RecommendationRow],
+    shadows: list[ShadowRow],
+    brief: str,
+) -> dict:
+    """Ответ GET /portraits/{id}/sphere/{n}; facts — по убыванию weight."""
+    return {
+        "sphere": sphere_num,
+        "name": SPHERE_NAMES[sphere_num],
+        "brief": brief,
+        "factors": [
+            {
+                "id": str(f.id),
+                "position": f.position,
+                "source_system": f.source_system,
+                "influence_level": f.influence_level,
+                "core_theme": f.core_theme,
+                "light_aspect": f.light_aspect,
+                "shadow_aspect": f.shadow_aspect,
+                "energy_description": f.energy_description,
+                "developmental_task": f.developmental_task,
+                "integration_key": f.integration_key,
+                "triggers": f.triggers,
+                "timing": f.timing,
+                "spheres_affected": f.spheres_affected or [],
+            }
+            for f in facts
+        ],
+        "patterns": [
+            {
+                "id": str(p.id),
+                "pattern_name": p.pattern_name,
+                "formula": p.formula,
+                "influence_level": p.influence_level,
+                "convergence_score": p.convergence_score,
+                "description": p.description,
+            }
+            for p in patterns
+        ],
+        "recommendations": [
+            {
+                "id": str(r.id),
+                "recommendation": r.recommendation,
+                "influence_level": r.influence_level,
+            }
+            for r in recommendations
+        ],
+        "shadows": [
+            {
+                "id": str(s.id),
+                "risk_name": s.risk_name,
+                "description": s.description,
+                "convergence_score": s.convergence_score,
+                "antidote": s.antidote,
+            }
+            for s in shadows
+        ],
+    }
+
+
+def build_portrait_sections(
+    portrait: DigitalPortrait,
+    facts: list[FactRow],
+    chains: list[ChainRow],
+    patterns: list[PatternRow],
+    recommendations: list[RecommendationRow],
+    shadows: list[ShadowRow],
+    metas: list[MetaPatternRow],
+    summaries: list[SummaryRow],
+) -> dict[str, dict]:
+    """Все секции документа: полный портрет, бриф и 12 сфер. Слои группируются по сфере один раз."""
+    by_sphere: dict[str, dict[int, list]] = {
+        layer: {i: [] for i in range(1, 13)}
+        for layer in ("facts", "chains", "patterns", "recommendations", "shadows")
+    }
+    for layer, rows, attr in (
+        ("facts", facts, "sphere_primary"),
+        ("chains", chains, "sphere"),
+        ("patterns", patterns, "sphere"),
+        ("recommendations", recommendations, "sphere"),
+        ("shadows", shadows, "sphere"),
+    ):
+        for row in rows:
+            bucket = by_sphere[layer].get(getattr(row, attr))
+            if bucket is not None:
+                bucket.append(row)
+
+    brief = brief_dict(summaries)
+    spheres = {}
+    for i in range(1, 13):
+        spheres[str(i)] = {
+            "name": SPHERE_NAMES[i],
+            "layer1_facts": [
+                {"position": f.position, "source": f.source_system,
+                 "influence": f.influence_level, "light": f.light_aspect,
+                 "shadow": f.shadow_aspect, "core_theme": f.core_theme}
+                for f in by_sphere["facts"][i]
+            ],
+            "layer2_chains": [
+                {"name": c.chain_name, "convergence": c.convergence_score,
+                 "description": c.description}
+                for c in by_sphere["chains"][i]
+            ],
+            "layer3_patterns": [
+                {"name": p.pattern_name, "formula": p.formula,
+                 "description": p.description, "convergence": p.convergence_score}
+                for p in by_sphere["patterns"][i]
+            ],
+            "layer4_recommendations": [
+                {"text": r.recommendation, "influence": r.influence_level,
+                 "category": r.category}
+                for r in by_sphere["recommendations"][i]
+            ],
+            "layer5_shadow_audit": [
+                {"risk": s.risk_name, "description": s.description,
+                 "antidote": s.antidote, "convergence": s.convergence_score}
+                for s in by_sphere["shadows"][i]
+            ],
+        }
+
+    sections = {
+        SECTION_PORTRAIT: {
+            "portrait_id": portrait.id,
+            "status": portrait.status,
+            "systems_used": portrait.systems_used,
+            "birth_data": portrait.birth_data,
+            "spheres": spheres,
+            "meta_patterns": [
+                {"name": m.pattern_name, "spheres": m.spheres_involved,
+                 "description": m.description, "convergence": m.convergence_score}
+                for m in metas
+            ],
+        },
+        SECTION_BRIEF: {
+            "portrait_id": portrait.id,
+            "systems_used": portrait.systems_used,
+            "brief": brief,
+        },
+    }
+    for i in range(1, 13):
+        sphere_facts = sorted(by_sphere["facts"][i], key=lambda f: f.weight or 0.0, reverse=True)
+        sections[sphere_section_name(i)] = sphere_payload(
+            i, sphere_facts, by_sphere["patterns"][i], by_sphere["recommendations"][i],
+            by_sphere["shadows"][i], brief.get(f"sphere_{i}_brief", ""),
+        )
+    return sections
+
+
+def encode_document(sections: dict[str, dict]) -> tuple[str, bytes, dict[str, bytes]]:
+    """→ (etag, сжатое тело, секции в JSON). JSON — как у JSONResponse FastAPI."""
+    encoded = {
+        name: json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        for name, payload in sections.items()
+    }
+    raw = b"\n".join(name.encode("ascii") + b"\t" + payload for name, payload in encoded.items())
+    etag = hashlib.sha256(raw).hexdigest()[:32]
+    return etag, gzip.compress(raw, compresslevel=6), encoded
+
+
+def decode_document(body: bytes) -> dict[str, bytes]:
+    sections = {}
+    for line in gzip.decompress(body).split(b"\n"):
+        name, _, payload = line.partition(b"\t")
+        sections[name.decode("ascii")] = payload
+    return sections
+
+
+def section_etag(etag: str, section: str) -> str:
+    return f'"{etag}-{section}"'
+
+
+def etag_matches(if_none_match: str | None, etag: str) -> bool:
+    """If-None-Match: список ETag через запятую, слабые (W/) сравниваются как сильные, "*" — любой."""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate in (etag, "*"):
+            return True
+    return False
+
+
+class PortraitDocumentCache:
+    """LRU разобранных документов: portrait_id → (etag, секции). Устаревший etag — промах."""
+
+    def __init__(self, size: int = 256):
+        self.size = size
+        self._items: OrderedDict[str, tuple[str, dict[str, bytes]]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, portrait_id: str, etag: str) -> dict[str, bytes] | None:
+        item = self._items.get(portrait_id)
+        if item is None or item[0] != etag:
+            self.misses += 1
+            return None
+        self._items.move_to_end(portrait_id)
+        self.hits += 1
+        return item[1]
+
+    def put(self, portrait_id: str, etag: str, sections: dict[str, bytes]) -> None:
+        self._items[portrait_id] = (etag, sections)
+        self._items.move_to_end(portrait_id)
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"size": len(self._items), "capacity": self.size, "hits": self.hits, "misses": self.misses}
+
+
+# Один LRU на процесс
+portrait_documents = PortraitDocumentCache(DSB_PORTRAIT_DOCUMENT_CACHE_SIZE)
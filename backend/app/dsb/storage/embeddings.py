@@ -1,17 +1,20 @@
 from __future__ import annotations
 """
 DSB Embeddings — генерация векторных эмбеддингов для портрета.
-Используется OpenAI text-embedding-3-small (1536 dim).
+Модель и размерность общие для всего бэкенда (settings.EMBEDDING_MODEL,
+по умолчанию text-embedding-3-small, 1536 dim); вызовы идут через
+app.services.embeddings — с батчингом, дедупликацией и кэшем.
 """
 
 import logging
-from openai import AsyncOpenAI
+from app.config import settings
 from app.dsb.config import SPHERE_NAMES
+from app.services.embeddings import embed, embed_many
 
 logger = logging.getLogger(__name__)
 
-EMBEDDING_MODEL = "text-embedding-3-small"
-EMBEDDING_DIMS = 1536
+EMBEDDING_MODEL = settings.EMBEDDING_MODEL
+EMBEDDING_DIMS = settings.EMBEDDING_DIMENSIONS
 
 
 def generate_embedding_text(record: dict, record_type: str = "fact") -> str:
@@ -69,28 +72,28 @@ def generate_embedding_text(record: dict, record_type: str = "fact") -> str:
 
 
 async def generate_embedding(text: str) -> list[float] | None:
-    """Генерирует эмбеддинг для одного текста."""
-    client = AsyncOpenAI()
+    """Генерирует эмбеддинг для одного текста; None при ошибке."""
     try:
-        response = await client.embeddings.create(
-            model=EMBEDDING_MODEL,
-            input=text[:8000],  # ограничение контекста
-        )
-        return response.data[0].embedding
+        return await embed(text)
     except Exception as e:
         logger.error(f"[Embeddings] Failed to generate embedding: {e}")
         return None
 
 
 async def generate_embeddings_batch(texts: list[str]) -> list[list[float] | None]:
-    """Генерирует эмбеддинги для пакета текстов (до 100 за вызов)."""
-    client = AsyncOpenAI()
+    """
+    Генерирует эмбеддинги для пакета текстов любого размера (сервис сам
+    режет его на вызовы API). Пустые тексты и пакет при ошибке — None.
+    """
+    indexed = [(i, t) for i, t in enumerate(texts) if t and t.strip()]
+    result: list[list[float] | None] = [None] * len(texts)
+    if not indexed:
+        return result
     try:
-        response = await client.embeddings.create(
-            model=EMBEDDING_MODEL,
-            input=[t[:8000] for t in texts],
-        )
-        return [item.embedding for item in response.data]
+        vectors = await embed_many([t for _, t in indexed])
     except Exception as e:
         logger.error(f"[Embeddings] Batch generation failed: {e}")
-        return [None] * len(texts)
+        return result
+    for (i, _), vector in zip(indexed, vectors):
+        result[i] = vector
+    return result
@@ -4,6 +4,10 @@ DSB Storage Models — SQLAlchemy ORM модели для всех 7 табли
 Схема полная — готова под все 8 учений, хотя на старте активно только одно.
 
 Поле source_system отличает данные разных учений в одних таблицах.
+
+Колонки embedding отложены (deferred + raiseload): обычное чтение их не
+тянет (~6 КБ на строку), а обращение к незагруженному .embedding падает
+сразу вместо скрытого запроса. Нужен вектор — options(undefer(Model.embedding)).
 """
 
 import uuid
@@ -11,8 +15,8 @@ from datetime import datetime, timezone
 from typing import Optional
 
 from sqlalchemy import (
-    Boolean, CheckConstraint, DateTime, Float, Integer,
-    String, Text, ForeignKey, func,
+    Boolean, CheckConstraint, DateTime, Float, Integer, LargeBinary,
+    String, Text, ForeignKey, UniqueConstraint, func,
 )
 from sqlalchemy.dialects.postgresql import ARRAY, JSONB, UUID
 from sqlalchemy.orm import Mapped, mapped_column, relationship
@@ -62,6 +66,8 @@ class DigitalPortrait(Base):
     meta_patterns = relationship("PortraitMetaPattern", back_populates="portrait", cascade="all, delete-orphan")
     summaries = relationship("PortraitSummary", back_populates="portrait", cascade="all, delete-orphan")
     raw_data = relationship("PortraitRawData", back_populates="portrait", cascade="all, delete-orphan")
+    checkpoints = relationship("PortraitCheckpoint", back_populates="portrait", cascade="all, delete-orphan")
+    document = relationship("PortraitDocument", back_populates="portrait", cascade="all, delete-orphan", uselist=False)
 
 
 # ─── Таблица 0.5: Сырые данные калькуляторов ────────────────────────────────
@@ -116,7 +122,10 @@ class PortraitFact(Base):
     confidence: Mapped[float] = mapped_column(Float, default=0.5)
     raw_uis: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
 
-    embedding = mapped_column(Vector(1536) if _VECTOR_AVAILABLE and Vector else JSONB, nullable=True)
+    embedding = mapped_column(
+        Vector(1536) if _VECTOR_AVAILABLE and Vector else JSONB, nullable=True,
+        deferred=True, deferred_raiseload=True,
+    )
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=_now)
 
     portrait = relationship("DigitalPortrait", back_populates="facts")
@@ -140,7 +149,10 @@ class PortraitAspectChain(Base):
     convergence_score: Mapped[float] = mapped_column(Float, nullable=False)
     description: Mapped[str] = mapped_column(Text, nullable=False)
 
-    embedding = mapped_column(Vector(1536) if _VECTOR_AVAILABLE and Vector else JSONB, nullable=True)
+    embedding = mapped_column(
+        Vector(1536) if _VECTOR_AVAILABLE and Vector else JSONB, nullable=True,
+        deferred=True, deferred_raiseload=True,
+    )
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=_now)
 
     portrait = relationship("DigitalPortrait", back_populates="aspect_chains")
@@ -165,7 +177,10 @@ class PortraitPattern(Base):
     convergence_score: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
     influence_level: Mapped[Optional[str]] = mapped_column(String(16), nullable=True)
 
-    embedding = mapped_column(Vector(1536) if _VECTOR_AVAILABLE and Vector else JSONB, nullable=True)
+    embedding = mapped_column(
+        Vector(1536) if _VECTOR_AVAILABLE and Vector else JSONB, nullable=True,
+        deferred=True, deferred_raiseload=True,
+    )
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=_now)
 
     portrait = relationship("DigitalPortrait", back_populates="patterns")
@@ -185,7 +200,10 @@ class PortraitRecommendation(Base):
     category: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
     # practical | mindset | timing | partnership | spiritual
 
-    embedding = mapped_column(Vector(1536) if _VECTOR_AVAILABLE and Vector else JSONB, nullable=True)
+    embedding = mapped_column(
+        Vector(1536) if _VECTOR_AVAILABLE and Vector else JSONB, nullable=True,
+        deferred=True, deferred_raiseload=True,
+    )
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=_now)
 
     portrait = relationship("DigitalPortrait", back_populates="recommendations")
@@ -205,7 +223,10 @@ class PortraitShadowAudit(Base):
     convergence_score: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
     antidote: Mapped[str] = mapped_column(Text, nullable=False)
 
-    embedding = mapped_column(Vector(1536) if _VECTOR_AVAILABLE and Vector else JSONB, nullable=True)
+    embedding = mapped_column(
+        Vector(1536) if _VECTOR_AVAILABLE and Vector else JSONB, nullable=True,
+        deferred=True, deferred_raiseload=True,
+    )
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=_now)
 
     portrait = relationship("DigitalPortrait", back_populates="shadow_audits")
@@ -225,7 +246,10 @@ class PortraitMetaPattern(Base):
     convergence_score: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
     key_manifestations: Mapped[Optional[list]] = mapped_column(JSONB, nullable=True)
 
-    embedding = mapped_column(Vector(1536) if _VECTOR_AVAILABLE and Vector else JSONB, nullable=True)
+    embedding = mapped_column(
+        Vector(1536) if _VECTOR_AVAILABLE and Vector else JSONB, nullable=True,
+        deferred=True, deferred_raiseload=True,
+    )
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=_now)
 
     portrait = relationship("DigitalPortrait", back_populates="meta_patterns")
@@ -246,3 +270,62 @@ class PortraitSummary(Base):
     created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=_now)
 
     portrait = relationship("DigitalPortrait", back_populates="summaries")
+
+
+# ─── Кэш результатов калькуляторов (Слой 1) ──────────────────────────────────
+class CalculatorCacheEntry(Base):
+    __tablename__ = "dsb_calculator_cache"
+
+    cache_key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    # sha256(system_name, version, нормализованные BirthData)
+
+    system_name: Mapped[str] = mapped_column(String(64), nullable=False, index=True)
+    calculator_version: Mapped[str] = mapped_column(String(32), nullable=False)
+    result: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    # полный конверт calculate(): system, raw_data, calculated_at, input_birth_data
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=_now)
+
+
+# ─── Чекпоинты пайплайна (возобновление генерации) ───────────────────────────
+class PortraitCheckpoint(Base):
+    __tablename__ = "dsb_portrait_checkpoints"
+    __table_args__ = (UniqueConstraint("portrait_id", "layer", "unit", name="uq_dsb_checkpoint_unit"),)
+
+    id: Mapped[str] = mapped_column(UUID(as_uuid=False), primary_key=True, default=_uuid)
+    portrait_id: Mapped[str] = mapped_column(UUID(as_uuid=False), ForeignKey("dsb_digital_portraits.id", ondelete="CASCADE"), index=True)
+
+    layer: Mapped[str] = mapped_column(String(32), nullable=False)
+    # calculators | interpretation | spheres | meta | compressor
+    unit: Mapped[str] = mapped_column(String(64), nullable=False)
+    # system_name / номер сферы / "all"
+
+    status: Mapped[str] = mapped_column(String(16), nullable=False)
+    # done | error
+    input_hash: Mapped[str] = mapped_column(String(64), nullable=False)
+    # sha256 входов юнита: чекпоинт годен, только пока входы не изменились
+    payload: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
+    error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    updated_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=_now, onupdate=_now)
+
+    portrait = relationship("DigitalPortrait", back_populates="checkpoints")
+
+
+# ─── Материализованный документ портрета (read model) ────────────────────────
+class PortraitDocument(Base):
+    __tablename__ = "dsb_portrait_documents"
+
+    portrait_id: Mapped[str] = mapped_column(
+        UUID(as_uuid=False), ForeignKey("dsb_digital_portraits.id", ondelete="CASCADE"), primary_key=True,
+    )
+    etag: Mapped[str] = mapped_column(String(64), nullable=False)
+    # sha256 несжатого тела (32 hex)
+    body: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    # gzip("<секция>\t<json>" построчно), см. app.dsb.storage.documents
+    raw_size: Mapped[int] = mapped_column(Integer, nullable=False)
+    # суммарный размер JSON секций до сжатия
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), default=_now)
+
+    portrait = relationship("DigitalPortrait", back_populates="document")
@@ -0,0 +1,111 @@
+from __future__ import annotations
+"""
+Проекции для чтения DSB — лёгкие типизированные строки без embedding.
+
+Пути чтения, которым нужен только текст (документ портрета, сфера
+генерирующегося портрета, бриф), выбирают ровно поля DTO:
+select(<колонки DTO>) → NamedTuple, без ORM identity map и без векторов.
+ORM-объекты остаются для записи; векторы загружаются явно —
+options(undefer(Model.embedding)) там, где они нужны (поиск, признаки).
+"""
+
+from typing import NamedTuple, Optional, TypeVar
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.dsb.storage.models import (
+    PortraitAspectChain, PortraitFact, PortraitMetaPattern, PortraitPattern,
+    PortraitRecommendation, PortraitShadowAudit, PortraitSummary,
+)
+
+
+class FactRow(NamedTuple):
+    id: str
+    sphere_primary: int
+    spheres_affected: Optional[list]
+    position: str
+    source_system: str
+    influence_level: str
+    core_theme: Optional[str]
+    light_aspect: Optional[str]
+    shadow_aspect: Optional[str]
+    energy_description: Optional[str]
+    developmental_task: Optional[str]
+    integration_key: Optional[str]
+    triggers: Optional[list]
+    timing: Optional[str]
+    weight: Optional[float]
+
+
+class ChainRow(NamedTuple):
+    id: str
+    sphere: int
+    chain_name: str
+    convergence_score: Optional[float]
+    description: Optional[str]
+
+
+class PatternRow(NamedTuple):
+    id: str
+    sphere: int
+    pattern_name: str
+    formula: Optional[str]
+    influence_level: Optional[str]
+    convergence_score: Optional[float]
+    description: Optional[str]
+
+
+class RecommendationRow(NamedTuple):
+    id: str
+    sphere: int
+    recommendation: str
+    influence_level: Optional[str]
+    category: Optional[str]
+
+
+class ShadowRow(NamedTuple):
+    id: str
+    sphere: int
+    risk_name: str
+    description: Optional[str]
+    convergence_score: Optional[float]
+    antidote: Optional[str]
+
+
+class MetaPatternRow(NamedTuple):
+    id: str
+    pattern_name: str
+    spheres_involved: Optional[list]
+    description: Optional[str]
+    convergence_score: Optional[float]
+
+
+class SummaryRow(NamedTuple):
+    sphere: Optional[int]
+    brief_text: str
+    is_overall: bool
+
+
+ROW_MODELS = {
+    FactRow: PortraitFact,
+    ChainRow: PortraitAspectChain,
+    PatternRow: PortraitPattern,
+    RecommendationRow: PortraitRecommendation,
+    ShadowRow: PortraitShadowAudit,
+    MetaPatternRow: PortraitMetaPattern,
+    SummaryRow: PortraitSummary,
+}
+
+RowT = TypeVar("RowT", bound=tuple)
+
+
+def projection(row_type: type[RowT]):
+    """SELECT ровно тех колонок модели, что есть в DTO (в порядке полей)."""
+    model = ROW_MODELS[row_type]
+    return select(*(getattr(model, field) for field in row_type._fields))
+
+
+async def fetch_rows(session: AsyncSession, row_type: type[RowT], *criteria, order_by=()) -> list[RowT]:
+    result = await session.execute(projection(row_type).where(*criteria).order_by(*order_by))
+    return [row_type(*row) for row in result]
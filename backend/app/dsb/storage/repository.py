@@ -5,16 +5,209 @@ DSB Repository — CRUD операции для хранилища портре
 
 import logging
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, update
+from sqlalchemy import delete, func, insert, select, update
+from sqlalchemy.orm import defer
+from sqlalchemy.dialects.postgresql import insert as pg_insert
 from app.dsb.storage.models import (
     DigitalPortrait, PortraitFact, PortraitAspectChain,
     PortraitPattern, PortraitRecommendation, PortraitShadowAudit,
-    PortraitMetaPattern, PortraitSummary, PortraitRawData,
+    PortraitMetaPattern, PortraitSummary, PortraitRawData, PortraitCheckpoint, PortraitDocument,
+)
+from app.dsb.storage.documents import brief_dict, build_portrait_sections, encode_document
+from app.dsb.storage.projections import (
+    ROW_MODELS, ChainRow, FactRow, MetaPatternRow, PatternRow, RecommendationRow, ShadowRow, SummaryRow,
+    fetch_rows,
 )
 from app.dsb.interpreters.schemas import UniversalInsightSchema
 
 logger = logging.getLogger(__name__)
 
+# Слои с колонкой embedding и тип записи для generate_embedding_text
+_EMBEDDED_LAYERS = (
+    (PortraitFact, "fact"),
+    (PortraitAspectChain, "chain"),
+    (PortraitPattern, "pattern"),
+    (PortraitRecommendation, "recommendation"),
+    (PortraitShadowAudit, "shadow"),
+    (PortraitMetaPattern, "meta"),
+)
+
+
+# ─── Row builders (plain dicts for bulk INSERT) ──────────────────────────────
+
+def _raw_row(portrait_id: str, system_name: str, data_group: str, data_key: str, payload) -> dict:
+    return {
+        "portrait_id": portrait_id,
+        "system_name": system_name,
+        "data_group": data_group,
+        "data_key": data_key,
+        "payload": payload,
+    }
+
+
+def build_raw_data_rows(portrait_id: str, system_name: str, raw_data: dict) -> list[dict]:
+    """Строки dsb_raw_data одного учения: полный снимок + гранулярные группы."""
+    def row(data_group: str, data_key: str, payload) -> None:
+        rows.append(_raw_row(portrait_id, system_name, data_group, data_key, payload))
+
+    rows: list[dict] = []
+
+    # 0. Full Output Snapshot (For 100% Identicalness)
+    row("full_output", "engine_results", raw_data)
+
+    # 1. Planets
+    for p in raw_data.get("planets", []):
+        row("planets", p.get("name_en", "Unknown"), p)
+
+    # 2. Aspects
+    for a in raw_data.get("aspects", []):
+        row("aspects", f"{a.get('planet1')}-{a.get('planet2')}-{a.get('type')}", a)
+
+    # 3. Houses (Full object + Detailed per house)
+    houses = raw_data.get("houses", {})
+    if houses:
+        row("houses", "all_houses", houses)
+        rulers = houses.get("rulers", {})
+        for i, cusp_deg in enumerate(houses.get("cusps", [])):
+            h_num = i + 1
+            row("houses_detailed", f"House-{h_num}", {
+                "house_num": h_num,
+                "cusp_degree": cusp_deg,
+                "ruler": rulers.get(str(h_num)),
+            })
+
+    # 4. Technical Summary (Hemispheres, Elements, etc.)
+    tech = raw_data.get("technical_summary", {})
+    if tech:
+        row("technical", "summary", tech)
+
+    # 5. Core Points (Ascendant, MC, South Node)
+    if "ascendant" in raw_data:
+        row("points", "ascendant", raw_data["ascendant"])
+    if "mc_degree" in raw_data:
+        row("points", "mc_degree", {"degree": raw_data["mc_degree"]})
+    if "south_node" in raw_data:
+        row("points", "south_node", raw_data["south_node"])
+    if "geocoded" in raw_data:
+        row("metadata", "geocoding", raw_data["geocoded"])
+
+    # 6. Other groups (Stelliums, Arabic Parts, Patterns, Chains)
+    for key in ["aspect_patterns", "arabic_parts", "stelliums", "dispositor_chains"]:
+        group_data = raw_data.get(key)
+        if group_data:
+            row(key, "collection", group_data if isinstance(group_data, dict) else {"items": group_data})
+
+    return rows
+
+
+def build_fact_rows(portrait_id: str, insights: list[UniversalInsightSchema]) -> list[dict]:
+    return [
+        {
+            "portrait_id": portrait_id,
+            "source_system": uis.source_system,
+            "sphere_primary": uis.primary_sphere,
+            "spheres_affected": uis.spheres_affected,
+            "position": uis.position,
+            "influence_level": uis.influence_level,
+            "light_aspect": uis.light_aspect,
+            "shadow_aspect": uis.shadow_aspect,
+            "energy_description": uis.energy_description,
+            "core_theme": uis.core_theme,
+            "developmental_task": uis.developmental_task,
+            "integration_key": uis.integration_key,
+            "triggers": uis.triggers,
+            "timing": uis.timing,
+            "book_references": uis.book_references,
+            "weight": uis.weight,
+            "confidence": uis.confidence,
+            "raw_uis": uis.model_dump(),
+        }
+        for uis in insights
+    ]
+
+
+def build_sphere_rows(portrait_id: str, sphere_data: dict) -> dict[type, list[dict]]:
+    """Строки слоёв 2-5 одной сферы, сгруппированные по моделям."""
+    sphere_num = sphere_data.get("sphere_num")
+    return {
+        # Layer 2: chains
+        PortraitAspectChain: [
+            {
+                "portrait_id": portrait_id,
+                "sphere": sphere_num,
+                "chain_name": chain.get("chain_name", ""),
+                "systems_involved": chain.get("systems_involved", []),
+                "convergence_score": min(1.0, max(0.0, chain.get("convergence_score", 0))),
+                "description": chain.get("description", ""),
+            }
+            for chain in sphere_data.get("layer2_chains", [])
+        ],
+        # Layer 3: patterns
+        PortraitPattern: [
+            {
+                "portrait_id": portrait_id,
+                "sphere": sphere_num,
+                "pattern_name": pattern.get("pattern_name", ""),
+                "formula": pattern.get("formula"),
+                "description": pattern.get("description", ""),
+                "systems_supporting": pattern.get("systems_supporting", []),
+                "convergence_score": pattern.get("convergence_score"),
+            }
+            for pattern in sphere_data.get("layer3_patterns", [])
+        ],
+        # Layer 4: recommendations
+        PortraitRecommendation: [
+            {
+                "portrait_id": portrait_id,
+                "sphere": sphere_num,
+                "recommendation": rec.get("text", ""),
+                "source_systems": [rec["source_system"]] if "source_system" in rec else [],
+                "influence_level": rec.get("influence_level"),
+                "category": rec.get("category"),
+            }
+            for rec in sphere_data.get("layer4_recommendations", [])
+        ],
+        # Layer 5: shadow audit
+        PortraitShadowAudit: [
+            {
+                "portrait_id": portrait_id,
+                "sphere": sphere_num,
+                "risk_name": risk.get("risk_name", ""),
+                "description": risk.get("description", ""),
+                "source_systems": risk.get("source_systems", []),
+                "convergence_score": risk.get("convergence_score"),
+                "antidote": risk.get("antidote", ""),
+            }
+            for risk in sphere_data.get("layer5_shadow_audit", [])
+        ],
+    }
+
+
+def build_meta_pattern_rows(portrait_id: str, meta_data: dict) -> list[dict]:
+    return [
+        {
+            "portrait_id": portrait_id,
+            "pattern_name": pattern.get("name", ""),
+            "spheres_involved": pattern.get("spheres_involved", []),
+            "description": pattern.get("description", ""),
+            "systems_supporting": pattern.get("systems_supporting", []),
+            "convergence_score": pattern.get("convergence_score"),
+            "key_manifestations": pattern.get("key_manifestations"),
+        }
+        for pattern in meta_data.get("meta_patterns", [])
+    ]
+
+
+def build_summary_rows(portrait_id: str, brief_data: dict) -> list[dict]:
+    rows = [
+        {"portrait_id": portrait_id, "sphere": i, "brief_text": brief_data[f"sphere_{i}_brief"], "is_overall": False}
+        for i in range(1, 13)
+        if f"sphere_{i}_brief" in brief_data
+    ]
+    if "overall_brief" in brief_data:
+        rows.append({"portrait_id": portrait_id, "sphere": None, "brief_text": brief_data["overall_brief"], "is_overall": True})
+    return rows
+
 
 class PortraitRepository:
     def __init__(self, session: AsyncSession):
@@ -33,285 +226,107 @@ class PortraitRepository:
         await self.session.flush()
         return portrait.id
 
-    async def save_raw_results(self, portrait_id: str, system_name: str, raw_data: dict) -> None:
+    async def _bulk_insert(self, model, rows: list[dict]) -> int:
+        """
+        Один многострочный INSERT на таблицу (executemany → insertmanyvalues)
+        вместо ORM-объекта на строку. id/created_at заполняются дефолтами колонок.
+        """
+        if rows:
+            await self.session.execute(insert(model), rows)
+        return len(rows)
+
+    async def save_raw_results(self, portrait_id: str, system_name: str, raw_data: dict) -> int:
         """
         Flatten complex calculator output into granular dsb_raw_data rows.
         Splits data by groups (planets, aspects, houses, etc.) and saves a full snapshot.
         """
-        # 0. Full Output Snapshot (For 100% Identicalness)
-        self.session.add(PortraitRawData(
-            portrait_id=portrait_id,
-            system_name=system_name,
-            data_group="full_output",
-            data_key="engine_results",
-            payload=raw_data,
-        ))
-
-        # 1. Planets
-        for p in raw_data.get("planets", []):
-            self.session.add(PortraitRawData(
-                portrait_id=portrait_id,
-                system_name=system_name,
-                data_group="planets",
-                data_key=p.get("name_en", "Unknown"),
-                payload=p,
-            ))
-
-        # 2. Aspects
-        for a in raw_data.get("aspects", []):
-            p1, p2 = a.get("planet1"), a.get("planet2")
-            asp_type = a.get("type")
-            self.session.add(PortraitRawData(
-                portrait_id=portrait_id,
-                system_name=system_name,
-                data_group="aspects",
-                data_key=f"{p1}-{p2}-{asp_type}",
-                payload=a,
-            ))
-
-        # 3. Houses (Full object + Detailed per house)
-        houses = raw_data.get("houses", {})
-        if houses:
-            self.session.add(PortraitRawData(
-                portrait_id=portrait_id,
-                system_name=system_name,
-                data_group="houses",
-                data_key="all_houses",
-                payload=houses,
-            ))
-            
-            # Detailed house cusps/rulers
-            cusps = houses.get("cusps", [])
-            rulers = houses.get("rulers", {})
-            for i, cusp_deg in enumerate(cusps):
-                h_num = i + 1
-                self.session.add(PortraitRawData(
-                    portrait_id=portrait_id,
-                    system_name=system_name,
-                    data_group="houses_detailed",
-                    data_key=f"House-{h_num}",
-                    payload={
-                        "house_num": h_num,
-                        "cusp_degree": cusp_deg,
-                        "ruler": rulers.get(str(h_num)),
-                    },
-                ))
-
-        # 4. Technical Summary (Hemispheres, Elements, etc.)
-        tech = raw_data.get("technical_summary", {})
-        if tech:
-            self.session.add(PortraitRawData(
-                portrait_id=portrait_id,
-                system_name=system_name,
-                data_group="technical",
-                data_key="summary",
-                payload=tech,
-            ))
-
-        # 5. Core Points (Ascendant, MC, South Node)
-        if "ascendant" in raw_data:
-            self.session.add(PortraitRawData(
-                portrait_id=portrait_id,
-                system_name=system_name,
-                data_group="points",
-                data_key="ascendant",
-                payload=raw_data["ascendant"],
-            ))
-        if "mc_degree" in raw_data:
-            self.session.add(PortraitRawData(
-                portrait_id=portrait_id,
-                system_name=system_name,
-                data_group="points",
-                data_key="mc_degree",
-                payload={"degree": raw_data["mc_degree"]},
-            ))
-        if "south_node" in raw_data:
-            self.session.add(PortraitRawData(
-                portrait_id=portrait_id,
-                system_name=system_name,
-                data_group="points",
-                data_key="south_node",
-                payload=raw_data["south_node"],
-            ))
-        if "geocoded" in raw_data:
-            self.session.add(PortraitRawData(
-                portrait_id=portrait_id,
-                system_name=system_name,
-                data_group="metadata",
-                data_key="geocoding",
-                payload=raw_data["geocoded"],
-            ))
-
-        # 6. Other groups (Stelliums, Arabic Parts, Patterns, Chains)
-        for key in ["aspect_patterns", "arabic_parts", "stelliums", "dispositor_chains"]:
-            group_data = raw_data.get(key)
-            if group_data:
-                self.session.add(PortraitRawData(
-                    portrait_id=portrait_id,
-                    system_name=system_name,
-                    data_group=key,
-                    data_key="collection",
-                    payload=group_data if isinstance(group_data, dict) else {"items": group_data},
-                ))
-
-        await self.session.flush()
-        logger.info(f"[Repo] Saved granular and full results for {system_name} in portrait {portrait_id}")
-
-    async def save_facts(self, portrait_id: str, insights: list[UniversalInsightSchema]) -> None:
-        for uis in insights:
-            fact = PortraitFact(
-                portrait_id=portrait_id,
-                source_system=uis.source_system,
-                sphere_primary=uis.primary_sphere,
-                spheres_affected=uis.spheres_affected,
-                position=uis.position,
-                influence_level=uis.influence_level,
-                light_aspect=uis.light_aspect,
-                shadow_aspect=uis.shadow_aspect,
-                energy_description=uis.energy_description,
-                core_theme=uis.core_theme,
-                developmental_task=uis.developmental_task,
-                integration_key=uis.integration_key,
-                triggers=uis.triggers,
-                timing=uis.timing,
-                book_references=uis.book_references,
-                weight=uis.weight,
-                confidence=uis.confidence,
-                raw_uis=uis.model_dump(),
+        return await self.save_raw_results_many(portrait_id, {system_name: raw_data})
+
+    async def save_raw_results_many(self, portrait_id: str, results: dict[str, dict]) -> int:
+        """Сырые данные всех учений портрета одним INSERT. results: {system_name: raw_data}."""
+        rows = []
+        for system_name, raw_data in results.items():
+            rows.extend(build_raw_data_rows(portrait_id, system_name, raw_data))
+        count = await self._bulk_insert(PortraitRawData, rows)
+        logger.info(
+            f"[Repo] Saved {count} granular and full result rows for "
+            f"{', '.join(results)} in portrait {portrait_id}"
+        )
+        return count
+
+    async def save_facts(self, portrait_id: str, insights: list[UniversalInsightSchema]) -> int:
+        count = await self._bulk_insert(PortraitFact, build_fact_rows(portrait_id, insights))
+        logger.info(f"[Repo] Saved {count} facts for portrait {portrait_id}")
+        return count
+
+    async def save_sphere_synthesis(self, portrait_id: str, sphere_data: dict) -> int:
+        return await self.save_sphere_syntheses(portrait_id, [sphere_data])
+
+    async def save_sphere_syntheses(self, portrait_id: str, spheres: list[dict]) -> int:
+        """Слои 2-5 всех сфер: по одному INSERT на таблицу."""
+        tables: dict[type, list[dict]] = {
+            PortraitAspectChain: [],
+            PortraitPattern: [],
+            PortraitRecommendation: [],
+            PortraitShadowAudit: [],
+        }
+        for sphere_data in spheres:
+            for model, rows in build_sphere_rows(portrait_id, sphere_data).items():
+                tables[model].extend(rows)
+        count = 0
+        for model, rows in tables.items():
+            count += await self._bulk_insert(model, rows)
+        return count
+
+    async def save_meta_patterns(self, portrait_id: str, meta_data: dict) -> int:
+        return await self._bulk_insert(PortraitMetaPattern, build_meta_pattern_rows(portrait_id, meta_data))
+
+    async def save_summaries(self, portrait_id: str, brief_data: dict) -> int:
+        return await self._bulk_insert(PortraitSummary, build_summary_rows(portrait_id, brief_data))
+
+    async def pending_embedding_texts(self, portrait_id: str) -> list[tuple[type, str, str]]:
+        """(модель, id записи, текст для эмбеддинга) всех записей портрета без вектора."""
+        from app.dsb.storage.embeddings import generate_embedding_text
+
+        pending = []
+        for model_cls, record_type in _EMBEDDED_LAYERS:
+            result = await self.session.execute(
+                select(model_cls).where(
+                    model_cls.portrait_id == portrait_id,
+                    model_cls.embedding.is_(None)
+                )
             )
-            self.session.add(fact)
-        await self.session.flush()
-        logger.info(f"[Repo] Saved {len(insights)} facts for portrait {portrait_id}")
-
-    async def save_sphere_synthesis(self, portrait_id: str, sphere_data: dict) -> None:
-        sphere_num = sphere_data.get("sphere_num")
-
-        # Layer 2: chains
-        for chain in sphere_data.get("layer2_chains", []):
-            self.session.add(PortraitAspectChain(
-                portrait_id=portrait_id,
-                sphere=sphere_num,
-                chain_name=chain.get("chain_name", ""),
-                systems_involved=chain.get("systems_involved", []),
-                convergence_score=min(1.0, max(0.0, chain.get("convergence_score", 0))),
-                description=chain.get("description", ""),
-            ))
-
-        # Layer 3: patterns
-        for pattern in sphere_data.get("layer3_patterns", []):
-            self.session.add(PortraitPattern(
-                portrait_id=portrait_id,
-                sphere=sphere_num,
-                pattern_name=pattern.get("pattern_name", ""),
-                formula=pattern.get("formula"),
-                description=pattern.get("description", ""),
-                systems_supporting=pattern.get("systems_supporting", []),
-                convergence_score=pattern.get("convergence_score"),
-            ))
-
-        # Layer 4: recommendations
-        for rec in sphere_data.get("layer4_recommendations", []):
-            self.session.add(PortraitRecommendation(
-                portrait_id=portrait_id,
-                sphere=sphere_num,
-                recommendation=rec.get("text", ""),
-                source_systems=([rec["source_system"]] if "source_system" in rec else []),
-                influence_level=rec.get("influence_level"),
-                category=rec.get("category"),
-            ))
-
-        # Layer 5: shadow audit
-        for risk in sphere_data.get("layer5_shadow_audit", []):
-            self.session.add(PortraitShadowAudit(
-                portrait_id=portrait_id,
-                sphere=sphere_num,
-                risk_name=risk.get("risk_name", ""),
-                description=risk.get("description", ""),
-                source_systems=risk.get("source_systems", []),
-                convergence_score=risk.get("convergence_score"),
-                antidote=risk.get("antidote", ""),
-            ))
-
-        await self.session.flush()
-
-    async def save_meta_patterns(self, portrait_id: str, meta_data: dict) -> None:
-        for pattern in meta_data.get("meta_patterns", []):
-            self.session.add(PortraitMetaPattern(
-                portrait_id=portrait_id,
-                pattern_name=pattern.get("name", ""),
-                spheres_involved=pattern.get("spheres_involved", []),
-                description=pattern.get("description", ""),
-                systems_supporting=pattern.get("systems_supporting", []),
-                convergence_score=pattern.get("convergence_score"),
-                key_manifestations=pattern.get("key_manifestations"),
-            ))
-        await self.session.flush()
-
-    async def save_summaries(self, portrait_id: str, brief_data: dict) -> None:
-        for i in range(1, 13):
-            key = f"sphere_{i}_brief"
-            if key in brief_data:
-                self.session.add(PortraitSummary(
-                    portrait_id=portrait_id,
-                    sphere=i,
-                    brief_text=brief_data[key],
-                    is_overall=False,
-                ))
-        if "overall_brief" in brief_data:
-            self.session.add(PortraitSummary(
-                portrait_id=portrait_id,
-                sphere=None,
-                brief_text=brief_data["overall_brief"],
-                is_overall=True,
-            ))
+            for rec in result.scalars():
+                rec_dict = {k: v for k, v in rec.__dict__.items() if not k.startswith('_')}
+                pending.append((model_cls, rec.id, generate_embedding_text(rec_dict, record_type)))
+        return pending
+
+    async def save_embeddings(self, items: list[tuple[type, str, list[float]]]) -> int:
+        """Записывает векторы: один UPDATE по первичному ключу на тип записи."""
+        by_model: dict[type, list[dict]] = {}
+        for model_cls, record_id, embedding in items:
+            by_model.setdefault(model_cls, []).append({"id": record_id, "embedding": embedding})
+        for model_cls, rows in by_model.items():
+            await self.session.execute(update(model_cls), rows)
         await self.session.flush()
+        return len(items)
 
     async def generate_all_embeddings(self, portrait_id: str) -> None:
         """Генерирует и сохраняет эмбеддинги для всех записей портрета."""
-        from sqlalchemy import select
-        from app.dsb.storage.embeddings import generate_embedding_text, generate_embeddings_batch
-        from app.dsb.storage.models import (
-            PortraitFact, PortraitAspectChain, PortraitPattern,
-            PortraitRecommendation, PortraitShadowAudit, PortraitMetaPattern
-        )
-
-        models_config = [
-            (PortraitFact, "fact"),
-            (PortraitAspectChain, "chain"),
-            (PortraitPattern, "pattern"),
-            (PortraitRecommendation, "recommendation"),
-            (PortraitShadowAudit, "shadow"),
-            (PortraitMetaPattern, "meta"),
-        ]
+        from app.dsb.storage.embeddings import generate_embeddings_batch
 
         try:
-            for model_cls, record_type in models_config:
-                result = await self.session.execute(
-                    select(model_cls).where(
-                        model_cls.portrait_id == portrait_id,
-                        model_cls.embedding.is_(None)
-                    )
-                )
-                records = list(result.scalars().all())
-                if not records:
-                    continue
-
-                texts = []
-                for rec in records:
-                    rec_dict = {k: v for k, v in rec.__dict__.items() if not k.startswith('_')}
-                    texts.append(generate_embedding_text(rec_dict, record_type))
-
-                for i in range(0, len(texts), 100):
-                    batch_texts = texts[i:i+100]
-                    batch_records = records[i:i+100]
-                    embeddings = await generate_embeddings_batch(batch_texts)
-
-                    for j, emb in enumerate(embeddings):
-                        if emb is not None:
-                            batch_records[j].embedding = emb
-
-                await self.session.flush()
-                logger.info(f"[Repo] Generated {len(records)} embeddings for {record_type}")
+            pending = await self.pending_embedding_texts(portrait_id)
+            if not pending:
+                return
+            embeddings = await generate_embeddings_batch([text for _, _, text in pending])
+            saved = await self.save_embeddings([
+                (model_cls, record_id, emb)
+                for (model_cls, record_id, _), emb in zip(pending, embeddings)
+                if emb is not None
+            ])
+            await self.touch(portrait_id)
+            logger.info(f"[Repo] Generated {saved}/{len(pending)} embeddings for portrait {portrait_id}")
         except Exception as e:
             logger.error(f"[Repo] Failed to generate embeddings for portrait {portrait_id}: {e}")
 
@@ -323,6 +338,103 @@ class PortraitRepository:
         )
         await self.session.flush()
 
+    async def touch(self, portrait_id: str) -> None:
+        """Новая версия портрета (updated_at) без смены полей — например, после записи векторов."""
+        await self.session.execute(
+            update(DigitalPortrait)
+            .where(DigitalPortrait.id == portrait_id)
+            .values(updated_at=func.now())
+        )
+
+    async def clear_layers(self, portrait_id: str) -> None:
+        """Удаляет данные слоёв 0.5-7 портрета перед повторной записью (регенерация)."""
+        for model in (
+            PortraitRawData, PortraitFact, PortraitAspectChain, PortraitPattern,
+            PortraitRecommendation, PortraitShadowAudit, PortraitMetaPattern, PortraitSummary,
+        ):
+            await self.session.execute(delete(model).where(model.portrait_id == portrait_id))
+
+    # ─── Checkpoints ─────────────────────────────────────────────────────────
+
+    async def save_checkpoints(self, portrait_id: str, rows: list[dict]) -> None:
+        """
+        Upsert чекпоинтов одним INSERT ... ON CONFLICT.
+        rows: {layer, unit, status, input_hash, payload, error}.
+        """
+        if not rows:
+            return
+        stmt = pg_insert(PortraitCheckpoint).values([{"portrait_id": portrait_id, **row} for row in rows])
+        await self.session.execute(
+            stmt.on_conflict_do_update(
+                constraint="uq_dsb_checkpoint_unit",
+                set_={
+                    "status": stmt.excluded.status,
+                    "input_hash": stmt.excluded.input_hash,
+                    "payload": stmt.excluded.payload,
+                    "error": stmt.excluded.error,
+                    "updated_at": func.now(),
+                },
+            )
+        )
+
+    async def get_checkpoints(self, portrait_id: str, with_payload: bool = True) -> list[PortraitCheckpoint]:
+        stmt = select(PortraitCheckpoint).where(PortraitCheckpoint.portrait_id == portrait_id)
+        if not with_payload:
+            stmt = stmt.options(defer(PortraitCheckpoint.payload))
+        result = await self.session.execute(stmt)
+        return list(result.scalars().all())
+
+    async def clear_checkpoints(self, portrait_id: str) -> None:
+        await self.session.execute(
+            delete(PortraitCheckpoint).where(PortraitCheckpoint.portrait_id == portrait_id)
+        )
+
+    # ─── Материализованный документ ─────────────────────────────────────────
+
+    async def materialize_document(self, portrait_id: str) -> tuple[str, dict[str, bytes]]:
+        """
+        Собирает документ портрета из слоёв (без embedding) и сохраняет его.
+        Вызывается в транзакции, где портрет стал ready, — документ всегда
+        соответствует записанным слоям. → (etag, секции в JSON).
+        """
+        portrait = await self.get_portrait(portrait_id)
+
+        async def load(row_type):
+            return await fetch_rows(self.session, row_type, ROW_MODELS[row_type].portrait_id == portrait_id)
+
+        sections = build_portrait_sections(
+            portrait,
+            await load(FactRow),
+            await load(ChainRow),
+            await load(PatternRow),
+            await load(RecommendationRow),
+            await load(ShadowRow),
+            await load(MetaPatternRow),
+            await load(SummaryRow),
+        )
+        etag, body, encoded = encode_document(sections)
+        stmt = pg_insert(PortraitDocument).values(
+            portrait_id=portrait_id, etag=etag, body=body, raw_size=sum(map(len, encoded.values())),
+        )
+        await self.session.execute(stmt.on_conflict_do_update(
+            index_elements=[PortraitDocument.portrait_id],
+            set_={"etag": stmt.excluded.etag, "body": stmt.excluded.body,
+                  "raw_size": stmt.excluded.raw_size, "created_at": func.now()},
+        ))
+        return etag, encoded
+
+    async def get_document_state(self, portrait_id: str) -> tuple[str, str | None] | None:
+        """(status портрета, etag документа или None) одним запросом; None — портрета нет."""
+        row = (await self.session.execute(
+            select(DigitalPortrait.status, PortraitDocument.etag)
+            .outerjoin(PortraitDocument, PortraitDocument.portrait_id == DigitalPortrait.id)
+            .where(DigitalPortrait.id == portrait_id)
+        )).first()
+        return tuple(row) if row is not None else None
+
+    async def get_document(self, portrait_id: str) -> PortraitDocument | None:
+        return await self.session.get(PortraitDocument, portrait_id)
+
     # ─── Read ────────────────────────────────────────────────────────────────
 
     async def get_portrait(self, portrait_id: str) -> DigitalPortrait | None:
@@ -339,27 +451,33 @@ class PortraitRepository:
         )
         return result.scalars().first()
 
-    async def get_facts_for_sphere(self, portrait_id: str, sphere: int) -> list[PortraitFact]:
-        result = await self.session.execute(
-            select(PortraitFact)
-            .where(
-                PortraitFact.portrait_id == portrait_id,
-                PortraitFact.sphere_primary == sphere,
-            )
-            .order_by(PortraitFact.weight.desc())
+    async def get_facts_for_sphere(self, portrait_id: str, sphere: int) -> list[FactRow]:
+        return await fetch_rows(
+            self.session, FactRow,
+            PortraitFact.portrait_id == portrait_id, PortraitFact.sphere_primary == sphere,
+            order_by=[PortraitFact.weight.desc()],
         )
-        return list(result.scalars().all())
 
-    async def get_brief_portrait(self, portrait_id: str) -> dict:
-        result = await self.session.execute(
-            select(PortraitSummary)
-            .where(PortraitSummary.portrait_id == portrait_id)
+    async def _sphere_rows(self, row_type, portrait_id: str, sphere: int) -> list:
+        model = ROW_MODELS[row_type]
+        return await fetch_rows(self.session, row_type, model.portrait_id == portrait_id, model.sphere == sphere)
+
+    async def get_patterns_for_sphere(self, portrait_id: str, sphere: int) -> list[PatternRow]:
+        return await self._sphere_rows(PatternRow, portrait_id, sphere)
+
+    async def get_recommendations_for_sphere(self, portrait_id: str, sphere: int) -> list[RecommendationRow]:
+        return await self._sphere_rows(RecommendationRow, portrait_id, sphere)
+
+    async def get_shadows_for_sphere(self, portrait_id: str, sphere: int) -> list[ShadowRow]:
+        return await self._sphere_rows(ShadowRow, portrait_id, sphere)
+
+    async def get_latest_ready_portrait_id(self, user_id: int) -> str | None:
+        return await self.session.scalar(
+            select(DigitalPortrait.id)
+            .where(DigitalPortrait.user_id == user_id, DigitalPortrait.status == "ready")
+            .order_by(DigitalPortrait.created_at.desc())
+            .limit(1)
         )
-        summaries = result.scalars().all()
-        output = {}
-        for s in summaries:
-            if s.is_overall:
-                output["overall_brief"] = s.brief_text
-            else:
-                output[f"sphere_{s.sphere}_brief"] = s.brief_text
-        return output
+
+    async def get_brief_portrait(self, portrait_id: str) -> dict:
+        return brief_dict(await fetch_rows(self.session, SummaryRow, PortraitSummary.portrait_id == portrait_id))
@@ -1,16 +1,132 @@
 from __future__ import annotations
 """
 DSB Semantic Search — semantic search по портрету через pgvector.
+
+Один запрос на поиск: пять типов записей (facts, chains, patterns,
+recommendations, shadow) — ветки UNION ALL, у каждой свой top-k.
+Вектор запроса передаётся один раз bound-параметром, текст SQL не зависит
+от запроса — asyncpg переиспользует подготовленный statement. Фильтры по
+сферам и уровню влияния применяются на сервере.
+
+Нормализация: косинусная близость у разных типов записей живёт в разных
+диапазонах (тексты разной длины и формы), поэтому ранжирование идёт по
+relevance — z-оценке близости внутри своего типа портрета (сколько
+стандартных отклонений запись ближе к запросу, чем средняя запись этого
+типа). В ответе остаются оба значения: score (косинус) и relevance.
+
+Горячие портреты: портрет, который ищут DSB_SEARCH_HOT_AFTER раз, целиком
+(векторы и поля ответа) загружается в LRU процесса, и следующие поиски
+считаются в памяти. Индекс сверяется с версией портрета (updated_at),
+которую передаёт вызывающий: перегенерация и проход эмбеддингов её меняют.
 """
 
 import logging
+from collections import OrderedDict
+from functools import lru_cache
+from typing import NamedTuple
+
+import numpy as np
+from sqlalchemy import Integer, String, Text, any_, bindparam, cast, func, literal, null, select, union_all
+from sqlalchemy.dialects.postgresql import ARRAY
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import text
 
-from app.dsb.storage.embeddings import generate_embedding
+from app.dsb.config import DSB_SEARCH_HOT_AFTER, DSB_SEARCH_INDEX_SIZE
+from app.dsb.storage.embeddings import EMBEDDING_DIMS, generate_embedding
+from app.dsb.storage.models import (
+    PortraitAspectChain, PortraitFact, PortraitPattern, PortraitRecommendation, PortraitShadowAudit,
+)
 
 logger = logging.getLogger(__name__)
 
+RESULT_FIELDS = (
+    "id", "source_table", "sphere", "source_system", "position", "core_theme", "content", "influence_level",
+)
+
+
+def _source_columns(source: str) -> tuple[type, dict]:
+    """Модель типа записи и её колонки под общими именами ответа (None — у типа такого поля нет)."""
+    if source == "fact":
+        m = PortraitFact
+        return m, {"sphere": m.sphere_primary, "source_system": m.source_system, "position": m.position,
+                   "core_theme": m.core_theme, "content": m.light_aspect, "influence_level": m.influence_level}
+    if source == "chain":
+        m = PortraitAspectChain
+        return m, {"sphere": m.sphere, "source_system": None, "position": m.chain_name,
+                   "core_theme": None, "content": m.description, "influence_level": None}
+    if source == "pattern":
+        m = PortraitPattern
+        return m, {"sphere": m.sphere, "source_system": None, "position": m.pattern_name,
+                   "core_theme": m.formula, "content": m.description, "influence_level": m.influence_level}
+    if source == "recommendation":
+        m = PortraitRecommendation
+        return m, {"sphere": m.sphere, "source_system": None, "position": m.category,
+                   "core_theme": None, "content": m.recommendation, "influence_level": m.influence_level}
+    if source == "shadow":
+        m = PortraitShadowAudit
+        return m, {"sphere": m.sphere, "source_system": None, "position": m.risk_name,
+                   "core_theme": m.antidote, "content": m.description, "influence_level": None}
+    raise ValueError(f"Unknown record type: {source}")
+
+
+SOURCES = ("fact", "chain", "pattern", "recommendation", "shadow")
+_FIELD_TYPES = {"sphere": Integer, "source_system": String, "position": Text, "core_theme": Text,
+                "content": Text, "influence_level": String}
+
+
+def _branch_columns(source: str) -> tuple[type, list]:
+    model, columns = _source_columns(source)
+    return model, [
+        model.id.label("id"),
+        literal(source, String).label("source_table"),
+        *[(column if column is not None else cast(null(), _FIELD_TYPES[name])).label(name)
+          for name, column in columns.items()],
+    ]
+
+
+@lru_cache(maxsize=None)
+def _search_statement(with_spheres: bool, with_influence: bool):
+    """
+    Запрос поиска; параметры :portrait_id, :query_vector, :per_type_k, :top_k
+    (+ :spheres, :influence). По варианту на набор фильтров — текст SQL
+    постоянный, кэш подготовленных statement'ов asyncpg срабатывает.
+    """
+    from pgvector.sqlalchemy import Vector
+
+    query_vector = bindparam("query_vector", type_=Vector(EMBEDDING_DIMS))
+    branches = []
+    for source in SOURCES:
+        model, columns = _branch_columns(source)
+        score = (1 - model.embedding.cosine_distance(query_vector)).label("score")
+        # Статистика близости — по всем записям типа в портрете, до фильтров.
+        # MATERIALIZED: иначе планировщик подставит выражение score во все
+        # места использования и посчитает расстояние до 1536-мерного вектора
+        # по нескольку раз на строку
+        scored = (
+            select(*columns, score)
+            .where(model.portrait_id == bindparam("portrait_id"), model.embedding.is_not(None))
+            .cte(source)
+            .prefix_with("MATERIALIZED")
+        )
+        relevance = func.coalesce(
+            (scored.c.score - func.avg(scored.c.score).over())
+            / func.nullif(func.stddev_pop(scored.c.score).over(), 0),
+            0.0,
+        ).label("relevance")
+        ranked = select(*scored.c, relevance).subquery(f"{source}_ranked")
+        branch = select(*ranked.c)
+        if with_spheres:
+            branch = branch.where(ranked.c.sphere == any_(bindparam("spheres", type_=ARRAY(Integer))))
+        if with_influence and _source_columns(source)[1]["influence_level"] is not None:
+            branch = branch.where(ranked.c.influence_level == any_(bindparam("influence", type_=ARRAY(String))))
+        branches.append(branch.order_by(ranked.c.score.desc()).limit(bindparam("per_type_k")))
+
+    found = union_all(*branches).subquery("found")
+    return (
+        select(*found.c)
+        .order_by(found.c.relevance.desc(), found.c.score.desc())
+        .limit(bindparam("top_k"))
+    )
+
 
 async def semantic_search(
     session: AsyncSession,
@@ -19,6 +135,8 @@ async def semantic_search(
     top_k: int = 10,
     spheres_filter: list[int] | None = None,
     influence_filter: list[str] | None = None,
+    per_type_k: int | None = None,
+    version: str | None = None,
 ) -> list[dict]:
     """
     Семантический поиск по портрету пользователя.
@@ -29,78 +147,161 @@ async def semantic_search(
         query: вопрос пользователя на естественном языке
         top_k: количество результатов
         spheres_filter: ограничить поиск сферами [1, 7, 10]
-        influence_filter: ограничить по уровню ['high', 'medium']
+        influence_filter: ограничить по уровню ['high', 'medium'] — для типов,
+            у которых есть уровень влияния (facts, patterns, recommendations)
+        per_type_k: не больше стольких записей каждого типа (по умолчанию top_k)
+        version: версия портрета (updated_at); с ней горячий портрет ищется в памяти
 
     Returns:
-        Список найденных чанков с score и source_table
+        Список найденных чанков с score, relevance и source_table, по убыванию relevance
     """
     embedding = await generate_embedding(query)
     if embedding is None:
         logger.warning("[Search] Failed to generate query embedding")
         return []
+    per_type_k = per_type_k or top_k
+
+    if version is not None and search_indexes.size > 0:
+        index = search_indexes.get(portrait_id, version)
+        if index is None and search_indexes.is_hot(portrait_id):
+            try:
+                index = await PortraitSearchIndex.load(session, portrait_id)
+                search_indexes.put(portrait_id, version, index)
+            except Exception as e:
+                logger.warning(f"[Search] Cannot load search index of portrait {portrait_id}: {e}")
+        if index is not None:
+            return index.search(embedding, top_k, per_type_k, spheres_filter, influence_filter)
 
-    embedding_str = "[" + ",".join(str(x) for x in embedding) + "]"
-    sphere_clause = ""
+    params = {"portrait_id": portrait_id, "query_vector": embedding, "per_type_k": per_type_k, "top_k": top_k}
     if spheres_filter:
-        sphere_clause = f"AND sphere_primary IN ({','.join(str(s) for s in spheres_filter)})"
-    influence_clause = ""
+        params["spheres"] = list(spheres_filter)
     if influence_filter:
-        quoted = ",".join(f"'{i}'" for i in influence_filter)
-        influence_clause = f"AND influence_level IN ({quoted})"
-
-    results = []
-
-    # Search in portrait_facts
-    facts_sql = text(f"""
-        SELECT
-            id, 'fact' as source_table,
-            sphere_primary as sphere,
-            source_system,
-            position,
-            core_theme,
-            light_aspect as content,
-            influence_level,
-            1 - (embedding <=> '{embedding_str}'::vector) as score
-        FROM dsb_portrait_facts
-        WHERE portrait_id = :portrait_id
-            AND embedding IS NOT NULL
-            {sphere_clause}
-            {influence_clause}
-        ORDER BY embedding <=> '{embedding_str}'::vector
-        LIMIT :top_k
-    """)
-
+        params["influence"] = list(influence_filter)
     try:
-        rows = await session.execute(facts_sql, {"portrait_id": portrait_id, "top_k": top_k})
-        for row in rows.mappings():
-            results.append(dict(row))
+        rows = await session.execute(_search_statement(bool(spheres_filter), bool(influence_filter)), params)
     except Exception as e:
-        logger.warning(f"[Search] Facts search failed (pgvector may not be set up): {e}")
-
-    # Search in portrait_patterns
-    patterns_sql = text(f"""
-        SELECT
-            id, 'pattern' as source_table,
-            sphere,
-            pattern_name as position,
-            formula as core_theme,
-            description as content,
-            NULL as influence_level,
-            1 - (embedding <=> '{embedding_str}'::vector) as score
-        FROM dsb_portrait_patterns
-        WHERE portrait_id = :portrait_id
-            AND embedding IS NOT NULL
-        ORDER BY embedding <=> '{embedding_str}'::vector
-        LIMIT :top_k
-    """)
+        logger.warning(f"[Search] Search failed (pgvector may not be set up): {e}")
+        return []
+    return [dict(row) for row in rows.mappings()]
+
+
+# ─── Горячие портреты: поиск в памяти процесса ──────────────────────────────
+
+class _SourceBlock(NamedTuple):
+    rows: list[dict]           # поля ответа без score/relevance
+    vectors: np.ndarray        # (записи, dims) float32, строки единичной длины
+    spheres: np.ndarray
+    influence: list[str | None]
+
+
+class PortraitSearchIndex:
+    """Записи одного портрета с векторами; search() повторяет семантику SQL-запроса."""
+
+    def __init__(self, blocks: dict[str, _SourceBlock]):
+        self.blocks = blocks
+
+    @classmethod
+    async def load(cls, session: AsyncSession, portrait_id: str) -> "PortraitSearchIndex":
+        branches = []
+        for source in SOURCES:
+            model, columns = _branch_columns(source)
+            branches.append(
+                select(*columns, model.embedding.label("embedding"))
+                .where(model.portrait_id == portrait_id, model.embedding.is_not(None))
+            )
+        grouped: dict[str, list] = {source: [] for source in SOURCES}
+        for row in (await session.execute(union_all(*branches))).mappings():
+            grouped[row["source_table"]].append(row)
+        return cls.build(grouped)
+
+    @classmethod
+    def build(cls, grouped: dict[str, list]) -> "PortraitSearchIndex":
+        """grouped: тип записи → строки с полями RESULT_FIELDS и embedding."""
+        blocks = {}
+        for source, rows in grouped.items():
+            if not rows:
+                continue
+            vectors = np.array([row["embedding"] for row in rows], dtype=np.float32)
+            norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            blocks[source] = _SourceBlock(
+                rows=[{field: row[field] for field in RESULT_FIELDS} for row in rows],
+                vectors=vectors / norms,
+                spheres=np.array([row["sphere"] if row["sphere"] is not None else -1 for row in rows]),
+                influence=[row["influence_level"] for row in rows],
+            )
+        return cls(blocks)
+
+    def search(
+        self,
+        embedding,
+        top_k: int,
+        per_type_k: int,
+        spheres_filter: list[int] | None = None,
+        influence_filter: list[str] | None = None,
+    ) -> list[dict]:
+        query = np.asarray(embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+        found = []
+        for source, block in self.blocks.items():
+            scores = block.vectors @ query
+            std = float(scores.std())
+            relevance = (scores - scores.mean()) / std if std > 0 else np.zeros_like(scores)
+            allowed = np.ones(len(scores), dtype=bool)
+            if spheres_filter:
+                allowed &= np.isin(block.spheres, list(spheres_filter))
+            if influence_filter and _source_columns(source)[1]["influence_level"] is not None:
+                allowed &= np.array([level in influence_filter for level in block.influence])
+            candidates = np.flatnonzero(allowed)
+            candidates = candidates[np.argsort(-scores[candidates], kind="stable")][:per_type_k]
+            found += [
+                {**block.rows[i], "score": float(scores[i]), "relevance": float(relevance[i])}
+                for i in candidates
+            ]
+        found.sort(key=lambda r: (r["relevance"], r["score"]), reverse=True)
+        return found[:top_k]
+
+
+class PortraitSearchIndexes:
+    """
+    LRU индексов горячих портретов: portrait_id → (версия, индекс). Портрет
+    становится горячим на hot_after-м поиске; устаревшая версия — промах.
+    """
+
+    def __init__(self, size: int = 32, hot_after: int = 3):
+        self.size = size
+        self.hot_after = hot_after
+        self._items: OrderedDict[str, tuple[str, PortraitSearchIndex]] = OrderedDict()
+        self._searches: OrderedDict[str, int] = OrderedDict()
+        self.hits = 0
+        self.loads = 0
+
+    def get(self, portrait_id: str, version: str) -> PortraitSearchIndex | None:
+        item = self._items.get(portrait_id)
+        if item is None or item[0] != version:
+            return None
+        self._items.move_to_end(portrait_id)
+        self.hits += 1
+        return item[1]
+
+    def is_hot(self, portrait_id: str) -> bool:
+        """Учитывает поиск по портрету; True — пора держать его в памяти."""
+        count = self._searches.pop(portrait_id, 0) + 1
+        self._searches[portrait_id] = count
+        while len(self._searches) > self.size * 8:
+            self._searches.popitem(last=False)
+        return count >= self.hot_after
+
+    def put(self, portrait_id: str, version: str, index: PortraitSearchIndex) -> None:
+        self._items[portrait_id] = (version, index)
+        self._items.move_to_end(portrait_id)
+        self.loads += 1
+        while len(self._items) > self.size:
+            self._items.popitem(last=False)
+
+    def stats(self) -> dict:
+        return {"size": len(self._items), "capacity": self.size, "hits": self.hits, "loads": self.loads}
 
-    try:
-        rows = await session.execute(patterns_sql, {"portrait_id": portrait_id, "top_k": top_k // 2})
-        for row in rows.mappings():
-            results.append(dict(row))
-    except Exception as e:
-        logger.warning(f"[Search] Patterns search failed: {e}")
 
-    # Sort by score and return top_k
-    results.sort(key=lambda x: x.get("score", 0), reverse=True)
-    return results[:top_k]
+# Один LRU на процесс
+search_indexes = PortraitSearchIndexes(DSB_SEARCH_INDEX_SIZE, DSB_SEARCH_HOT_AFTER)
@@ -10,9 +10,9 @@ Compressor — Слой 3d DSB.
 import os
 import json
 import logging
-from openai import AsyncOpenAI
 
 from app.dsb.config import DSB_MODEL_FAST, DSB_TEMPERATURE_INTERPRETATION, DSB_MAX_TOKENS_COMPRESSOR
+from app.dsb.llm.client import llm_client
 
 logger = logging.getLogger(__name__)
 
@@ -28,7 +28,7 @@ class Compressor:
     """
 
     def __init__(self):
-        self._client = AsyncOpenAI()
+        self._llm = llm_client
 
     async def compress(
         self,
@@ -76,7 +76,7 @@ class Compressor:
         )
 
         try:
-            response = await self._client.chat.completions.create(
+            content = await self._llm.complete(
                 model=DSB_MODEL_FAST,
                 temperature=DSB_TEMPERATURE_INTERPRETATION,
                 max_tokens=DSB_MAX_TOKENS_COMPRESSOR,
@@ -85,13 +85,13 @@ class Compressor:
                     {"role": "user", "content": user_prompt},
                 ],
                 response_format={"type": "json_object"},
+                tag="compressor",
             )
 
-            content = response.choices[0].message.content
             result = json.loads(content)
             logger.info(f"[Compressor] Brief portrait generated ({len(result)} keys)")
             return result
 
         except Exception as e:
             logger.error(f"[Compressor] Failed: {e}")
-            return {"overall_brief": "Ошибка генерации краткого формата."}
+            return {"overall_brief": "Ошибка генерации краткого формата.", "error": str(e)}
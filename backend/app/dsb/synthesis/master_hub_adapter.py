@@ -8,6 +8,13 @@ UserPrint-объект, чтобы UI отображался корректно,
 детальные карточки прямо из DSB-таблиц.
 """
 
+import logging
+
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.user_print import UserPrint
+
 logger = logging.getLogger(__name__)
 
 SPHERES_META = [
@@ -11,9 +11,9 @@ MetaAgent — Слой 3c DSB.
 import os
 import json
 import logging
-from openai import AsyncOpenAI
 
 from app.dsb.config import DSB_MODEL_DEEP, DSB_TEMPERATURE_SYNTHESIS, DSB_MAX_TOKENS_META
+from app.dsb.llm.client import llm_client
 
 logger = logging.getLogger(__name__)
 
@@ -29,7 +29,7 @@ class MetaAgent:
     """
 
     def __init__(self):
-        self._client = AsyncOpenAI()
+        self._llm = llm_client
 
     async def find_patterns(self, sphere_portraits: list[dict]) -> dict:
         """
@@ -66,7 +66,7 @@ class MetaAgent:
         )
 
         try:
-            response = await self._client.chat.completions.create(
+            content = await self._llm.complete(
                 model=DSB_MODEL_DEEP,
                 temperature=DSB_TEMPERATURE_SYNTHESIS,
                 max_tokens=DSB_MAX_TOKENS_META,
@@ -75,9 +75,9 @@ class MetaAgent:
                     {"role": "user", "content": user_prompt},
                 ],
                 response_format={"type": "json_object"},
+                tag="meta",
             )
 
-            content = response.choices[0].message.content
             result = json.loads(content)
             meta_patterns = result.get("meta_patterns", [])
             logger.info(f"[MetaAgent] Found {len(meta_patterns)} meta-patterns")
@@ -85,4 +85,4 @@ class MetaAgent:
 
         except Exception as e:
             logger.error(f"[MetaAgent] Failed: {e}")
-            return {"meta_patterns": []}
+            return {"meta_patterns": [], "error": str(e)}
@@ -10,7 +10,6 @@ SphereAgent — Слой 3b DSB.
 import os
 import json
 import logging
-from openai import AsyncOpenAI
 
 from app.dsb.interpreters.schemas import UniversalInsightSchema
 from app.dsb.config import (
@@ -20,6 +19,7 @@ from app.dsb.config import (
     SPHERE_NAMES,
     ACTIVE_SYSTEMS,
 )
+from app.dsb.llm.client import llm_client
 
 logger = logging.getLogger(__name__)
 
@@ -35,7 +35,7 @@ class SphereAgent:
     """
 
     def __init__(self):
-        self._client = AsyncOpenAI()
+        self._llm = llm_client
 
     async def synthesize(
         self,
@@ -99,7 +99,7 @@ class SphereAgent:
         )
 
         try:
-            response = await self._client.chat.completions.create(
+            content = await self._llm.complete(
                 model=DSB_MODEL_DEEP,
                 temperature=DSB_TEMPERATURE_SYNTHESIS,
                 max_tokens=DSB_MAX_TOKENS_SPHERE,
@@ -108,9 +108,9 @@ class SphereAgent:
                     {"role": "user", "content": user_prompt},
                 ],
                 response_format={"type": "json_object"},
+                tag="sphere",
             )
 
-            content = response.choices[0].message.content
             result = json.loads(content)
             result["sphere_num"] = sphere_num
             result["sphere_name"] = sphere_name
@@ -1,10 +1,11 @@
+import asyncio
 import uvicorn
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import settings
-from app.database import init_db
+from app.database import engine, init_db
 from app.routers import (
     auth, profile, sync, session, 
     diary, cards, calc, game, match, portrait, retro, 
@@ -14,7 +15,17 @@ from app.dsb.api.routes import portraits as dsb_portraits
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     await init_db()
+    if not settings.JOB_INLINE_WORKER:
+        yield
+        return
+    # Development: background jobs run in this process instead of `python -m app.worker`
+    from app.worker import Worker, load_handlers
+    load_handlers()
+    worker = Worker(engine)
+    task = asyncio.create_task(worker.run())
     yield
+    worker.stop()
+    await task
 
 app = FastAPI(
     title="AVATAR Платформа",
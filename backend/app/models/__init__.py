@@ -3,6 +3,7 @@ from app.models.user import User
 from app.models.natal_chart import NatalChart
 from app.models.card_progress import CardProgress, CardStatus
 from app.models.sync_session import SyncSession
+from app.models.sync_event import SyncEvent
 from app.models.align_session import AlignSession
 from app.models.diary import DiaryEntry
 from app.models.portrait import UserPortrait, Pattern, Connection, UserSymbol
@@ -18,12 +19,15 @@ from app.models.text_diagnostics import (
     Sphere, Archetype, TextScene, SceneInteraction, SceneStats, SceneSet, SceneSetItem
 )
 from app.models.user_print import UserPrint
+from app.models.background_job import BackgroundJob
+from app.models.embedding_cache import EmbeddingCacheEntry
 
 __all__ = [
     "User",
     "CardProgress",
     "CardStatus",
     "SyncSession",
+    "SyncEvent",
     "AlignSession",
     "NatalChart",
     "Pattern",
@@ -50,5 +54,7 @@ __all__ = [
     "AssistantSession",
     "UserMemory",
     "UserPrint",
-    "UserSymbol"
+    "UserSymbol",
+    "BackgroundJob",
+    "EmbeddingCacheEntry",
 ]
@@ -43,3 +43,6 @@ class AlignSession(Base, TimestampMixin):
     # Pattern analysis from this session
     patterns_identified: Mapped[Optional[list]] = mapped_column(JSONB, nullable=True)
     new_belief: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    # Short summary used as history context by later sessions of the card (written once)
+    context_summary: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
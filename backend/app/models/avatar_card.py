@@ -12,5 +12,6 @@ class AvatarCard(Base):
     sphere: Mapped[str] = mapped_column(String, index=True)
     shadow: Mapped[str] = mapped_column(Text)
     light: Mapped[str] = mapped_column(Text)
-    embedding: Mapped[Vector] = mapped_column(Vector(1536))
+    # Deferred: loaded only via undefer() (see app.dsb.storage.models)
+    embedding: Mapped[Vector] = mapped_column(Vector(1536), deferred=True, deferred_raiseload=True)
     metadata_json: Mapped[dict] = mapped_column(JSON, nullable=True)
@@ -0,0 +1,50 @@
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import BigInteger, DateTime, Index, SmallInteger, String, Text, func, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class BackgroundJob(Base):
+    """
+    Durable background job, see app/services/jobs.py.
+
+    queued -> running -> done, or back to queued with a delay after a failure,
+    and dead once max_attempts are used up. While a job is running,
+    available_at is its lease deadline: a worker that stops heartbeating
+    loses the job to the next claim.
+    """
+    __tablename__ = "background_jobs"
+
+    id: Mapped[int] = mapped_column(BigInteger, primary_key=True, autoincrement=True)
+    job_type: Mapped[str] = mapped_column(String(64), nullable=False)
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False, default=dict)
+
+    # queued, running, done, dead
+    status: Mapped[str] = mapped_column(String(16), nullable=False, default="queued", server_default="queued")
+    # Lower runs first (same scale as llm_scheduler.Priority)
+    priority: Mapped[int] = mapped_column(SmallInteger, nullable=False, default=0, server_default="0")
+    attempts: Mapped[int] = mapped_column(SmallInteger, nullable=False, default=0, server_default="0")
+    max_attempts: Mapped[int] = mapped_column(SmallInteger, nullable=False)
+
+    available_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), nullable=False, server_default=func.now())
+    locked_by: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
+
+    __table_args__ = (
+        # Claim scan: only unfinished jobs, in claim order
+        Index(
+            "ix_background_jobs_claim", "job_type", "priority", "available_at",
+            postgresql_where=text("status IN ('queued', 'running')"),
+        ),
+        Index("ix_background_jobs_finished", "finished_at", postgresql_where=text("status = 'done'")),
+    )
+
+    def __repr__(self):
+        return f"<BackgroundJob id={self.id} type={self.job_type} status={self.status} attempts={self.attempts}>"
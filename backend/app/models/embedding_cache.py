@@ -0,0 +1,25 @@
+from datetime import datetime
+from sqlalchemy import DateTime, LargeBinary, String, func
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class EmbeddingCacheEntry(Base):
+    """
+    Persistent text -> vector cache of app/services/embeddings.py.
+
+    key is sha256 of (model, dimensions, normalized text), so a change of
+    model or dimensions never returns a stale vector. The vector is stored as
+    raw float32 bytes: the cache is only read by key, never searched, and
+    bytes cost nothing to encode compared with pgvector's text format.
+    """
+    __tablename__ = "embedding_cache"
+
+    key: Mapped[str] = mapped_column(String(64), primary_key=True)
+    model: Mapped[str] = mapped_column(String(64), nullable=False)
+    embedding: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<EmbeddingCacheEntry key={self.key[:12]} model={self.model}>"
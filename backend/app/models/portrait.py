@@ -1,5 +1,5 @@
 from typing import Optional
-from sqlalchemy import Integer, ForeignKey, String, Text, Float
+from sqlalchemy import Integer, ForeignKey, Index, String, Text, Float
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -36,6 +36,14 @@ class UserPortrait(Base, TimestampMixin):
     # Hawkins history: [{date, score, archetype_id}]
     hawkins_timeline: Mapped[Optional[list]] = mapped_column(JSONB, default=[])
 
+    # Running aggregates of the completed sessions, folded in one at a time
+    # (app/core/sync_analytics.py): avg_hawkins = hawkins_sum / hawkins_count
+    # over non-zero scores, patterns_json from tag_counts {tag: count}
+    sessions_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    hawkins_sum: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    hawkins_count: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
+    tag_counts: Mapped[Optional[dict]] = mapped_column(JSONB, default={})
+
 
 class Pattern(Base, TimestampMixin):
     """Cross-sphere patterns detected from all sync sessions."""
@@ -53,6 +61,11 @@ class Pattern(Base, TimestampMixin):
     strength: Mapped[int] = mapped_column(Integer, default=1)
     occurrences: Mapped[int] = mapped_column(Integer, default=1)
 
+    __table_args__ = (
+        # One row per tag: post-sync analytics upsert the tags of a batch at once
+        Index("uq_patterns_user_tag", "user_id", "tag", unique=True),
+    )
+
 
 class Connection(Base, TimestampMixin):
     """Connections between cards based on aspects, patterns, or body map."""
@@ -0,0 +1,29 @@
+from datetime import datetime
+from sqlalchemy import DateTime, ForeignKey, Integer, String, func
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.orm import Mapped, mapped_column
+
+from app.database import Base
+
+
+class SyncEvent(Base):
+    """
+    One append-only event of a sync session, see app/core/sync_log.py.
+
+    seq numbers the events of a session from 1 and sync_sessions.event_seq is
+    the last one written; (session_id, seq) being the key makes two phases
+    computed from the same state unable to both append.
+    """
+    __tablename__ = "sync_events"
+
+    session_id: Mapped[int] = mapped_column(
+        Integer, ForeignKey("sync_sessions.id", ondelete="CASCADE"), primary_key=True
+    )
+    seq: Mapped[int] = mapped_column(Integer, primary_key=True)
+    # user, assistant (transcript turns), state (keys merged into phase_data)
+    kind: Mapped[str] = mapped_column(String(16), nullable=False)
+    payload: Mapped[dict] = mapped_column(JSONB, nullable=False)
+    created_at: Mapped[datetime] = mapped_column(DateTime(timezone=True), server_default=func.now())
+
+    def __repr__(self):
+        return f"<SyncEvent session={self.session_id} seq={self.seq} kind={self.kind}>"
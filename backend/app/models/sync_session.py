@@ -2,8 +2,9 @@
 SyncSession: stores data for all 10 phases of the synchronization process.
 Each card has one sync session per activation attempt.
 """
+from datetime import datetime
 from typing import Optional
-from sqlalchemy import Integer, ForeignKey, String, Boolean, Text
+from sqlalchemy import Integer, ForeignKey, Index, String, Boolean, DateTime, Text, text
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import Mapped, mapped_column
 
@@ -24,6 +25,9 @@ class SyncSession(Base, TimestampMixin):
     # Current phase (1-10), 0 = not started
     current_phase: Mapped[int] = mapped_column(Integer, default=0)
     is_complete: Mapped[bool] = mapped_column(Boolean, default=False)
+    # Set when post-sync analytics folded the completed session into the
+    # user's aggregates (app/core/sync_analytics.py)
+    analyzed_at: Mapped[Optional[datetime]] = mapped_column(DateTime(timezone=True), nullable=True)
 
     # Layer data stored as JSON: { "1": { "ai": "...", "user": "..." }, "2": { "ai": "...", "user": "...", "is_narrowing": true }, ... }
     phase_data: Mapped[Optional[dict]] = mapped_column(JSONB, default={})
@@ -47,8 +51,12 @@ class SyncSession(Base, TimestampMixin):
     reaction_pattern: Mapped[Optional[str]] = mapped_column(String(64), nullable=True)
     response_delay_info: Mapped[Optional[dict]] = mapped_column(JSONB, nullable=True)
 
-    # Full transcript as a list of {role, content}
+    # Full transcript as a list of {role, content}. While the session runs its
+    # turns are appended to sync_events (app/core/sync_log.py); the transcript
+    # and phase_data are written here once the session completes.
     session_transcript: Mapped[Optional[list]] = mapped_column(JSONB, nullable=True)
+    # seq of the last sync_events row: optimistic concurrency of phase transitions
+    event_seq: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
 
     # Legacy/Extended insights (kept for compatibility or extra detail)
     extracted_core_belief: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
@@ -62,3 +70,11 @@ class SyncSession(Base, TimestampMixin):
     # Hawkins tracking
     hawkins_score: Mapped[int] = mapped_column(Integer, default=0)
     hawkins_level: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    __table_args__ = (
+        # Completed sessions still waiting for post-sync analytics, per user
+        Index(
+            "ix_sync_sessions_pending_analytics", "user_id",
+            postgresql_where=text("is_complete AND analyzed_at IS NULL"),
+        ),
+    )
@@ -1,5 +1,5 @@
 from sqlalchemy import Column, Integer, String, DateTime, JSON, Float, Boolean, ForeignKey, Text
-from sqlalchemy.orm import relationship
+from sqlalchemy.orm import deferred, relationship
 from sqlalchemy.sql import func
 from app.database import Base
 from pgvector.sqlalchemy import Vector
@@ -28,7 +28,7 @@ class TextScene(Base):
     sphere_id = Column(Integer, ForeignKey("spheres.id"), index=True)
     archetype_id = Column(Integer, ForeignKey("archetypes.id"), index=True)
     scene_text = Column(Text)
-    scene_embedding = Column(Vector(1536)) # OpenAI embeddings size
+    scene_embedding = deferred(Column(Vector(1536)), raiseload=True) # OpenAI embeddings size; load via undefer()
 
     complexity_score = Column(Float, default=0.5)
     ambiguity_score = Column(Float, default=0.5)
@@ -55,7 +55,7 @@ class SceneInteraction(Base):
     pause_before_response = Column(Float)
 
     response_text = Column(Text)
-    response_embedding = Column(Vector(1536))
+    response_embedding = deferred(Column(Vector(1536)), raiseload=True)
     response_length = Column(Integer)
     extracted_features = Column(JSON) # Structured features (actions, emotions, patterns)
     
@@ -74,6 +74,7 @@ class SceneStats(Base):
     
     response_entropy = Column(Float, default=0.0)
     diagnostic_power_score = Column(Float, default=1.0)
+    reward_sum = Column(Float, default=0.0) # Sum of scene_reward() over times_shown (bandit posterior)
 
 # Scene Sets for a session
 class SceneSet(Base):
@@ -18,7 +18,7 @@ class UserMemory(Base, TimestampMixin):
     user_id: Mapped[int] = mapped_column(Integer, ForeignKey("users.id", ondelete="CASCADE"), index=True)
     
     content: Mapped[str] = mapped_column(Text, nullable=False)
-    embedding: Mapped[Vector] = mapped_column(Vector(1536), nullable=False)
+    embedding: Mapped[Vector] = mapped_column(Vector(1536), nullable=False, deferred=True, deferred_raiseload=True)
     
     # source: assistant, sync, manual, etc.
     source: Mapped[str] = mapped_column(String(32), default="assistant")
@@ -1,15 +1,17 @@
 from datetime import datetime
 from typing import Optional
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
-from app.database import get_db, AsyncSessionLocal
+from app.database import get_db
 from app.models import User, NatalChart
 from app.core.astrology.natal_chart import geocode_place
 from app.dsb.pipeline.orchestrator import PortraitOrchestrator
 from app.dsb.calculators.base import BirthData
+from app.services.jobs import enqueue
+from app.services.llm_scheduler import Priority
 import logging
 
 logger = logging.getLogger(__name__)
@@ -48,7 +50,6 @@ async def get_geocode(request: GeocodeRequest):
 @router.post("", response_model=CalcResponse)
 async def calculate(
     request: BirthDataRequest,
-    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
 ):
     """
@@ -56,7 +57,7 @@ async def calculate(
     1. Geocode
     2. DSB L1 (Synchronous) -> NatalChart & CardProgress Sync
     3. Return L1 results
-    4. Trigger DSB L2/L3 (Background)
+    4. Enqueue DSB L2/L3 (background job)
     """
     logger.info(f"--- [DSB] Onboarding Started for user {request.user_id} ---")
     
@@ -106,19 +107,18 @@ async def calculate(
         user.birth_tz = tz_name
         user.onboarding_done = True
         db.add(user)
-        
+
+        # 6. L2/L3 pipeline as a durable job, committed together with L1
+        await enqueue(db, "dsb.generate_portrait", {
+            "portrait_id": dsb_res["portrait_id"],
+            "user_id": user.id,
+            "birth_data": birth_data.model_dump(mode="json"),
+            "priority": Priority.ONBOARDING,
+        }, priority=Priority.ONBOARDING)
+
         await db.commit()
         logger.info(f"DSB L1 Commit successful for user {user.id}")
 
-        # 6. Trigger L2/L3 Background Pipeline
-        background_tasks.add_task(
-            run_dsb_pipeline, 
-            user.id, 
-            birth_data,
-            AsyncSessionLocal,
-            dsb_res.get("portrait_id")
-        )
-
         return CalcResponse(
             success=True,
             natal_chart=dsb_res["natal_chart"],
@@ -131,15 +131,3 @@ async def calculate(
         logger.error(f"DSB Onboarding failed: {e}", exc_info=True)
         await db.rollback()
         raise HTTPException(status_code=500, detail=f"Onboarding error: {e}")
-
-async def run_dsb_pipeline(u_id: int, birth_data: BirthData, session_maker, portrait_id: str = None):
-    """
-    Background DSB Pipeline executor.
-    """
-    logger.info(f"--- [BACKGROUND] DSB Pipeline STARTED for user {u_id} (Portrait: {portrait_id}) ---")
-    try:
-        async with session_maker() as session:
-            orchestrator = PortraitOrchestrator()
-            await orchestrator.generate(birth_data, u_id, session, portrait_id=portrait_id)
-    except Exception as e:
-        logger.error(f"[BACKGROUND] DSB Pipeline failed for user {u_id}: {e}", exc_info=True)
@@ -186,12 +186,12 @@ async def get_card_history(
 
     # 2. Get Sync Session (Initial Activation)
     sync_result = await db.execute(
-        select(SyncSession).where(
+        select(SyncSession.created_at, SyncSession.hawkins_score).where(
             SyncSession.card_progress_id == card_id,
             SyncSession.is_complete == True
         ).order_by(SyncSession.created_at.asc())
     )
-    syncs = sync_result.scalars().all()
+    syncs = sync_result.all()
     for s in syncs:
         if s.hawkins_score > 0:
             history.append({
@@ -202,12 +202,15 @@ async def get_card_history(
 
     # 3. Get Align Sessions
     align_result = await db.execute(
-        select(AlignSession).where(
+        select(
+            AlignSession.created_at, AlignSession.updated_at,
+            AlignSession.hawkins_entry, AlignSession.hawkins_exit,
+        ).where(
             AlignSession.card_progress_id == card_id,
             AlignSession.is_complete == True
         ).order_by(AlignSession.created_at.asc())
     )
-    aligns = align_result.scalars().all()
+    aligns = align_result.all()
     for a in aligns:
         # We can add entry and peak/exit to make the graph more detailed
         if a.hawkins_entry > 0:
@@ -222,7 +225,7 @@ async def get_card_history(
             # The exit time is simulated as later
             # (In a real app, AlignSession could store updated_at)
             history.append({
-                "date": a.updated_at.isoformat() if hasattr(a, 'updated_at') and a.updated_at else a.created_at.isoformat(),
+                "date": a.updated_at.isoformat() if a.updated_at else a.created_at.isoformat(),
                 "score": a.hawkins_exit,
                 "type": "align_end"
             })
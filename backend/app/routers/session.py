@@ -2,27 +2,79 @@
 Session router: WebSocket-based alignment sessions (6 stages).
 """
 from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from sqlalchemy import select
+from sqlalchemy import select, update
+from sqlalchemy.orm import defer
 
 from app.database import AsyncSessionLocal
 from app.models import CardProgress, AlignSession, SyncSession, User, DiaryEntry
 from app.agents.align_agent import alignment_session_message
+from app.agents.align_context import AlignmentDialogue, build_history_context, summarize_alignment
 from app.core.economy import spend_energy, hawkins_to_rank, process_card_rank_up
 from app.config import settings
+from app.services.jobs import enqueue, job_handler
+from app.services.llm_scheduler import Priority, priority_scope
+from app.services.streaming import DeltaSender
 
 router = APIRouter()
 
 
+@job_handler("align.summarize", concurrency=4, visibility_timeout=120, max_attempts=3)
+async def _summarize_align_session(align_session_id: int) -> None:
+    """
+    Job (app/services/jobs.py): context_summary of a completed alignment for
+    the next sessions of its card, written after the session itself was saved.
+    """
+    async with AsyncSessionLocal() as db:
+        align_session = await db.get(AlignSession, align_session_id)
+        if not align_session or align_session.context_summary:
+            return
+        messages = align_session.messages_json or []
+        hawkins_entry, hawkins_peak = align_session.hawkins_entry, align_session.hawkins_peak
+        final_insight, integration_plan = align_session.new_belief, align_session.integration_plan
+
+    with priority_scope(Priority.BACKGROUND):
+        summary = await summarize_alignment(messages, hawkins_entry, hawkins_peak, final_insight, integration_plan)
+    if not summary:
+        return  # the next session of the card queues it again (_enqueue_missing_summaries)
+    async with AsyncSessionLocal() as db:
+        await db.execute(
+            update(AlignSession)
+            .where(AlignSession.id == align_session_id, AlignSession.context_summary.is_(None))
+            .values(context_summary=summary)
+        )
+        await db.commit()
+
+
+async def _enqueue_missing_summaries(db, prev_aligns: list) -> list[int]:
+    """
+    Queues align.summarize for earlier alignments without a context_summary
+    (legacy rows, failed jobs). The opening message does not wait for them:
+    until a summary is written, build_history_context uses fallback_summary.
+    """
+    missing = [prev.id for prev in prev_aligns if not prev.context_summary]
+    for prev_id in missing:
+        await enqueue(db, "align.summarize", {"align_session_id": prev_id},
+                      priority=Priority.BACKGROUND, coalesce=True)
+    return missing
+
+
 @router.websocket("/{user_id}/{card_progress_id}")
 async def alignment_session(
     websocket: WebSocket,
     user_id: int,
     card_progress_id: int,
+    stream: bool = False,
 ):
     """
     WebSocket alignment session with optimized DB connection management.
+
+    With ?stream=true the reply text is sent as {"type": "delta"} messages
+    while it is generated; the "opening" / "response" message that ends the
+    turn carries the full text and the scores, as without streaming.
     """
     await websocket.accept()
+    deltas = DeltaSender(websocket) if stream else None
+    on_delta = deltas.push if deltas else None
 
     # 1. INITIAL LOAD (Read context and create session record)
     async with AsyncSessionLocal() as db:
@@ -57,9 +109,11 @@ async def alignment_session(
         )
         last_sync = sync_result.scalar_one_or_none()
 
-        # Get all previous alignment sessions for this card
+        # Get all previous alignment sessions for this card (summaries only)
         align_history_result = await db.execute(
-            select(AlignSession).where(
+            select(AlignSession)
+            .options(defer(AlignSession.messages_json, raiseload=True))
+            .where(
                 AlignSession.card_progress_id == card_progress_id,
                 AlignSession.is_complete == True
             ).order_by(AlignSession.created_at.asc())
@@ -77,28 +131,6 @@ async def alignment_session(
         from app.agents.assistant_agent import search_user_memory
         memory_context = await search_user_memory(db, user_id, f"Сфера {sphere}")
 
-        # Build History Context
-        history_lines = []
-        if last_sync:
-            history_lines.append(f"--- СИНХРОНИЗАЦИЯ ({last_sync.created_at.strftime('%Y-%m-%d %H:%M')}) ---")
-            history_lines.append(f"Итог: Хокинс {last_sync.hawkins_score} ({last_sync.hawkins_level})")
-            history_lines.append(f"Ядро: {last_sync.extracted_core_belief}")
-            history_lines.append(f"Тень: {last_sync.extracted_shadow_pattern}")
-            if last_sync.session_transcript:
-                history_lines.append("Диалог:")
-                for m in last_sync.session_transcript[-6:]: 
-                    history_lines.append(f"{m['role']}: {m['content']}")
-        
-        for idx, prev in enumerate(prev_aligns):
-            history_lines.append(f"\n--- СЕССИЯ ВЫРАВНИВАНИЯ #{idx+1} ({prev.created_at.strftime('%Y-%m-%d %H:%M')}) ---")
-            history_lines.append(f"Хокинс: вход {prev.hawkins_entry} -> пик {prev.hawkins_peak}")
-            if prev.messages_json:
-                history_lines.append("Диалог:")
-                for m in prev.messages_json[-4:]: 
-                    history_lines.append(f"{m.get('role')}: {m.get('content')}")
-        
-        history_context = "\n".join(history_lines)
-
         # Create session record
         align_session = AlignSession(
             user_id=user_id,
@@ -111,12 +143,15 @@ async def alignment_session(
             messages_json=[],
         )
         db.add(align_session)
+        await _enqueue_missing_summaries(db, prev_aligns)
         await db.commit()
         await db.refresh(align_session)
         align_session_id = align_session.id
 
+    history_context = build_history_context(last_sync, prev_aligns)
+
     # 2. SESSION LOOP (Variables in memory)
-    chat_history = []
+    dialogue = AlignmentDialogue()
     current_stage = 1
     hawkins_min = hawkins_entry
     hawkins_peak = hawkins_entry
@@ -135,11 +170,14 @@ async def alignment_session(
         shadow_pattern=shadow_pattern,
         history_context=history_context,
         recurring_symbol=recurring_symbol,
-        memory_context=memory_context
+        memory_context=memory_context,
+        on_delta=on_delta,
     )
     opening = opening_dict.get("ai_response", "Дыши. Что ты чувствуешь?")
-    chat_history.append({"role": "assistant", "content": opening})
+    dialogue.append("assistant", opening)
 
+    if deltas:
+        await deltas.flush()
     await websocket.send_json({
         "type": "opening",
         "content": opening,
@@ -161,8 +199,10 @@ async def alignment_session(
                 is_manual_transition = (msg_type == "complete_stage")
                 is_deepening = False
                 
+                # The prompt carries the window up to this turn; the user message goes in as user_message
+                window = dialogue.window()
                 if user_content.strip():
-                    chat_history.append({"role": "user", "content": user_content})
+                    dialogue.append("user", user_content)
 
                 effective_user_content = user_content if user_content.strip() else "[Переход к следующему протоколу]"
 
@@ -172,14 +212,15 @@ async def alignment_session(
                     archetype_id=archetype_id,
                     sphere=sphere,
                     hawkins_score=int(current_hawkins),
-                    chat_history=chat_history,
+                    chat_history=window,
                     user_message=effective_user_content,
                     core_belief=core_belief,
                     shadow_pattern=shadow_pattern,
                     history_context=history_context,
                     is_deepening=is_deepening,
                     recurring_symbol=recurring_symbol,
-                    memory_context=memory_context
+                    memory_context=memory_context,
+                    on_delta=on_delta,
                 )
                 
                 ai_response = ai_response_dict.get("ai_response", "...")
@@ -204,7 +245,7 @@ async def alignment_session(
                         
                 is_complete = current_stage >= 3 and (user_content.strip() or is_manual_transition) and not is_deepening
 
-                chat_history.append({"role": "assistant", "content": ai_response})
+                dialogue.append("assistant", ai_response)
 
                 if is_complete:
                     session_expert_results = {
@@ -213,6 +254,8 @@ async def alignment_session(
                         "integration_plan": ai_response_dict.get("integration_plan")
                     }
 
+                if deltas:
+                    await deltas.flush()
                 await websocket.send_json({
                     "type": "response",
                     "content": ai_response,
@@ -242,7 +285,7 @@ async def alignment_session(
         align_session = await db.get(AlignSession, align_session_id)
         if not align_session: return
 
-        align_session.messages_json = chat_history
+        align_session.messages_json = dialogue.messages
         align_session.stages_completed = current_stage
         align_session.is_complete = current_stage >= 3
         
@@ -303,4 +346,10 @@ async def alignment_session(
             except Exception as e:
                 print(f"[Session Auto-Save Error] {e}")
 
+        # Summary for the next sessions of this card: a job committed with the results,
+        # so the save never waits behind the interactive LLM traffic
+        if align_session.is_complete:
+            await enqueue(db, "align.summarize", {"align_session_id": align_session.id},
+                          priority=Priority.BACKGROUND)
+
         await db.commit()
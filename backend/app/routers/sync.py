@@ -1,135 +1,52 @@
 """
 Sync router: manage 5-phase synchronization sessions.
 """
-from fastapi import APIRouter, Depends, HTTPException, BackgroundTasks
+import datetime
+
+from fastapi import APIRouter, Depends, HTTPException
 from pydantic import BaseModel
 from typing import Optional
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
 from app.database import get_db
-from app.models import CardProgress, SyncSession, User, SphereKnowledge, UserWorldKnowledge, UserPortrait, SceneSet, SceneSetItem, SceneInteraction
+from app.models import CardProgress, SyncSession, User, UserPortrait, SceneSet, SceneSetItem, SceneInteraction
 from app.models.card_progress import CardStatus
-from app.agents.sync_agent import run_avatar_layer, get_response_metrics, autonomous_somatic_check
-from app.agents.analytic_agent import run_mirror_analysis, extract_response_features, update_user_portrait
-from app.core.feature_extractor import FeatureExtractor
+from app.agents.sync_agent import run_avatar_layer, get_response_metrics, autonomous_somatic_check, SpeculativeLayer
+from app.agents.analytic_agent import run_mirror_analysis, extract_response_features
 from app.core.economy import spend_energy, hawkins_to_rank, award_xp, process_card_rank_up, XP_VALUES
-from app.core.portrait_service import build_portrait_for_sphere
+from app.core.scene_index import get_scene_index, record_scene_reward, seen_scene_ids
+from app.core.sync_analytics import fold_completed_sessions, pending_sessions
+from app.core.sync_log import SessionConflict, SessionLog, append_events, load_session_log, remember_session_log
 # from app.rro.ocean.hub import OceanService
+from app.config import settings
 from app.database import AsyncSessionLocal
+from app.services.jobs import count_pending, enqueue, job_handler
 
 router = APIRouter()
 
 
-async def _background_sync_processing(user_id: int, session_id: int, sphere: str) -> None:
-    """Wrapper for background tasks to use a fresh session."""
+@job_handler("sync.analytics", concurrency=16, visibility_timeout=120, max_attempts=5)
+async def _run_sync_analytics(user_id: int) -> None:
+    """Post-sync job (app/services/jobs.py): the user's completed sessions folded into the aggregates."""
     async with AsyncSessionLocal() as session:
-        try:
-            # 1. Aggregate knowledge
-            await _aggregate_knowledge(user_id, sphere) # This function already manages its own session
-            
-            # 2. Extract features
-            await FeatureExtractor.process_sync_session(session, session_id, user_id)
-            
-            # 3. Update technical portrait (River)
-            portrait_res = await update_user_portrait(session, user_id, session_id)
-            
-            # 4. Level 2 & 3 Pipeline: Update the Hub (Now handled by DSB)
-            # from app.rro.sync.river import SyncRiver
-            # from app.rro.ocean.hub import OceanService
-            
-            sync_session_res = await session.execute(select(SyncSession).where(SyncSession.id == session_id))
-            sync_session = sync_session_res.scalar_one_or_none()
-            
-            if sync_session:
-                # Prepare Level 1 (Rain) data for the River
-                rain_data = {
-                    "session_id": session_id,
-                    "transcript": sync_session.session_transcript,
-                    "phase_data": sync_session.phase_data,
-                    "archetype_id": sync_session.archetype_id,
-                    "sphere": sync_session.sphere
-                }
-                
-                # Legacy River/Ocean flow removed in favor of DSB pipeline
-                pass
-            
+        while True:
+            folded = await fold_completed_sessions(session, user_id)
+            await session.commit()
+            if folded < settings.SYNC_ANALYTICS_BATCH:
+                break
+        # Sessions whose answers are still being logged: once more after the window
+        if await pending_sessions(session, user_id):
+            await enqueue(session, "sync.analytics", {"user_id": user_id},
+                          delay=settings.SYNC_ANALYTICS_WINDOW, coalesce=True)
             await session.commit()
-        except Exception as e:
-            import logging
-            logging.getLogger(__name__).error(f"Background Sync Processing Failed: {e}")
-            await session.rollback()
 
-async def _aggregate_knowledge(user_id: int, sphere: str) -> None:
-    """Background task: Aggregate Level 3 -> Level 2 -> Level 1."""
-    async with AsyncSessionLocal() as session:
-        try:
-            # 1. Aggregate to Level 2 (Sphere)
-            # Find all completed synced cards in this sphere
-            results = await session.execute(
-                select(SyncSession).where(
-                    SyncSession.user_id == user_id,
-                    SyncSession.sphere == sphere,
-                    SyncSession.is_complete == True
-                )
-            )
-            sessions = results.scalars().all()
-            if not sessions:
-                return
-
-            # Simple aggregation logic: average Hawkins, collect patterns
-            avg_hawkins = int(sum(s.hawkins_score for s in sessions) / len(sessions))
-            patterns = [s.core_pattern for s in sessions if s.core_pattern]
-            completed_archetypes = list(set(s.archetype_id for s in sessions))
-            
-            # Find or create SphereKnowledge
-            sk_result = await session.execute(
-                select(SphereKnowledge).where(
-                    SphereKnowledge.user_id == user_id,
-                    SphereKnowledge.sphere == sphere
-                )
-            )
-            sk = sk_result.scalar_one_or_none()
-            if not sk:
-                sk = SphereKnowledge(user_id=user_id, sphere=sphere)
-                session.add(sk)
-            
-            sk.sphere_picture = f"Сводная картина по {len(sessions)} архетипам."
-            sk.sphere_pattern = " / ".join(patterns[:3])
-            sk.sphere_hawkins = avg_hawkins
-            sk.cards_completed = completed_archetypes
-            
-            # 2. Aggregate to Level 1 (World)
-            # Find all sphere knowledges for this user
-            sk_all_result = await session.execute(
-                select(SphereKnowledge).where(SphereKnowledge.user_id == user_id)
-            )
-            sks = sk_all_result.scalars().all()
-            
-            if sks:
-                world_avg_hawkins = int(sum(s.sphere_hawkins for s in sks) / len(sks))
-                completed_spheres = [s.sphere for s in sks]
-                
-                wk_result = await session.execute(
-                    select(UserWorldKnowledge).where(UserWorldKnowledge.user_id == user_id)
-                )
-                wk = wk_result.scalar_one_or_none()
-                if not wk:
-                    wk = UserWorldKnowledge(user_id=user_id)
-                    session.add(wk)
-                
-                wk.hawkins_baseline = world_avg_hawkins
-                wk.spheres_completed = completed_spheres
-                wk.overall_pattern = "Комплексный паттерн развития."
 
-            await session.commit()
-            
-            # Also rebuild portrait
-            await build_portrait_for_sphere(session, user_id, sphere)
-            
-        except Exception as e:
-            import logging
-            logging.getLogger(__name__).error(f"Knowledge aggregation error: {e}")
+@job_handler("sync.post_process", concurrency=16, visibility_timeout=120, max_attempts=5)
+async def _background_sync_processing(user_id: int, session_id: int, sphere: str) -> None:
+    """Jobs enqueued per session before sync.analytics: the session is folded with its user's."""
+    await _run_sync_analytics(user_id)
+
 
 async def _get_portrait_context(db: AsyncSession, user_id: int, sphere: str) -> dict:
     """Retrieves previous patterns and symbols for the AI prompt."""
@@ -157,6 +74,87 @@ async def _get_portrait_context(db: AsyncSession, user_id: int, sphere: str) ->
     }
 
 
+async def _session_portrait_context(db: AsyncSession, session: SyncSession, log: SessionLog) -> dict:
+    """
+    Portrait context of the session: taken once at start and kept in phase_data,
+    so phases skip the lookup and every prompt of the session starts the same.
+    """
+    if "portrait_context" not in log.state:
+        # Sessions started before the context was kept in phase_data
+        log.add("state", {"portrait_context": await _get_portrait_context(db, session.user_id, session.sphere)})
+    return log.state["portrait_context"]
+
+
+@job_handler("sync.log_interaction", concurrency=8, visibility_timeout=300, max_attempts=3)
+async def _log_scene_interaction(
+    user_id: int,
+    session_id: int,
+    scene_id: int,
+    layer_index: int,
+    reading_time: float,
+    response_text: str,
+    scene_text: str,
+    archetype_id: int,
+    sphere: str,
+    somatic: dict,
+    created_at: str,
+) -> None:
+    """
+    Self-Learning Layer 1: SceneInteraction of one answer. The embedding and the
+    LLM feature extraction run here, off the critical path of the phase.
+    """
+    from app.agents.sync_agent import get_embedding
+
+    created = datetime.datetime.fromisoformat(created_at).replace(tzinfo=datetime.timezone.utc)
+    async with AsyncSessionLocal() as db:
+        # A job can run twice (expired lease): one row per answer
+        logged = await db.execute(
+            select(SceneInteraction.id).where(
+                SceneInteraction.session_id == session_id,
+                SceneInteraction.layer_index == layer_index,
+                SceneInteraction.created_at == created,
+            )
+        )
+        if logged.first():
+            return
+
+        resp_emb = await get_embedding(response_text)
+
+        # Structured features for research and future training
+        extracted_feats = await extract_response_features(
+            scene_text=scene_text or "",
+            user_response=response_text,
+            archetype_id=archetype_id,
+            sphere=sphere
+        )
+        # Verdict of the somatic check; LLM ones are labels for
+        # scripts/eval_somatic_classifier.py
+        extracted_feats = {**(extracted_feats or {}), "somatic": somatic}
+
+        db.add(SceneInteraction(
+            user_id=user_id,
+            session_id=session_id,
+            scene_id=scene_id,
+            layer_index=layer_index,
+            reading_time=reading_time,
+            response_text=response_text,
+            response_embedding=resp_emb,
+            response_length=len(response_text),
+            extracted_features=extracted_feats,
+            created_at=created,
+        ))
+        # Reward of the scene for scene selection
+        if scene_id is not None:
+            await record_scene_reward(db, scene_id, reading_time, len(response_text))
+        # Analytics skip a session until its answers are logged: the last
+        # answer of a completed session brings them back, after this job is done
+        complete = await db.scalar(select(SyncSession.is_complete).where(SyncSession.id == session_id))
+        if complete and await count_pending(db, "sync.log_interaction", session_id=session_id) <= 1:
+            await enqueue(db, "sync.analytics", {"user_id": user_id},
+                          delay=settings.JOB_POLL_INTERVAL, coalesce=True)
+        await db.commit()
+
+
 class StartSyncRequest(BaseModel):
     user_id: int
     card_progress_id: int
@@ -205,14 +203,13 @@ async def start_sync(
     existing_session = existing_result.scalars().first()
 
     if existing_session:
-        # Resume: return current phase content without charging energy
         # Resume: return current phase content without charging energy
         current_phase = existing_session.current_phase
-        transcript = list(existing_session.session_transcript or [])
+        log = await load_session_log(db, existing_session)
         
         # Get last assistant message if possible
         phase_content = "Продолжаем с места, где остановились..."
-        for msg in reversed(transcript):
+        for msg in reversed(log.transcript):
             if msg.get("role") == "assistant":
                 phase_content = msg.get("content")
                 break
@@ -235,8 +232,6 @@ async def start_sync(
         raise HTTPException(status_code=402, detail="Недостаточно ✦ Энергии")
 
     # Pre-fetch 5 scenes to eliminate DB lookups during the session
-    from app.models.text_diagnostics import TextScene
-    import random
     from app.agents.common import SPHERES
     
     sphere_id = 1
@@ -244,26 +239,23 @@ async def start_sync(
         if s.get('key') == card.sphere:
             sphere_id = s.get('id', 1)
             break
-            
-    scene_res = await db.execute(
-        select(TextScene).where(TextScene.sphere_id == sphere_id, TextScene.is_active == True)
-    )
-    scenes = scene_res.scalars().all()
-    if len(scenes) < 5:
-        scene_res = await db.execute(select(TextScene).where(TextScene.is_active == True).limit(20))
-        scenes = scene_res.scalars().all()
-    
-    selected_scenes = random.sample(scenes, min(len(scenes), 5)) if scenes else []
+
+    # Bandit over the in-process scene library, skipping scenes the user has answered
+    scene_index = await get_scene_index(db)
+    selected_scenes = scene_index.select(sphere_id, seen=await seen_scene_ids(db, request.user_id))
     
     scenes_data = {}
     for i, sc in enumerate(selected_scenes):
         layer_num = str(i + 1)
         scenes_data[layer_num] = {
             "id": sc.id, 
-            "text": sc.scene_text,
+            "text": sc.text,
             "meta_data": sc.meta_data
         }
 
+    # Context from the portrait, kept for the whole session
+    portrait_ctx = await _get_portrait_context(db, request.user_id, card.sphere)
+
     # Create new sync session
     session = SyncSession(
         user_id=request.user_id,
@@ -275,11 +267,8 @@ async def start_sync(
             "current_layer": "intro", 
             "sub_phase": 0, 
             "scenes": scenes_data,
-            "timing": {
-                "intro_0": datetime.datetime.utcnow().isoformat()
-            }
+            "portrait_context": portrait_ctx,
         },
-        session_transcript=[]
     )
     db.add(session)
 
@@ -290,9 +279,6 @@ async def start_sync(
     await db.commit()
     await db.refresh(session)
 
-    # Get context from portrait
-    portrait_ctx = await _get_portrait_context(db, request.user_id, card.sphere)
-
     # 1. Generate Intro content
     ai_content = await run_avatar_layer(
         layer="intro",
@@ -303,10 +289,18 @@ async def start_sync(
         portrait_context=portrait_ctx
     )
 
-    # Store first AI message
-    session.session_transcript = [{"role": "assistant", "content": ai_content}]
-    db.add(session)
+    # Store first AI message: the first event of the session log
+    log = await load_session_log(db, session)
+    log.add("assistant", {
+        "role": "assistant",
+        "content": ai_content,
+        "created_at": datetime.datetime.utcnow().isoformat(),
+        "layer": "intro",
+        "sub_phase": 0,
+    })
+    await append_events(db, session.id, log)
     await db.commit()
+    remember_session_log(session.id, log)
 
     return {
         "session_id": session.id,
@@ -318,7 +312,6 @@ async def start_sync(
 @router.post("/phase")
 async def process_phase(
     request: PhaseRequest,
-    background_tasks: BackgroundTasks,
     db: AsyncSession = Depends(get_db),
 ):
     # Fetch current session state
@@ -335,15 +328,10 @@ async def process_phase(
     user_result = await db.execute(select(User).where(User.id == request.user_id))
     user = user_result.scalar_one_or_none()
 
-    # Fetch current session state
-    # Filter transcript to ensure no None/null entries or non-dict items
-    raw_transcript = session.session_transcript or []
-    transcript = []
-    for m in raw_transcript:
-        if isinstance(m, dict) and m.get("role") and m.get("content") is not None:
-            transcript.append({"role": m["role"], "content": str(m["content"])})
-    
-    state = dict(session.phase_data or {"current_layer": "intro", "sub_phase": 0})
+    # Session log: the row with the events of earlier phases folded over it
+    log = await load_session_log(db, session)
+    transcript = log.transcript
+    state = log.state
     current_layer = state.get("current_layer", "intro")
     sub_phase = state.get("sub_phase", 0)
 
@@ -357,22 +345,22 @@ async def process_phase(
     if user_response_text:
         # Safety net: ensure transcript has the assistant's intro message
         if not transcript:
-             transcript.append({"role": "assistant", "content": "..."})
+            log.add("assistant", {"role": "assistant", "content": "..."})
         
-        import datetime
+        # The answer, with its timing for delay analysis
         user_timestamp = datetime.datetime.utcnow().isoformat()
-        transcript.append({
-            "role": "user", 
+        log.add("user", {
+            "role": "user",
             "content": str(user_response_text),
-            "created_at": user_timestamp
+            "created_at": user_timestamp,
+            "layer": current_layer,
+            "sub_phase": sub_phase,
         })
-        
-        # Track timing in state for delay analysis
-        if "timing" not in state:
-            state["timing"] = {}
-        state["timing"][f"{current_layer}_{sub_phase}_user"] = user_timestamp
+
+    portrait_ctx = await _session_portrait_context(db, session, log)
 
     # 1. Determine next move
+    advance = None
     if current_layer == "intro":
         # Always move to Layer 1 from Intro
         next_layer = "1"
@@ -382,6 +370,20 @@ async def process_phase(
     else:
         # NEW: Autonomous Somatic Check
         scene_text = state.get("scenes", {}).get(current_layer, {}).get("text", "")
+
+        # SPECULATION: the next layer is generated while the somatic check
+        # decides whether it is shown (the verdict that narrows makes no LLM call)
+        if settings.SYNC_SPECULATION and current_layer in ("1", "2", "3", "4"):
+            following = str(int(current_layer) + 1)
+            advance = SpeculativeLayer(
+                layer=following,
+                archetype_id=session.archetype_id,
+                sphere=session.sphere,
+                previous_messages=list(transcript),
+                scene_text=state.get("scenes", {}).get(following, {}).get("text"),
+                portrait_context=portrait_ctx
+            )
+
         somatic_result = await autonomous_somatic_check(user_response_text, scene_text)
         
         is_abstract = not somatic_result.get("is_somatic", False)
@@ -389,15 +391,18 @@ async def process_phase(
             "length": len(user_response_text),
             "has_body": somatic_result.get("has_body", False),
             "has_objects": somatic_result.get("has_objects", False),
-            "ai_reason": somatic_result.get("reason")
+            "ai_reason": somatic_result.get("reason"),
+            "somatic_source": somatic_result.get("source"),
+            "somatic_confidence": somatic_result.get("confidence"),
         }
         
         # Store metrics in session state per phase
-        if "metrics" not in state:
-            state["metrics"] = {}
-        state["metrics"][current_layer] = metrics
+        log.add("state", {"metrics": {current_layer: metrics}})
         
         should_move_deeper = not is_abstract or sub_phase >= 1 # Max 1 retry for abstract responses
+        if advance is not None and not should_move_deeper:
+            advance.discard()
+            advance = None
     
     if should_move_deeper:
         # Move to next layer
@@ -444,11 +449,8 @@ async def process_phase(
 
     # 2. Handle Mirror Analysis (Final)
     if next_layer == "mirror":
-        # Get context from portrait for continuity in analysis
-        portrait_ctx = await _get_portrait_context(db, request.user_id, session.sphere)
-        
         analysis = await run_mirror_analysis(
-            session.archetype_id, session.sphere, transcript, session.phase_data, portrait_context=portrait_ctx, db=db
+            session.archetype_id, session.sphere, transcript, state, portrait_context=portrait_ctx, db=db
         )
         
         # NEW: Save personal symbols if any were identified
@@ -458,9 +460,6 @@ async def process_phase(
             await SymbolicService.update_personal_symbols(db, request.user_id, identified_syms, session.sphere)
         
         # Save results (Level 3 Knowledge Cell)
-        session.is_complete = True
-        session.current_phase = 6
-        session.session_transcript = transcript
         session.real_picture = analysis.get("real_picture")
         session.core_pattern = analysis.get("core_pattern")
         session.shadow_active = analysis.get("shadow_active")
@@ -529,11 +528,21 @@ async def process_phase(
             card.sync_sessions_count += 1
             db.add(card)
 
+        # 3. Context aggregation and behavioral analysis: a job committed with the session,
+        # shared by the user's completions within SYNC_ANALYTICS_WINDOW
+        await enqueue(db, "sync.analytics", {"user_id": request.user_id},
+                      delay=settings.SYNC_ANALYTICS_WINDOW, coalesce=True)
+        # The folded log goes to the row once, for the readers of complete sessions
+        try:
+            await append_events(
+                db, session.id, log, is_complete=True, current_phase=6,
+                session_transcript=transcript, phase_data=state,
+            )
+        except SessionConflict:
+            await db.rollback()
+            raise HTTPException(status_code=409, detail="Фаза уже обработана")
         await db.commit()
 
-        # 3. Trigger context aggregation and behavioral analysis in background
-        background_tasks.add_task(_background_sync_processing, request.user_id, session.id, session.sphere)
-
         return {
             "session_id": session.id,
             "current_phase": 6,
@@ -543,11 +552,10 @@ async def process_phase(
         }
 
     try:
-        # Get context from portrait for continuity
-        portrait_ctx = await _get_portrait_context(db, request.user_id, session.sphere)
-
         # 3. Handle next narrative step
-        if not is_fast_fail and next_layer != "mirror":
+        if advance is not None:
+            ai_content = await advance.commit()
+        elif not is_fast_fail and next_layer != "mirror":
             scene_text = state.get("scenes", {}).get(next_layer, {}).get("text")
             ai_content = await run_avatar_layer(
                 layer=next_layer,
@@ -580,71 +588,55 @@ async def process_phase(
                             except (ValueError, TypeError):
                                 reading_time = 0
 
-                        from app.agents.sync_agent import get_embedding
-                        resp_emb = await get_embedding(user_response_text)
-
-                        # NEW: Extract structured features for research and future training
-                        extracted_feats = await extract_response_features(
-                            scene_text=scene_text or "",
-                            user_response=user_response_text,
-                            archetype_id=session.archetype_id,
-                            sphere=session.sphere
-                        )
-
-                        interaction = SceneInteraction(
-                            user_id=request.user_id,
-                            session_id=session.id,
-                            scene_id=scene_id,
-                            layer_index=layer_int,
-                            reading_time=reading_time,
-                            response_text=user_response_text,
-                            response_embedding=resp_emb,
-                            response_length=len(user_response_text),
-                            extracted_features=extracted_feats
-                        )
-                        db.add(interaction)
+                        # Embedding and feature extraction: a job committed with the phase
+                        await enqueue(db, "sync.log_interaction", {
+                            "user_id": request.user_id,
+                            "session_id": session.id,
+                            "scene_id": scene_id,
+                            "layer_index": layer_int,
+                            "reading_time": reading_time,
+                            "response_text": user_response_text,
+                            "scene_text": scene_text or "",
+                            "archetype_id": session.archetype_id,
+                            "sphere": session.sphere,
+                            "somatic": {
+                                "is_somatic": not is_abstract,
+                                "source": metrics.get("somatic_source"),
+                                "confidence": metrics.get("somatic_confidence"),
+                            },
+                            "created_at": user_timestamp,
+                        })
             except Exception as ex:
                 import logging
                 logging.getLogger(__name__).error(f"SceneInteraction logging failed: {ex}")
 
-        # Update session state: Ensure context is saved
-        timestamp = datetime.datetime.utcnow().isoformat()
-        transcript.append({
-            "role": "assistant", 
+        # Update session state: the reply opens next_layer / new_sub_phase
+        log.add("assistant", {
+            "role": "assistant",
             "content": str(ai_content),
-            "created_at": timestamp
+            "created_at": datetime.datetime.utcnow().isoformat(),
+            "layer": next_layer,
+            "sub_phase": new_sub_phase,
         })
-        session.session_transcript = transcript
-        
-        # Track timing for sub-phases to analyze delays
-        if "timing" not in state:
-            state["timing"] = {}
-        state["timing"][f"{next_layer}_{new_sub_phase}"] = timestamp
-        
-        state["current_layer"] = next_layer
-        state["sub_phase"] = new_sub_phase
-        session.phase_data = state
-        session.current_phase = new_phase_val
-        
-        # Explicitly mark as modified for SQLAlchemy just in case
-        from sqlalchemy.orm.attributes import flag_modified
-        flag_modified(session, "phase_data")
-        flag_modified(session, "session_transcript")
-        
-        db.add(session)
+        await append_events(db, session.id, log, current_phase=new_phase_val)
         await db.commit()
-        await db.refresh(session)
+        remember_session_log(session.id, log)
 
         return {
             "session_id": session.id,
-            "current_phase": session.current_phase,
+            "current_phase": new_phase_val,
             "is_complete": False,
             "phase_content": ai_content,
             "layer": next_layer,
             "sub_phase": new_sub_phase,
             "transcript_len": len(transcript)
         }
+    except SessionConflict:
+        await db.rollback()
+        raise HTTPException(status_code=409, detail="Фаза уже обработана")
     except Exception as e:
+        if advance is not None:
+            advance.discard()
         import logging
         import traceback
         logging.getLogger(__name__).error(f"Sync Phase Error: {e}\n{traceback.format_exc()}")
@@ -0,0 +1,324 @@
+"""
+One embedding service for the whole backend.
+
+Every vector column (avatar cards, scenes, sync responses, user memory, DSB
+portrait layers) is compared against query vectors by cosine distance, so all
+of them must come from the same model at the same dimensions. embed() and
+embed_many() are the only way in:
+
+- Normalization: texts are whitespace-collapsed and cut to MAX_TEXT_CHARS,
+  vectors are cut to EMBEDDING_DIMENSIONS and L2-normalized whatever the
+  backend returns.
+- Micro-batching: single-text requests that arrive within
+  EMBEDDING_BATCH_WINDOW_MS of each other (concurrent sync sessions, the
+  insights of one dialogue) go out as one API call; a full batch is sent
+  at once without waiting for the window.
+- Deduplication: a text that is already in flight is not requested again;
+  recent vectors are kept in an in-process LRU.
+- Persistent cache: table embedding_cache maps sha256(model, dimensions,
+  text) to the vector, so re-embedding unchanged texts (portrait
+  regeneration, script re-runs) costs no API call.
+
+API calls go through the LLM scheduler (budget and retries per model).
+EMBEDDING_BACKEND=local swaps OpenAI for LocalEmbeddingBackend: deterministic
+feature-hashing vectors for tests and offline development, similar texts
+still land close together.
+"""
+import asyncio
+import hashlib
+import logging
+import re
+import time
+from collections import OrderedDict
+from typing import Optional, Protocol
+
+import numpy as np
+from openai import AsyncOpenAI
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import async_sessionmaker
+
+from app.config import settings
+from app.models.embedding_cache import EmbeddingCacheEntry
+from app.services.llm_scheduler import LLMScheduler, _openai_usage, llm_scheduler
+
+logger = logging.getLogger(__name__)
+
+MAX_TEXT_CHARS = 8000
+# Per API call; OpenAI caps a request at 2048 inputs and 300k tokens
+MAX_BATCH_CHARS = 400_000
+
+
+class EmbeddingBackend(Protocol):
+    model: str
+    dimensions: int
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        ...
+
+
+class OpenAIEmbeddingBackend:
+    def __init__(
+        self,
+        model: str,
+        dimensions: int,
+        client: Optional[AsyncOpenAI] = None,
+        scheduler: Optional[LLMScheduler] = None,
+    ):
+        self.model = model
+        self.dimensions = dimensions
+        # Retries are the scheduler's job, as for chat completions
+        self._client = (client or AsyncOpenAI(api_key=settings.OPENAI_API_KEY)).with_options(max_retries=0)
+        self._scheduler = scheduler or llm_scheduler
+        # text-embedding-3-* shorten on the server; older models return their native size
+        self._params = {"dimensions": dimensions} if model.startswith("text-embedding-3") else {}
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        response = await self._scheduler.run(
+            self.model,
+            lambda: self._client.embeddings.create(model=self.model, input=texts, **self._params),
+            sum(len(t) for t in texts) // 4 + 1,
+            count_tokens=_openai_usage,
+        )
+        return [item.embedding for item in sorted(response.data, key=lambda item: item.index)]
+
+
+_TOKEN_RE = re.compile(r"\w+")
+
+
+class LocalEmbeddingBackend:
+    """
+    Deterministic offline vectors: words and character trigrams hashed into
+    `dimensions` buckets with a random sign. Texts sharing words or word
+    parts get a high cosine similarity; no network, no model files.
+    """
+
+    model = "local-hash-v1"
+
+    def __init__(self, dimensions: int):
+        self.dimensions = dimensions
+
+    def _vector(self, text: str) -> np.ndarray:
+        vector = np.zeros(self.dimensions, dtype=np.float32)
+        for word in _TOKEN_RE.findall(text.lower()):
+            padded = f"#{word}#"
+            features = [(word, 1.0)] + [(padded[i:i + 3], 0.5) for i in range(len(padded) - 2)]
+            for feature, weight in features:
+                digest = hashlib.blake2b(feature.encode(), digest_size=8).digest()
+                index = int.from_bytes(digest[:4], "little") % self.dimensions
+                vector[index] += weight if digest[4] & 1 else -weight
+        return vector
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        return [self._vector(text) for text in texts]
+
+
+def prepare_text(text: str) -> str:
+    return " ".join(text.split())[:MAX_TEXT_CHARS]
+
+
+def normalize_vector(vector, dimensions: int) -> np.ndarray:
+    """
+    Cuts to `dimensions` (text-embedding-3 vectors stay meaningful when
+    truncated) and scales to unit length, so cosine distance and dot product
+    agree for every stored vector.
+    """
+    array = np.asarray(vector, dtype=np.float32)[:dimensions]
+    if array.shape[0] != dimensions:
+        raise ValueError(f"Embedding has {array.shape[0]} dimensions, expected {dimensions}")
+    norm = float(np.linalg.norm(array))
+    return array / norm if norm > 0 else array
+
+
+class EmbeddingService:
+    def __init__(
+        self,
+        backend: EmbeddingBackend,
+        session_factory: Optional[async_sessionmaker] = None,
+        *,
+        batch_window: Optional[float] = None,
+        max_batch: Optional[int] = None,
+        memory_size: Optional[int] = None,
+    ):
+        self.backend = backend
+        self.session_factory = session_factory  # None — no persistent cache
+        self.batch_window = settings.EMBEDDING_BATCH_WINDOW_MS / 1000 if batch_window is None else batch_window
+        self.max_batch = max_batch or settings.EMBEDDING_MAX_BATCH
+        self.memory_size = settings.EMBEDDING_MEMORY_CACHE_SIZE if memory_size is None else memory_size
+        self._memory: OrderedDict[str, np.ndarray] = OrderedDict()
+        # key -> future of every text queued or in flight
+        self._pending: dict[str, asyncio.Future] = {}
+        self._queue: list[tuple[str, str]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._flushes: set[asyncio.Task] = set()
+        self.stats = {
+            "requested": 0, "memory_hits": 0, "deduplicated": 0, "cache_hits": 0,
+            "api_calls": 0, "api_texts": 0, "failed_batches": 0, "api_ms": 0.0,
+        }
+
+    def key(self, text: str) -> str:
+        raw = f"{self.backend.model}\x00{self.backend.dimensions}\x00{text}"
+        return hashlib.sha256(raw.encode()).hexdigest()
+
+    async def embed(self, text: str) -> list[float]:
+        return (await self.embed_many([text]))[0]
+
+    async def embed_many(self, texts: list[str]) -> list[list[float]]:
+        """Vectors in input order. Raises ValueError for empty texts and the backend's error if its call fails."""
+        prepared = [prepare_text(text) for text in texts]
+        if not all(prepared):
+            raise ValueError("Cannot embed an empty text")
+        futures = [self._request(text) for text in prepared]
+        # shield: a cancelled caller must not cancel a future other callers share
+        vectors = await asyncio.gather(*(asyncio.shield(future) for future in futures))
+        return [vector.tolist() for vector in vectors]
+
+    def _request(self, text: str) -> asyncio.Future:
+        self.stats["requested"] += 1
+        loop = asyncio.get_running_loop()
+        key = self.key(text)
+
+        vector = self._memory.get(key)
+        if vector is not None:
+            self._memory.move_to_end(key)
+            self.stats["memory_hits"] += 1
+            future = loop.create_future()
+            future.set_result(vector)
+            return future
+
+        future = self._pending.get(key)
+        if future is not None:
+            self.stats["deduplicated"] += 1
+            return future
+
+        future = self._pending[key] = loop.create_future()
+        self._queue.append((key, text))
+        if len(self._queue) >= self.max_batch:
+            self._flush_queue()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.batch_window, self._flush_queue)
+        return future
+
+    def _flush_queue(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._queue = self._queue, []
+        if batch:
+            task = asyncio.get_running_loop().create_task(self._flush(batch))
+            self._flushes.add(task)
+            task.add_done_callback(self._flushes.discard)
+
+    async def _flush(self, batch: list[tuple[str, str]]) -> None:
+        try:
+            found = await self._load_cached([key for key, _ in batch])
+            self.stats["cache_hits"] += len(found)
+            missing = [(key, text) for key, text in batch if key not in found]
+            computed = {}
+            for chunk in self._chunks(missing):
+                started = time.perf_counter()
+                vectors = await self.backend.embed([text for _, text in chunk])
+                self.stats["api_ms"] += (time.perf_counter() - started) * 1000
+                self.stats["api_calls"] += 1
+                self.stats["api_texts"] += len(chunk)
+                for (key, _), vector in zip(chunk, vectors, strict=True):
+                    computed[key] = normalize_vector(vector, self.backend.dimensions)
+            for key, _ in batch:
+                vector = found.get(key)
+                vector = computed[key] if vector is None else vector
+                self._remember(key, vector)
+                self._resolve(key, vector)
+        except Exception as e:
+            self.stats["failed_batches"] += 1
+            logger.error(f"[Embeddings] Batch of {len(batch)} failed: {e}")
+            for key, _ in batch:
+                self._resolve(key, error=e)
+            return
+        # Callers already have their vectors; the write only serves later processes
+        if computed:
+            await self._store_cached(computed)
+
+    def _chunks(self, items: list[tuple[str, str]]):
+        chunk, chars = [], 0
+        for item in items:
+            if chunk and (len(chunk) >= self.max_batch or chars + len(item[1]) > MAX_BATCH_CHARS):
+                yield chunk
+                chunk, chars = [], 0
+            chunk.append(item)
+            chars += len(item[1])
+        if chunk:
+            yield chunk
+
+    def _resolve(self, key: str, vector: Optional[np.ndarray] = None, error: Optional[Exception] = None) -> None:
+        future = self._pending.pop(key, None)
+        if future is None or future.done():
+            return
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(vector)
+
+    def _remember(self, key: str, vector: np.ndarray) -> None:
+        if self.memory_size <= 0:
+            return
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    async def _load_cached(self, keys: list[str]) -> dict[str, np.ndarray]:
+        # The cache only saves API calls: if it is unavailable, embed anyway
+        if self.session_factory is None:
+            return {}
+        try:
+            async with self.session_factory() as session:
+                rows = await session.execute(
+                    select(EmbeddingCacheEntry.key, EmbeddingCacheEntry.embedding)
+                    .where(EmbeddingCacheEntry.key.in_(keys))
+                )
+                return {row.key: np.frombuffer(row.embedding, dtype=np.float32) for row in rows}
+        except Exception as e:
+            logger.warning(f"[Embeddings] Cache lookup failed: {e}")
+            return {}
+
+    async def _store_cached(self, vectors: dict[str, np.ndarray]) -> None:
+        if self.session_factory is None:
+            return
+        try:
+            async with self.session_factory() as session, session.begin():
+                await session.execute(
+                    insert(EmbeddingCacheEntry)
+                    .values([
+                        {"key": key, "model": self.backend.model, "embedding": vector.astype(np.float32).tobytes()}
+                        for key, vector in vectors.items()
+                    ])
+                    .on_conflict_do_nothing(index_elements=["key"])
+                )
+        except Exception as e:
+            logger.warning(f"[Embeddings] Cache write failed: {e}")
+
+
+def build_backend() -> EmbeddingBackend:
+    if settings.EMBEDDING_BACKEND == "local":
+        return LocalEmbeddingBackend(settings.EMBEDDING_DIMENSIONS)
+    if settings.EMBEDDING_BACKEND == "openai":
+        return OpenAIEmbeddingBackend(settings.EMBEDDING_MODEL, settings.EMBEDDING_DIMENSIONS)
+    raise ValueError(f"Unknown EMBEDDING_BACKEND: {settings.EMBEDDING_BACKEND}")
+
+
+def _build_default_service() -> EmbeddingService:
+    from app.database import AsyncSessionLocal
+
+    return EmbeddingService(build_backend(), AsyncSessionLocal if settings.EMBEDDING_PERSISTENT_CACHE else None)
+
+
+# One service per process: batching and deduplication work across all callers
+embedding_service = _build_default_service()
+
+
+async def embed(text: str) -> list[float]:
+    return await embedding_service.embed(text)
+
+
+async def embed_many(texts: list[str]) -> list[list[float]]:
+    return await embedding_service.embed_many(texts)
@@ -0,0 +1,290 @@
+"""
+Durable background jobs in Postgres (table background_jobs).
+
+Request handlers call enqueue() inside their own transaction, so a job exists
+exactly when the request's writes were committed, and a NOTIFY sent on commit
+wakes the workers (python -m app.worker, any number of processes). Workers
+claim ready jobs with FOR UPDATE SKIP LOCKED: concurrent claims never block on
+or double-take a row, and the work runs off the API's event loop.
+
+- Visibility timeout: a claimed job is leased until available_at and the
+  worker extends the lease while the handler runs. If the worker dies, the
+  job becomes claimable again when the lease expires.
+- Retries: a failed job goes back to the queue after exponential backoff
+  with jitter. After max_attempts it is dead (the dead letter) with its last
+  error kept; requeue_dead() puts dead jobs back by hand.
+- Concurrency: a job type may cap how many of its jobs run at once across
+  all workers (JobType.concurrency, JOB_CONCURRENCY overrides it). Claims of
+  a capped type are serialized by a transaction-level advisory lock.
+- Coalescing: enqueue(coalesce=True) returns the job of the same type and
+  payload that has not run yet instead of adding another, so work arriving
+  within its delay is handled by one run. A started or retried job takes no
+  more.
+
+Handlers are registered with @job_handler in the module that owns the work
+and are called with the job payload as keyword arguments. A lease can expire
+under a stuck handler, so handlers must tolerate running twice.
+"""
+import logging
+import random
+from dataclasses import dataclass
+from datetime import timedelta
+from typing import Awaitable, Callable, Optional, Union
+
+from sqlalchemy import func, insert, select, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+
+from app.config import settings
+from app.models.background_job import BackgroundJob
+
+logger = logging.getLogger(__name__)
+
+NOTIFY_CHANNEL = "background_jobs"
+ERROR_MAX_CHARS = 4000
+
+Executor = Union[AsyncSession, AsyncConnection]
+
+
+class PermanentJobError(Exception):
+    """Raised by a handler when retrying cannot help; the job goes straight to dead."""
+
+
+@dataclass(frozen=True)
+class JobType:
+    name: str
+    handler: Callable[..., Awaitable[None]]
+    concurrency: Optional[int] = None  # across all workers; None — only the worker's own slots
+    visibility_timeout: float = 300.0
+    max_attempts: int = 5
+
+
+@dataclass(frozen=True)
+class ClaimedJob:
+    id: int
+    job_type: str
+    payload: dict
+    priority: int
+    attempts: int  # includes the current one; doubles as the lease token
+    max_attempts: int
+
+
+JOB_TYPES: dict[str, JobType] = {}
+
+
+def job_handler(
+    name: str,
+    *,
+    concurrency: Optional[int] = None,
+    visibility_timeout: float = 300.0,
+    max_attempts: int = 5,
+):
+    """Registers the decorated coroutine function as the handler of job type `name`."""
+    def register(handler: Callable[..., Awaitable[None]]):
+        JOB_TYPES[name] = JobType(
+            name=name,
+            handler=handler,
+            concurrency=settings.JOB_CONCURRENCY.get(name, concurrency),
+            visibility_timeout=visibility_timeout,
+            max_attempts=max_attempts,
+        )
+        return handler
+    return register
+
+
+def retry_delay(attempts: int) -> float:
+    """Seconds before retry number `attempts`: exponential, capped, half of it jittered."""
+    delay = min(settings.JOB_RETRY_BASE_DELAY * 2 ** (attempts - 1), settings.JOB_RETRY_MAX_DELAY)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+async def enqueue(
+    session: AsyncSession,
+    job_type: str,
+    payload: dict,
+    *,
+    priority: int = 0,
+    delay: float = 0.0,
+    coalesce: bool = False,
+) -> int:
+    """
+    Adds a job in the caller's transaction and returns its id. Workers are
+    notified on commit; a rolled back request leaves no job behind. With
+    coalesce, a job of the same type and payload that has not run yet is
+    returned instead.
+    """
+    spec = JOB_TYPES.get(job_type)
+    if spec is None:
+        raise ValueError(f"Unknown job type: {job_type}")
+
+    if coalesce:
+        waiting = await session.scalar(
+            select(BackgroundJob.id).where(
+                BackgroundJob.job_type == job_type,
+                BackgroundJob.status == "queued",
+                BackgroundJob.attempts == 0,
+                BackgroundJob.payload == payload,
+            ).limit(1)
+        )
+        if waiting is not None:
+            return waiting
+
+    values = dict(job_type=job_type, payload=payload, priority=int(priority), max_attempts=spec.max_attempts)
+    if delay:
+        values["available_at"] = func.now() + timedelta(seconds=delay)
+    # INSERT and NOTIFY in one round trip
+    job = insert(BackgroundJob).values(**values).returning(BackgroundJob.id).cte("job")
+    row = (await session.execute(select(job.c.id, func.pg_notify(NOTIFY_CHANNEL, job_type)))).one()
+    return row.id
+
+
+async def count_pending(session: Executor, job_type: str, **payload) -> int:
+    """Queued or running jobs of job_type whose payload contains `payload`; a running handler counts itself."""
+    return await session.scalar(
+        select(func.count()).select_from(BackgroundJob).where(
+            BackgroundJob.job_type == job_type,
+            BackgroundJob.status.in_(("queued", "running")),
+            BackgroundJob.payload.contains(payload),
+        )
+    )
+
+
+_CLAIM_SQL = text("""
+    WITH ready AS (
+        SELECT id FROM background_jobs
+        WHERE job_type = :job_type AND status IN ('queued', 'running')
+          AND available_at <= now() AND attempts < max_attempts
+        ORDER BY priority, available_at
+        LIMIT :limit
+        FOR UPDATE SKIP LOCKED
+    )
+    UPDATE background_jobs AS j
+    SET status = 'running', attempts = j.attempts + 1, locked_by = :worker,
+        available_at = now() + make_interval(secs => :lease), started_at = now()
+    FROM ready
+    WHERE j.id = ready.id
+    RETURNING j.id, j.payload, j.priority, j.attempts, j.max_attempts
+""")
+
+_RUNNING_SQL = text("""
+    SELECT count(*) FROM background_jobs
+    WHERE job_type = :job_type AND status = 'running' AND available_at > now()
+""")
+
+
+async def claim(conn: Executor, spec: JobType, worker: str, limit: int) -> list[ClaimedJob]:
+    """
+    Leases up to `limit` ready jobs of one type: queued ones whose delay has
+    passed and running ones whose lease expired. Must run in a transaction.
+    """
+    if spec.concurrency is not None:
+        await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"),
+                           {"key": f"{NOTIFY_CHANNEL}:{spec.name}"})
+        running = await conn.scalar(_RUNNING_SQL, {"job_type": spec.name})
+        limit = min(limit, spec.concurrency - running)
+    if limit <= 0:
+        return []
+
+    rows = await conn.execute(_CLAIM_SQL, {
+        "worker": worker, "lease": float(spec.visibility_timeout), "job_type": spec.name, "limit": limit,
+    })
+    jobs = [ClaimedJob(id=r.id, job_type=spec.name, payload=r.payload, priority=r.priority,
+                       attempts=r.attempts, max_attempts=r.max_attempts) for r in rows]
+    jobs.sort(key=lambda job: (job.priority, job.id))
+    return jobs
+
+
+async def complete(conn: Executor, finished: list[ClaimedJob]) -> int:
+    """
+    Marks finished jobs done in one statement; jobs whose lease was lost to
+    another worker are left alone. Returns how many were marked.
+    """
+    result = await conn.execute(text("""
+        UPDATE background_jobs AS j
+        SET status = 'done', finished_at = now(), locked_by = NULL, last_error = NULL
+        FROM unnest(CAST(:ids AS bigint[]), CAST(:attempts AS smallint[])) AS f(id, attempts)
+        WHERE j.id = f.id AND j.attempts = f.attempts AND j.status = 'running'
+    """), {"ids": [job.id for job in finished], "attempts": [job.attempts for job in finished]})
+    return result.rowcount
+
+
+async def fail(conn: Executor, job: ClaimedJob, error: str, retry: bool = True) -> Optional[str]:
+    """
+    Requeues the job after retry_delay() or moves it to dead once attempts
+    are used up (or retry=False). Returns the new status, None if the lease
+    was lost.
+    """
+    dead = not retry or job.attempts >= job.max_attempts
+    result = await conn.execute(text("""
+        UPDATE background_jobs
+        SET status = :status, locked_by = NULL, last_error = :error,
+            available_at = now() + make_interval(secs => :delay),
+            finished_at = CASE WHEN :dead THEN now() END
+        WHERE id = :id AND status = 'running' AND attempts = :attempts
+    """), {
+        "status": "dead" if dead else "queued", "dead": dead, "error": error[-ERROR_MAX_CHARS:],
+        "delay": 0.0 if dead else retry_delay(job.attempts), "id": job.id, "attempts": job.attempts,
+    })
+    if result.rowcount != 1:
+        return None
+    return "dead" if dead else "queued"
+
+
+async def release(conn: Executor, job: ClaimedJob) -> bool:
+    """Returns an interrupted job (worker shutdown) to the queue without spending an attempt."""
+    result = await conn.execute(text("""
+        UPDATE background_jobs
+        SET status = 'queued', attempts = attempts - 1, locked_by = NULL, available_at = now()
+        WHERE id = :id AND status = 'running' AND attempts = :attempts
+    """), {"id": job.id, "attempts": job.attempts})
+    return result.rowcount == 1
+
+
+async def heartbeat(conn: Executor, worker: str, job_ids: list[int], lease: float) -> set[int]:
+    """Extends the leases of this worker's running jobs; returns the ids it still holds."""
+    rows = await conn.execute(text("""
+        UPDATE background_jobs SET available_at = now() + make_interval(secs => :lease)
+        WHERE id = ANY(:ids) AND status = 'running' AND locked_by = :worker
+        RETURNING id
+    """), {"lease": float(lease), "ids": job_ids, "worker": worker})
+    return {r.id for r in rows}
+
+
+async def reap_expired(conn: Executor) -> int:
+    """Dead-letters jobs whose last allowed attempt timed out (the worker never reported back)."""
+    result = await conn.execute(text("""
+        UPDATE background_jobs
+        SET status = 'dead', finished_at = now(), locked_by = NULL,
+            last_error = coalesce(last_error || E'\\n', '') || 'Lease expired on attempt ' || attempts
+        WHERE status = 'running' AND available_at <= now() AND attempts >= max_attempts
+    """))
+    return result.rowcount
+
+
+async def purge_finished(conn: Executor, older_than: timedelta) -> int:
+    """Deletes done jobs finished more than `older_than` ago; dead ones are kept for inspection."""
+    result = await conn.execute(text("""
+        DELETE FROM background_jobs
+        WHERE status = 'done' AND finished_at < now() - make_interval(secs => :age)
+    """), {"age": older_than.total_seconds()})
+    return result.rowcount
+
+
+async def requeue_dead(conn: Executor, job_type: Optional[str] = None) -> int:
+    """Puts dead jobs (of one type, or all) back with a fresh attempt budget."""
+    result = await conn.execute(text("""
+        UPDATE background_jobs
+        SET status = 'queued', attempts = 0, available_at = now(), finished_at = NULL
+        WHERE status = 'dead' AND (CAST(:job_type AS varchar) IS NULL OR job_type = :job_type)
+    """), {"job_type": job_type})
+    if result.rowcount:
+        await conn.execute(text("SELECT pg_notify(:channel, '')"), {"channel": NOTIFY_CHANNEL})
+    return result.rowcount
+
+
+async def queue_stats(conn: Executor) -> dict[str, dict[str, int]]:
+    """{job_type: {status: count}} over the whole table."""
+    rows = await conn.execute(text("SELECT job_type, status, count(*) AS n FROM background_jobs GROUP BY 1, 2"))
+    stats: dict[str, dict[str, int]] = {}
+    for r in rows:
+        stats.setdefault(r.job_type, {})[r.status] = r.n
+    return stats
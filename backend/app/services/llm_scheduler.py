@@ -0,0 +1,395 @@
+"""
+Process-wide scheduler for outgoing LLM calls.
+
+Every chat completion in the backend (DSB agents through LLMClient,
+app.agents and app.core.astrology.llm_engine through ScheduledOpenAI) is
+dispatched by one LLMScheduler, which enforces a budget per model:
+
+- at most `max_concurrency` requests in flight,
+- `requests_per_minute` / `tokens_per_minute` token buckets (a request is
+  charged prompt size + max completion, then corrected by the real usage).
+
+The scheduler is per process. The API and every job worker process each
+build one and enforce their share of the account budgets (LLM_PROCESS_SHARE,
+by default an even split over JOB_WORKER_PROCESSES + 1), so together they stay
+within the limits instead of relying on 429 backoff.
+
+Queued calls are dispatched by priority class, FIFO within a class; a burst of
+onboarding portraits therefore waits behind interactive sync/align replies
+instead of competing with them. Rate-limit and transient API errors are
+retried with exponential backoff and full jitter, and a 429 pauses the whole
+model until its Retry-After. stats() exposes queue depth, waits and retries.
+
+Streamed completions (ScheduledOpenAI.stream_chat_completion) hold their slot
+until the last chunk, so concurrency counts generations, not requests.
+
+The priority of a call is read from the `llm_priority` context variable:
+entry points (a background pipeline, a batch job) set it once with
+priority_scope() and every call they await inherits it.
+"""
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+from enum import IntEnum
+from types import SimpleNamespace
+from typing import Awaitable, Callable, Optional, TypeVar
+
+import openai
+from openai import AsyncOpenAI
+
+from app.config import settings
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+DEFAULT_COMPLETION_TOKENS = 1024
+
+RETRYABLE_ERRORS = (
+    openai.RateLimitError,
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.InternalServerError,
+    asyncio.TimeoutError,
+)
+
+
+class StreamInterruptedError(Exception):
+    """A streamed completion failed after part of it was delivered; it is not retried."""
+
+
+@dataclass
+class StreamedCompletion:
+    content: str
+    usage: Optional[object] = None  # CompletionUsage from the final chunk
+
+
+class Priority(IntEnum):
+    INTERACTIVE = 0  # sync / align / assistant replies, the user is waiting
+    ONBOARDING = 1   # first DSB portrait after onboarding
+    BACKGROUND = 2   # regenerate, batch jobs
+
+
+llm_priority: ContextVar[Priority] = ContextVar("llm_priority", default=Priority.INTERACTIVE)
+
+
+@contextmanager
+def priority_scope(priority: Priority):
+    """Runs the enclosed code (and everything it awaits) at the given priority."""
+    token = llm_priority.set(priority)
+    try:
+        yield
+    finally:
+        llm_priority.reset(token)
+
+
+@dataclass(frozen=True)
+class ModelBudget:
+    max_concurrency: int
+    requests_per_minute: int
+    tokens_per_minute: int
+
+
+def estimate_tokens(messages: list[dict], params: dict) -> int:
+    """Upper bound used for the token budget: ~4 chars per prompt token + max completion."""
+    prompt_chars = sum(len(m.get("content") or "") for m in messages if isinstance(m.get("content"), str))
+    completion = params.get("max_tokens") or params.get("max_completion_tokens") or DEFAULT_COMPLETION_TOKENS
+    return prompt_chars // 4 + completion
+
+
+class _TokenBucket:
+    """Continuously refilled bucket holding at most one minute of budget."""
+
+    def __init__(self, per_minute: int):
+        self.capacity = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.level = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, amount: float, now: float) -> float:
+        """Seconds until `amount` is available (requests larger than the bucket wait for a full one)."""
+        self._refill(now)
+        missing = min(amount, self.capacity) - self.level
+        return missing / self.rate if missing > 0 else 0.0
+
+    def take(self, amount: float) -> None:
+        self.level -= amount
+
+    def credit(self, amount: float) -> None:
+        """Returns an over-estimate (or charges an under-estimate when negative)."""
+        self.level = min(self.capacity, self.level + amount)
+
+
+class _ModelQueue:
+    def __init__(self, budget: ModelBudget):
+        self.budget = budget
+        self.requests = _TokenBucket(budget.requests_per_minute)
+        self.tokens = _TokenBucket(budget.tokens_per_minute)
+        # (priority, seq, tokens, future) — heap order = dispatch order
+        self.waiting: list[tuple[int, int, int, asyncio.Future]] = []
+        self.in_flight = 0
+        self.paused_until = 0.0
+        self.timer: Optional[asyncio.TimerHandle] = None
+        self.stats = {
+            "submitted": 0, "completed": 0, "failed": 0, "retries": 0, "rate_limited": 0,
+            "max_queue_depth": 0,
+            "wait_ms": {p.name.lower(): 0.0 for p in Priority},
+            "max_wait_ms": {p.name.lower(): 0.0 for p in Priority},
+        }
+
+    def queue_depth(self) -> dict[str, int]:
+        depth = dict.fromkeys((p.name.lower() for p in Priority), 0)
+        for priority, _, _, future in self.waiting:
+            if not future.done():
+                depth[Priority(priority).name.lower()] += 1
+        return depth
+
+
+class LLMScheduler:
+    def __init__(
+        self,
+        default_budget: ModelBudget,
+        model_budgets: Optional[dict[str, ModelBudget]] = None,
+        max_retries: int = 4,
+        backoff_base: float = 1.0,
+        backoff_cap: float = 30.0,
+    ):
+        self.default_budget = default_budget
+        self.model_budgets = model_budgets or {}
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self._queues: dict[str, _ModelQueue] = {}
+        self._seq = itertools.count()
+
+    def _queue(self, model: str) -> _ModelQueue:
+        queue = self._queues.get(model)
+        if queue is None:
+            queue = self._queues[model] = _ModelQueue(self.model_budgets.get(model, self.default_budget))
+        return queue
+
+    async def run(
+        self,
+        model: str,
+        call: Callable[[], Awaitable[T]],
+        tokens: int,
+        priority: Optional[Priority] = None,
+        count_tokens: Optional[Callable[[T], Optional[int]]] = None,
+    ) -> T:
+        """
+        Awaits a slot within the model's budget, then `call()`.
+        Retryable errors are retried (each attempt queues again at the same
+        priority); count_tokens(result) corrects the token estimate.
+        """
+        priority = llm_priority.get() if priority is None else priority
+        queue = self._queue(model)
+        queue.stats["submitted"] += 1
+        attempt = 0
+        while True:
+            await self._acquire(queue, tokens, priority)
+            try:
+                result = await call()
+            except RETRYABLE_ERRORS as e:
+                if attempt >= self.max_retries:
+                    queue.stats["failed"] += 1
+                    raise
+                delay = self._backoff(attempt, e)
+                if isinstance(e, openai.RateLimitError):
+                    queue.stats["rate_limited"] += 1
+                    queue.paused_until = max(queue.paused_until, time.monotonic() + delay)
+                logger.warning(f"[LLMScheduler] {model}: {type(e).__name__}, retry {attempt + 1} in {delay:.1f}s")
+            except Exception:
+                queue.stats["failed"] += 1
+                raise
+            else:
+                queue.stats["completed"] += 1
+                used = count_tokens(result) if count_tokens is not None else None
+                if used is not None:
+                    queue.tokens.credit(tokens - used)
+                return result
+            finally:
+                self._release(queue)
+            queue.stats["retries"] += 1
+            attempt += 1
+            await asyncio.sleep(delay)
+
+    def _backoff(self, attempt: int, error: Exception) -> float:
+        delay = random.uniform(0, min(self.backoff_cap, self.backoff_base * 2 ** attempt))
+        response = getattr(error, "response", None)
+        retry_after = response.headers.get("retry-after") if response is not None else None
+        try:
+            return max(delay, float(retry_after)) if retry_after else delay
+        except ValueError:
+            return delay
+
+    async def _acquire(self, queue: _ModelQueue, tokens: int, priority: Priority) -> None:
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(queue.waiting, (int(priority), next(self._seq), tokens, future))
+        queue.stats["max_queue_depth"] = max(queue.stats["max_queue_depth"], len(queue.waiting))
+        started = time.perf_counter()
+        self._dispatch(queue)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Slot was granted just before the cancellation arrived
+                self._release(queue)
+            raise
+        waited = (time.perf_counter() - started) * 1000
+        name = priority.name.lower()
+        queue.stats["wait_ms"][name] += waited
+        queue.stats["max_wait_ms"][name] = max(queue.stats["max_wait_ms"][name], waited)
+
+    def _release(self, queue: _ModelQueue) -> None:
+        queue.in_flight -= 1
+        self._dispatch(queue)
+
+    def _dispatch(self, queue: _ModelQueue) -> None:
+        """Grants slots to the head of the queue while the budget allows."""
+        now = time.monotonic()
+        while queue.waiting:
+            _, _, tokens, future = queue.waiting[0]
+            if future.done():  # cancelled while waiting
+                heapq.heappop(queue.waiting)
+                continue
+            if queue.in_flight >= queue.budget.max_concurrency:
+                return
+            delay = max(
+                queue.paused_until - now,
+                queue.requests.delay(1, now),
+                queue.tokens.delay(tokens, now),
+            )
+            if delay > 0:
+                if queue.timer is None:
+                    queue.timer = asyncio.get_running_loop().call_later(delay, self._on_timer, queue)
+                return
+            heapq.heappop(queue.waiting)
+            queue.in_flight += 1
+            queue.requests.take(1)
+            queue.tokens.take(tokens)
+            future.set_result(None)
+
+    def _on_timer(self, queue: _ModelQueue) -> None:
+        queue.timer = None
+        self._dispatch(queue)
+
+    def stats(self) -> dict:
+        return {
+            model: {
+                "in_flight": queue.in_flight,
+                "queue_depth": queue.queue_depth(),
+                "budget": vars(queue.budget),
+                **queue.stats,
+            }
+            for model, queue in self._queues.items()
+        }
+
+
+def _openai_usage(response) -> Optional[int]:
+    usage = getattr(response, "usage", None)
+    return usage.total_tokens if usage is not None else None
+
+
+class ScheduledOpenAI:
+    """
+    AsyncOpenAI whose chat.completions.create goes through the scheduler.
+    Other APIs (embeddings, audio, ...) are passed through unchanged.
+    """
+
+    def __init__(self, client: AsyncOpenAI, scheduler: LLMScheduler):
+        self._client = client
+        # Retries are the scheduler's job; SDK retries would bypass the budget
+        self._chat_client = client.with_options(max_retries=0)
+        self._scheduler = scheduler
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create_chat_completion))
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+    async def _create_chat_completion(self, *, model: str, messages: list[dict], **params):
+        return await self._scheduler.run(
+            model,
+            lambda: self._chat_client.chat.completions.create(model=model, messages=messages, **params),
+            estimate_tokens(messages, params),
+            count_tokens=_openai_usage,
+        )
+
+    async def stream_chat_completion(
+        self,
+        *,
+        model: str,
+        messages: list[dict],
+        on_text: Callable[[str], Awaitable[None]],
+        **params,
+    ) -> StreamedCompletion:
+        """
+        Streams a chat completion, passing each content chunk to on_text.
+        The model slot is held until the stream ends. Errors before the first
+        chunk are retried like any call; after it they raise
+        StreamInterruptedError, since the caller has already shown part of it.
+        """
+        async def call() -> StreamedCompletion:
+            stream = await self._chat_client.chat.completions.create(
+                model=model, messages=messages, stream=True, stream_options={"include_usage": True}, **params,
+            )
+            parts: list[str] = []
+            usage = None
+            try:
+                async for chunk in stream:
+                    if chunk.usage is not None:
+                        usage = chunk.usage
+                    for choice in chunk.choices:
+                        if choice.delta.content:
+                            parts.append(choice.delta.content)
+                            await on_text(choice.delta.content)
+            except RETRYABLE_ERRORS as e:
+                if parts:
+                    raise StreamInterruptedError(f"{model} stream failed after {len(parts)} chunks") from e
+                raise
+            finally:
+                await stream.close()
+            return StreamedCompletion("".join(parts), usage)
+
+        return await self._scheduler.run(model, call, estimate_tokens(messages, params), count_tokens=_openai_usage)
+
+
+def process_share() -> float:
+    """Share of the account budgets that the scheduler of this process enforces."""
+    return settings.LLM_PROCESS_SHARE or 1 / (settings.JOB_WORKER_PROCESSES + 1)
+
+
+def process_budget(budget: ModelBudget, share: float) -> ModelBudget:
+    return ModelBudget(**{name: max(1, int(value * share)) for name, value in vars(budget).items()})
+
+
+def _build_default_scheduler() -> LLMScheduler:
+    default = ModelBudget(
+        max_concurrency=settings.LLM_MAX_CONCURRENCY,
+        requests_per_minute=settings.LLM_REQUESTS_PER_MINUTE,
+        tokens_per_minute=settings.LLM_TOKENS_PER_MINUTE,
+    )
+    overrides = {
+        model: ModelBudget(**{**vars(default), **budget})
+        for model, budget in settings.LLM_MODEL_BUDGETS.items()
+    }
+    share = process_share()
+    return LLMScheduler(
+        process_budget(default, share),
+        {model: process_budget(budget, share) for model, budget in overrides.items()},
+        max_retries=settings.LLM_MAX_RETRIES,
+    )
+
+
+# One scheduler per process: budgets are shared by every caller in it, and the
+# processes split the account budgets between them (process_share)
+llm_scheduler = _build_default_scheduler()
@@ -0,0 +1,152 @@
+"""
+Helpers for streaming LLM replies to clients.
+
+- JsonFieldStream pulls one top-level string field out of a JSON object
+  while it is still being generated (structured outputs stream the JSON
+  text, the user-facing reply is one of its fields).
+- DeltaSender forwards text deltas to a WebSocket without letting a slow
+  client stall the producer: while a send is in progress new deltas are
+  coalesced into the next message instead of queueing up.
+"""
+import asyncio
+from typing import Optional
+
+from fastapi import WebSocket
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+
+
+class JsonFieldStream:
+    """
+    Incremental extractor of a top-level string field.
+
+    feed() takes the next chunk of JSON text and returns the newly decoded
+    part of the field's value ("" until the field starts and after it ends).
+    Escapes, including \\uXXXX surrogate pairs split across chunks, are
+    decoded. The full document is still validated by the caller at the end.
+    """
+
+    def __init__(self, field: str):
+        self.field = field
+        self.value = ""
+        self.done = False
+        self._depth = 0
+        self._in_string = False
+        self._role: Optional[str] = None  # "key" | "value" | None (a string we skip)
+        self._escape: Optional[str] = None
+        self._high_surrogate: Optional[int] = None
+        self._expect_key = False
+        self._last_key: Optional[str] = None
+        self._value_next = False
+        self._key_chars: list[str] = []
+        self._out: list[str] = []
+
+    def feed(self, chunk: str) -> str:
+        if self.done:
+            return ""
+        for c in chunk:
+            if self._in_string:
+                self._string_char(c)
+                if self.done:
+                    break
+            elif c == '"':
+                self._in_string = True
+                if self._value_next:
+                    self._role = "value"
+                elif self._expect_key and self._depth == 1:
+                    self._role = "key"
+                    self._key_chars = []
+                else:
+                    self._role = None
+                self._value_next = False
+                self._expect_key = False
+            elif c in "{[":
+                self._depth += 1
+                self._expect_key = c == "{" and self._depth == 1
+                self._value_next = False
+            elif c in "}]":
+                self._depth -= 1
+            elif c == "," and self._depth == 1:
+                self._expect_key = True
+            elif c == ":" and self._depth == 1:
+                self._value_next = self._last_key == self.field
+                self._last_key = None
+            elif not c.isspace():
+                self._value_next = False  # null / number / bool value
+        text = "".join(self._out)
+        self._out.clear()
+        self.value += text
+        return text
+
+    def _string_char(self, c: str) -> None:
+        if self._escape is not None:
+            self._escape += c
+            if self._escape[0] == "u":
+                if len(self._escape) < 5:
+                    return
+                char = self._code_point(int(self._escape[1:], 16))
+            else:
+                char = _ESCAPES.get(c, c)
+            self._escape = None
+            if char:
+                self._append(char)
+        elif c == "\\":
+            self._escape = ""
+        elif c == '"':
+            self._in_string = False
+            if self._role == "key":
+                self._last_key = "".join(self._key_chars)
+            elif self._role == "value":
+                self.done = True
+        else:
+            self._append(c)
+
+    def _code_point(self, code: int) -> str:
+        if 0xD800 <= code < 0xDC00:
+            self._high_surrogate = code
+            return ""
+        if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+            code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+        self._high_surrogate = None
+        return chr(code)
+
+    def _append(self, char: str) -> None:
+        if self._role == "key":
+            self._key_chars.append(char)
+        elif self._role == "value":
+            self._out.append(char)
+
+
+class DeltaSender:
+    """
+    Sends {"type": "delta", "content": ...} messages over a WebSocket.
+
+    push() never waits on the socket, so the LLM stream (which holds a
+    scheduler slot) is consumed at model speed whatever the client's speed;
+    a single drain task sends everything pushed since its previous send.
+    Call flush() before sending the final message of the turn.
+    """
+
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self.messages_sent = 0
+        self._pending: list[str] = []
+        self._task: Optional[asyncio.Task] = None
+
+    async def push(self, text: str) -> None:
+        self._pending.append(text)
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._drain())
+
+    async def _drain(self) -> None:
+        while self._pending:
+            text = "".join(self._pending)
+            self._pending.clear()
+            await self.websocket.send_json({"type": "delta", "content": text})
+            self.messages_sent += 1
+
+    async def flush(self) -> None:
+        """Waits for pending deltas; re-raises a send error (e.g. the client disconnected)."""
+        task, self._task = self._task, None
+        if task is not None:
+            await task
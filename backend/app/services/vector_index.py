@@ -0,0 +1,57 @@
+"""
+Nearest-neighbour queries against pgvector columns.
+
+Vector lookups in Postgres come in two shapes:
+
+- Global: the nearest rows of a whole table. No query has this shape: sync
+  scenes come from the in-process scene index (app/core/scene_index.py) and
+  archetypes from the card index, so no table carries an HNSW index. One
+  would cost every insert into it: on scene_interactions, which gets a row
+  per logged sync answer, it made a single-row insert ~4x slower
+  (scripts/bench_vector_indexes.py). A table that gets a global query gets
+  its index in the same change.
+- Scoped: the nearest rows of one user (user_memory) or one portrait
+  (dsb_portrait_* layers). A scope holds tens to a few thousand rows, found
+  through the btree index on user_id / portrait_id, and ranking them exactly
+  takes a few milliseconds. An HNSW index would make these results
+  approximate: pgvector (0.6 here) applies the WHERE clause after an index
+  scan that yields only ef_search candidates, so rows of the scope outside
+  them are lost, and a scope that is a small share of the table can come
+  back with fewer than `limit` rows. nearest_in_scope() fences the scope
+  off in a MATERIALIZED CTE so that the ranking stays exact even if an
+  index is added later.
+
+scripts/bench_vector_indexes.py measures both shapes with and without HNSW.
+"""
+from typing import Sequence
+
+from sqlalchemy import Select, select
+
+
+def nearest_in_scope(
+    columns: Sequence,
+    embedding,
+    query_vector,
+    *,
+    scope: Sequence,
+    limit: int,
+) -> Select:
+    """
+    SELECT columns..., distance of the `limit` rows nearest to query_vector
+    (cosine distance, ascending) among the rows matching `scope`. The scope
+    is selected first (MATERIALIZED: the planner cannot push the ORDER BY
+    into a vector index scan) and ranked exactly; rows without an
+    embedding are skipped.
+    """
+    scoped = (
+        select(*columns, embedding.label("scope_embedding"))
+        .where(*scope, embedding.is_not(None))
+        .cte("scope")
+        .prefix_with("MATERIALIZED")
+    )
+    distance = scoped.c.scope_embedding.cosine_distance(query_vector)
+    return (
+        select(*[scoped.c[column.key] for column in columns], distance.label("distance"))
+        .order_by(distance)
+        .limit(limit)
+    )
@@ -0,0 +1,295 @@
+"""
+Background job worker (see app/services/jobs.py).
+
+Usage:
+  python -m app.worker [--processes N] [--slots 8] [--types dsb.generate_portrait,sync.post_process]
+
+Each process runs its own event loop and connection pool and executes up to
+--slots jobs at a time. It wakes on NOTIFY from enqueue() and also polls every
+JOB_POLL_INTERVAL seconds for delayed retries and expired leases. Jobs that
+finished since the last wake-up are marked done in the same transaction as
+the next claim, so a busy worker spends one round trip per batch. SIGTERM
+stops claiming, gives running jobs JOB_SHUTDOWN_GRACE seconds and returns the
+rest to the queue; the parent process restarts children that crash.
+"""
+import argparse
+import asyncio
+import importlib
+import logging
+import multiprocessing
+import os
+import secrets
+import signal
+import socket
+import time
+from datetime import timedelta
+from typing import Optional
+
+from sqlalchemy.ext.asyncio import AsyncEngine
+
+from app.config import settings
+from app.services import jobs
+from app.services.jobs import JOB_TYPES, ClaimedJob, JobType, PermanentJobError
+
+logger = logging.getLogger(__name__)
+
+# Modules whose import registers the job handlers
+HANDLER_MODULES = (
+    "app.dsb.pipeline.orchestrator",
+    "app.routers.session",
+    "app.routers.sync",
+)
+PURGE_INTERVAL = 600.0
+
+
+def load_handlers() -> None:
+    for module in HANDLER_MODULES:
+        importlib.import_module(module)
+
+
+class Worker:
+    """Claims and runs jobs in one event loop; `slots` bounds how many run at once."""
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        job_types: Optional[list[str]] = None,
+        slots: Optional[int] = None,
+        poll_interval: Optional[float] = None,
+    ):
+        self.engine = engine
+        self.types: list[JobType] = [JOB_TYPES[name] for name in job_types] if job_types else list(JOB_TYPES.values())
+        self.slots = slots or settings.JOB_WORKER_SLOTS
+        self.poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.worker_id = f"{socket.gethostname()[:40]}:{os.getpid()}:{secrets.token_hex(3)}"
+        self.running: dict[int, tuple[ClaimedJob, asyncio.Task]] = {}
+        self._finished: list[ClaimedJob] = []
+        self.stats = {"completed": 0, "retried": 0, "dead": 0, "lost": 0}
+        self._wake = asyncio.Event()
+        self._stopping = False
+        self._next_type = 0
+        self._last_purge = 0.0
+
+    def stop(self) -> None:
+        self._stopping = True
+        self._wake.set()
+
+    async def run(self) -> None:
+        names = {spec.name for spec in self.types}
+        listener = await self._listen(names)
+        heartbeat = asyncio.create_task(self._maintain())
+        logger.info(f"[Worker] {self.worker_id} started: {sorted(names)}, {self.slots} slots")
+        try:
+            while not self._stopping:
+                self._wake.clear()
+                try:
+                    await self._cycle()
+                except Exception as e:
+                    logger.error(f"[Worker] Claim failed: {e}")
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            heartbeat.cancel()
+            await self._drain()
+            try:
+                await self._cycle(claim=False)
+            except Exception as e:
+                logger.error(f"[Worker] Final completion report failed: {e}")
+            if listener is not None:
+                await listener.close()
+            logger.info(f"[Worker] {self.worker_id} stopped: {self.stats}")
+
+    async def _listen(self, names: set[str]):
+        """LISTEN on a dedicated connection; without it the worker still polls."""
+        def on_notify(_connection, _pid, _channel, payload):
+            if not payload or payload in names:
+                self._wake.set()
+
+        try:
+            connection = await self.engine.connect()
+            raw = await connection.get_raw_connection()
+            await raw.driver_connection.add_listener(jobs.NOTIFY_CHANNEL, on_notify)
+            return connection
+        except Exception as e:
+            logger.warning(f"[Worker] LISTEN unavailable, polling every {self.poll_interval}s: {e}")
+            return None
+
+    async def _cycle(self, claim: bool = True) -> None:
+        """
+        One transaction per wake-up: jobs finished since the last one are
+        marked done together, then free slots are filled. Handlers start
+        only after the claim is committed.
+        """
+        finished, self._finished = self._finished, []
+        free = self.slots - len(self.running) if claim else 0
+        if not finished and free <= 0:
+            return
+
+        done = 0
+        claimed: list[tuple[JobType, ClaimedJob]] = []
+        try:
+            async with self.engine.begin() as conn:
+                if finished:
+                    done = await jobs.complete(conn, finished)
+                if free > 0:
+                    claimed = await self._claim(conn, free)
+        except Exception:
+            self._finished = finished + self._finished  # reported with the next cycle
+            raise
+
+        self.stats["completed"] += done
+        self.stats["lost"] += len(finished) - done
+        for spec, job in claimed:
+            self.running[job.id] = (job, asyncio.create_task(self._execute(spec, job)))
+
+    async def _claim(self, conn, free: int) -> list[tuple[JobType, ClaimedJob]]:
+        # Types are tried round-robin so a deep queue of one type does not starve the others
+        claimed = []
+        for offset in range(len(self.types)):
+            if free <= 0:
+                break
+            spec = self.types[(self._next_type + offset) % len(self.types)]
+            batch = await jobs.claim(conn, spec, self.worker_id, free)
+            claimed.extend((spec, job) for job in batch)
+            free -= len(batch)
+        self._next_type = (self._next_type + 1) % max(len(self.types), 1)
+        return claimed
+
+    async def _execute(self, spec: JobType, job: ClaimedJob) -> None:
+        started = time.perf_counter()
+        try:
+            await spec.handler(**job.payload)
+        except asyncio.CancelledError:
+            if self._stopping:
+                await self._report(jobs.release, job)
+            raise  # otherwise the lease was lost: the job already belongs to another worker
+        except Exception as e:
+            retry = not isinstance(e, PermanentJobError)
+            logger.exception(f"[Worker] {job.job_type} #{job.id} failed (attempt {job.attempts}/{job.max_attempts}): {e}")
+            status = await self._report(jobs.fail, job, f"{type(e).__name__}: {e}", retry=retry)
+            self.stats["retried" if status == "queued" else "dead" if status == "dead" else "lost"] += 1
+        else:
+            self._finished.append(job)
+            logger.info(f"[Worker] {job.job_type} #{job.id} done in {time.perf_counter() - started:.1f}s")
+        finally:
+            self.running.pop(job.id, None)
+            self._wake.set()
+
+    async def _report(self, update, job: ClaimedJob, *args, **kwargs):
+        # If this write fails the lease simply expires and the job is retried
+        try:
+            async with self.engine.begin() as conn:
+                return await update(conn, job, *args, **kwargs)
+        except Exception as e:
+            logger.error(f"[Worker] Could not record outcome of {job.job_type} #{job.id}: {e}")
+            return None
+
+    async def _maintain(self) -> None:
+        """Lease heartbeats for running jobs, dead-lettering of expired ones, purge of old done jobs."""
+        interval = min([spec.visibility_timeout for spec in self.types] or [30.0]) / 3
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await self._heartbeat()
+                async with self.engine.begin() as conn:
+                    reaped = await jobs.reap_expired(conn)
+                    if time.monotonic() - self._last_purge > PURGE_INTERVAL:
+                        self._last_purge = time.monotonic()
+                        await jobs.purge_finished(conn, timedelta(hours=settings.JOB_RETENTION_HOURS))
+                if reaped:
+                    logger.warning(f"[Worker] {reaped} jobs dead after their last lease expired")
+            except Exception as e:
+                logger.error(f"[Worker] Maintenance failed: {e}")
+
+    async def _heartbeat(self) -> None:
+        by_type: dict[str, list[int]] = {}
+        for job, _ in self.running.values():
+            by_type.setdefault(job.job_type, []).append(job.id)
+        for job_type, ids in by_type.items():
+            async with self.engine.begin() as conn:
+                held = await jobs.heartbeat(conn, self.worker_id, ids, JOB_TYPES[job_type].visibility_timeout)
+            for job_id in set(ids) - held:
+                entry = self.running.get(job_id)
+                if entry:
+                    logger.warning(f"[Worker] Lease of {job_type} #{job_id} lost, cancelling")
+                    entry[1].cancel()
+
+    async def _drain(self) -> None:
+        tasks = [task for _, task in self.running.values()]
+        if not tasks:
+            return
+        _, pending = await asyncio.wait(tasks, timeout=settings.JOB_SHUTDOWN_GRACE)
+        for task in pending:
+            task.cancel()
+        await asyncio.gather(*pending, return_exceptions=True)
+
+
+async def _serve(job_types: Optional[list[str]], slots: Optional[int]) -> None:
+    from app.database import engine
+
+    load_handlers()
+    worker = Worker(engine, job_types, slots)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, worker.stop)
+    try:
+        await worker.run()
+    finally:
+        await engine.dispose()
+
+
+def _process_main(job_types: Optional[list[str]], slots: Optional[int]) -> None:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(processName)s %(name)s %(levelname)s %(message)s")
+    asyncio.run(_serve(job_types, slots))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--processes", type=int, default=settings.JOB_WORKER_PROCESSES)
+    parser.add_argument("--slots", type=int, default=None)
+    parser.add_argument("--types", default=None, help="comma-separated job types (default: all)")
+    args = parser.parse_args()
+    job_types = args.types.split(",") if args.types else None
+    # Every process builds its own LLM scheduler, sized for the process count
+    # actually started (llm_scheduler.process_share); spawned children read it
+    # from the environment
+    settings.JOB_WORKER_PROCESSES = max(args.processes, 1)
+    os.environ["JOB_WORKER_PROCESSES"] = str(settings.JOB_WORKER_PROCESSES)
+
+    if args.processes <= 1:
+        _process_main(job_types, args.slots)
+        return
+
+    # spawn: every child builds its own engine and event loop
+    context = multiprocessing.get_context("spawn")
+    stopping = False
+
+    def start(index: int):
+        process = context.Process(target=_process_main, args=(job_types, args.slots), name=f"worker-{index}")
+        process.start()
+        return process
+
+    def terminate(*_):
+        nonlocal stopping
+        stopping = True
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+
+    processes = [start(i) for i in range(args.processes)]
+    signal.signal(signal.SIGTERM, terminate)
+    signal.signal(signal.SIGINT, terminate)
+    while not stopping:
+        for i, process in enumerate(processes):
+            process.join(timeout=1.0)
+            if process.exitcode is not None and not stopping:
+                logger.error(f"{process.name} exited with {process.exitcode}, restarting")
+                processes[i] = start(i)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,33 @@
+"""add dsb_calculator_cache table
+
+Revision ID: b3f1c7a2d9e4
+Revises: 76499bd5a45e
+Create Date: 2026-10-16 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'b3f1c7a2d9e4'
+down_revision: Union[str, None] = '76499bd5a45e'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('dsb_calculator_cache',
+        sa.Column('cache_key', sa.String(length=64), nullable=False),
+        sa.Column('system_name', sa.String(length=64), nullable=False),
+        sa.Column('calculator_version', sa.String(length=32), nullable=False),
+        sa.Column('result', sa.dialects.postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.PrimaryKeyConstraint('cache_key')
+    )
+    op.create_index(op.f('ix_dsb_calculator_cache_system_name'), 'dsb_calculator_cache', ['system_name'], unique=False)
+
+
+def downgrade() -> None:
+    op.execute(f'DROP INDEX IF EXISTS {op.f("ix_dsb_calculator_cache_system_name")}')
+    op.execute("DROP TABLE IF EXISTS dsb_calculator_cache CASCADE")
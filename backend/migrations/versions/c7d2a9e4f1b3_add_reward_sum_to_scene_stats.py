@@ -0,0 +1,35 @@
+"""add reward_sum to scene_stats
+
+Sum of the per-answer rewards of a scene, the bandit posterior of scene
+selection (app/core/scene_index.py) together with times_shown. Existing rows
+start from their rolling diagnostic_power_score.
+
+Revision ID: c7d2a9e4f1b3
+Revises: a4c9e2b7d315
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'c7d2a9e4f1b3'
+down_revision: Union[str, None] = 'a4c9e2b7d315'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # scene_stats belongs to the pre-alembic schema and may be missing on fresh databases
+    if op.get_bind().exec_driver_sql("SELECT to_regclass('public.scene_stats')").scalar() is None:
+        return
+    op.add_column('scene_stats', sa.Column('reward_sum', sa.Float(), server_default=sa.text('0'), nullable=True))
+    op.execute(
+        "UPDATE scene_stats SET reward_sum = "
+        "LEAST(COALESCE(diagnostic_power_score, 0), 1) * COALESCE(times_shown, 0)"
+    )
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE scene_stats DROP COLUMN IF EXISTS reward_sum")
@@ -0,0 +1,39 @@
+"""add dsb_portrait_checkpoints table
+
+Revision ID: c8e2d4f61a07
+Revises: b3f1c7a2d9e4
+Create Date: 2026-10-17 10:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'c8e2d4f61a07'
+down_revision: Union[str, None] = 'b3f1c7a2d9e4'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('dsb_portrait_checkpoints',
+        sa.Column('id', sa.dialects.postgresql.UUID(as_uuid=False), nullable=False),
+        sa.Column('portrait_id', sa.dialects.postgresql.UUID(as_uuid=False), nullable=False),
+        sa.Column('layer', sa.String(length=32), nullable=False),
+        sa.Column('unit', sa.String(length=64), nullable=False),
+        sa.Column('status', sa.String(length=16), nullable=False),
+        sa.Column('input_hash', sa.String(length=64), nullable=False),
+        sa.Column('payload', sa.dialects.postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+        sa.Column('error', sa.Text(), nullable=True),
+        sa.Column('updated_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['portrait_id'], ['dsb_digital_portraits.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('id'),
+        sa.UniqueConstraint('portrait_id', 'layer', 'unit', name='uq_dsb_checkpoint_unit')
+    )
+    op.create_index(op.f('ix_dsb_portrait_checkpoints_portrait_id'), 'dsb_portrait_checkpoints', ['portrait_id'], unique=False)
+
+
+def downgrade() -> None:
+    op.execute(f'DROP INDEX IF EXISTS {op.f("ix_dsb_portrait_checkpoints_portrait_id")}')
+    op.execute("DROP TABLE IF EXISTS dsb_portrait_checkpoints CASCADE")
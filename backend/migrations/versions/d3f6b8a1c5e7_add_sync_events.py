@@ -0,0 +1,39 @@
+"""add sync_events table and sync_sessions.event_seq
+
+Sync phases append their transcript turns and state changes to sync_events
+instead of rewriting session_transcript / phase_data; event_seq is the last
+appended seq of a session (app/core/sync_log.py).
+
+Revision ID: d3f6b8a1c5e7
+Revises: c7d2a9e4f1b3
+Create Date: 2026-10-18 12:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = 'd3f6b8a1c5e7'
+down_revision: Union[str, None] = 'c7d2a9e4f1b3'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('sync_sessions', sa.Column('event_seq', sa.Integer(), server_default='0', nullable=False))
+    op.create_table('sync_events',
+        sa.Column('session_id', sa.Integer(), nullable=False),
+        sa.Column('seq', sa.Integer(), nullable=False),
+        sa.Column('kind', sa.String(length=16), nullable=False),
+        sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.ForeignKeyConstraint(['session_id'], ['sync_sessions.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('session_id', 'seq')
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS sync_events CASCADE")
+    op.execute("ALTER TABLE sync_sessions DROP COLUMN IF EXISTS event_seq")
@@ -0,0 +1,32 @@
+"""add dsb_portrait_documents table
+
+Revision ID: d4a9e1b7c352
+Revises: c8e2d4f61a07
+Create Date: 2026-10-17 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+
+
+revision: str = 'd4a9e1b7c352'
+down_revision: Union[str, None] = 'c8e2d4f61a07'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('dsb_portrait_documents',
+        sa.Column('portrait_id', sa.dialects.postgresql.UUID(as_uuid=False), nullable=False),
+        sa.Column('etag', sa.String(length=64), nullable=False),
+        sa.Column('body', sa.LargeBinary(), nullable=False),
+        sa.Column('raw_size', sa.Integer(), nullable=False),
+        sa.Column('created_at', sa.DateTime(timezone=True), nullable=False),
+        sa.ForeignKeyConstraint(['portrait_id'], ['dsb_digital_portraits.id'], ondelete='CASCADE'),
+        sa.PrimaryKeyConstraint('portrait_id')
+    )
+
+
+def downgrade() -> None:
+    op.execute("DROP TABLE IF EXISTS dsb_portrait_documents CASCADE")
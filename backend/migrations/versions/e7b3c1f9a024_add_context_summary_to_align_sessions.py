@@ -0,0 +1,27 @@
+"""add context_summary to align_sessions
+
+Revision ID: e7b3c1f9a024
+Revises: d4a9e1b7c352
+Create Date: 2026-10-17 16:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = 'e7b3c1f9a024'
+down_revision: Union[str, None] = 'd4a9e1b7c352'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Filled lazily: the next alignment session of the card summarizes rows without it
+    op.add_column('align_sessions', sa.Column('context_summary', sa.Text(), nullable=True))
+
+
+def downgrade() -> None:
+    op.execute("ALTER TABLE IF EXISTS align_sessions DROP COLUMN IF EXISTS context_summary")
@@ -0,0 +1,110 @@
+"""incremental post-sync analytics
+
+sync_sessions.analyzed_at marks completed sessions folded into the user's
+aggregates; user_portrait keeps the running aggregates they are folded into;
+patterns gets one row per (user_id, tag) for batched upserts
+(app/core/sync_analytics.py).
+
+Completed sessions count as analyzed when their portrait exists and neither a
+sync.post_process nor a sync.log_interaction job is still pending for them;
+the others are folded in by the next analytics run of their user. Features
+computed while answers of a session were still being logged are dropped, so
+that run computes them from all of its interactions.
+
+Revision ID: e8a4c2f7b9d1
+Revises: d3f6b8a1c5e7
+Create Date: 2026-10-18 14:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = 'e8a4c2f7b9d1'
+down_revision: Union[str, None] = 'd3f6b8a1c5e7'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.add_column('sync_sessions', sa.Column('analyzed_at', sa.DateTime(timezone=True), nullable=True))
+    op.add_column('user_portrait', sa.Column('sessions_count', sa.Integer(), server_default='0', nullable=True))
+    op.add_column('user_portrait', sa.Column('hawkins_sum', sa.Integer(), server_default='0', nullable=True))
+    op.add_column('user_portrait', sa.Column('hawkins_count', sa.Integer(), server_default='0', nullable=True))
+    op.add_column('user_portrait', sa.Column('tag_counts', postgresql.JSONB(astext_type=sa.Text()), nullable=True))
+
+    op.execute("""
+        UPDATE sync_sessions s SET analyzed_at = now()
+        WHERE s.is_complete
+          AND EXISTS (SELECT 1 FROM user_portrait p WHERE p.user_id = s.user_id AND p.sphere = s.sphere)
+          AND NOT EXISTS (
+              SELECT 1 FROM background_jobs j
+              WHERE j.job_type IN ('sync.post_process', 'sync.log_interaction')
+                AND j.status IN ('queued', 'running')
+                AND (j.payload->>'session_id')::int = s.id
+          )
+    """)
+    op.execute("""
+        DELETE FROM session_features f
+        WHERE EXISTS (
+            SELECT 1 FROM background_jobs j
+            WHERE j.job_type = 'sync.log_interaction' AND j.status IN ('queued', 'running')
+              AND (j.payload->>'session_id')::int = f.session_id
+        )
+    """)
+    op.execute("""
+        UPDATE user_portrait p SET
+            sessions_count = a.sessions, hawkins_sum = a.hawkins_sum, hawkins_count = a.hawkins_count
+        FROM (
+            SELECT user_id, sphere, count(*) AS sessions, COALESCE(sum(hawkins_score), 0) AS hawkins_sum,
+                   count(*) FILTER (WHERE hawkins_score <> 0) AS hawkins_count
+            FROM sync_sessions WHERE analyzed_at IS NOT NULL
+            GROUP BY user_id, sphere
+        ) a
+        WHERE p.user_id = a.user_id AND p.sphere = a.sphere
+    """)
+    op.execute("""
+        UPDATE user_portrait p SET tag_counts = t.counts
+        FROM (
+            SELECT user_id, sphere, jsonb_object_agg(tag, n) AS counts
+            FROM (
+                SELECT s.user_id, s.sphere, tag, count(*) AS n
+                FROM sync_sessions s, jsonb_array_elements_text(s.extracted_tags) AS tag
+                WHERE s.analyzed_at IS NOT NULL AND jsonb_typeof(s.extracted_tags) = 'array'
+                GROUP BY 1, 2, 3
+            ) c
+            GROUP BY user_id, sphere
+        ) t
+        WHERE p.user_id = t.user_id AND p.sphere = t.sphere
+    """)
+    op.create_index(
+        'ix_sync_sessions_pending_analytics', 'sync_sessions', ['user_id'],
+        postgresql_where=sa.text('is_complete AND analyzed_at IS NULL'),
+    )
+
+    # Duplicate tags of a user are merged into their oldest row
+    op.execute("""
+        UPDATE patterns p SET occurrences = d.occurrences, strength = LEAST(d.occurrences, 10)
+        FROM (
+            SELECT min(id) AS id, sum(COALESCE(occurrences, 1)) AS occurrences
+            FROM patterns GROUP BY user_id, tag HAVING count(*) > 1
+        ) d
+        WHERE p.id = d.id
+    """)
+    op.execute("""
+        DELETE FROM patterns p USING patterns q
+        WHERE p.user_id = q.user_id AND p.tag = q.tag AND p.id > q.id
+    """)
+    op.create_index('uq_patterns_user_tag', 'patterns', ['user_id', 'tag'], unique=True)
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS uq_patterns_user_tag")
+    op.execute("DROP INDEX IF EXISTS ix_sync_sessions_pending_analytics")
+    op.execute("ALTER TABLE user_portrait DROP COLUMN IF EXISTS tag_counts")
+    op.execute("ALTER TABLE user_portrait DROP COLUMN IF EXISTS hawkins_count")
+    op.execute("ALTER TABLE user_portrait DROP COLUMN IF EXISTS hawkins_sum")
+    op.execute("ALTER TABLE user_portrait DROP COLUMN IF EXISTS sessions_count")
+    op.execute("ALTER TABLE sync_sessions DROP COLUMN IF EXISTS analyzed_at")
@@ -0,0 +1,46 @@
+"""add background_jobs table
+
+Revision ID: f3a8d2c6b1e5
+Revises: e7b3c1f9a024
+Create Date: 2026-10-17 18:00:00.000000
+
+"""
+from typing import Sequence, Union
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+revision: str = 'f3a8d2c6b1e5'
+down_revision: Union[str, None] = 'e7b3c1f9a024'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('background_jobs',
+        sa.Column('id', sa.BigInteger(), autoincrement=True, nullable=False),
+        sa.Column('job_type', sa.String(length=64), nullable=False),
+        sa.Column('payload', postgresql.JSONB(astext_type=sa.Text()), nullable=False),
+        sa.Column('status', sa.String(length=16), server_default='queued', nullable=False),
+        sa.Column('priority', sa.SmallInteger(), server_default='0', nullable=False),
+        sa.Column('attempts', sa.SmallInteger(), server_default='0', nullable=False),
+        sa.Column('max_attempts', sa.SmallInteger(), nullable=False),
+        sa.Column('available_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=False),
+        sa.Column('locked_by', sa.String(length=64), nullable=True),
+        sa.Column('last_error', sa.Text(), nullable=True),
+        sa.Column('created_at', sa.DateTime(timezone=True), server_default=sa.text('now()'), nullable=True),
+        sa.Column('started_at', sa.DateTime(timezone=True), nullable=True),
+        sa.Column('finished_at', sa.DateTime(timezone=True), nullable=True),
+        sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_background_jobs_claim', 'background_jobs', ['job_type', 'priority', 'available_at'],
+                    unique=False, postgresql_where=sa.text("status IN ('queued', 'running')"))
+    op.create_index('ix_background_jobs_finished', 'background_jobs', ['finished_at'],
+                    unique=False, postgresql_where=sa.text("status = 'done'"))
+
+
+def downgrade() -> None:
+    op.execute("DROP INDEX IF EXISTS ix_background_jobs_finished")
+    op.execute("DROP INDEX IF EXISTS ix_background_jobs_claim")
+    op.execute("DROP TABLE IF EXISTS background_jobs CASCADE")
@@ -0,0 +1,217 @@
+"""
+Benchmark: alignment prompt size and turn latency for a user with a long
+history of the same card (the last sync + --history completed alignments).
+
+Usage:
+  python scripts/bench_align_context.py [--database-url postgresql+asyncpg://...]
+      [--history 20] [--turns 6] [--prefill-ms-per-1k 40]
+
+To compare with an older tree, put its backend first on PYTHONPATH:
+  PYTHONPATH=/path/to/old/backend python scripts/bench_align_context.py
+
+The recorded history is synthetic but sized like real sessions (10-14
+messages each, replies of 2-4 sentences). The provider is a local
+OpenAI-compatible server that counts prompt tokens (~3 chars per token, as
+in app/agents/align_context.py) and answers after 300 ms plus
+--prefill-ms-per-1k per 1000 prompt tokens. Two sessions run back to back:
+the first pays the one-time summaries of the earlier alignments, the second
+reads them from the rows. Tables live in a scratch schema that is dropped
+afterwards.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import websockets
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+from openai import AsyncOpenAI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.agents import align_agent, assistant_agent
+from app.config import settings
+from app.database import Base
+from app.models import AlignSession, CardProgress, DiaryEntry, SyncSession, User
+from app.routers import session as session_routes
+from app.services.llm_scheduler import LLMScheduler, ModelBudget, ScheduledOpenAI
+
+from bench_align_streaming import serve
+
+SCHEMA = "bench_align_context"
+TABLES = [User.__table__, CardProgress.__table__, SyncSession.__table__, AlignSession.__table__, DiaryEntry.__table__]
+USER_LINES = [
+    "Чувствую тяжесть в груди, как будто что-то давит изнутри, когда думаю о разговоре с отцом.",
+    "Да, в горле ком, хочется сглотнуть. Это похоже на то, как в детстве я молчал, чтобы не ссориться.",
+    "Если честно, молчание защищает меня от его разочарования. Я боюсь, что он скажет, что я не справился.",
+    "Когда я дышу в это место, становится теплее, плечи опускаются. Появляется немного пространства.",
+    "Я вижу себя за столом, говорю спокойно и не оправдываюсь. Голос ровный, руки лежат свободно.",
+    "На этой неделе я позвоню ему в среду и скажу одну фразу о том, что мне важно, без извинений.",
+]
+AI_LINE = ("Побудь с этим ощущением ещё немного и позволь ему быть, не меняя его. Дыши медленно, направляя "
+           "выдох туда, где тяжелее всего. Что происходит с телом, когда ты просто замечаешь это давление?")
+
+
+def reply(content: str) -> str:
+    # Never "sufficient": every stage takes two turns, the session runs ~5 turns
+    return json.dumps({"ai_response": content, "is_depth_sufficient": False, "hawkins_score_estimation": 210,
+                       "final_insight": "Я имею право говорить о своём", "integration_plan": "Позвонить в среду"},
+                      ensure_ascii=False)
+
+
+def provider_app(stats: dict, prefill_ms_per_1k: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        prompt_tokens = sum(len(m.get("content") or "") for m in body["messages"]) // 3
+        kind = "turn" if body.get("response_format") else "summary"
+        stats[kind].append(prompt_tokens)
+        await asyncio.sleep(0.3 + prefill_ms_per_1k * prompt_tokens / 1000 / 1000)
+        content = reply(AI_LINE) if kind == "turn" else (
+            "Работали с тяжестью в груди и комом в горле при мысли о разговоре с отцом: молчание защищало "
+            "от его разочарования. Через дыхание пришло тепло и опора; микро-действие — позвонить в среду."
+        )
+        return JSONResponse({
+            "id": "c", "object": "chat.completion", "created": int(time.time()), "model": body["model"],
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": 100, "total_tokens": prompt_tokens + 100},
+        })
+
+    return app
+
+
+def recorded_history(user_id: int, card_id: int, sessions: int) -> list:
+    rows = []
+    started = datetime.now(timezone.utc) - timedelta(days=sessions + 1)
+    rows.append(SyncSession(
+        user_id=user_id, card_progress_id=card_id, archetype_id=1, sphere="IDENTITY", is_complete=True,
+        hawkins_score=150, hawkins_level="Страх", extracted_core_belief="Меня не услышат",
+        extracted_shadow_pattern="Молчание вместо конфликта", created_at=started,
+        session_transcript=[{"role": r, "content": USER_LINES[i % 6] if r == "user" else AI_LINE}
+                            for i, r in enumerate(["assistant", "user"] * 8)],
+    ))
+    for n in range(sessions):
+        messages = [{"role": "assistant", "content": AI_LINE}]
+        for i in range(random.randint(5, 7)):
+            messages += [{"role": "user", "content": USER_LINES[i % 6]}, {"role": "assistant", "content": AI_LINE}]
+        rows.append(AlignSession(
+            user_id=user_id, card_progress_id=card_id, archetype_id=1, sphere="IDENTITY", is_complete=True,
+            hawkins_entry=150 + n, hawkins_min=140, hawkins_peak=220 + n, hawkins_exit=210, stages_completed=3,
+            messages_json=messages, new_belief="Я имею право говорить о своём", integration_plan="Позвонить в среду",
+            created_at=started + timedelta(days=n + 1),
+        ))
+    return rows
+
+
+async def run_session(url: str, turns: int, stats: dict) -> dict:
+    stats["turn"].clear()
+    stats["summary"].clear()
+    latencies = []
+    started = time.perf_counter()
+    async with websockets.connect(url) as ws:
+        await ws.recv()  # opening
+        opening = time.perf_counter() - started
+        for turn in range(turns):
+            started = time.perf_counter()
+            await ws.send(json.dumps({"type": "message", "content": USER_LINES[turn % 6]}))
+            while True:
+                message = json.loads(await ws.recv())
+                if message["type"] == "response":
+                    break
+            latencies.append(time.perf_counter() - started)
+            if message["is_complete"]:
+                break
+        await ws.send(json.dumps({"type": "close"}))
+    await asyncio.sleep(1.5)  # final save (and the closing summary) run after the socket closes
+    return {"opening": opening, "latencies": latencies, "turn_tokens": list(stats["turn"]),
+            "summaries": list(stats["summary"])}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--history", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--prefill-ms-per-1k", type=float, default=40.0)
+    args = parser.parse_args()
+    random.seed(7)
+
+    engine = create_async_engine(args.database_url, connect_args={"server_settings": {"search_path": f"{SCHEMA},public"}})
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.run_sync(Base.metadata.create_all, tables=TABLES)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def no_memory(*_args, **_kwargs) -> str:
+        return ""
+
+    session_routes.AsyncSessionLocal = sessions
+    assistant_agent.search_user_memory = no_memory  # embeddings are out of scope here
+
+    stats = {"turn": [], "summary": []}
+    provider, provider_port = await serve(provider_app(stats, args.prefill_ms_per_1k))
+    scheduled = ScheduledOpenAI(
+        AsyncOpenAI(base_url=f"http://127.0.0.1:{provider_port}/v1", api_key="bench"),
+        LLMScheduler(ModelBudget(64, 100_000, 100_000_000)),
+    )
+    align_agent.client = scheduled
+    history_tokens = []
+    original_message = session_routes.alignment_session_message
+
+    async def recording_message(**kwargs):
+        history_tokens.append(len(kwargs.get("history_context") or "") // 3)
+        return await original_message(**kwargs)
+
+    session_routes.alignment_session_message = recording_message
+    try:
+        from app.agents import align_context
+        align_context.client = scheduled
+    except ImportError:
+        pass
+    api = FastAPI()
+    api.include_router(session_routes.router, prefix="/api/session")
+    backend, backend_port = await serve(api)
+
+    try:
+        async with sessions() as db:
+            user = User(tg_id=20_000, is_premium=True)
+            db.add(user)
+            await db.flush()
+            card = CardProgress(user_id=user.id, archetype_id=1, sphere="IDENTITY", hawkins_current=150)
+            db.add(card)
+            await db.flush()
+            db.add_all(recorded_history(user.id, card.id, args.history))
+            await db.commit()
+            url = f"ws://127.0.0.1:{backend_port}/api/session/{user.id}/{card.id}"
+
+        print(f"Card with 1 sync + {args.history} alignments, session of up to {args.turns} turns")
+        for name in ("first session", "next session"):
+            history_tokens.clear()
+            r = await run_session(url, args.turns, stats)
+            tokens = r["turn_tokens"]
+            print(f"{name:>14}: prompt tokens per turn {tokens}")
+            print(f"{'':>14}  mean {sum(tokens) / len(tokens):.0f} tokens, opening {r['opening'] * 1000:.0f} ms, "
+                  f"turn p50 {sorted(r['latencies'])[len(r['latencies']) // 2] * 1000:.0f} ms, "
+                  f"summary calls {len(r['summaries'])}, history context built {history_tokens[0]} tokens")
+    finally:
+        for server in (backend, provider):
+            server.should_exit = True
+            await server.task
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,191 @@
+"""
+Benchmark: alignment WebSocket turn latency — time until the user sees the
+first text vs time until the full reply, with and without ?stream=true.
+
+Usage:
+  python scripts/bench_align_streaming.py [--database-url postgresql+asyncpg://...]
+      [--sessions 20] [--turns 4] [--ttft 0.4] [--token-interval 0.02]
+
+The provider is simulated by a local OpenAI-compatible server (uvicorn):
+the first token arrives after --ttft seconds, then one ~4-char token every
+--token-interval seconds; a non-streamed request answers when the last
+token would have been generated. The session router runs under uvicorn
+too and is driven by real WebSocket clients (--sessions concurrently), so
+the numbers include the scheduler, JSON field extraction and socket I/O.
+Tables live in a scratch schema that is dropped afterwards.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+import uvicorn
+import websockets
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from openai import AsyncOpenAI
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.agents import align_agent, assistant_agent
+from app.config import settings
+from app.database import Base
+from app.models import AlignSession, CardProgress, DiaryEntry, SyncSession, User
+from app.routers import session as session_routes
+from app.services.llm_scheduler import LLMScheduler, ModelBudget, ScheduledOpenAI
+
+SCHEMA = "bench_align_streaming"
+TABLES = [User.__table__, CardProgress.__table__, SyncSession.__table__, AlignSession.__table__, DiaryEntry.__table__]
+REPLY = json.dumps({
+    "ai_response": "Дыши медленно и мягко. Заметь, где в теле сейчас живёт это напряжение — в груди, "
+                   "в горле или в животе? Просто побудь с ним, не пытаясь изменить. Что оно хочет тебе сказать?",
+    "is_depth_sufficient": False,
+    "hawkins_score_estimation": 175,
+    "final_insight": None,
+    "integration_plan": None,
+}, ensure_ascii=False)
+TOKENS = [REPLY[i:i + 4] for i in range(0, len(REPLY), 4)]
+
+
+def provider_app(ttft: float, interval: float) -> FastAPI:
+    app = FastAPI()
+
+    @app.post("/v1/chat/completions")
+    async def completions(request: Request):
+        body = await request.json()
+        created = int(time.time())
+        if not body.get("stream"):
+            await asyncio.sleep(ttft + interval * len(TOKENS))
+            return JSONResponse({
+                "id": "c", "object": "chat.completion", "created": created, "model": body["model"],
+                "choices": [{"index": 0, "finish_reason": "stop",
+                             "message": {"role": "assistant", "content": REPLY}}],
+                "usage": {"prompt_tokens": 900, "completion_tokens": len(TOKENS), "total_tokens": 900 + len(TOKENS)},
+            })
+
+        async def events():
+            await asyncio.sleep(ttft)
+            for token in TOKENS:
+                chunk = {"id": "c", "object": "chat.completion.chunk", "created": created, "model": body["model"],
+                         "choices": [{"index": 0, "delta": {"content": token}, "finish_reason": None}]}
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                await asyncio.sleep(interval)
+            usage = {"id": "c", "object": "chat.completion.chunk", "created": created, "model": body["model"],
+                     "choices": [], "usage": {"prompt_tokens": 900, "completion_tokens": len(TOKENS),
+                                              "total_tokens": 900 + len(TOKENS)}}
+            yield f"data: {json.dumps(usage)}\n\ndata: [DONE]\n\n"
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+
+async def serve(app: FastAPI) -> tuple[uvicorn.Server, int]:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning", lifespan="off"))
+    task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    server.task = task
+    return server, server.servers[0].sockets[0].getsockname()[1]
+
+
+async def session(url: str, turns: int) -> tuple[list[float], list[float]]:
+    """→ (time to first text, time to full reply) per turn, the opening included."""
+    first, full = [], []
+    async with websockets.connect(url) as ws:
+        for turn in range(turns + 1):
+            started = time.perf_counter()
+            if turn:
+                await ws.send(json.dumps({"type": "message", "content": f"Я чувствую тяжесть в груди ({turn})"}))
+            seen_first = None
+            while True:
+                message = json.loads(await ws.recv())
+                if seen_first is None:
+                    seen_first = time.perf_counter() - started
+                if message["type"] != "delta":
+                    assert message["type"] in ("opening", "response"), message
+                    break
+            first.append(seen_first)
+            full.append(time.perf_counter() - started)
+        await ws.send(json.dumps({"type": "close"}))
+    return first, full
+
+
+def ms(values: list[float], q: float) -> str:
+    values = sorted(values)
+    return f"{values[min(len(values) - 1, int(q * len(values)))] * 1000:5.0f}"
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--turns", type=int, default=4)
+    parser.add_argument("--ttft", type=float, default=0.4)
+    parser.add_argument("--token-interval", type=float, default=0.02)
+    args = parser.parse_args()
+
+    engine = create_async_engine(args.database_url, connect_args={"server_settings": {"search_path": f"{SCHEMA},public"}})
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.run_sync(Base.metadata.create_all, tables=TABLES)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def no_memory(*_args, **_kwargs) -> str:
+        return ""
+
+    session_routes.AsyncSessionLocal = sessions
+    assistant_agent.search_user_memory = no_memory  # embeddings are out of scope here
+
+    provider, provider_port = await serve(provider_app(args.ttft, args.token_interval))
+    align_agent.client = ScheduledOpenAI(
+        AsyncOpenAI(base_url=f"http://127.0.0.1:{provider_port}/v1", api_key="bench"),
+        LLMScheduler(ModelBudget(64, 100_000, 100_000_000)),
+    )
+    api = FastAPI()
+    api.include_router(session_routes.router, prefix="/api/session")
+    backend, backend_port = await serve(api)
+
+    try:
+        async with sessions() as db:
+            cards = []
+            for i in range(args.sessions):
+                user = User(tg_id=10_000 + i, is_premium=True)
+                db.add(user)
+                await db.flush()
+                card = CardProgress(user_id=user.id, archetype_id=1, sphere="IDENTITY", hawkins_current=150)
+                db.add(card)
+                await db.flush()
+                cards.append((user.id, card.id))
+            await db.commit()
+
+        print(f"{args.sessions} concurrent sessions x {args.turns + 1} turns, "
+              f"provider TTFT {args.ttft * 1000:.0f} ms + {len(TOKENS)} tokens x {args.token_interval * 1000:.0f} ms")
+        for name, query in (("full response", ""), ("stream=true", "?stream=true")):
+            results = await asyncio.gather(*[
+                session(f"ws://127.0.0.1:{backend_port}/api/session/{user_id}/{card_id}{query}", args.turns)
+                for user_id, card_id in cards
+            ])
+            first = [v for f, _ in results for v in f]
+            full = [v for _, f in results for v in f]
+            print(f"{name:>14}: first text p50 {ms(first, 0.5)} ms  p95 {ms(first, 0.95)} ms | "
+                  f"full reply p50 {ms(full, 0.5)} ms  p95 {ms(full, 0.95)} ms  "
+                  f"(mean first {statistics.mean(first) * 1000:.0f} ms)")
+    finally:
+        for server in (backend, provider):
+            server.should_exit = True
+            await server.task
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,95 @@
+"""
+Benchmark: recall@k and latency of archetype matching through the card index
+(app/core/astrology/card_index.py) against a brute-force baseline.
+
+Usage:
+  python scripts/bench_archetype_matching.py [--queries 500] [--k 5]
+
+Cards are synthetic but shaped like avatar_cards: 22 archetypes x 12
+spheres, each 1536-dim vector = archetype direction + sphere direction +
+noise, so cards of one archetype are close to each other across spheres.
+Queries are noisy mixtures of two cards. The baseline scores every card in
+float64 and sorts them all, one query at a time. Reported per mode:
+latency per query, recall@k against the baseline's top k (same filter),
+and how many distinct archetypes the top k holds.
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+import numpy as np
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.astrology.card_index import CardIndex
+
+DIMS = 1536
+SPHERES = [f"SPHERE_{n}" for n in range(1, 13)]
+
+
+def synthetic_cards(rng) -> CardIndex:
+    archetypes = rng.standard_normal((22, DIMS))
+    spheres = rng.standard_normal((12, DIMS))
+    rows = [
+        (a, SPHERES[s], archetypes[a] + 0.7 * spheres[s] + 0.4 * rng.standard_normal(DIMS))
+        for a in range(22) for s in range(12)
+    ]
+    return CardIndex.build(rows, "synthetic", DIMS)
+
+
+def brute_force(index: CardIndex, query: np.ndarray, k: int, allowed=None) -> list[int]:
+    vectors = np.asarray(index.vectors, dtype=np.float64)
+    scores = vectors @ (query / np.linalg.norm(query))
+    order = np.argsort(-scores)
+    if allowed is not None:
+        order = [i for i in order if index.spheres[i] in allowed]
+    return list(order[:k])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+    rng = np.random.default_rng(11)
+    k = args.k
+
+    index = synthetic_cards(rng)
+    pairs = rng.integers(0, len(index), size=(args.queries, 2))
+    queries = (index.vectors[pairs[:, 0]] + 0.5 * index.vectors[pairs[:, 1]]
+               + 0.02 * rng.standard_normal((args.queries, DIMS))).astype(np.float32)
+    filters = [set(rng.choice(SPHERES, size=3, replace=False)) for _ in range(args.queries)]
+    key = {(int(a), s): i for i, (a, s) in enumerate(zip(index.archetype_ids, index.spheres))}
+
+    started = time.perf_counter()
+    truth = [brute_force(index, q, k) for q in queries]
+    baseline_ms = (time.perf_counter() - started) * 1000 / len(queries)
+    truth_filtered = [brute_force(index, q, k, f) for q, f in zip(queries, filters)]
+    print(f"{'mode':<40} {'ms/query':>9} {'recall@' + str(k):>9} {'archetypes':>11}")
+    print(f"{'brute force, float64 full sort':<40} {baseline_ms:9.3f} {1.0:9.3f} "
+          f"{statistics.mean(len({int(index.archetype_ids[i]) for i in t}) for t in truth):11.2f}")
+
+    def run(label: str, search, expected) -> None:
+        started = time.perf_counter()
+        hits = search()
+        elapsed = (time.perf_counter() - started) * 1000 / len(queries)
+        recall = statistics.mean(
+            len({key[(m.archetype_id, m.sphere)] for m in row} & set(t)) / k for row, t in zip(hits, expected)
+        )
+        distinct = statistics.mean(len({m.archetype_id for m in row}) for row in hits)
+        print(f"{label:<40} {elapsed:9.3f} {recall:9.3f} {distinct:11.2f}")
+
+    run("index, one query per call", lambda: [index.search(q, k=k)[0] for q in queries], truth)
+    run(f"index, {len(queries)} queries in one call", lambda: index.search(queries, k=k), truth)
+    run("index, batched, 3-sphere filter",
+        lambda: index.search(queries, k=k, spheres=filters), truth_filtered)
+    for diversity in (0.3, 0.5, 0.7):
+        run(f"index, batched, MMR diversity {diversity}",
+            lambda: index.search(queries, k=k, diversity=diversity), truth)
+
+
+if __name__ == "__main__":
+    main()
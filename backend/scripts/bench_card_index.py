@@ -0,0 +1,170 @@
+"""
+Benchmark: archetype matching against the AvatarCard vectors — pgvector
+queries (as vector_matcher did) vs the in-process card index
+(app/core/astrology/card_index.py).
+
+Usage:
+  python scripts/bench_card_index.py [--database-url postgresql+asyncpg://...]
+      [--iterations 200]
+
+Workloads (embeddings are precomputed, only the lookup is measured):
+  spheres — match_archetypes_to_spheres: 36 vectors (12 spheres x
+            shadow/light/insight), top 2 cards of the vector's sphere each;
+  text    — match_text_to_archetypes: 1 vector, top 5 cards overall.
+The pgvector side runs its queries one after another on one session (the
+old code gathered them on a shared AsyncSession, which is not allowed; that
+variant is run once to count failed queries). Results of both paths are
+compared for agreement. The 264 cards (22 archetypes x 12 spheres, random
+1536-dim vectors) live in a scratch schema that is dropped afterwards.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import numpy as np
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.core.astrology.card_index import CardIndex
+from app.database import Base
+from app.models.avatar_card import AvatarCard
+
+SCHEMA = "bench_card_index"
+SPHERES = [f"SPHERE_{n}" for n in range(1, 13)]
+DIMS = 1536
+
+
+def unit(rng, n: int) -> np.ndarray:
+    vectors = rng.standard_normal((n, DIMS)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+async def seed(sessions, rng) -> None:
+    vectors = unit(rng, 22 * 12)
+    async with sessions() as session:
+        session.add_all([
+            AvatarCard(archetype_id=i // 12, sphere=SPHERES[i % 12], light="", shadow="", embedding=vectors[i])
+            for i in range(22 * 12)
+        ])
+        await session.commit()
+
+
+async def pgvector_spheres(session, queries, spheres) -> list[list[int]]:
+    hits = []
+    for query, sphere in zip(queries, spheres):
+        result = await session.execute(
+            select(AvatarCard.archetype_id).where(AvatarCard.sphere == sphere)
+            .order_by(AvatarCard.embedding.cosine_distance(query)).limit(2)
+        )
+        hits.append(list(result.scalars()))
+    return hits
+
+
+async def pgvector_spheres_gathered(session, queries, spheres) -> int:
+    """The old concurrent variant; returns how many of its queries failed."""
+    async def one(query, sphere):
+        try:
+            await session.execute(
+                select(AvatarCard.archetype_id).where(AvatarCard.sphere == sphere)
+                .order_by(AvatarCard.embedding.cosine_distance(query)).limit(2)
+            )
+            return 0
+        except Exception:
+            return 1
+
+    failed = sum(await asyncio.gather(*[one(q, s) for q, s in zip(queries, spheres)]))
+    await session.rollback()
+    return failed
+
+
+async def pgvector_text(session, query) -> list[tuple[int, str, float]]:
+    distance = AvatarCard.embedding.cosine_distance(query)
+    result = await session.execute(
+        select(AvatarCard.archetype_id, AvatarCard.sphere, distance).order_by(distance).limit(5)
+    )
+    return [(a, s, 1.0 - d) for a, s, d in result]
+
+
+def report(label: str, samples: list[float]) -> None:
+    ms = sorted(s * 1000 for s in samples)
+    print(f"{label:<34} p50 {statistics.median(ms):8.3f} ms   p95 {ms[int(len(ms) * 0.95)]:8.3f} ms")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+    rng = np.random.default_rng(7)
+
+    engine = create_async_engine(args.database_url, pool_size=5,
+                                 connect_args={"server_settings": {"search_path": f"{SCHEMA},public"}})
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        await conn.run_sync(Base.metadata.create_all, tables=[AvatarCard.__table__])
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    try:
+        await seed(sessions, rng)
+        sphere_queries = unit(rng, 36)
+        query_spheres = [SPHERES[i // 3] for i in range(36)]
+        text_queries = unit(rng, args.iterations)
+
+        async with sessions() as session:
+            started = time.perf_counter()
+            index = await CardIndex.from_db(session)
+            print(f"index load from table:             {(time.perf_counter() - started) * 1000:8.1f} ms "
+                  f"({len(index)} cards, {index.vectors.nbytes / 1024:.0f} KiB)")
+        with tempfile.TemporaryDirectory() as directory:
+            index.save(directory)
+            started = time.perf_counter()
+            CardIndex.load(directory).search(sphere_queries[0], k=1)
+            print(f"index load from file (mmap):       {(time.perf_counter() - started) * 1000:8.1f} ms")
+
+        async with sessions() as session:
+            failed = await pgvector_spheres_gathered(session, sphere_queries, query_spheres)
+            print(f"old gathered queries on one session: {failed}/36 failed")
+
+            pg, local = [], []
+            for _ in range(args.iterations):
+                started = time.perf_counter()
+                expected = await pgvector_spheres(session, sphere_queries, query_spheres)
+                pg.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                hits = index.search(sphere_queries, k=2, spheres=query_spheres)
+                local.append(time.perf_counter() - started)
+            assert [[m.archetype_id for m in row] for row in hits] == expected
+            report("spheres, pgvector (36 queries):", pg)
+            report("spheres, card index:", local)
+
+            pg, local, agree = [], [], 0
+            for query in text_queries:
+                started = time.perf_counter()
+                expected = await pgvector_text(session, query)
+                pg.append(time.perf_counter() - started)
+                started = time.perf_counter()
+                hits = index.search(query, k=5)[0]
+                local.append(time.perf_counter() - started)
+                agree += [(a, s) for a, s, _ in expected] == [(m.archetype_id, m.sphere) for m in hits]
+                assert np.allclose([d for _, _, d in expected], [m.score for m in hits], atol=1e-4)
+            report("text, pgvector (1 query):", pg)
+            report("text, card index:", local)
+            print(f"identical top-5 (ids and scores):  {agree}/{len(text_queries)}")
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,265 @@
+"""
+Benchmark: embedding API calls and latency, per-caller clients vs the shared
+embedding service (app/services/embeddings.py).
+
+Usage:
+  python scripts/bench_embeddings.py [--database-url postgresql+asyncpg://...]
+      [--sessions 50] [--turns 5] [--portraits 4] [--facts 60] [--latency-ms 120]
+
+Scenarios:
+  sync      — --sessions concurrent sync sessions; every turn the user thinks
+              0.2-1.0 s and the response is embedded (sync_agent.get_embedding,
+              as in POST /sync/.../phase);
+  portrait  — the embedding pass of one portrait (~260 records in six layers),
+              then --portraits portraits at once, then the same portrait again
+              after regeneration (same texts, new rows, another process).
+
+OpenAI is replaced by a local OpenAI-compatible /v1/embeddings server that
+answers after --latency-ms + 0.3 ms per input and counts calls. Portrait
+tables and the embedding cache live in a scratch schema dropped afterwards.
+"""
+import argparse
+import asyncio
+import base64
+import hashlib
+import os
+import random
+import socket
+import sys
+import time
+
+import numpy as np
+import uvicorn
+from fastapi import FastAPI, Request
+from sqlalchemy import text, update
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+
+def _free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+# Clients are built at import time (app.agents.common), so the fake API must be known before that
+PORT = _free_port()
+os.environ["OPENAI_BASE_URL"] = f"http://127.0.0.1:{PORT}/v1"
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.agents.sync_agent import get_embedding
+from app.config import settings
+from app.database import Base
+from app.dsb.storage.models import (
+    DigitalPortrait, PortraitAspectChain, PortraitFact, PortraitMetaPattern, PortraitPattern,
+    PortraitRecommendation, PortraitShadowAudit,
+)
+from app.dsb.storage.repository import PortraitRepository
+from app.models.user import User
+
+try:
+    from app.models.embedding_cache import EmbeddingCacheEntry
+    from app.services import embeddings
+except ImportError:  # tree without the shared service
+    EmbeddingCacheEntry = embeddings = None
+
+SCHEMA = "bench_embeddings"
+LAYERS = [PortraitFact, PortraitAspectChain, PortraitPattern, PortraitRecommendation,
+          PortraitShadowAudit, PortraitMetaPattern]
+TABLES = [User.__table__, DigitalPortrait.__table__] + [model.__table__ for model in LAYERS]
+if EmbeddingCacheEntry is not None:
+    TABLES.append(EmbeddingCacheEntry.__table__)
+
+
+class FakeEmbeddingsAPI:
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+        self.inputs = 0
+        self.app = FastAPI()
+        self.app.post("/v1/embeddings")(self.embeddings)
+
+    def reset(self) -> None:
+        self.calls = self.inputs = 0
+
+    async def embeddings(self, request: Request):
+        body = await request.json()
+        inputs = body["input"] if isinstance(body["input"], list) else [body["input"]]
+        self.calls += 1
+        self.inputs += len(inputs)
+        await asyncio.sleep(self.latency + 0.0003 * len(inputs))
+        dims = body.get("dimensions") or 1536
+        data = []
+        for i, item in enumerate(inputs):
+            seed = int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), "little")
+            vector = np.random.default_rng(seed).standard_normal(dims, dtype=np.float32)
+            encoded = (base64.b64encode(vector.tobytes()).decode() if body.get("encoding_format") == "base64"
+                       else vector.tolist())
+            data.append({"object": "embedding", "index": i, "embedding": encoded})
+        return {"object": "list", "data": data, "model": body["model"],
+                "usage": {"prompt_tokens": self.inputs, "total_tokens": self.inputs}}
+
+
+async def serve(app: FastAPI) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=PORT, log_level="warning", lifespan="off"))
+    server.task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server
+
+
+def fresh_process() -> None:
+    """Another worker process: nothing in memory, only the persistent cache."""
+    if embeddings is not None:
+        embeddings.embedding_service._memory.clear()
+
+
+def percentile(values: list[float], q: float) -> float:
+    return sorted(values)[min(len(values) - 1, int(len(values) * q))] * 1000
+
+
+async def sync_scenario(api: FakeEmbeddingsAPI, sessions: int, turns: int) -> None:
+    latencies: list[float] = []
+
+    async def session(n: int):
+        for turn in range(turns):
+            await asyncio.sleep(random.uniform(0.2, 1.0))
+            started = time.perf_counter()
+            await get_embedding(f"Сессия {n}, слой {turn + 1}: я чувствую сжатие в груди и холод в руках")
+            latencies.append(time.perf_counter() - started)
+
+    api.reset()
+    await asyncio.gather(*[session(n) for n in range(sessions)])
+    print(f"sync, {sessions} sessions x {turns} turns:  {api.calls:4d} API calls for {len(latencies)} texts, "
+          f"latency p50 {percentile(latencies, 0.5):6.1f} ms  p95 {percentile(latencies, 0.95):6.1f} ms")
+
+
+def portrait_rows(portrait_id: str, facts: int) -> list:
+    """Distinct texts in every record, as after a real pipeline run; no vectors yet."""
+    tag = portrait_id[:8]
+
+    def words(kind: str, n: int) -> str:
+        return f"{kind} {n} портрета {tag}: " + " ".join(f"смысл{random.randint(0, 10 ** 6)}" for _ in range(40))
+
+    rows = [
+        PortraitFact(portrait_id=portrait_id, source_system="western_astrology", sphere_primary=i % 12 + 1,
+                     spheres_affected=[1], position=f"Element {i}", influence_level="medium",
+                     light_aspect=words("свет", i), shadow_aspect=words("тень", i), core_theme=f"Тема {i}")
+        for i in range(facts)
+    ]
+    for n in range(1, 13):
+        rows += [PortraitAspectChain(portrait_id=portrait_id, sphere=n, chain_name=f"chain {i}",
+                                     systems_involved=["western_astrology"], convergence_score=0.7,
+                                     description=words("цепочка", i)) for i in range(4)]
+        rows += [PortraitPattern(portrait_id=portrait_id, sphere=n, pattern_name=f"pattern {i}", formula="A + B",
+                                 description=words("паттерн", i), convergence_score=0.6) for i in range(4)]
+        rows += [PortraitRecommendation(portrait_id=portrait_id, sphere=n, recommendation=words("совет", i),
+                                        influence_level="high", category="practice") for i in range(5)]
+        rows += [PortraitShadowAudit(portrait_id=portrait_id, sphere=n, risk_name=f"risk {i}",
+                                     description=words("риск", i), convergence_score=0.5, antidote=words("антидот", i))
+                 for i in range(3)]
+    rows += [PortraitMetaPattern(portrait_id=portrait_id, pattern_name=f"meta {i}", spheres_involved=[1, 4, 7],
+                                 description=words("мета", i), convergence_score=0.8) for i in range(5)]
+    return rows
+
+
+async def seed_portrait(sessions, user_id: int, facts: int) -> tuple[str, int]:
+    async with sessions() as session:
+        portrait = DigitalPortrait(user_id=user_id, status="ready", birth_data={}, systems_used=["western_astrology"])
+        session.add(portrait)
+        await session.flush()
+        rows = portrait_rows(portrait.id, facts)
+        session.add_all(rows)
+        await session.commit()
+        return portrait.id, len(rows)
+
+
+async def embed_portrait(sessions, portrait_id: str) -> None:
+    async with sessions() as session:
+        await PortraitRepository(session).generate_all_embeddings(portrait_id)
+        await session.commit()
+
+
+async def count_embedded(sessions, portrait_ids: list[str]) -> int:
+    async with sessions() as session:
+        total = 0
+        for model in LAYERS:
+            total += await session.scalar(text(
+                f"SELECT count(*) FROM {model.__tablename__} WHERE embedding IS NOT NULL AND portrait_id = ANY(:ids)"
+            ), {"ids": portrait_ids})
+        return total
+
+
+async def portrait_scenario(api: FakeEmbeddingsAPI, sessions, user_id: int, portraits: int, facts: int) -> None:
+    async def measure(label: str, portrait_ids: list[str], records: int) -> None:
+        api.reset()
+        started = time.perf_counter()
+        await asyncio.gather(*[embed_portrait(sessions, pid) for pid in portrait_ids])
+        elapsed = time.perf_counter() - started
+        embedded = await count_embedded(sessions, portrait_ids)
+        assert embedded == records, (embedded, records)
+        print(f"{label:<36} {api.calls:4d} API calls, {api.inputs:5d} texts, {elapsed * 1000:7.0f} ms "
+              f"({records} records)")
+
+    portrait_id, records = await seed_portrait(sessions, user_id, facts)
+    await measure("portrait pass, 1 portrait:", [portrait_id], records)
+
+    batch = [await seed_portrait(sessions, user_id, facts) for _ in range(portraits)]
+    await measure(f"portrait pass, {portraits} portraits at once:", [pid for pid, _ in batch],
+                  sum(n for _, n in batch))
+
+    # Regeneration rewrites the layers with the same texts; the next pass runs in another worker
+    async with sessions() as session:
+        for model in LAYERS:
+            await session.execute(update(model).where(model.portrait_id == portrait_id).values(embedding=None))
+        await session.commit()
+    fresh_process()
+    await measure("portrait pass, regenerated portrait:", [portrait_id], records)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--sessions", type=int, default=50)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--portraits", type=int, default=4)
+    parser.add_argument("--facts", type=int, default=60)
+    parser.add_argument("--latency-ms", type=float, default=120.0)
+    args = parser.parse_args()
+    random.seed(7)
+
+    engine = create_async_engine(args.database_url, pool_size=10,
+                                 connect_args={"server_settings": {"search_path": f"{SCHEMA},public"}})
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        await conn.run_sync(Base.metadata.create_all, tables=TABLES)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    if embeddings is not None:
+        embeddings.embedding_service.session_factory = sessions
+
+    api = FakeEmbeddingsAPI(args.latency_ms / 1000)
+    server = await serve(api.app)
+    try:
+        async with sessions() as session:
+            user = User(tg_id=1, first_name="bench")
+            session.add(user)
+            await session.commit()
+
+        await sync_scenario(api, args.sessions, args.turns)
+        fresh_process()
+        await portrait_scenario(api, sessions, user.id, args.portraits, args.facts)
+        if embeddings is not None:
+            print(f"service stats: {embeddings.embedding_service.stats}")
+    finally:
+        server.should_exit = True
+        await server.task
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,89 @@
+"""
+Accuracy report and microbenchmark: ephemeris table vs pyswisseph.
+
+Usage: python scripts/bench_ephemeris_table.py [--samples 20000]
+Requires a table built by scripts/build_ephemeris_table.py. Random JDs are
+drawn inside the table range; errors are measured only where the table would
+answer (within the configured tolerances), the rest counts as fallbacks.
+"""
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+import swisseph as swe
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.core.astrology.ephemeris_table import CALC_FLAGS, EphemerisTable
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--samples", type=int, default=20_000)
+    args = parser.parse_args()
+
+    swe.set_ephe_path(settings.EPHE_PATH)
+    table = EphemerisTable()
+    tol, speed_tol = settings.EPHEMERIS_TABLE_TOLERANCE, settings.EPHEMERIS_TABLE_SPEED_TOLERANCE
+    rnd = np.random.default_rng(42)
+    jds = rnd.uniform(table.jd_start, table.jd_end, args.samples)
+    names = table.meta["body_names"]
+
+    # ── Accuracy ────────────────────────────────────────────────────────────
+    true_lon = np.empty((len(jds), len(table.codes)))
+    true_speed = np.empty_like(true_lon)
+    for i, jd in enumerate(jds.tolist()):
+        for j, code in enumerate(table.codes):
+            pos, _ = swe.calc_ut(jd, code, CALC_FLAGS)
+            true_lon[i, j], true_speed[i, j] = pos[0], pos[3]
+
+    lon, speed, ok = table.lookup(jds, tol, speed_tol)
+    lon_err = np.abs((lon - true_lon + 180) % 360 - 180)
+    speed_err = np.abs(speed - true_speed)
+    rounding_diff = np.round(lon, 4) != np.round(true_lon, 4)
+
+    print(f"Accuracy vs pyswisseph ({args.samples} random JDs, tolerance {tol}°, {speed_tol}°/day)")
+    print(f"{'body':>10} | {'served':>7} | {'max lon err°':>12} | {'p99 lon err°':>12} | {'max speed err':>13} | {'4-digit diff':>12}")
+    for j, name in enumerate(names):
+        m = ok[:, j]
+        if not m.any():
+            print(f"{name:>10} | {0:>7.1%} | {'-':>12} | {'-':>12} | {'-':>13} | {'-':>12}")
+            continue
+        print(
+            f"{name:>10} | {m.mean():>7.1%} | {lon_err[m, j].max():>12.2e} | "
+            f"{np.percentile(lon_err[m, j], 99):>12.2e} | {speed_err[m, j].max():>13.2e} | "
+            f"{rounding_diff[m, j].mean():>12.2%}"
+        )
+
+    # ── Speed ───────────────────────────────────────────────────────────────
+    n_positions = len(jds) * len(table.codes)
+    jd_list = jds.tolist()
+
+    start = time.perf_counter()
+    for jd in jd_list:
+        for code in table.codes:
+            swe.calc_ut(jd, code, CALC_FLAGS)
+    t_swe = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for jd in jd_list:
+        for code in table.codes:
+            table.calc(jd, code, tol, speed_tol)
+    t_scalar = time.perf_counter() - start
+
+    start = time.perf_counter()
+    table.lookup(jds, tol, speed_tol)
+    t_vector = time.perf_counter() - start
+
+    print(f"\nMicrobenchmark ({n_positions} body positions)")
+    print(f"  swe.calc_ut          {t_swe / n_positions * 1e9:>8.0f} ns/position")
+    print(f"  table.calc (scalar)  {t_scalar / n_positions * 1e9:>8.0f} ns/position")
+    print(f"  table.lookup (batch) {t_vector / n_positions * 1e9:>8.0f} ns/position")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,179 @@
+"""
+Benchmark: background job queue (app/services/jobs.py) throughput on Postgres.
+
+Usage:
+  python scripts/bench_job_queue.py [--database-url postgresql+asyncpg://...]
+      [--jobs 20000] [--producers 16] [--processes 1,2,4] [--slots 32]
+
+Phases:
+  enqueue  — --producers concurrent tasks, one job per transaction (as a
+             request handler does), then one transaction with 1000 jobs;
+  dequeue  — --jobs no-op jobs drained by N worker processes (python -m
+             app.worker equivalent: Worker per process, own engine), for
+             every N in --processes; measures claim + complete round trips;
+  capped   — 200 jobs of 50 ms under a cross-worker concurrency limit of 4,
+             run by 4 processes; reports the peak running count seen.
+Tables live in a scratch schema that is dropped afterwards.
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import sys
+import time
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.database import Base
+from app.models import BackgroundJob
+from app.services import jobs
+from app.services.jobs import job_handler
+from app.worker import Worker
+
+SCHEMA = "bench_job_queue"
+CAPPED_LIMIT = 4
+
+
+@job_handler("bench.noop")
+async def noop(n: int) -> None:
+    pass
+
+
+@job_handler("bench.capped", concurrency=CAPPED_LIMIT)
+async def capped(n: int) -> None:
+    await asyncio.sleep(0.05)
+
+
+def make_engine(url: str, pool_size: int = 20):
+    return create_async_engine(url, pool_size=pool_size, max_overflow=0,
+                               connect_args={"server_settings": {"search_path": f"{SCHEMA},public"}})
+
+
+def worker_process(url: str, job_type: str, slots: int, ready, stop) -> None:
+    async def serve():
+        engine = make_engine(url, pool_size=4)  # claim/complete, LISTEN, heartbeat, failures
+        worker = Worker(engine, [job_type], slots=slots, poll_interval=0.5)
+        task = asyncio.create_task(worker.run())
+        ready.set()
+        while not stop.is_set():
+            await asyncio.sleep(0.05)
+        worker.stop()
+        await task
+        await engine.dispose()
+
+    asyncio.run(serve())
+
+
+async def count(engine, *statuses: str) -> int:
+    async with engine.connect() as conn:
+        return await conn.scalar(text("SELECT count(*) FROM background_jobs WHERE status = ANY(:s)"),
+                                 {"s": list(statuses)})
+
+
+async def enqueue_phase(sessions, total: int, producers: int) -> None:
+    per_producer = total // producers
+
+    async def produce(p: int):
+        for i in range(per_producer):
+            async with sessions() as db:
+                await jobs.enqueue(db, "bench.noop", {"n": p * per_producer + i})
+                await db.commit()
+
+    started = time.perf_counter()
+    await asyncio.gather(*[produce(p) for p in range(producers)])
+    elapsed = time.perf_counter() - started
+    print(f"enqueue, 1 job/txn, {producers} producers: {per_producer * producers / elapsed:8.0f} jobs/s "
+          f"({per_producer * producers} jobs in {elapsed:.2f}s)")
+
+    started = time.perf_counter()
+    async with sessions() as db:
+        for i in range(1000):
+            await jobs.enqueue(db, "bench.noop", {"n": -i})
+        await db.commit()
+    elapsed = time.perf_counter() - started
+    print(f"enqueue, 1000 jobs in one txn:          {1000 / elapsed:8.0f} jobs/s")
+
+
+async def drain(engine, url: str, job_type: str, processes: int, slots: int,
+                sample_running: bool = False) -> tuple[float, int]:
+    context = multiprocessing.get_context("spawn")
+    stop = context.Event()
+    readies = [context.Event() for _ in range(processes)]
+    procs = [context.Process(target=worker_process, args=(url, job_type, slots, readies[i], stop))
+             for i in range(processes)]
+    for proc in procs:
+        proc.start()
+    while not all(ready.is_set() for ready in readies):
+        await asyncio.sleep(0.01)
+    started = time.perf_counter()
+    peak = 0
+    try:
+        while True:
+            if sample_running:
+                peak = max(peak, await count(engine, "running"))
+            if not await count(engine, "queued", "running"):
+                break
+            await asyncio.sleep(0.01 if sample_running else 0.05)
+        return time.perf_counter() - started, peak
+    finally:
+        stop.set()
+        for proc in procs:
+            proc.join()
+
+
+async def reset(engine) -> None:
+    async with engine.begin() as conn:
+        await conn.execute(text("TRUNCATE background_jobs"))
+
+
+async def fill(sessions, job_type: str, total: int) -> None:
+    async with sessions() as db:
+        for i in range(total):
+            await jobs.enqueue(db, job_type, {"n": i})
+        await db.commit()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--jobs", type=int, default=20000)
+    parser.add_argument("--producers", type=int, default=16)
+    parser.add_argument("--processes", default="1,2,4")
+    parser.add_argument("--slots", type=int, default=32)
+    args = parser.parse_args()
+
+    engine = make_engine(args.database_url, pool_size=args.producers + 2)
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.run_sync(Base.metadata.create_all, tables=[BackgroundJob.__table__])
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    try:
+        await enqueue_phase(sessions, args.jobs, args.producers)
+
+        for processes in [int(n) for n in args.processes.split(",")]:
+            await reset(engine)
+            await fill(sessions, "bench.noop", args.jobs)
+            elapsed, _ = await drain(engine, args.database_url, "bench.noop", processes, args.slots)
+            print(f"dequeue, {processes} process(es) x {args.slots} slots:   {args.jobs / elapsed:8.0f} jobs/s "
+                  f"({args.jobs} jobs in {elapsed:.2f}s)")
+
+        await reset(engine)
+        await fill(sessions, "bench.capped", 200)
+        elapsed, peak = await drain(engine, args.database_url, "bench.capped", 4, 8, sample_running=True)
+        print(f"capped, limit {CAPPED_LIMIT}, 4 processes x 8 slots:   peak running {peak}, "
+              f"200 x 50 ms jobs in {elapsed:.2f}s (ideal {200 * 0.05 / CAPPED_LIMIT:.2f}s)")
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,132 @@
+"""
+Benchmark: DSB sphere fan-out from many simultaneous onboardings, with and
+without the LLM scheduler.
+
+Usage:
+  python scripts/bench_llm_scheduler.py [--portraits 50] [--provider-limit 40]
+      [--llm-delay 0.5] [--max-concurrency 32] [--interactive 40]
+
+The provider is simulated in-process: a call that arrives while
+--provider-limit calls are in flight is rejected with a 429. Every portrait
+runs the 12 SphereAgent.synthesize calls of layer 3b at ONBOARDING priority,
+while --interactive INTERACTIVE requests (sync/align replies) arrive during
+the burst. Reports empty spheres (the _empty_sphere fallback), 429s seen by
+the provider, interactive latency and wall time.
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+import httpx
+import openai
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.dsb.config import DSB_MODEL_DEEP
+from app.dsb.interpreters.schemas import UniversalInsightSchema
+from app.dsb.llm.backends import LLMBackend, LLMResponse
+from app.dsb.llm.client import llm_client
+from app.dsb.synthesis.sphere_agent import SphereAgent
+from app.services.llm_scheduler import LLMScheduler, ModelBudget, Priority, priority_scope
+
+
+class ProviderBackend(LLMBackend):
+    """Fixed latency, hard concurrency limit → 429 beyond it."""
+
+    def __init__(self, limit: int, delay: float):
+        self.limit = limit
+        self.delay = delay
+        self.active = 0
+        self.rejected = 0
+
+    async def complete(self, model: str, messages: list[dict], **params) -> LLMResponse:
+        if self.active >= self.limit:
+            self.rejected += 1
+            request = httpx.Request("POST", "https://api.openai.com/v1/chat/completions")
+            raise openai.RateLimitError(
+                "Rate limit reached", response=httpx.Response(429, request=request), body=None,
+            )
+        self.active += 1
+        try:
+            await asyncio.sleep(self.delay)
+        finally:
+            self.active -= 1
+        return LLMResponse(json.dumps({"layer3_patterns": [{"pattern_name": "p", "formula": "f"}]}), 1000, 300)
+
+
+def insight(sphere: int, portrait: int) -> UniversalInsightSchema:
+    return UniversalInsightSchema(
+        source_system="western_astrology", position=f"Sun {portrait}", primary_sphere=sphere,
+        influence_level="high", polarity="dual", light_aspect="a", shadow_aspect="b",
+        energy_description="c", core_theme="d", developmental_task="e", integration_key="f",
+    )
+
+
+async def run(args, scheduler: LLMScheduler | None) -> dict:
+    backend = ProviderBackend(args.provider_limit, args.llm_delay)
+    llm_client.backend = backend
+    llm_client.cache = None
+    llm_client.scheduler = scheduler
+    agent = SphereAgent()
+
+    async def portrait(p: int) -> int:
+        with priority_scope(Priority.ONBOARDING):
+            spheres = await asyncio.gather(*[agent.synthesize(n, [insight(n, p)], ["western_astrology"]) for n in range(1, 13)])
+        return sum(1 for s in spheres if s.get("error"))
+
+    latencies: list[float] = []
+    interactive_errors = 0
+
+    async def interactive(i: int):
+        nonlocal interactive_errors
+        await asyncio.sleep(i * args.llm_delay * 2 / args.interactive)
+        started = time.perf_counter()
+        try:
+            await llm_client.complete(DSB_MODEL_DEEP, [{"role": "user", "content": f"sync reply {i}"}], tag="interactive")
+            latencies.append(time.perf_counter() - started)
+        except Exception:
+            interactive_errors += 1
+
+    started = time.perf_counter()
+    empty, _ = await asyncio.gather(
+        asyncio.gather(*[portrait(p) for p in range(args.portraits)]),
+        asyncio.gather(*[interactive(i) for i in range(args.interactive)]),
+    )
+    return {
+        "wall": time.perf_counter() - started,
+        "empty": sum(empty),
+        "rejected": backend.rejected,
+        "latencies": latencies,
+        "interactive_errors": interactive_errors,
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--portraits", type=int, default=50)
+    parser.add_argument("--provider-limit", type=int, default=40)
+    parser.add_argument("--llm-delay", type=float, default=0.5)
+    parser.add_argument("--max-concurrency", type=int, default=32)
+    parser.add_argument("--interactive", type=int, default=40)
+    args = parser.parse_args()
+
+    scheduled = LLMScheduler(ModelBudget(args.max_concurrency, 100_000, 100_000_000), backoff_base=0.2, backoff_cap=2.0)
+    print(f"{args.portraits} portraits x 12 spheres, provider limit {args.provider_limit} concurrent, "
+          f"{args.llm_delay}s/call, {args.interactive} interactive requests")
+    for name, scheduler in (("bare gather", None), (f"scheduler({args.max_concurrency})", scheduled)):
+        r = await run(args, scheduler)
+        lat = sorted(r["latencies"])
+        lat_report = (
+            f"p50 {statistics.median(lat) * 1000:.0f} ms, max {lat[-1] * 1000:.0f} ms" if lat else "n/a"
+        )
+        print(f"{name:>16}: empty spheres {r['empty']}/{args.portraits * 12}, 429s {r['rejected']}, "
+              f"interactive {lat_report} ({r['interactive_errors']} failed), wall {r['wall']:.1f}s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
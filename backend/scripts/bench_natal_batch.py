@@ -0,0 +1,64 @@
+"""
+Benchmark: scalar calculate_natal_chart vs calculate_natal_charts_batch.
+
+Usage: python scripts/bench_natal_batch.py [--sizes 1 100 10000]
+Prints charts/sec for the scalar loop, the batch arrays alone and the batch
+with every chart materialized back to NatalChartData.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.astrology.natal_chart import (
+    BirthRecord,
+    calculate_natal_chart,
+    calculate_natal_charts_batch,
+)
+
+TIMEZONES = ["Europe/Moscow", "Europe/Kiev", "Asia/Almaty", "Europe/Berlin", "America/New_York"]
+
+
+def make_births(n: int, seed: int = 42) -> list[BirthRecord]:
+    rnd = random.Random(seed)
+    return [
+        BirthRecord(
+            datetime(rnd.randint(1950, 2010), rnd.randint(1, 12), rnd.randint(1, 28)),
+            f"{rnd.randint(0, 23):02d}:{rnd.randint(0, 59):02d}",
+            rnd.uniform(-55.0, 65.0),
+            rnd.uniform(-170.0, 170.0),
+            rnd.choice(TIMEZONES),
+        )
+        for _ in range(n)
+    ]
+
+
+def timed(fn) -> float:
+    start = time.perf_counter()
+    fn()
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1, 100, 10_000])
+    args = parser.parse_args()
+
+    calculate_natal_charts_batch(make_births(10))  # warm up ephemeris files
+
+    print(f"{'N':>7} | {'scalar c/s':>12} | {'batch c/s':>12} | {'batch+charts c/s':>16}")
+    for n in args.sizes:
+        births = make_births(n)
+        t_scalar = timed(lambda: [calculate_natal_chart(*b) for b in births])
+        t_batch = timed(lambda: calculate_natal_charts_batch(births))
+        t_full = timed(lambda: calculate_natal_charts_batch(births).charts())
+        print(f"{n:>7} | {n / t_scalar:>12.0f} | {n / t_batch:>12.0f} | {n / t_full:>16.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+"""
+Benchmark: DB connection usage of PortraitOrchestrator.generate under load.
+
+Usage:
+  python scripts/bench_pipeline_pool.py [--database-url postgresql+asyncpg://...]
+      [--portraits 20] [--stagger 0.2] [--llm-delay 1.0] [--notify-delay 0.5] [--pool-size 20] [--max-overflow 0]
+
+Starts N portraits --stagger seconds apart, with an offline LLM backend (fixed latency per
+call) and a simulated Telegram notification, while request handlers keep
+checking out connections for a `SELECT 1`. Reports per-portrait connection
+hold time (pool checkout → checkin) and the handlers' pool wait time.
+Tables live in a scratch schema that is dropped afterwards.
+"""
+import argparse
+import asyncio
+import contextvars
+import datetime
+import json
+import os
+import statistics
+import sys
+import time
+
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import app.models  # noqa: F401 — register all tables
+import app.dsb.storage.models  # noqa: F401
+from app.config import settings
+from app.database import Base
+from app.dsb.calculators.base import BirthData
+from app.dsb.llm.backends import FakeLLMBackend
+from app.dsb.llm.client import llm_client
+from app.dsb.pipeline.orchestrator import PortraitOrchestrator
+from app.models.user import User
+from app.services.notification import NotificationService
+
+SCHEMA = "bench_pipeline_pool"
+ROLE = contextvars.ContextVar("role", default="pipeline")
+INSIGHT = {
+    "source_system": "western_astrology", "position": "Sun in Aries", "influence_level": "high",
+    "polarity": "dual", "light_aspect": "a", "shadow_aspect": "b", "energy_description": "c",
+    "core_theme": "d", "developmental_task": "e", "integration_key": "f",
+}
+
+
+def responder(model, messages, params) -> str:
+    """Минимальные валидные ответы для каждого слоя: по инсайту на сферу → все 12 SphereAgent."""
+    user = messages[-1]["content"]
+    if "сырые расчётные данные" in user:
+        return json.dumps({"insights": [{**INSIGHT, "primary_sphere": n} for n in range(1, 13)]})
+    if "СФЕРЫ" in user:
+        return json.dumps({"layer3_patterns": [{"pattern_name": "p", "formula": "f"}]})
+    if "суперпаттерн" in user:
+        return json.dumps({"meta_patterns": [{"name": "m", "description": "d"}]})
+    return json.dumps({"overall_brief": "brief"})
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--portraits", type=int, default=20)
+    parser.add_argument("--stagger", type=float, default=0.2)
+    parser.add_argument("--llm-delay", type=float, default=1.0)
+    parser.add_argument("--notify-delay", type=float, default=0.5)
+    parser.add_argument("--pool-size", type=int, default=20)
+    parser.add_argument("--max-overflow", type=int, default=0)
+    parser.add_argument("--handlers", type=int, default=10)
+    args = parser.parse_args()
+
+    engine = create_async_engine(
+        args.database_url, pool_size=args.pool_size, max_overflow=args.max_overflow,
+        connect_args={"server_settings": {"search_path": f"{SCHEMA},public"}},
+    )
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.run_sync(Base.metadata.create_all)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    # Pool events: время удержания каждого соединения пайплайном
+    # (контекст asyncio-задачи виден в greenlet'ах SQLAlchemy, ROLE отделяет хендлеры)
+    holds: list[float] = []
+    checked_out: dict[int, tuple[float, str]] = {}
+
+    @event.listens_for(engine.sync_engine.pool, "checkout")
+    def on_checkout(dbapi_conn, record, proxy):
+        checked_out[id(record)] = (time.perf_counter(), ROLE.get())
+
+    @event.listens_for(engine.sync_engine.pool, "checkin")
+    def on_checkin(dbapi_conn, record):
+        started, role = checked_out.pop(id(record), (None, None))
+        if role == "pipeline":
+            holds.append(time.perf_counter() - started)
+
+    llm_client.backend = FakeLLMBackend(responder, delay=args.llm_delay)
+    llm_client.cache = None
+
+    async def fake_notify(tg_id: int, msg: str, parse_mode: str = "HTML") -> bool:
+        await asyncio.sleep(args.notify_delay)
+        return True
+
+    NotificationService.send_tg_message = staticmethod(fake_notify)
+
+    try:
+        async with sessions() as session:
+            users = [User(tg_id=1000 + i) for i in range(args.portraits)]
+            session.add_all(users)
+            await session.commit()
+            user_ids = [u.id for u in users]
+
+        orchestrator = PortraitOrchestrator()
+        done = asyncio.Event()
+        waits: list[float] = []
+
+        async def handler():
+            ROLE.set("handler")
+            while not done.is_set():
+                async with sessions() as session:
+                    started = time.perf_counter()
+                    await session.connection()
+                    waits.append(time.perf_counter() - started)
+                    await session.execute(text("SELECT 1"))
+                await asyncio.sleep(0.01)
+
+        async def portrait(i: int):
+            await asyncio.sleep(i * args.stagger)
+            birth = BirthData(
+                date=datetime.date(1980 + i % 30, 1 + i % 12, 1 + i % 28), time=datetime.time(i % 24, 30),
+                place="Kyiv", lat=50.45, lon=30.52, timezone="Europe/Kiev",
+            )
+            await orchestrator.generate(birth, user_ids[i], sessions)
+
+        holds.clear()
+        handlers = [asyncio.create_task(handler()) for _ in range(args.handlers)]
+        started = time.perf_counter()
+        await asyncio.gather(*[portrait(i) for i in range(args.portraits)])
+        wall = time.perf_counter() - started
+        done.set()
+        await asyncio.gather(*handlers)
+
+        async with sessions() as session:
+            statuses = (await session.execute(
+                text("SELECT status, count(*) FROM dsb_digital_portraits GROUP BY status")
+            )).all()
+
+        pipeline_checkouts = len(holds)
+        pipeline_hold = sum(holds)
+        print(f"{args.portraits} portraits, pool {args.pool_size}+{args.max_overflow}, "
+              f"LLM {args.llm_delay}s/call, notify {args.notify_delay}s: wall {wall:.1f}s, "
+              f"statuses {dict(statuses)}")
+        print(f"pipeline: {pipeline_checkouts / args.portraits:.1f} checkouts and "
+              f"{pipeline_hold / args.portraits * 1000:.0f} ms connection hold per portrait, "
+              f"longest single hold {max(holds) * 1000:.0f} ms")
+        print(f"handler pool wait: p50 {percentile(waits, 0.5) * 1000:.2f} ms, "
+              f"p99 {percentile(waits, 0.99) * 1000:.1f} ms, max {max(waits) * 1000:.0f} ms, "
+              f"mean {statistics.mean(waits) * 1000:.2f} ms over {len(waits)} requests")
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,245 @@
+"""
+Load test: GET /api/dsb/portraits/{id} — the handler as it was (seven
+full-row SELECTs incl. embeddings + per-sphere filtering in Python) vs the
+materialized portrait document (dsb_portrait_documents + in-process LRU).
+
+Usage:
+  python scripts/bench_portrait_read.py [--database-url postgresql+asyncpg://...]
+      [--requests 2000] [--concurrency 20] [--facts 60]
+
+Requests go through the real FastAPI router (httpx ASGITransport), so the
+numbers include routing and response encoding but no network. Layers are
+synthetic but sized like a real portrait and carry 1536-dim embeddings, as
+after generate_all_embeddings. Tables live in a scratch schema that is
+dropped afterwards.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+
+import httpx
+from fastapi import Depends, FastAPI
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.database import Base, get_db
+from app.dsb.api.routes import portraits as portraits_routes
+from app.dsb.config import SPHERE_NAMES
+from app.dsb.storage.documents import portrait_documents
+from app.dsb.storage.models import (
+    DigitalPortrait, PortraitAspectChain, PortraitDocument, PortraitFact, PortraitMetaPattern,
+    PortraitPattern, PortraitRecommendation, PortraitShadowAudit, PortraitSummary,
+)
+from app.dsb.storage.repository import PortraitRepository
+from app.models.user import User
+
+SCHEMA = "bench_portrait_read"
+TABLES = [
+    User.__table__, DigitalPortrait.__table__, PortraitFact.__table__, PortraitAspectChain.__table__,
+    PortraitPattern.__table__, PortraitRecommendation.__table__, PortraitShadowAudit.__table__,
+    PortraitMetaPattern.__table__, PortraitSummary.__table__, PortraitDocument.__table__,
+]
+TEXT = "Развёрнутое описание на несколько предложений. " * 6
+
+
+def vector() -> list[float]:
+    return [random.random() for _ in range(1536)]
+
+
+def synthetic_portrait(portrait_id: str, facts: int) -> list:
+    rows = [
+        PortraitFact(
+            portrait_id=portrait_id, source_system="western_astrology", sphere_primary=i % 12 + 1,
+            spheres_affected=[1, 7], position=f"Element {i}", influence_level="medium",
+            light_aspect=TEXT, shadow_aspect=TEXT, energy_description=TEXT, core_theme="Тема",
+            developmental_task=TEXT, integration_key=TEXT, triggers=["ситуация"] * 3,
+            weight=random.random(), embedding=vector(),
+        )
+        for i in range(facts)
+    ]
+    for n in range(1, 13):
+        rows += [PortraitAspectChain(portrait_id=portrait_id, sphere=n, chain_name=f"chain {i}",
+                                     systems_involved=["western_astrology"], convergence_score=0.7,
+                                     description=TEXT, embedding=vector()) for i in range(4)]
+        rows += [PortraitPattern(portrait_id=portrait_id, sphere=n, pattern_name=f"pattern {i}", formula="A + B",
+                                 description=TEXT, convergence_score=0.6, embedding=vector()) for i in range(4)]
+        rows += [PortraitRecommendation(portrait_id=portrait_id, sphere=n, recommendation=TEXT,
+                                        influence_level="high", category="practice", embedding=vector())
+                 for _ in range(5)]
+        rows += [PortraitShadowAudit(portrait_id=portrait_id, sphere=n, risk_name=f"risk {i}", description=TEXT,
+                                     convergence_score=0.5, antidote=TEXT, embedding=vector()) for i in range(3)]
+        rows.append(PortraitSummary(portrait_id=portrait_id, sphere=n, brief_text=TEXT))
+    rows += [PortraitMetaPattern(portrait_id=portrait_id, pattern_name=f"meta {i}", spheres_involved=[1, 4, 7],
+                                 description=TEXT, convergence_score=0.8, embedding=vector()) for i in range(5)]
+    rows.append(PortraitSummary(portrait_id=portrait_id, brief_text=TEXT, is_overall=True))
+    return rows
+
+
+async def legacy_get_portrait(portrait_id: str, session: AsyncSession = Depends(get_db)):
+    """GET /portraits/{id} до read model (без проверки статуса — портрет готов)."""
+    portrait = await PortraitRepository(session).get_portrait(portrait_id)
+
+    async def load(model):
+        result = await session.execute(select(model).where(model.portrait_id == portrait_id))
+        return result.scalars().all()
+
+    facts = await load(PortraitFact)
+    chains = await load(PortraitAspectChain)
+    patterns = await load(PortraitPattern)
+    recs = await load(PortraitRecommendation)
+    shadows = await load(PortraitShadowAudit)
+    metas = await load(PortraitMetaPattern)
+    await load(PortraitSummary)
+
+    spheres = {}
+    for i in range(1, 13):
+        spheres[str(i)] = {
+            "name": SPHERE_NAMES[i],
+            "layer1_facts": [
+                {"position": f.position, "source": f.source_system, "influence": f.influence_level,
+                 "light": f.light_aspect, "shadow": f.shadow_aspect, "core_theme": f.core_theme}
+                for f in facts if f.sphere_primary == i
+            ],
+            "layer2_chains": [
+                {"name": c.chain_name, "convergence": c.convergence_score, "description": c.description}
+                for c in chains if c.sphere == i
+            ],
+            "layer3_patterns": [
+                {"name": p.pattern_name, "formula": p.formula, "description": p.description,
+                 "convergence": p.convergence_score}
+                for p in patterns if p.sphere == i
+            ],
+            "layer4_recommendations": [
+                {"text": r.recommendation, "influence": r.influence_level, "category": r.category}
+                for r in recs if r.sphere == i
+            ],
+            "layer5_shadow_audit": [
+                {"risk": s.risk_name, "description": s.description, "antidote": s.antidote,
+                 "convergence": s.convergence_score}
+                for s in shadows if s.sphere == i
+            ],
+        }
+    return {
+        "portrait_id": portrait_id,
+        "status": portrait.status,
+        "systems_used": portrait.systems_used,
+        "birth_data": portrait.birth_data,
+        "spheres": spheres,
+        "meta_patterns": [
+            {"name": m.pattern_name, "spheres": m.spheres_involved, "description": m.description,
+             "convergence": m.convergence_score}
+            for m in metas
+        ],
+    }
+
+
+def percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+async def load_test(client: httpx.AsyncClient, url: str, requests: int, concurrency: int,
+                    headers: dict | None = None, before=None) -> tuple[list[float], int, int]:
+    latencies: list[float] = []
+    sizes: list[int] = []
+    statuses: set[int] = set()
+    counter = iter(range(requests))
+
+    async def worker():
+        for _ in counter:
+            if before is not None:
+                before()
+            started = time.perf_counter()
+            response = await client.get(url, headers=headers)
+            latencies.append(time.perf_counter() - started)
+            sizes.append(len(response.content))
+            statuses.add(response.status_code)
+
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return latencies, sizes[0], statuses.pop() if len(statuses) == 1 else -1
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--facts", type=int, default=60)
+    args = parser.parse_args()
+
+    engine = create_async_engine(
+        args.database_url, pool_size=args.concurrency, max_overflow=0,
+        connect_args={"server_settings": {"search_path": f"{SCHEMA},public"}},
+    )
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.run_sync(Base.metadata.create_all, tables=TABLES)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def bench_db():
+        async with sessions() as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(portraits_routes.router, prefix="/api/dsb")
+    app.add_api_route("/legacy/portraits/{portrait_id}", legacy_get_portrait)
+    app.dependency_overrides[get_db] = bench_db
+
+    try:
+        async with sessions() as session:
+            user = User(tg_id=1)
+            session.add(user)
+            await session.flush()
+            portrait = DigitalPortrait(user_id=user.id, birth_data={"date": "1990-03-15"},
+                                       systems_used=["western_astrology"], status="ready")
+            session.add(portrait)
+            await session.flush()
+            portrait_id = portrait.id
+            session.add_all(synthetic_portrait(portrait_id, args.facts))
+            await session.commit()
+            etag, _ = await PortraitRepository(session).materialize_document(portrait_id)
+            await session.commit()
+            document = await PortraitRepository(session).get_document(portrait_id)
+            print(f"Document: {document.raw_size / 1024:.0f} KB JSON, {len(document.body) / 1024:.0f} KB gzip")
+
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+            legacy = (await client.get(f"/legacy/portraits/{portrait_id}")).json()
+            current = await client.get(f"/api/dsb/portraits/{portrait_id}")
+            print(f"Same body as legacy handler: {current.json() == legacy}")
+            portrait_etag = current.headers["etag"]
+
+            scenarios = [
+                ("legacy handler", f"/legacy/portraits/{portrait_id}", None, None),
+                ("document, cold LRU", f"/api/dsb/portraits/{portrait_id}", None, portrait_documents._items.clear),
+                ("document, warm LRU", f"/api/dsb/portraits/{portrait_id}", None, None),
+                ("If-None-Match 304", f"/api/dsb/portraits/{portrait_id}", {"If-None-Match": portrait_etag}, None),
+                ("sphere slice", f"/api/dsb/portraits/{portrait_id}/sphere/7", None, None),
+            ]
+            print(f"{args.requests} requests, concurrency {args.concurrency}")
+            for name, url, headers, before in scenarios:
+                await load_test(client, url, 50, args.concurrency, headers, before)  # прогрев
+                latencies, size, status = await load_test(client, url, args.requests, args.concurrency,
+                                                          headers, before)
+                print(f"{name:>20}: p50 {percentile(latencies, 0.5) * 1000:6.1f} ms  "
+                      f"p99 {percentile(latencies, 0.99) * 1000:6.1f} ms  "
+                      f"mean {statistics.mean(latencies) * 1000:6.1f} ms  ({status}, {size / 1024:.0f} KB)")
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,284 @@
+"""
+Benchmark: semantic search over a portrait (app/dsb/storage/search.py) —
+the old two-query search with the vector interpolated into the SQL text vs
+the single bound-parameter UNION ALL query vs the in-memory index of a hot
+portrait.
+
+Usage:
+  python scripts/bench_portrait_search.py [--database-url postgresql+asyncpg://...]
+      [--portraits 50] [--queries 300] [--top-k 10]
+
+Reported:
+  statement         — SQL text size, client-side preparation (building the
+                      text / encoding the vector parameter) and server parse
+                      (prepare round trip: every query for the old search,
+                      once per connection for the new one, whose text is
+                      constant and stays in asyncpg's statement cache);
+  server            — planning and execution time from EXPLAIN (ANALYZE);
+  end-to-end        — semantic_search() latency over random portraits with
+                      the query embedding precomputed (no API call).
+The old search only looked at facts and patterns; the new one covers all
+five record types, so it reads ~2.5x more rows per query. Portraits are
+synthetic (~270 records, 1536-dim vectors) in a scratch schema that is
+dropped afterwards.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+import asyncpg
+import numpy as np
+from sqlalchemy import text
+from sqlalchemy.dialects.postgresql import asyncpg as asyncpg_dialect
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.database import Base
+from app.dsb.storage import search
+from app.dsb.storage.models import (
+    DigitalPortrait, PortraitAspectChain, PortraitFact, PortraitPattern, PortraitRecommendation,
+    PortraitShadowAudit,
+)
+from app.models.user import User
+
+SCHEMA = "bench_portrait_search"
+LAYERS = [PortraitFact, PortraitAspectChain, PortraitPattern, PortraitRecommendation, PortraitShadowAudit]
+TABLES = [User.__table__, DigitalPortrait.__table__] + [model.__table__ for model in LAYERS]
+TEXT = "Развёрнутое описание на несколько предложений. " * 4
+
+
+def unit(rng, n: int) -> np.ndarray:
+    vectors = rng.standard_normal((n, 1536)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def portrait_rows(portrait_id: str, rng) -> list:
+    levels = ["high", "medium", "low"]
+    rows = [PortraitFact(portrait_id=portrait_id, source_system="western_astrology", sphere_primary=i % 12 + 1,
+                         spheres_affected=[i % 12 + 1], position=f"Element {i}", influence_level=levels[i % 3],
+                         light_aspect=TEXT, shadow_aspect=TEXT, core_theme=f"Тема {i}") for i in range(60)]
+    for n in range(1, 13):
+        rows += [PortraitAspectChain(portrait_id=portrait_id, sphere=n, chain_name=f"chain {i}",
+                                     systems_involved=["western_astrology"], convergence_score=0.7,
+                                     description=TEXT) for i in range(4)]
+        rows += [PortraitPattern(portrait_id=portrait_id, sphere=n, pattern_name=f"pattern {i}", formula="A + B",
+                                 description=TEXT, convergence_score=0.6, influence_level=levels[i % 3])
+                 for i in range(4)]
+        rows += [PortraitRecommendation(portrait_id=portrait_id, sphere=n, recommendation=TEXT,
+                                        influence_level=levels[i % 3], category="practice") for i in range(5)]
+        rows += [PortraitShadowAudit(portrait_id=portrait_id, sphere=n, risk_name=f"risk {i}", description=TEXT,
+                                     convergence_score=0.5, antidote=TEXT) for i in range(3)]
+    for row, embedding in zip(rows, unit(rng, len(rows))):
+        row.embedding = embedding
+    return rows
+
+
+async def legacy_search(session, portrait_id: str, embedding, top_k: int) -> list[dict]:
+    """semantic_search as it was: vector literal in the SQL text, facts and patterns one after another."""
+    embedding_str = "[" + ",".join(str(x) for x in embedding) + "]"
+    results = []
+    for sql, k in ((legacy_facts_sql(embedding_str), top_k), (legacy_patterns_sql(embedding_str), top_k // 2)):
+        rows = await session.execute(text(sql), {"portrait_id": portrait_id, "top_k": k})
+        results += [dict(row) for row in rows.mappings()]
+    results.sort(key=lambda x: x.get("score", 0), reverse=True)
+    return results[:top_k]
+
+
+def legacy_facts_sql(embedding_str: str) -> str:
+    return f"""
+        SELECT id, 'fact' as source_table, sphere_primary as sphere, source_system, position, core_theme,
+            light_aspect as content, influence_level, 1 - (embedding <=> '{embedding_str}'::vector) as score
+        FROM dsb_portrait_facts
+        WHERE portrait_id = :portrait_id AND embedding IS NOT NULL
+        ORDER BY embedding <=> '{embedding_str}'::vector
+        LIMIT :top_k
+    """
+
+
+def legacy_patterns_sql(embedding_str: str) -> str:
+    return f"""
+        SELECT id, 'pattern' as source_table, sphere, pattern_name as position, formula as core_theme,
+            description as content, NULL as influence_level, 1 - (embedding <=> '{embedding_str}'::vector) as score
+        FROM dsb_portrait_patterns
+        WHERE portrait_id = :portrait_id AND embedding IS NOT NULL
+        ORDER BY embedding <=> '{embedding_str}'::vector
+        LIMIT :top_k
+    """
+
+
+def report(label: str, samples: list[float]) -> None:
+    ms = sorted(s * 1000 for s in samples)
+    print(f"  {label:<44} p50 {statistics.median(ms):8.2f} ms   p95 {ms[int(len(ms) * 0.95)]:8.2f} ms")
+
+
+async def statement_costs(raw: asyncpg.Connection, portrait_id: str, queries: np.ndarray, top_k: int) -> None:
+    print("statement (per query):")
+    vector_type = await raw.fetchval("SELECT 'vector'::regtype::oid")
+    await raw.set_type_codec("vector", encoder=lambda v: v, decoder=lambda v: v, schema="public", format="text")
+
+    build, prepare, plan, execute, size = [], [], [], [], 0
+    for query in queries:
+        started = time.perf_counter()
+        embedding_str = "[" + ",".join(str(x) for x in query.tolist()) + "]"
+        sqls = [legacy_facts_sql(embedding_str), legacy_patterns_sql(embedding_str)]
+        sqls = [sql.replace(":portrait_id", "$1").replace(":top_k", "$2") for sql in sqls]
+        build.append(time.perf_counter() - started)
+        size = sum(map(len, sqls))
+        started = time.perf_counter()
+        for sql in sqls:
+            await raw.prepare(sql)
+        prepare.append(time.perf_counter() - started)
+        planning = executing = 0.0
+        for sql, k in zip(sqls, (top_k, top_k // 2)):
+            explained = await raw.fetchval(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", portrait_id, k)
+            planning += _explain(explained)["Planning Time"]
+            executing += _explain(explained)["Execution Time"]
+        plan.append(planning / 1000)
+        execute.append(executing / 1000)
+    print(f"  old: {size / 1024:.1f} KiB of SQL in 2 statements, facts + patterns")
+    report("old: build SQL text (vector -> literal)", build)
+    report("old: server parse (prepare round trip)", prepare)
+    report("old: server planning", plan)
+    report("old: server execution", execute)
+
+    stmt = search._search_statement(False, False)
+    compiled = stmt.compile(dialect=asyncpg_dialect.dialect())
+    sql = str(compiled)
+    order = compiled.positiontup
+    build, prepare, plan, execute = [], [], [], []
+    for query in queries:
+        # The statement is compiled once: SQLAlchemy caches the compiled form
+        # of _search_statement(), so per query only the parameter is encoded
+        started = time.perf_counter()
+        vector = "[" + ",".join(str(x) for x in query.tolist()) + "]"
+        build.append(time.perf_counter() - started)
+        params = {"portrait_id": portrait_id, "query_vector": vector, "per_type_k": top_k, "top_k": top_k}
+        bound = compiled.construct_params(params)
+        args = [bound[name] for name in order]
+        started = time.perf_counter()
+        await raw.prepare(sql)
+        prepare.append(time.perf_counter() - started)
+        explained = await raw.fetchval(f"EXPLAIN (ANALYZE, FORMAT JSON) {sql}", *args)
+        plan.append(_explain(explained)["Planning Time"] / 1000)
+        execute.append(_explain(explained)["Execution Time"] / 1000)
+    print(f"  new: {len(sql) / 1024:.1f} KiB of SQL in 1 statement, all five types (vector type oid {vector_type})")
+    report("new: encode vector parameter", build)
+    report("new: server parse (once per connection)", prepare)
+    report("new: server planning", plan)
+    report("new: server execution", execute)
+    await raw.reset_type_codec("vector", schema="public")
+
+
+def _explain(value) -> dict:
+    import json
+    return (json.loads(value) if isinstance(value, str) else value)[0]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--portraits", type=int, default=50)
+    parser.add_argument("--queries", type=int, default=300)
+    parser.add_argument("--top-k", type=int, default=10)
+    args = parser.parse_args()
+    rng = np.random.default_rng(3)
+    random.seed(3)
+
+    engine = create_async_engine(args.database_url, pool_size=5,
+                                 connect_args={"server_settings": {"search_path": f"{SCHEMA},public"}})
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        await conn.run_sync(Base.metadata.create_all, tables=TABLES)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    raw = await asyncpg.connect(engine.url.set(drivername="postgresql").render_as_string(hide_password=False),
+                                server_settings={"search_path": f"{SCHEMA},public"})
+
+    try:
+        portraits = []
+        async with sessions() as session:
+            user = User(tg_id=1, first_name="bench")
+            session.add(user)
+            await session.flush()
+            for _ in range(args.portraits):
+                portrait = DigitalPortrait(user_id=user.id, status="ready", birth_data={},
+                                           systems_used=["western_astrology"])
+                session.add(portrait)
+                await session.flush()
+                session.add_all(portrait_rows(portrait.id, rng))
+                portraits.append((portrait.id, portrait.updated_at.isoformat()))
+            await session.commit()
+            await session.execute(text("ANALYZE"))
+        print(f"{args.portraits} portraits, {len(portrait_rows('x', rng))} records each")
+
+        queries = unit(rng, args.queries)
+        await statement_costs(raw, portraits[0][0], queries[:50], args.top_k)
+
+        current = {}
+
+        async def precomputed(query: str):
+            return current["vector"]
+
+        search.generate_embedding = precomputed
+        workload = [(random.choice(portraits), q) for q in queries]
+
+        print("end-to-end (semantic_search):")
+        async with sessions() as session:
+            samples = []
+            for (portrait_id, _), query in workload:
+                started = time.perf_counter()
+                await legacy_search(session, portrait_id, query.tolist(), args.top_k)
+                samples.append(time.perf_counter() - started)
+            report("old: 2 queries, vector literal, 2 types", samples)
+
+            samples = []
+            for (portrait_id, _), query in workload:
+                current["vector"] = query.tolist()
+                started = time.perf_counter()
+                await search.semantic_search(session, portrait_id, "запрос", top_k=args.top_k)
+                samples.append(time.perf_counter() - started)
+            report("new: 1 UNION ALL query, 5 types", samples)
+
+            samples = []
+            for (portrait_id, _), query in workload:
+                current["vector"] = query.tolist()
+                started = time.perf_counter()
+                await search.semantic_search(session, portrait_id, "запрос", top_k=args.top_k,
+                                             spheres_filter=[2, 7], influence_filter=["high", "medium"])
+                samples.append(time.perf_counter() - started)
+            report("new: with sphere + influence filters", samples)
+
+            hot = portraits[:5]
+            for portrait_id, version in hot:
+                for _ in range(search.search_indexes.hot_after):
+                    await search.semantic_search(session, portrait_id, "запрос", version=version)
+            samples, agree = [], 0
+            for n, query in enumerate(queries):
+                portrait_id, version = hot[n % len(hot)]
+                current["vector"] = query.tolist()
+                started = time.perf_counter()
+                found = await search.semantic_search(session, portrait_id, "запрос", top_k=args.top_k,
+                                                     version=version)
+                samples.append(time.perf_counter() - started)
+                expected = await search.semantic_search(session, portrait_id, "запрос", top_k=args.top_k)
+                agree += [r["id"] for r in found] == [r["id"] for r in expected]
+            report(f"new: hot portrait, in-memory index", samples)
+            print(f"  in-memory == SQL top-{args.top_k}: {agree}/{len(queries)}; "
+                  f"index stats {search.search_indexes.stats()}")
+    finally:
+        await raw.close()
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,232 @@
+"""
+Benchmark: bytes pulled from Postgres and queries per read path — full-row
+entity loads (every 1536-dim embedding travels with the row) vs column
+projections and deferred vectors.
+
+Usage:
+  python scripts/bench_read_projection.py [--pg-socket /tmp/pgdata/.s.PGSQL.5432]
+      [--pg-user postgres] [--pg-database postgres] [--iterations 200] [--facts 60]
+
+To compare with an older tree, put its backend first on PYTHONPATH:
+  PYTHONPATH=/path/to/old/backend python scripts/bench_read_projection.py
+
+Postgres is reached through an in-process TCP proxy in front of the unix
+socket, so "KB from DB" is the exact wire size of the results. Queries are
+counted with a before_cursor_execute listener. Tables live in a scratch
+schema that is dropped afterwards.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+import httpx
+from fastapi import FastAPI
+from sqlalchemy import event, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.database import Base, get_db
+from app.core.astrology import vector_matcher
+from app.dsb.api.routes import portraits as portraits_routes
+from app.dsb.storage.models import (
+    DigitalPortrait, PortraitAspectChain, PortraitDocument, PortraitFact, PortraitMetaPattern,
+    PortraitPattern, PortraitRecommendation, PortraitShadowAudit, PortraitSummary,
+)
+from app.dsb.storage.repository import PortraitRepository
+from app.models.align_session import AlignSession
+from app.models.avatar_card import AvatarCard
+from app.models.card_progress import CardProgress
+from app.models.sync_session import SyncSession
+from app.models.text_diagnostics import Archetype, Sphere, TextScene
+from app.models.user import User
+from app.routers import cards as cards_routes
+
+from bench_portrait_read import synthetic_portrait
+
+SCHEMA = "bench_read_projection"
+TABLES = [
+    User.__table__, DigitalPortrait.__table__, PortraitFact.__table__, PortraitAspectChain.__table__,
+    PortraitPattern.__table__, PortraitRecommendation.__table__, PortraitShadowAudit.__table__,
+    PortraitMetaPattern.__table__, PortraitSummary.__table__, PortraitDocument.__table__,
+    AvatarCard.__table__, Sphere.__table__, Archetype.__table__, TextScene.__table__,
+    CardProgress.__table__, SyncSession.__table__, AlignSession.__table__,
+]
+TEXT = "Развёрнутое описание на несколько предложений. " * 6
+
+
+def vector() -> list[float]:
+    return [random.random() for _ in range(1536)]
+
+
+class WireCounter:
+    """TCP → unix socket proxy; counts bytes sent by the server."""
+
+    def __init__(self, socket_path: str):
+        self.socket_path = socket_path
+        self.received = 0
+
+    async def handle(self, client_reader, client_writer):
+        server_reader, server_writer = await asyncio.open_unix_connection(self.socket_path)
+
+        async def pipe(reader, writer, count: bool):
+            try:
+                while data := await reader.read(65536):
+                    if count:
+                        self.received += len(data)
+                    writer.write(data)
+                    await writer.drain()
+            finally:
+                writer.close()
+
+        await asyncio.gather(pipe(client_reader, server_writer, False), pipe(server_reader, client_writer, True),
+                             return_exceptions=True)
+
+    async def start(self) -> int:
+        self.server = await asyncio.start_server(self.handle, "127.0.0.1", 0)
+        return self.server.sockets[0].getsockname()[1]
+
+
+async def seed(session: AsyncSession, facts: int) -> dict:
+    user = User(tg_id=1)
+    session.add(user)
+    await session.flush()
+    ready = DigitalPortrait(user_id=user.id, birth_data={"date": "1990-03-15"},
+                            systems_used=["western_astrology"], status="ready")
+    generating = DigitalPortrait(user_id=user.id, birth_data={"date": "1990-03-15"},
+                                 systems_used=["western_astrology"], status="generating")
+    session.add_all([ready, generating])
+    await session.flush()
+    session.add_all(synthetic_portrait(ready.id, facts) + synthetic_portrait(generating.id, facts))
+
+    session.add_all([Sphere(id=n, key=f"S{n}") for n in range(1, 9)] + [Archetype(id=n, name=f"A{n}") for n in range(1, 9)])
+    session.add_all(
+        AvatarCard(archetype_id=a, sphere=f"S{s}", shadow=TEXT, light=TEXT, embedding=vector())
+        for s in range(1, 9) for a in range(1, 23)
+    )
+    session.add_all(
+        TextScene(sphere_id=s, archetype_id=s, scene_text=TEXT, scene_embedding=vector(), meta_data={"k": "v"})
+        for s in range(1, 9) for _ in range(25)
+    )
+    card = CardProgress(user_id=user.id, archetype_id=1, sphere="S1")
+    session.add(card)
+    await session.flush()
+    session.add_all(
+        SyncSession(user_id=user.id, card_progress_id=card.id, archetype_id=1, sphere="S1", is_complete=True,
+                    hawkins_score=200, real_picture=TEXT, core_pattern=TEXT, session_transcript=[TEXT] * 20)
+        for _ in range(3)
+    )
+    session.add_all(
+        AlignSession(user_id=user.id, card_progress_id=card.id, archetype_id=1, sphere="S1", is_complete=True,
+                     hawkins_entry=150, hawkins_exit=250, messages_json=[{"role": "user", "content": TEXT}] * 20)
+        for _ in range(10)
+    )
+    await session.commit()
+    return {"user": user.id, "ready": ready.id, "generating": generating.id, "card": card.id}
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--pg-socket", default="/tmp/pgdata/.s.PGSQL.5432")
+    parser.add_argument("--pg-user", default="postgres")
+    parser.add_argument("--pg-database", default="postgres")
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--facts", type=int, default=60)
+    args = parser.parse_args()
+
+    wire = WireCounter(args.pg_socket)
+    port = await wire.start()
+    engine = create_async_engine(
+        f"postgresql+asyncpg://{args.pg_user}@127.0.0.1:{port}/{args.pg_database}",
+        connect_args={"server_settings": {"search_path": f"{SCHEMA},public"}},
+    )
+    queries = 0
+
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def count_query(*_):
+        nonlocal queries
+        queries += 1
+
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.run_sync(Base.metadata.create_all, tables=TABLES)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    async def bench_db():
+        async with sessions() as session:
+            yield session
+
+    app = FastAPI()
+    app.include_router(portraits_routes.router, prefix="/api/dsb")
+    app.include_router(cards_routes.router, prefix="/api/cards")
+    app.dependency_overrides[get_db] = bench_db
+
+    async def fixed_embeddings(texts: list[str]) -> list[list[float]]:
+        return [query_vector] * len(texts)
+
+    query_vector = vector()
+    vector_matcher.embed_many = fixed_embeddings  # no OpenAI call: the DB side is measured
+
+    try:
+        async with sessions() as session:
+            ids = await seed(session, args.facts)
+        client = httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://bench")
+
+        async def http_get(url: str):
+            response = await client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+
+        async def materialize():
+            async with sessions() as session:
+                await PortraitRepository(session).materialize_document(ids["ready"])
+                await session.rollback()
+
+        async def match_text():
+            async with sessions() as session:
+                assert await vector_matcher.match_text_to_archetypes(session, "текст")
+
+        async def scene_library():
+            async with sessions() as session:
+                result = await session.execute(
+                    select(TextScene).where(TextScene.sphere_id == 3).where(TextScene.is_active == True)
+                )
+                assert len(result.scalars().all()) == 25
+
+        scenarios = [
+            ("materialize document", materialize),
+            ("sphere, generating", lambda: http_get(f"/api/dsb/portraits/{ids['generating']}/sphere/7")),
+            ("brief, generating", lambda: http_get(f"/api/dsb/portraits/{ids['generating']}/brief")),
+            ("card history", lambda: http_get(f"/api/cards/{ids['user']}/card/{ids['card']}/history")),
+            ("cards list", lambda: http_get(f"/api/cards/{ids['user']}")),
+            ("match_text top-5", match_text),
+            ("scene library (25)", scene_library),
+        ]
+        print(f"{args.iterations} iterations per path, {args.facts} facts per portrait")
+        for name, op in scenarios:
+            for _ in range(5):  # прогрев: пул соединений, кэш запросов
+                await op()
+            queries, wire.received = 0, 0
+            latencies = []
+            for _ in range(args.iterations):
+                started = time.perf_counter()
+                await op()
+                latencies.append(time.perf_counter() - started)
+            print(f"{name:>22}: {wire.received / args.iterations / 1024:8.1f} KB from DB  "
+                  f"{queries / args.iterations:4.1f} queries  p50 {statistics.median(latencies) * 1000:6.2f} ms")
+        await client.aclose()
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await engine.dispose()
+        wire.server.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,177 @@
+"""
+Benchmark: persisting a full DSB portrait — ORM session.add per row vs
+PortraitRepository bulk INSERT (one statement per table).
+
+Usage:
+  python scripts/bench_repository_bulk.py [--database-url postgresql+asyncpg://...] [--rounds 5]
+
+Layer 1 payload is the real output of every calculator in SYSTEM_REGISTRY
+for a fixed birth; layers 2-5 are synthetic but sized like a real portrait
+(facts per system, 12 spheres of chains/patterns/recommendations/shadows,
+meta patterns, 13 summaries). Tables are created in a scratch schema that is
+dropped afterwards, so any database with the pgvector extension will do.
+"""
+import argparse
+import asyncio
+import datetime
+import os
+import statistics
+import sys
+import time
+import uuid
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.database import Base
+from app.dsb.calculators.base import BirthData
+from app.dsb.config import SYSTEM_REGISTRY
+from app.dsb.interpreters.schemas import UniversalInsightSchema
+from app.dsb.pipeline.orchestrator import _import_class
+from app.dsb.storage import repository
+from app.dsb.storage.models import (
+    DigitalPortrait, PortraitAspectChain, PortraitFact, PortraitMetaPattern, PortraitPattern,
+    PortraitRawData, PortraitRecommendation, PortraitShadowAudit, PortraitSummary,
+)
+from app.dsb.storage.repository import PortraitRepository
+from app.models.user import User
+
+SCHEMA = "bench_dsb_bulk"
+TABLES = [
+    User.__table__, DigitalPortrait.__table__, PortraitRawData.__table__, PortraitFact.__table__,
+    PortraitAspectChain.__table__, PortraitPattern.__table__, PortraitRecommendation.__table__,
+    PortraitShadowAudit.__table__, PortraitMetaPattern.__table__, PortraitSummary.__table__,
+]
+BIRTH = BirthData(
+    date=datetime.date(1990, 3, 15), time=datetime.time(14, 30), place="Kyiv",
+    lat=50.45, lon=30.52, timezone="Europe/Kiev", full_name="Иван Петров",
+)
+TEXT = "Развёрнутое описание на несколько предложений. " * 6
+
+
+async def layer1_results() -> dict[str, dict]:
+    results = {}
+    for name, cfg in SYSTEM_REGISTRY.items():
+        if cfg.get("runs_calculator", False):
+            calc = _import_class(cfg["calculator"])()
+            results[name] = (await calc.calculate(BIRTH)).get("raw_data", {})
+    return results
+
+
+def synthetic_layers(systems: list[str], facts_per_system: int):
+    insights = [
+        UniversalInsightSchema(
+            source_system=system, position=f"{system} element {i}", spheres_affected=[1, 7, 10],
+            primary_sphere=i % 12 + 1, influence_level="medium", polarity="dual",
+            light_aspect=TEXT, shadow_aspect=TEXT, energy_description=TEXT, core_theme="Тема",
+            developmental_task=TEXT, integration_key=TEXT, triggers=["ситуация"] * 3,
+        )
+        for system in systems for i in range(facts_per_system)
+    ]
+    spheres = [
+        {
+            "sphere_num": n,
+            "layer2_chains": [{"chain_name": f"chain {i}", "systems_involved": systems[:3],
+                               "convergence_score": 0.7, "description": TEXT} for i in range(4)],
+            "layer3_patterns": [{"pattern_name": f"pattern {i}", "formula": "A + B", "description": TEXT,
+                                 "systems_supporting": systems[:2], "convergence_score": 0.6} for i in range(4)],
+            "layer4_recommendations": [{"text": TEXT, "source_system": systems[0],
+                                        "influence_level": "high", "category": "practice"} for _ in range(5)],
+            "layer5_shadow_audit": [{"risk_name": f"risk {i}", "description": TEXT, "source_systems": systems[:2],
+                                     "convergence_score": 0.5, "antidote": TEXT} for i in range(3)],
+        }
+        for n in range(1, 13)
+    ]
+    meta = {"meta_patterns": [{"name": f"meta {i}", "spheres_involved": [1, 4, 7], "description": TEXT,
+                               "systems_supporting": systems, "convergence_score": 0.8,
+                               "key_manifestations": ["a", "b"]} for i in range(5)]}
+    brief = {f"sphere_{i}_brief": TEXT for i in range(1, 13)} | {"overall_brief": TEXT}
+    return insights, spheres, meta, brief
+
+
+async def persist_orm(session: AsyncSession, portrait_id: str, raw, insights, spheres, meta, brief) -> int:
+    """Как было до bulk-пути: по ORM-объекту на строку, flush на commit."""
+    objects = []
+    for system, raw_data in raw.items():
+        objects += [PortraitRawData(**row) for row in repository.build_raw_data_rows(portrait_id, system, raw_data)]
+    objects += [PortraitFact(**row) for row in repository.build_fact_rows(portrait_id, insights)]
+    for sphere_data in spheres:
+        for model, rows in repository.build_sphere_rows(portrait_id, sphere_data).items():
+            objects += [model(**row) for row in rows]
+    objects += [PortraitMetaPattern(**row) for row in repository.build_meta_pattern_rows(portrait_id, meta)]
+    objects += [PortraitSummary(**row) for row in repository.build_summary_rows(portrait_id, brief)]
+    for obj in objects:
+        session.add(obj)
+    await session.commit()
+    return len(objects)
+
+
+async def persist_bulk(session: AsyncSession, portrait_id: str, raw, insights, spheres, meta, brief) -> int:
+    repo = PortraitRepository(session)
+    count = await repo.save_raw_results_many(portrait_id, raw)
+    count += await repo.save_facts(portrait_id, insights)
+    count += await repo.save_sphere_syntheses(portrait_id, spheres)
+    count += await repo.save_meta_patterns(portrait_id, meta)
+    count += await repo.save_summaries(portrait_id, brief)
+    await session.commit()
+    return count
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--rounds", type=int, default=5)
+    parser.add_argument("--facts-per-system", type=int, default=25)
+    args = parser.parse_args()
+
+    raw = await layer1_results()
+    insights, spheres, meta, brief = synthetic_layers(list(raw), args.facts_per_system)
+
+    engine = create_async_engine(
+        args.database_url, connect_args={"server_settings": {"search_path": f"{SCHEMA},public"}},
+    )
+    async with engine.begin() as conn:
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.run_sync(Base.metadata.create_all, tables=TABLES)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+
+    try:
+        async with sessions() as session:
+            user = User(tg_id=1)
+            session.add(user)
+            await session.commit()
+            user_id = user.id
+
+        timings: dict[str, list[float]] = {"orm": [], "bulk": []}
+        rows = 0
+        # Первый раунд — прогрев (компиляция запросов, соединения пула)
+        for round_num in range(args.rounds + 1):
+            for name, persist in (("orm", persist_orm), ("bulk", persist_bulk)):
+                async with sessions() as session:
+                    portrait_id = str(uuid.uuid4())
+                    session.add(DigitalPortrait(id=portrait_id, user_id=user_id, birth_data={}, systems_used=list(raw)))
+                    await session.commit()
+                    started = time.perf_counter()
+                    rows = await persist(session, portrait_id, raw, insights, spheres, meta, brief)
+                    if round_num:
+                        timings[name].append(time.perf_counter() - started)
+
+        print(f"Portrait: {len(raw)} systems, {rows} rows")
+        for name, values in timings.items():
+            print(f"{name:>5}: median {statistics.median(values) * 1000:7.1f} ms  "
+                  f"(min {min(values) * 1000:.1f}, max {max(values) * 1000:.1f}, {args.rounds} rounds)")
+        print(f"speedup: {statistics.median(timings['orm']) / statistics.median(timings['bulk']):.1f}x")
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,160 @@
+"""
+Benchmark: scene selection at sync start — the per-session query of the
+sphere's active scenes plus random.sample (as start_sync did) vs the
+in-process scene index (app/core/scene_index.py).
+
+Usage:
+  python scripts/bench_scene_index.py [--database-url postgresql+asyncpg://...]
+      [--scenes-per-sphere 200] [--iterations 300]
+
+A simulated library (12 spheres, random 1536-dim embeddings, SceneStats with
+random rewards, one user with 40 answered scenes) lives in a scratch schema
+that is dropped afterwards. Measured per session start:
+  old        SELECT of the sphere's active TextScene rows + random.sample
+  index      seen_scene_ids() query + SceneIndex.select() per policy
+  select     SceneIndex.select() alone (no database)
+and once: loading the index, a refresh without changes (signature + stats)
+and record_scene_reward() (the upsert the interaction job runs).
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+import numpy as np
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.core import scene_index
+from app.core.scene_index import SceneIndex, record_scene_reward, seen_scene_ids
+from app.database import Base
+from app.models.text_diagnostics import Archetype, SceneInteraction, SceneStats, Sphere, TextScene
+
+SCHEMA = "bench_scene_index"
+SPHERES = 12
+DIMS = 1536
+USER_ID = 1
+
+
+def ms(values) -> str:
+    return f"p50 {statistics.median(values) * 1000:8.3f} ms   p95 {np.percentile(values, 95) * 1000:8.3f} ms"
+
+
+async def seed(sessions, rng, per_sphere: int) -> None:
+    async with sessions() as db:
+        db.add_all([Sphere(id=s, key=f"SPHERE_{s}", name_ru=f"Сфера {s}") for s in range(1, SPHERES + 1)])
+        await db.flush()
+        n = SPHERES * per_sphere
+        vectors = rng.standard_normal((n, DIMS)).astype(np.float32)
+        scenes = [
+            TextScene(sphere_id=1 + i % SPHERES, scene_text="Сцена " * 60, scene_embedding=vectors[i],
+                      meta_data={"scene_name": f"scene {i}", "projection_dictionary": [{"object": "x" * 200}] * 3},
+                      is_active=True)
+            for i in range(n)
+        ]
+        db.add_all(scenes)
+        await db.flush()
+        shown = rng.integers(0, 200, n)
+        db.add_all([
+            SceneStats(scene_id=scene.id, times_shown=int(k), reward_sum=float(rng.uniform(0, 1) * k))
+            for scene, k in zip(scenes, shown)
+        ])
+        db.add_all([
+            SceneInteraction(user_id=USER_ID, session_id=i // 5, scene_id=scenes[i * SPHERES].id, layer_index=1 + i % 5)
+            for i in range(40)
+        ])
+        await db.commit()
+
+
+async def old_select(db, sphere_id: int) -> list:
+    """start_sync before the index."""
+    result = await db.execute(select(TextScene).where(TextScene.sphere_id == sphere_id, TextScene.is_active == True))
+    scenes = result.scalars().all()
+    if len(scenes) < 5:
+        result = await db.execute(select(TextScene).where(TextScene.is_active == True).limit(20))
+        scenes = result.scalars().all()
+    return random.sample(scenes, min(len(scenes), 5)) if scenes else []
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--scenes-per-sphere", type=int, default=200)
+    parser.add_argument("--iterations", type=int, default=300)
+    args = parser.parse_args()
+
+    engine = create_async_engine(args.database_url, connect_args={"server_settings": {"search_path": f"{SCHEMA},public"}})
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.run_sync(Base.metadata.create_all, tables=[
+            Sphere.__table__, Archetype.__table__, TextScene.__table__, SceneStats.__table__,
+            SceneInteraction.__table__,
+        ])
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    rng = np.random.default_rng(0)
+    try:
+        await seed(sessions, rng, args.scenes_per_sphere)
+        print(f"{SPHERES * args.scenes_per_sphere} scenes ({args.scenes_per_sphere} per sphere x {SPHERES}), "
+              f"{args.iterations} session starts each")
+        spheres = [int(s) for s in rng.integers(1, SPHERES + 1, args.iterations)]
+
+        async with sessions() as db:
+            for sphere_id in spheres[:20]:  # warm up the connection and statement caches
+                await old_select(db, sphere_id)
+            timings = []
+            for sphere_id in spheres:
+                t0 = time.perf_counter()
+                await old_select(db, sphere_id)
+                timings.append(time.perf_counter() - t0)
+        print(f"  old (query + random.sample)           {ms(timings)}")
+
+        scene_index.reset_scene_index()
+        async with sessions() as db:
+            t0 = time.perf_counter()
+            index = await scene_index.get_scene_index(db)
+            load = time.perf_counter() - t0
+            settings.SCENE_INDEX_REFRESH = 0.0
+            t0 = time.perf_counter()
+            await scene_index.get_scene_index(db)
+            refresh = time.perf_counter() - t0
+            settings.SCENE_INDEX_REFRESH = 3600.0
+
+            for policy, diversity in (("random", 0.0), ("thompson", 0.0), ("ucb", 0.0), ("thompson", 0.3), ("ucb", 0.3)):
+                timings, select_only = [], []
+                for sphere_id in spheres:
+                    t0 = time.perf_counter()
+                    seen = await seen_scene_ids(db, USER_ID)
+                    t1 = time.perf_counter()
+                    chosen = index.select(sphere_id, seen=seen, policy=policy, diversity=diversity)
+                    t2 = time.perf_counter()
+                    assert len(chosen) == 5 and not {s.id for s in chosen} & seen
+                    timings.append(t2 - t0)
+                    select_only.append(t2 - t1)
+                label = f"{policy}, diversity {diversity}"
+                print(f"  index ({label:<23}) {ms(timings)}   select alone {ms(select_only)}")
+
+            t0 = time.perf_counter()
+            for scene in index.scenes[:100]:
+                await record_scene_reward(db, scene.id, 12.0, 150)
+            await db.commit()
+            record = (time.perf_counter() - t0) / 100
+            shown = (await db.execute(select(SceneStats.times_shown).where(SceneStats.scene_id == index.scenes[0].id))).scalar()
+        print(f"  index load {load * 1000:.0f} ms ({len(index)} scenes), refresh without changes "
+              f"{refresh * 1000:.1f} ms, record_scene_reward {record * 1000:.2f} ms "
+              f"(times_shown {int(index.shown[0])} -> {shown})")
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
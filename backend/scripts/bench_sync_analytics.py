@@ -0,0 +1,202 @@
+"""
+Benchmark: database work of post-sync analytics per completed session — the
+per-session sync.post_process job (older trees) vs the batched, incremental
+sync.analytics job (app/core/sync_analytics.py).
+
+Usage:
+  python scripts/bench_sync_analytics.py [--database-url postgresql+asyncpg://...]
+      [--users 5] [--history 30] [--burst 3] [--spheres 4]
+
+To compare with an older tree, put its backend first on PYTHONPATH:
+  PYTHONPATH=/path/to/old/backend python scripts/bench_sync_analytics.py
+
+Every user has --history completed sessions over --spheres spheres, already
+through the pipeline (not measured), then completes --burst more in a row,
+each with five scene interactions (embeddings, extracted features). Measured
+per completed session: SQL statements sent (cursor executions, executemany
+counted once), commits and wall time of
+  old        one post-process job per session
+  separate   one sync.analytics job per session (each alone in its window)
+  batched    one sync.analytics job per user for the whole burst
+A fingerprint of the resulting aggregates (portrait and sphere Hawkins,
+world baseline, pattern occurrences) is printed to compare the trees.
+Tables live in a scratch schema that is dropped afterwards.
+"""
+import argparse
+import asyncio
+import os
+import random
+import statistics
+import sys
+import time
+
+from sqlalchemy import event, func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.agents.common import SPHERES
+from app.config import settings
+from app.database import Base
+from app.models import (
+    CardProgress, Pattern, SphereKnowledge, SyncSession, User, UserPortrait, UserWorldKnowledge,
+)
+from app.models.background_job import BackgroundJob
+from app.models.data_architecture import SessionFeatures, UserBehaviorProfileV2
+from app.models.text_diagnostics import Archetype, SceneInteraction, Sphere, TextScene
+from app.routers import sync as sync_routes
+
+BATCHED = hasattr(sync_routes, "_run_sync_analytics")
+SCHEMA = "bench_sync_analytics"
+TABLES = [User.__table__, CardProgress.__table__, SyncSession.__table__, UserPortrait.__table__,
+          Pattern.__table__, SphereKnowledge.__table__, UserWorldKnowledge.__table__,
+          SessionFeatures.__table__, UserBehaviorProfileV2.__table__, Sphere.__table__, Archetype.__table__,
+          TextScene.__table__, SceneInteraction.__table__, BackgroundJob.__table__]
+try:
+    from app.models import SyncEvent
+    TABLES.append(SyncEvent.__table__)
+except ImportError:  # trees before the event log
+    pass
+PATTERNS = ["Контроль через избегание", "Страх отвержения, поиск опоры", "Ожидание одобрения извне",
+            "Гиперответственность и усталость", "Сдерживание гнева"]
+
+
+class StatementCounter:
+    def __init__(self, engine):
+        self.statements = self.commits = 0
+        event.listen(engine.sync_engine, "before_cursor_execute", self.on_statement)
+        event.listen(engine.sync_engine, "commit", self.on_commit)
+
+    def on_statement(self, *args):
+        self.statements += 1
+
+    def on_commit(self, *args):
+        self.commits += 1
+
+    def snapshot(self) -> tuple[int, int]:
+        return self.statements, self.commits
+
+
+async def add_sessions(sessions, rng, user_id: int, cards: dict, n: int) -> list[tuple[int, str]]:
+    """n completed sessions with their interactions; returns (session_id, sphere)."""
+    async with sessions() as db:
+        rows = []
+        for _ in range(n):
+            sphere = rng.choice(list(cards))
+            rows.append(SyncSession(
+                user_id=user_id, card_progress_id=cards[sphere], archetype_id=rng.randint(0, 21), sphere=sphere,
+                is_complete=True, current_phase=6, hawkins_score=rng.choice([150, 175, 200, 250, 310]),
+                core_pattern=rng.choice(PATTERNS), extracted_core_belief="...", extracted_body_anchor=rng.choice(["грудь", "горло", "живот"]),
+                mental_thinking="...", phase_data={}, session_transcript=[],
+            ))
+        db.add_all(rows)
+        await db.flush()
+        db.add_all([
+            SceneInteraction(
+                user_id=user_id, session_id=row.id, layer_index=layer, reading_time=rng.uniform(4, 30),
+                response_text="Сжимается грудь, я смотрю на дверь и не двигаюсь. " * 3,
+                response_embedding=[rng.random() for _ in range(1536)],
+                extracted_features={"emotion_vector": {"fear": rng.random(), "calm": rng.random()}},
+            )
+            for row in rows for layer in range(1, 6)
+        ])
+        await db.commit()
+        return [(row.id, row.sphere) for row in rows]
+
+
+async def run_old(completed: list[tuple[int, str]], user_id: int) -> None:
+    for session_id, sphere in completed:
+        await sync_routes._background_sync_processing(user_id=user_id, session_id=session_id, sphere=sphere)
+
+
+async def fingerprint(sessions, user_ids: list[int]) -> str:
+    async with sessions() as db:
+        portraits = (await db.execute(
+            select(func.sum(UserPortrait.avg_hawkins), func.sum(UserPortrait.min_hawkins))
+            .where(UserPortrait.user_id.in_(user_ids))
+        )).one()
+        spheres = await db.scalar(select(func.sum(SphereKnowledge.sphere_hawkins)).where(SphereKnowledge.user_id.in_(user_ids)))
+        world = await db.scalar(select(func.sum(UserWorldKnowledge.hawkins_baseline)).where(UserWorldKnowledge.user_id.in_(user_ids)))
+        patterns = await db.scalar(select(func.sum(Pattern.occurrences)).where(Pattern.user_id.in_(user_ids)))
+        features = await db.scalar(select(func.count()).select_from(SessionFeatures).where(SessionFeatures.user_id.in_(user_ids)))
+    return (f"portrait avg/min {portraits[0]}/{portraits[1]}, sphere {spheres}, world {world}, "
+            f"pattern occurrences {patterns}, session features {features}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--history", type=int, default=30)
+    parser.add_argument("--burst", type=int, default=3)
+    parser.add_argument("--spheres", type=int, default=4)
+    args = parser.parse_args()
+
+    engine = create_async_engine(args.database_url, connect_args={"server_settings": {"search_path": f"{SCHEMA},public"}})
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.run_sync(Base.metadata.create_all, tables=TABLES)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    sync_routes.AsyncSessionLocal = sessions
+    counter = StatementCounter(engine)
+    rng = random.Random(11)
+
+    try:
+        scenarios = ["separate", "batched"] if BATCHED else ["old"]
+        print(f"{'batched sync.analytics' if BATCHED else 'per-session sync.post_process'}: {args.users} users, "
+              f"{args.history} sessions of history over {args.spheres} spheres, bursts of {args.burst}")
+        for scenario in scenarios:
+            async with sessions() as db:
+                users = [User(tg_id=40_000 + i + 1000 * scenarios.index(scenario), is_premium=True) for i in range(args.users)]
+                db.add_all(users)
+                await db.flush()
+                user_ids = [user.id for user in users]
+                spheres = list(SPHERES)[:args.spheres]
+                cards = {uid: {} for uid in user_ids}
+                for uid in user_ids:
+                    for sphere in spheres:
+                        card = CardProgress(user_id=uid, archetype_id=1, sphere=sphere, hawkins_current=150)
+                        db.add(card)
+                        await db.flush()
+                        cards[uid][sphere] = card.id
+                await db.commit()
+
+            # History through the pipeline of this tree, not measured
+            for uid in user_ids:
+                history = await add_sessions(sessions, rng, uid, cards[uid], args.history)
+                if BATCHED:
+                    await sync_routes._run_sync_analytics(user_id=uid)
+                else:
+                    await run_old(history, uid)
+
+            bursts = {uid: await add_sessions(sessions, rng, uid, cards[uid], args.burst) for uid in user_ids}
+            statements, commits, timings = [], [], []
+            for uid in user_ids:
+                before = counter.snapshot()
+                t0 = time.perf_counter()
+                if scenario == "old":
+                    await run_old(bursts[uid], uid)
+                elif scenario == "separate":
+                    for _ in bursts[uid]:
+                        async with sessions() as db:
+                            await sync_routes.fold_completed_sessions(db, uid, limit=1)
+                            await db.commit()
+                else:
+                    await sync_routes._run_sync_analytics(user_id=uid)
+                timings.append((time.perf_counter() - t0) / args.burst)
+                after = counter.snapshot()
+                statements.append((after[0] - before[0]) / args.burst)
+                commits.append((after[1] - before[1]) / args.burst)
+            print(f"\n  {scenario}: per completed session {statistics.fmean(statements):.1f} statements, "
+                  f"{statistics.fmean(commits):.1f} commits, {statistics.fmean(timings) * 1000:.1f} ms")
+            print(f"  {await fingerprint(sessions, user_ids)}")
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
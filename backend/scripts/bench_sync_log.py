@@ -0,0 +1,260 @@
+"""
+Benchmark: what a sync phase writes to the database, and what happens when
+two requests answer the same phase, with the transcript and phase state
+rewritten as JSONB blobs on sync_sessions (older trees) vs appended to
+sync_events (app/core/sync_log.py).
+
+Usage:
+  python scripts/bench_sync_log.py [--database-url postgresql+asyncpg://...]
+      [--sessions 20] [--scene-kb 4] [--reply-chars 1200] [--llm-ms 0] [--race 10] [--race-ms 50]
+
+To compare with an older tree, put its backend first on PYTHONPATH:
+  PYTHONPATH=/path/to/old/backend python scripts/bench_sync_log.py
+
+Each session is started and taken through its six phases (intro, layers
+1-5, the last one to the mirror) with somatic answers from
+data/somatic_seed.jsonl; the LLM and the embedding API are fakes answering
+after --llm-ms with --reply-chars of text. Scenes carry --scene-kb of
+metadata (projection dictionaries), which phase_data keeps for the whole
+session. Replies and metadata are words of the seed answers in random
+order, so they compress about as well as real text. Per phase:
+  wal      bytes of WAL the request generated (pg_current_wal_lsn before/after)
+  row      sync_sessions row size after the phase (pg_column_size)
+  latency  process_phase wall time
+Then --race sessions get the answer to layer 1 twice at once (fake LLM
+answers after --race-ms, so both requests read the same state): counted are
+the requests that succeeded, the answers left in the transcript and the
+interaction jobs enqueued. Tables live in a scratch schema that is dropped
+afterwards; run it against an otherwise idle server, the WAL is global.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+from types import SimpleNamespace
+
+from fastapi import HTTPException
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.agents import analytic_agent, sync_agent
+from app.config import settings
+from app.core import symbolic_service
+from app.database import Base
+from app.models import CardProgress, SyncSession, User, UserPortrait
+from app.models.background_job import BackgroundJob
+from app.models.text_diagnostics import Archetype, SceneInteraction, SceneStats, Sphere, TextScene
+from app.routers import sync as sync_routes
+
+try:
+    from app.models import SyncEvent
+except ImportError:  # trees before the event log
+    SyncEvent = None
+
+SCHEMA = "bench_sync_log"
+TABLES = [User.__table__, CardProgress.__table__, SyncSession.__table__, UserPortrait.__table__,
+          Sphere.__table__, Archetype.__table__, TextScene.__table__, SceneStats.__table__, SceneInteraction.__table__,
+          BackgroundJob.__table__] + ([SyncEvent.__table__] if SyncEvent is not None else [])
+LAYER_TEXT = "Ты стоишь на пустой площади. Под ногами камень, впереди закрытая дверь. Что делает твоё тело?"
+MIRROR = {"real_picture": "...", "core_pattern": "Контроль", "shadow_active": "...", "hawkins_score": 200,
+          "hawkins_level": "Смелость", "symbols_identified": {}}
+PHASES = ["intro", "1", "2", "3", "4", "5 -> mirror"]
+
+
+def prose(rng: random.Random, words: list[str], chars: int) -> str:
+    out, size = [], 0
+    while size < chars:
+        out.append(rng.choice(words))
+        size += len(out[-1]) + 1
+    return " ".join(out)
+
+
+class FakeLLM:
+    def __init__(self, reply):
+        self.latency = 0.0
+        self.reply = reply
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        prompt = "\n".join(m["content"] for m in kwargs["messages"])
+        if "response_format" not in kwargs:
+            content = self.reply()
+        elif "ПРОАНАЛИЗИРУЙ ОТВЕТ" in prompt:
+            content = json.dumps({"is_somatic": True, "has_body": True, "has_objects": False, "reason": "bench"})
+        elif "ВЫДЕЛИ КЛЮЧЕВЫЕ ОБРАЗЫ" in prompt:
+            content = json.dumps({"identified_symbols": [], "new_symbols": []})
+        else:
+            content = json.dumps(MIRROR, ensure_ascii=False)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+async def wal_lsn(engine) -> str:
+    async with engine.connect() as conn:
+        return (await conn.execute(text("SELECT pg_current_wal_lsn()"))).scalar()
+
+
+async def wal_since(engine, lsn: str) -> int:
+    async with engine.connect() as conn:
+        return int((await conn.execute(text("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), :lsn)"), {"lsn": lsn})).scalar())
+
+
+async def row_size(sessions, session_id: int) -> int:
+    async with sessions() as db:
+        return (await db.execute(
+            select(func.pg_column_size(text("sync_sessions.*"))).select_from(SyncSession).where(SyncSession.id == session_id)
+        )).scalar()
+
+
+async def phase(sessions, user_id: int, session_id: int, current: int, answer: str) -> dict:
+    async with sessions() as db:
+        return await sync_routes.process_phase(
+            sync_routes.PhaseRequest(user_id=user_id, sync_session_id=session_id, phase=current,
+                                     user_response=answer), db=db)
+
+
+async def start(sessions, user_id: int, card_id: int) -> int:
+    async with sessions() as db:
+        started = await sync_routes.start_sync(
+            sync_routes.StartSyncRequest(user_id=user_id, card_progress_id=card_id), db=db)
+    return started["session_id"]
+
+
+async def new_cards(sessions, user_id: int, n: int) -> list[int]:
+    async with sessions() as db:
+        cards = [CardProgress(user_id=user_id, archetype_id=1, sphere="IDENTITY", hawkins_current=150) for _ in range(n)]
+        db.add_all(cards)
+        await db.commit()
+        return [card.id for card in cards]
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--sessions", type=int, default=20)
+    parser.add_argument("--scene-kb", type=float, default=4)
+    parser.add_argument("--reply-chars", type=int, default=1200)
+    parser.add_argument("--llm-ms", type=float, default=0)
+    parser.add_argument("--race", type=int, default=10)
+    parser.add_argument("--race-ms", type=float, default=50)
+    args = parser.parse_args()
+
+    with open(os.path.join(settings.DATA_DIR, "somatic_seed.jsonl"), encoding="utf-8") as f:
+        somatic = [row["text"] for row in map(json.loads, f) if row["is_somatic"]]
+    rng = random.Random(7)
+    words = sorted({word for answer in somatic for word in answer.split()})
+
+    llm = FakeLLM(lambda: prose(rng, words, args.reply_chars))
+
+    async def get_embedding(value: str) -> list[float]:
+        return [0.0] * settings.EMBEDDING_DIMENSIONS
+
+    sync_agent.client = analytic_agent.client = symbolic_service.client = llm
+    sync_agent.get_embedding = get_embedding
+    sync_routes.datetime = __import__("datetime")  # older trees miss this import in start_sync
+    settings.SOMATIC_LLM_SAMPLE_RATE = 0.0
+
+    engine = create_async_engine(args.database_url, connect_args={"server_settings": {"search_path": f"{SCHEMA},public"}})
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.run_sync(Base.metadata.create_all, tables=TABLES)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    sync_routes.AsyncSessionLocal = sessions
+
+    try:
+        async with sessions() as db:
+            db.add(Sphere(id=1, key="IDENTITY", name_ru="Личность"))
+            db.add(Archetype(id=1, name="Шут"))
+            await db.flush()
+            entries = max(1, int(args.scene_kb * 1024 / 200))
+            db.add_all([
+                TextScene(sphere_id=1, archetype_id=1, scene_text=LAYER_TEXT, is_active=True,
+                          meta_data={"scene_name": f"scene {i}", "projection_dictionary": [
+                              {"object": rng.choice(words), "meaning": prose(rng, words, 100)} for _ in range(entries)
+                          ]})
+                for i in range(8)
+            ])
+            user = User(tg_id=31_000, is_premium=True)
+            db.add(user)
+            await db.flush()
+            user_id = user.id
+            await db.commit()
+
+        label = "event log" if SyncEvent is not None else "JSONB rewrite"
+        print(f"{label}: {args.sessions} sessions x 6 phases, scene metadata {args.scene_kb:g} KB, "
+              f"LLM {args.llm_ms:.0f} ms")
+        llm.latency = args.llm_ms / 1000
+        wal, rows, latency = defaultdict(list), defaultdict(list), defaultdict(list)
+        for card_id in await new_cards(sessions, user_id, args.sessions):
+            session_id = await start(sessions, user_id, card_id)
+            current = 0
+            for name, answer in zip(PHASES, ["", *rng.sample(somatic, 5)]):
+                lsn = await wal_lsn(engine)
+                t0 = time.perf_counter()
+                result = await phase(sessions, user_id, session_id, current, answer)
+                latency[name].append(time.perf_counter() - t0)
+                wal[name].append(await wal_since(engine, lsn))
+                rows[name].append(await row_size(sessions, session_id))
+                current = result["current_phase"]
+            assert result["is_complete"], result
+
+        print("  phase          wal bytes   row bytes   p50 ms")
+        for name in PHASES:
+            print(f"  {name:<12} {statistics.median(wal[name]):>11.0f} {statistics.median(rows[name]):>11.0f} "
+                  f"{statistics.median(latency[name]) * 1000:>8.1f}")
+        layers = [x for name in PHASES[:-1] for x in wal[name]]
+        print(f"  per session: {sum(statistics.fmean(wal[n]) for n in PHASES) / 1024:.1f} KB of WAL, "
+              f"phases before the mirror {statistics.fmean(layers) / 1024:.1f} KB each")
+
+        # Two requests answering layer 1 of the same session at once
+        llm.latency = args.race_ms / 1000
+        ok = conflicts = 0
+        answers_kept, jobs = [], []
+        for card_id in await new_cards(sessions, user_id, args.race):
+            session_id = await start(sessions, user_id, card_id)
+            await phase(sessions, user_id, session_id, 0, "")
+            outcomes = await asyncio.gather(
+                phase(sessions, user_id, session_id, 1, somatic[0]),
+                phase(sessions, user_id, session_id, 1, somatic[1]),
+                return_exceptions=True,
+            )
+            for outcome in outcomes:
+                if isinstance(outcome, HTTPException) and outcome.status_code == 409:
+                    conflicts += 1
+                elif isinstance(outcome, BaseException):
+                    raise outcome
+                else:
+                    ok += 1
+            async with sessions() as db:
+                session = (await db.execute(select(SyncSession).where(SyncSession.id == session_id))).scalar_one()
+                if SyncEvent is not None:
+                    from app.core.sync_log import load_session_log, reset_session_logs
+                    reset_session_logs()
+                    transcript = (await load_session_log(db, session)).transcript
+                else:
+                    transcript = session.session_transcript
+                answers_kept.append(sum(m["content"] in somatic[:2] for m in transcript))
+                jobs.append((await db.execute(
+                    select(func.count()).select_from(BackgroundJob).where(
+                        BackgroundJob.job_type == "sync.log_interaction",
+                        BackgroundJob.payload["session_id"].as_integer() == session_id)
+                )).scalar())
+        print(f"\n  {args.race} races: {ok} requests succeeded, {conflicts} got 409; answers in the transcript "
+              f"{statistics.fmean(answers_kept):.1f} per session, interaction jobs {statistics.fmean(jobs):.1f} per session")
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,231 @@
+"""
+Benchmark: perceived latency of sync phases (POST /sync/phase, from the
+user's answer to the next layer's text), with and without speculative
+generation of the next layer (settings.SYNC_SPECULATION).
+
+Usage:
+  python scripts/bench_sync_phase.py [--database-url postgresql+asyncpg://...]
+      [--sessions 12] [--layer-ms 2500] [--check-ms 1200] [--features-ms 4000]
+      [--mirror-ms 6000] [--embedding-ms 150]
+
+To compare with an older tree, put its backend first on PYTHONPATH:
+  PYTHONPATH=/path/to/old/backend python scripts/bench_sync_phase.py
+
+The LLM and the embedding API are replaced in process by fakes that answer
+after the given latencies: layer generation, the somatic check, feature
+extraction of the answer, the mirror analysis (symbol extraction takes
+--check-ms). Answers are drawn from
+data/somatic_seed.jsonl (a quarter abstract, which makes the layer narrow
+once), and the fake somatic check returns their label. Each scenario runs
+the same sessions:
+  LLM check     every answer goes to the LLM somatic check (SOMATIC_CONFIDENCE > 1)
+  local check   the local classifier decides, the LLM only when unsure
+Tables live in a scratch schema that is dropped afterwards.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import Counter, defaultdict
+from types import SimpleNamespace
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.agents import analytic_agent, sync_agent
+from app.config import settings
+from app.core import symbolic_service
+from app.database import Base
+from app.models import CardProgress, SyncSession, User, UserPortrait
+from app.models.background_job import BackgroundJob
+from app.models.text_diagnostics import Archetype, SceneInteraction, SceneStats, Sphere, TextScene
+from app.routers import sync as sync_routes
+
+SCHEMA = "bench_sync_phase"
+TABLES = [User.__table__, CardProgress.__table__, SyncSession.__table__, UserPortrait.__table__,
+          Sphere.__table__, Archetype.__table__, TextScene.__table__, SceneStats.__table__, SceneInteraction.__table__,
+          BackgroundJob.__table__]
+LAYER_TEXT = "Ты стоишь на пустой площади. Под ногами камень, впереди закрытая дверь. Что делает твоё тело?"
+MIRROR = {"real_picture": "...", "core_pattern": "Контроль", "shadow_active": "...", "hawkins_score": 200,
+          "hawkins_level": "Смелость", "symbols_identified": {}}
+
+
+class FakeLLM:
+    """chat.completions.create with a latency per kind of call; calls are counted."""
+
+    def __init__(self, latency: dict, labels: dict):
+        self.latency = latency
+        self.labels = labels
+        self.calls = Counter()
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    @staticmethod
+    def kind(kwargs) -> str:
+        prompt = "\n".join(m["content"] for m in kwargs["messages"])
+        if "response_format" not in kwargs:
+            return "layer"
+        if "ПРОАНАЛИЗИРУЙ ОТВЕТ" in prompt:
+            return "check"
+        if "структурированные признаки" in prompt:
+            return "features"
+        if "ВЫДЕЛИ КЛЮЧЕВЫЕ ОБРАЗЫ" in prompt:
+            return "symbols"
+        return "mirror"
+
+    async def create(self, **kwargs):
+        kind = self.kind(kwargs)
+        self.calls[kind] += 1
+        await asyncio.sleep(self.latency[kind] / 1000)
+        if kind == "layer":
+            content = LAYER_TEXT
+        elif kind == "check":
+            answer = kwargs["messages"][0]["content"].split("ОТВЕТ: ", 1)[1].split("\n", 1)[0]
+            somatic = self.labels.get(answer, False)
+            content = json.dumps({"is_somatic": somatic, "has_body": somatic, "has_objects": False, "reason": "bench"})
+        elif kind == "symbols":
+            content = json.dumps({"identified_symbols": [], "new_symbols": []})
+        elif kind == "features":
+            content = json.dumps({"action_type": "stay", "emotion_vector": {}, "behavior_pattern": "observation"})
+        else:
+            content = json.dumps(MIRROR, ensure_ascii=False)
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+
+def session_answers(rng: random.Random, somatic: list[str], abstract: list[str]) -> list[str]:
+    """Answers of one session: per layer 1-5 a somatic one, after an abstract one for a quarter of layers."""
+    answers = []
+    for _ in range(5):
+        if rng.random() < 0.25:
+            answers.append(rng.choice(abstract))
+        answers.append(rng.choice(somatic))
+    return answers
+
+
+async def run_sessions(sessions, user_id: int, card_ids: list[int], scripts: list[list[str]]) -> dict:
+    """Per phase kind (layer the answer was given in) → latencies of process_phase."""
+    latency = defaultdict(list)
+    for card_id, answers in zip(card_ids, scripts):
+        async with sessions() as db:
+            started = await sync_routes.start_sync(
+                sync_routes.StartSyncRequest(user_id=user_id, card_progress_id=card_id), db=db)
+        session_id = started["session_id"]
+        phase, queue = 0, ["", *answers]
+        while queue:
+            answer = queue.pop(0)
+            async with sessions() as db:
+                t0 = time.perf_counter()
+                result = await sync_routes.process_phase(
+                    sync_routes.PhaseRequest(user_id=user_id, sync_session_id=session_id, phase=phase,
+                                             user_response=answer), db=db)
+                elapsed = time.perf_counter() - t0
+            layer = "intro" if phase == 0 else str(phase)
+            latency[layer + (" -> mirror" if result.get("is_complete") else "")].append(elapsed)
+            phase = result["current_phase"]
+            if result.get("is_complete"):
+                break
+    return latency
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--sessions", type=int, default=12)
+    parser.add_argument("--layer-ms", type=float, default=2500)
+    parser.add_argument("--check-ms", type=float, default=1200)
+    parser.add_argument("--features-ms", type=float, default=4000)
+    parser.add_argument("--mirror-ms", type=float, default=6000)
+    parser.add_argument("--embedding-ms", type=float, default=150)
+    args = parser.parse_args()
+
+    with open(os.path.join(settings.DATA_DIR, "somatic_seed.jsonl"), encoding="utf-8") as f:
+        seed = [json.loads(line) for line in f]
+    labels = {row["text"]: row["is_somatic"] for row in seed}
+    somatic = [row["text"] for row in seed if row["is_somatic"]]
+    abstract = [row["text"] for row in seed if not row["is_somatic"]]
+    rng = random.Random(7)
+    scripts = [session_answers(rng, somatic, abstract) for _ in range(args.sessions)]
+
+    llm = FakeLLM({"layer": args.layer_ms, "check": args.check_ms, "features": args.features_ms,
+                   "mirror": args.mirror_ms, "symbols": args.check_ms}, labels)
+
+    async def get_embedding(value: str) -> list[float]:
+        await asyncio.sleep(args.embedding_ms / 1000)
+        return [0.0] * settings.EMBEDDING_DIMENSIONS
+
+    sync_agent.client = analytic_agent.client = symbolic_service.client = llm
+    sync_agent.get_embedding = get_embedding
+    sync_routes.datetime = __import__("datetime")  # older trees miss this import in start_sync
+
+    engine = create_async_engine(args.database_url, connect_args={"server_settings": {"search_path": f"{SCHEMA},public"}})
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.run_sync(Base.metadata.create_all, tables=TABLES)
+    sessions = async_sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
+    sync_routes.AsyncSessionLocal = sessions
+
+    speculation = hasattr(settings, "SYNC_SPECULATION")
+    scenarios = [("as is", {})]
+    if speculation:
+        scenarios = [
+            (f"{check}, {'speculative' if spec else 'serial'}",
+             {"SYNC_SPECULATION": spec, "SOMATIC_CONFIDENCE": 1.01 if check == "LLM check" else 0.85,
+              "SOMATIC_LLM_SAMPLE_RATE": 0.0})
+            for check in ("LLM check", "local check") for spec in (False, True)
+        ]
+    try:
+        async with sessions() as db:
+            db.add(Sphere(id=1, key="IDENTITY", name_ru="Личность"))
+            db.add(Archetype(id=1, name="Шут"))
+            await db.flush()
+            db.add_all([TextScene(sphere_id=1, archetype_id=1, scene_text=LAYER_TEXT, is_active=True)
+                        for _ in range(8)])
+            user = User(tg_id=30_000, is_premium=True)
+            db.add(user)
+            await db.flush()
+            user_id = user.id
+            await db.commit()
+
+        print(f"{args.sessions} sessions per scenario; LLM latency: layer {args.layer_ms:.0f} ms, "
+              f"somatic check {args.check_ms:.0f} ms, features {args.features_ms:.0f} ms, "
+              f"mirror {args.mirror_ms:.0f} ms, embedding {args.embedding_ms:.0f} ms")
+        for name, overrides in scenarios:
+            for key, value in overrides.items():
+                setattr(settings, key, value)
+            async with sessions() as db:
+                cards = [CardProgress(user_id=user_id, archetype_id=1, sphere="IDENTITY", hawkins_current=150)
+                         for _ in scripts]
+                db.add_all(cards)
+                await db.commit()
+                card_ids = [card.id for card in cards]
+            llm.calls.clear()
+            if speculation:
+                sync_agent.speculation_stats.clear()
+            latency = await run_sessions(sessions, user_id, card_ids, scripts)
+            phases = [v for k, v in latency.items() if k not in ("intro",) and "mirror" not in k]
+            layer_phases = [x for v in phases for x in v]
+            print(f"\n{name}:")
+            print("  answer in   phases   p50 ms   mean ms")
+            for layer in sorted(latency):
+                values = latency[layer]
+                print(f"  {layer:<11} {len(values):>6}  {statistics.median(values) * 1000:>7.0f}  "
+                      f"{statistics.fmean(values) * 1000:>8.0f}")
+            print(f"  layers 1-5 (no mirror): p50 {statistics.median(layer_phases) * 1000:.0f} ms, "
+                  f"mean {statistics.fmean(layer_phases) * 1000:.0f} ms")
+            print(f"  LLM calls on the request path: {dict(llm.calls)}"
+                  + (f"; speculation {dict(sync_agent.speculation_stats)}" if speculation else ""))
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,73 @@
+"""
+Benchmark: timezone service vs per-call TimezoneFinder / pytz.localize.
+
+Usage: python scripts/bench_timezones.py [--n 10000]
+Prints TimezoneFinder startup cost, per-call latency of timezone_at with a
+fresh vs the shared finder, and local->UTC conversion with pytz per call,
+to_utc (LRU) and to_utc_many over a batch of births.
+"""
+import argparse
+import os
+import random
+import sys
+import time
+from datetime import datetime
+
+import pytz
+from timezonefinder import TimezoneFinder
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.astrology import timezones
+from app.core.astrology.timezones import get_timezone_finder, timezone_at, to_utc, to_utc_many, utc_offset
+
+TIMEZONES = ["Europe/Moscow", "Europe/Kiev", "Asia/Almaty", "Europe/Berlin", "America/New_York"]
+
+
+def per_call_us(fn, items) -> float:
+    start = time.perf_counter()
+    for item in items:
+        fn(*item)
+    return (time.perf_counter() - start) / len(items) * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--n", type=int, default=10_000)
+    args = parser.parse_args()
+    rnd = random.Random(42)
+
+    # ── Finder ──────────────────────────────────────────────────────────────
+    get_timezone_finder()
+    print(f"TimezoneFinder() startup:          {timezones.finder_init_seconds * 1000:>10.1f} ms")
+    coords = [(rnd.uniform(-55, 65), rnd.uniform(-170, 170)) for _ in range(args.n)]
+    fresh = per_call_us(lambda lat, lon: TimezoneFinder().timezone_at(lng=lon, lat=lat), coords[:20])
+    print(f"timezone_at, new finder per call:  {fresh:>10.1f} µs")
+    print(f"timezone_at, shared finder:        {per_call_us(timezone_at, coords):>10.1f} µs")
+
+    # ── Local -> UTC ────────────────────────────────────────────────────────
+    # Births repeat the way real traffic does: many users share a few cities
+    # and re-request the same chart, so draw from a limited pool.
+    pool = [
+        (datetime(rnd.randint(1950, 2010), rnd.randint(1, 12), rnd.randint(1, 28),
+                  rnd.randint(0, 23), rnd.randint(0, 59)), rnd.choice(TIMEZONES))
+        for _ in range(args.n // 4)
+    ]
+    births = [rnd.choice(pool) for _ in range(args.n)]
+
+    def localize(local_dt, tz_name):
+        return pytz.timezone(tz_name).localize(local_dt).astimezone(pytz.utc)
+
+    utc_offset.cache_clear()
+    print(f"pytz localize per call:            {per_call_us(localize, births):>10.2f} µs")
+    print(f"to_utc, cold LRU:                  {per_call_us(to_utc, births):>10.2f} µs  ({utc_offset.cache_info()})")
+    print(f"to_utc, warm LRU:                  {per_call_us(to_utc, births):>10.2f} µs")
+    utc_offset.cache_clear()
+    start = time.perf_counter()
+    to_utc_many([b[0] for b in births], [b[1] for b in births])
+    print(f"to_utc_many, cold LRU:             {(time.perf_counter() - start) / len(births) * 1e6:>10.2f} µs")
+
+
+if __name__ == "__main__":
+    main()
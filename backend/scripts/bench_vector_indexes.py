@@ -0,0 +1,235 @@
+"""
+Benchmark: pgvector query latency and recall with and without HNSW, for
+global lookups and for lookups scoped to one user
+(app/services/vector_index.py).
+
+Usage:
+  python scripts/bench_vector_indexes.py [--database-url postgresql+asyncpg://...]
+      [--sizes 10000,100000,1000000] [--dims 1536] [--rows-per-user 100]
+      [--queries 50] [--k 10] [--ef-search 40,100,200]
+      [--m 16] [--ef-construction 64] [--maintenance-work-mem 1GB] [--inserts 200]
+
+A user_memory-shaped table (id, user_id, embedding) in a scratch schema is
+grown to every size in turn: --rows-per-user rows per synthetic user, each
+user writing about 3 of 1000 topics (row = topic direction + noise, unit
+length). Per size the report has:
+  build            — HNSW build time and index size (btree on user_id always);
+  global, exact    — ORDER BY distance LIMIT k over the table, seq scan;
+  global, hnsw     — the same through the index, per ef_search, with
+                     recall@k against the exact answer;
+  user, ...        — WHERE user_id = ? ORDER BY distance LIMIT k: without
+                     HNSW (btree + sort), with HNSW and the plain query,
+                     and through nearest_in_scope() (MATERIALIZED scope).
+                     "rows" is the average number of rows returned;
+  insert           — one row per transaction, as a logged sync answer is
+                     written, without and with the HNSW index.
+The HNSW graph must fit in --maintenance-work-mem to build at a sane
+speed: at 1536 dimensions that is ~7 GB per million rows, so larger sizes
+want smaller --dims (text-embedding-3 models take `dimensions`).
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import asyncpg
+import numpy as np
+from pgvector.asyncpg import register_vector
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import Column, Integer, MetaData, Table, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.services.vector_index import nearest_in_scope
+
+SCHEMA = "bench_vector_indexes"
+INDEX = "ix_memories_embedding_hnsw"
+TOPICS = 1000
+TOPICS_PER_USER = 3
+CHUNK = 20000
+USER_SKEW = 0.8
+
+
+def unit(matrix: np.ndarray) -> np.ndarray:
+    return (matrix / np.linalg.norm(matrix, axis=1, keepdims=True)).astype(np.float32)
+
+
+class Dataset:
+    def __init__(self, dims: int, rows_per_user: int, seed: int = 5):
+        self.dims = dims
+        self.rows_per_user = rows_per_user
+        self.rng = np.random.default_rng(seed)
+        self.topics = unit(self.rng.standard_normal((TOPICS, dims)))
+        self.rows = 0
+
+    def user_topics(self, user_id: int) -> np.ndarray:
+        return np.random.default_rng(user_id).choice(TOPICS, TOPICS_PER_USER, replace=False)
+
+    def chunk(self, count: int, users: int) -> list[tuple[int, int, np.ndarray]]:
+        # Activity is skewed: user u writes in proportion to 1 / (u + 1) ** USER_SKEW
+        weights = 1.0 / np.arange(1, users + 1) ** USER_SKEW
+        owners = self.rng.choice(users, size=count, p=weights / weights.sum())
+        topics = np.array([self.user_topics(int(u))[self.rng.integers(TOPICS_PER_USER)] for u in owners])
+        vectors = unit(self.topics[topics] + 1.5 * self.rng.standard_normal((count, self.dims)) / np.sqrt(self.dims))
+        ids = range(self.rows + 1, self.rows + count + 1)
+        self.rows += count
+        return [(i, int(u), v) for i, u, v in zip(ids, owners, vectors)]
+
+    def query(self, user_id: int) -> np.ndarray:
+        topic = self.topics[self.rng.choice(self.user_topics(user_id))]
+        return unit((topic + 0.5 * self.rng.standard_normal(self.dims) / np.sqrt(self.dims))[None, :])[0]
+
+
+async def grow(engine, dataset: Dataset, size: int) -> None:
+    # Binary COPY on a separate connection: the pooled ones keep SQLAlchemy's text vector format
+    raw = await asyncpg.connect(engine.url.set(drivername="postgresql").render_as_string(hide_password=False))
+    try:
+        await register_vector(raw)
+        while dataset.rows < size:
+            records = dataset.chunk(min(CHUNK, size - dataset.rows), size // dataset.rows_per_user)
+            await raw.copy_records_to_table("memories", records=records, columns=["id", "user_id", "embedding"],
+                                            schema_name=SCHEMA)
+        await raw.execute(f"ANALYZE {SCHEMA}.memories")
+    finally:
+        await raw.close()
+
+
+async def run(conn, statements: list) -> tuple[list[float], list[set[int]]]:
+    latencies, results = [], []
+    for stmt in statements:
+        started = time.perf_counter()
+        ids = set((await conn.execute(stmt)).scalars())
+        latencies.append(time.perf_counter() - started)
+        results.append(ids)
+    return latencies, results
+
+
+def line(label: str, latencies: list[float], results: list[set[int]], expected=None) -> None:
+    ms = sorted(s * 1000 for s in latencies)
+    recall = "" if expected is None else "  recall {:5.3f}".format(
+        statistics.mean(len(r & e) / max(len(e), 1) for r, e in zip(results, expected)))
+    print(f"  {label:<42} p50 {statistics.median(ms):8.2f} ms  p95 {ms[int(len(ms) * 0.95)]:8.2f} ms"
+          f"  rows {statistics.mean(len(r) for r in results):5.2f}{recall}")
+
+
+async def insert_latency(conn, memories: Table, dataset: Dataset, count: int, users: int) -> list[float]:
+    latencies, rows = [], dataset.chunk(count, users)
+    for row_id, user_id, vector in rows:
+        started = time.perf_counter()
+        await conn.execute(memories.insert().values(id=row_id, user_id=user_id, embedding=vector))
+        await conn.commit()
+        latencies.append(time.perf_counter() - started)
+    # Removed again, so the exact answers measured before still hold
+    await conn.execute(memories.delete().where(memories.c.id.in_([row_id for row_id, _, _ in rows])))
+    await conn.commit()
+    return latencies
+
+
+def insert_line(label: str, latencies: list[float]) -> None:
+    ms = sorted(s * 1000 for s in latencies)
+    print(f"  {label:<42} p50 {statistics.median(ms):8.2f} ms  p95 {ms[int(len(ms) * 0.95)]:8.2f} ms")
+
+
+async def measure(engine, memories: Table, dataset: Dataset, size: int, args) -> None:
+    k = args.k
+    users = size // args.rows_per_user
+    distance = memories.c.embedding.cosine_distance
+    global_queries = [dataset.query(int(u)) for u in dataset.rng.integers(0, users, args.queries)]
+    groups = {
+        "typical": [int(u) for u in dataset.rng.integers(0, users, args.queries)],
+        "heavy": [n % 10 for n in range(args.queries)],  # the ten most active users
+    }
+    user_queries = {group: [(dataset.query(u), u) for u in ids] for group, ids in groups.items()}
+    global_stmts = [select(memories.c.id).order_by(distance(q)).limit(k) for q in global_queries]
+    plain = {group: [select(memories.c.id).where(memories.c.user_id == u).order_by(distance(q)).limit(k)
+                     for q, u in pairs] for group, pairs in user_queries.items()}
+    scoped = {group: [nearest_in_scope([memories.c.id], memories.c.embedding, q, scope=[memories.c.user_id == u],
+                                       limit=k) for q, u in pairs] for group, pairs in user_queries.items()}
+
+    async with engine.connect() as conn:
+        counts = [await conn.scalar(text("SELECT count(*) FROM memories WHERE user_id = :u"), {"u": u})
+                  for u in (groups["typical"][0], 0)]
+        print(f"{size} rows, {users} users ({counts[1]} rows for the most active), {dataset.dims} dims:")
+        latencies, exact_global = await run(conn, global_stmts)
+        line("global, exact (seq scan)", latencies, exact_global)
+        exact = {}
+        for group in groups:
+            latencies, exact[group] = await run(conn, plain[group])
+            line(f"{group} user, no hnsw (btree + sort)", latencies, exact[group])
+        await conn.rollback()
+        if args.inserts:
+            insert_line("insert, no hnsw", await insert_latency(conn, memories, dataset, args.inserts, users))
+
+        await conn.execute(text(f"SET maintenance_work_mem = '{args.maintenance_work_mem}'"))
+        started = time.perf_counter()
+        await conn.execute(text(
+            f"CREATE INDEX {INDEX} ON memories USING hnsw (embedding vector_cosine_ops) "
+            f"WITH (m = {args.m}, ef_construction = {args.ef_construction})"
+        ))
+        await conn.commit()
+        built = time.perf_counter() - started
+        size_mb = await conn.scalar(text(f"SELECT pg_relation_size('{INDEX}')")) / 2 ** 20
+        print(f"  hnsw build (m={args.m}, ef_construction={args.ef_construction}): {built:.1f} s, {size_mb:.1f} MiB")
+        if args.inserts:
+            insert_line("insert, hnsw", await insert_latency(conn, memories, dataset, args.inserts, users))
+
+        for ef in args.ef_search:
+            await conn.execute(text(f"SET LOCAL hnsw.ef_search = {ef}"))
+            line(f"global, hnsw ef_search={ef}", *await run(conn, global_stmts), exact_global)
+            for group in groups:
+                line(f"{group} user, hnsw + WHERE, ef_search={ef}", *await run(conn, plain[group]), exact[group])
+            await conn.rollback()
+        for group in groups:
+            line(f"{group} user, nearest_in_scope", *await run(conn, scoped[group]), exact[group])
+        await conn.rollback()
+        # The next size is seeded without the index and builds it from scratch
+        await conn.execute(text(f"DROP INDEX {INDEX}"))
+        await conn.commit()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=settings.DATABASE_URL)
+    parser.add_argument("--sizes", default="10000,100000,1000000")
+    parser.add_argument("--dims", type=int, default=1536)
+    parser.add_argument("--rows-per-user", type=int, default=100)
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef-search", default="40,100,200")
+    parser.add_argument("--m", type=int, default=16)
+    parser.add_argument("--ef-construction", type=int, default=64)
+    parser.add_argument("--maintenance-work-mem", default="1GB")
+    parser.add_argument("--inserts", type=int, default=200)
+    args = parser.parse_args()
+    args.ef_search = [int(v) for v in args.ef_search.split(",")]
+
+    engine = create_async_engine(args.database_url, pool_size=2,
+                                 connect_args={"server_settings": {"search_path": f"{SCHEMA},public"}})
+    memories = Table("memories", MetaData(), Column("id", Integer, primary_key=True),
+                     Column("user_id", Integer, index=True), Column("embedding", Vector(args.dims)))
+    async with engine.begin() as conn:
+        await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await conn.execute(text(f"CREATE SCHEMA {SCHEMA}"))
+        await conn.execute(text("CREATE EXTENSION IF NOT EXISTS vector"))
+        await conn.run_sync(memories.metadata.create_all)
+
+    dataset = Dataset(args.dims, args.rows_per_user)
+    try:
+        for size in sorted(int(s) for s in args.sizes.split(",")):
+            started = time.perf_counter()
+            await grow(engine, dataset, size)
+            print(f"seeded {size} rows in {time.perf_counter() - started:.1f} s")
+            await measure(engine, memories, dataset, size, args)
+    finally:
+        async with engine.begin() as conn:
+            await conn.execute(text(f"DROP SCHEMA IF EXISTS {SCHEMA} CASCADE"))
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
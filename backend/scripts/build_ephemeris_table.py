@@ -0,0 +1,134 @@
+"""
+Build the precomputed ephemeris table used by app.core.astrology.ephemeris_table.
+
+Usage: python scripts/build_ephemeris_table.py [--start 1900-01-01] [--end 2050-01-01] [--step 1]
+
+Writes data/ephe/ephemeris_table.npy (memory-mapped at runtime) and
+data/ephe/ephemeris_table.json (range, bodies, per-body error summary).
+For every interval the worst Hermite error against pyswisseph is measured at
+the points where smooth position (t=0.5) and speed (t=0.5±0.289) errors peak,
+plus a few more, so the runtime can fall back to pyswisseph wherever the
+tolerance would be exceeded. TrueNode is not tabulated at all: its
+short-period wobble slips between any practical set of probes.
+
+Enable with EPHEMERIS_TABLE_ENABLED=true after building.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from datetime import date, datetime, timezone
+
+import numpy as np
+import swisseph as swe
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.core.astrology.ephemeris_table import (
+    CALC_FLAGS, META_PATH, TABLE_PATH, LON, SPEED, LON_ERR, SPEED_ERR, hermite,
+)
+from app.core.astrology.natal_chart import PLANET_CODES
+
+# Peaks of |e(t)| and |e'(t)| for cubic Hermite error e(t) ~ t²(1-t)², plus
+# extra probes for motion that is not smooth on a one-step scale
+PROBE_POINTS = (0.5, 0.5 - 3 ** -0.5 / 2, 0.5 + 3 ** -0.5 / 2, 0.1, 0.35, 0.65, 0.9)
+
+# Always computed by pyswisseph (see module docstring)
+EXCLUDED_BODIES = ("TrueNode",)
+
+
+def sample(jds: np.ndarray, codes: list[int]) -> tuple[np.ndarray, np.ndarray]:
+    """Longitude and speed of every body at every jd straight from pyswisseph."""
+    lon = np.empty((len(jds), len(codes)))
+    speed = np.empty((len(jds), len(codes)))
+    for i, jd in enumerate(jds.tolist()):
+        for j, code in enumerate(codes):
+            pos, _ = swe.calc_ut(jd, code, CALC_FLAGS)
+            lon[i, j] = pos[0]
+            speed[i, j] = pos[3]
+    return lon, speed
+
+
+def to_jd(day: date) -> float:
+    return swe.julday(day.year, day.month, day.day, 0.0)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--start", type=date.fromisoformat, default=date(1900, 1, 1))
+    parser.add_argument("--end", type=date.fromisoformat, default=date(2050, 1, 1))
+    parser.add_argument("--step", type=float, default=1.0, help="sample spacing in days")
+    args = parser.parse_args()
+
+    swe.set_ephe_path(settings.EPHE_PATH)
+    names = [name for name in PLANET_CODES if name not in EXCLUDED_BODIES]
+    codes = [PLANET_CODES[name] for name in names]
+    jd_start = to_jd(args.start)
+    n = int((to_jd(args.end) - jd_start) / args.step) + 1
+    jds = jd_start + args.step * np.arange(n)
+
+    started = time.perf_counter()
+    print(f"Sampling {len(codes)} bodies x {n} points ({args.start} .. {args.end}, step {args.step}d)...")
+    lon, speed = sample(jds, codes)
+    lon = np.unwrap(lon, period=360, axis=0)
+
+    print("Measuring interpolation error per interval...")
+    lon_err = np.zeros((n - 1, len(codes)))
+    speed_err = np.zeros((n - 1, len(codes)))
+    for t in PROBE_POINTS:
+        true_lon, true_speed = sample(jds[:-1] + t * args.step, codes)
+        est_lon, est_speed = hermite(lon[:-1], speed[:-1], lon[1:], speed[1:], t, args.step)
+        diff = np.abs((est_lon - true_lon + 180) % 360 - 180)
+        lon_err = np.maximum(lon_err, diff)
+        speed_err = np.maximum(speed_err, np.abs(est_speed - true_speed))
+
+    table = np.empty((n, len(codes), 4))
+    table[..., LON] = lon
+    table[..., SPEED] = speed
+    table[..., LON_ERR] = np.inf
+    table[..., SPEED_ERR] = np.inf
+    table[:-1, :, LON_ERR] = lon_err
+    table[:-1, :, SPEED_ERR] = speed_err
+
+    os.makedirs(os.path.dirname(TABLE_PATH), exist_ok=True)
+    np.save(TABLE_PATH, table)
+
+    usable = (lon_err <= settings.EPHEMERIS_TABLE_TOLERANCE) & (speed_err <= settings.EPHEMERIS_TABLE_SPEED_TOLERANCE)
+    summary = {
+        name: {
+            "max_lon_error_deg": float(lon_err[:, j].max()),
+            "max_speed_error_deg_day": float(speed_err[:, j].max()),
+            "coverage_at_default_tolerance": round(float(usable[:, j].mean()), 4),
+        }
+        for j, name in enumerate(names)
+    }
+    meta = {
+        "jd_start": jd_start,
+        "step": args.step,
+        "samples": n,
+        "start": args.start.isoformat(),
+        "end": args.end.isoformat(),
+        "body_codes": codes,
+        "body_names": names,
+        "flags": CALC_FLAGS,
+        "swisseph_version": swe.version,
+        "built_at": datetime.now(timezone.utc).isoformat(),
+        "interval_errors": summary,
+    }
+    with open(META_PATH, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=2)
+
+    print(f"\nWrote {TABLE_PATH} ({table.nbytes / 1e6:.1f} MB) in {time.perf_counter() - started:.1f}s")
+    print(f"{'body':>10} | {'max lon err°':>12} | {'max speed err':>13} | {'coverage':>8}")
+    for name, s in summary.items():
+        print(
+            f"{name:>10} | {s['max_lon_error_deg']:>12.2e} | "
+            f"{s['max_speed_error_deg_day']:>13.2e} | {s['coverage_at_default_tolerance']:>8.2%}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,102 @@
+"""
+Build the offline gazetteer index used by app.core.astrology.gazetteer.
+
+Usage:
+  python scripts/build_gazetteer.py [--tsv data/gazetteer/places_sample.tsv]
+  python scripts/build_gazetteer.py --geonames cities15000.txt [--admin1 admin1CodesASCII.txt]
+      [--min-population 15000]
+
+--tsv reads the bundled format (name, country, lat, lon, timezone, population,
+|-separated aliases, |-separated region names). --geonames reads a GeoNames
+cities*.txt dump; only Latin and Cyrillic alternate names are kept as aliases.
+Both may be given. --admin1 adds the region names of the GeoNames dump, so
+queries like "Moscow, Idaho" resolve offline; without it only region codes
+made of letters ("ID") qualify.
+Writes the memory-mappable index to settings.GAZETTEER_PATH (or --out).
+"""
+import argparse
+import os
+import random
+import sys
+import time
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.core.astrology.gazetteer import SAMPLE_SOURCE, Gazetteer, PlaceRow, read_places_tsv
+
+
+def _latin_or_cyrillic(name: str) -> bool:
+    """Latin (incl. extended) or Cyrillic letters only."""
+    return all(not ch.isalpha() or ord(ch) < 0x250 or 0x400 <= ord(ch) < 0x530 for ch in name)
+
+
+def read_admin1(path: str) -> dict[str, tuple[str, ...]]:
+    """GeoNames admin1CodesASCII.txt: "US.ID" -> ("Idaho",)."""
+    regions = {}
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) >= 3:
+                regions[cols[0]] = tuple(dict.fromkeys(name for name in cols[1:3] if name))
+    return regions
+
+
+def read_geonames(path: str, min_population: int, regions: dict[str, tuple[str, ...]]) -> list[PlaceRow]:
+    """
+    GeoNames dump columns: 1 name, 2 asciiname, 3 alternatenames, 4 lat, 5 lon,
+    8 country, 10 admin1 code, 14 population, 17 tz.
+    """
+    rows = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            cols = line.rstrip("\n").split("\t")
+            if len(cols) < 18 or not cols[17]:
+                continue
+            population = int(cols[14] or 0)
+            if population < min_population:
+                continue
+            aliases = {cols[2], *cols[3].split(",")} - {"", cols[1]}
+            admin = regions.get(f"{cols[8]}.{cols[10]}", ()) + ((cols[10],) if cols[10].isalpha() else ())
+            rows.append(PlaceRow(
+                cols[1], cols[8], float(cols[4]), float(cols[5]), cols[17], population,
+                tuple(sorted(a for a in aliases if _latin_or_cyrillic(a))), admin,
+            ))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tsv", nargs="*", default=None, help="bundled-format files (default: the sample)")
+    parser.add_argument("--geonames", nargs="*", default=[], help="GeoNames cities*.txt dumps")
+    parser.add_argument("--admin1", default=None, help="GeoNames admin1CodesASCII.txt (region names)")
+    parser.add_argument("--min-population", type=int, default=0)
+    parser.add_argument("--out", default=settings.GAZETTEER_PATH)
+    args = parser.parse_args()
+
+    tsv_files = args.tsv if args.tsv is not None else ([] if args.geonames else [SAMPLE_SOURCE])
+    rows: list[PlaceRow] = []
+    for path in tsv_files:
+        rows += read_places_tsv(path)
+    regions = read_admin1(args.admin1) if args.admin1 else {}
+    for path in args.geonames:
+        rows += read_geonames(path, args.min_population, regions)
+
+    started = time.perf_counter()
+    gazetteer = Gazetteer.build(rows)
+    gazetteer.save(args.out)
+    print(f"Indexed {len(gazetteer)} places / {len(gazetteer.keys)} keys into {args.out} "
+          f"in {time.perf_counter() - started:.1f}s")
+
+    # Smoke-check lookup latency on the mmap-loaded index
+    loaded = Gazetteer.load(args.out)
+    names = [row.name for row in random.Random(0).sample(rows, min(1000, len(rows)))]
+    start = time.perf_counter()
+    hits = sum(loaded.lookup(name) is not None for name in names)
+    elapsed = time.perf_counter() - start
+    print(f"Lookup: {elapsed / len(names) * 1e6:.1f} µs/query, {hits}/{len(names)} resolved")
+
+
+if __name__ == "__main__":
+    main()
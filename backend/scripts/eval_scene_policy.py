@@ -0,0 +1,250 @@
+"""
+Offline evaluation of the scene selection policies (app/core/scene_index.py).
+
+Usage:
+  python scripts/eval_scene_policy.py replay [--database-url ...] [--limit 200000]
+      [--diversity 0.3] [--runs 5]
+  python scripts/eval_scene_policy.py simulate [--scenes-per-sphere 40] [--sessions 20000]
+      [--users 3000] [--diversity 0.3] [--runs 3]
+
+replay     replays the logged sync sessions (SceneInteraction rows, oldest
+           first) against each policy, starting from empty stats. Sessions
+           before the scene index drew their five scenes uniformly at random,
+           which makes the replay estimate unbiased (Li et al., 2011): a
+           policy is credited, and learns, only for the scenes of its set
+           that the logged session actually showed. The reward of a shown
+           scene is scene_reward() of its answers (mean over the session).
+simulate   a synthetic library: scenes come in groups of near-duplicates
+           (close embeddings, similar quality) and every scene has a hidden
+           mean reward. Each policy runs online against it (the five scenes
+           it picks are shown and rewarded); a uniformly random log of the
+           same sessions is then replayed, to check the replay estimate
+           against the online value.
+
+Per policy: mean reward per shown scene, mean pairwise cosine similarity of
+a set (lower is more diverse), share of picks the user had seen before, and
+the shown scenes a replay credited (matched) or, online, the share of sets
+holding two near-duplicates.
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import sys
+from collections import defaultdict
+from itertools import combinations
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.config import settings
+from app.core.scene_index import POLICIES, SET_SIZE, SceneIndex, scene_reward
+from app.models.text_diagnostics import SceneInteraction, TextScene
+
+GROUP_SIZE = 4  # near-duplicate scenes per group in simulate
+
+
+def set_similarity(index: SceneIndex, chosen) -> float:
+    rows = [index._rows[scene.id] for scene in chosen]
+    pairs = [float(index.vectors[a] @ index.vectors[b]) for a, b in combinations(rows, 2)]
+    return statistics.fmean(pairs) if pairs else 0.0
+
+
+def replay(index: SceneIndex, sessions: list[dict], policy: str, diversity: float, seed: int) -> dict:
+    """sessions: {"user", "sphere", "rewards": {scene_id: reward}} in log order."""
+    index.shown[:] = 0
+    index.reward[:] = 0
+    rng = np.random.default_rng(seed)
+    seen = defaultdict(set)
+    credited, similarity, repeats = [], [], 0
+    for session in sessions:
+        chosen = index.select(session["sphere"], k=SET_SIZE, seen=seen[session["user"]], policy=policy,
+                              diversity=diversity, rng=rng)
+        for scene in chosen:
+            repeats += scene.id in seen[session["user"]]
+            reward = session["rewards"].get(scene.id)
+            if reward is not None:
+                credited.append(reward)
+                index.observe(scene.id, reward)
+        similarity.append(set_similarity(index, chosen))
+        seen[session["user"]] |= session["rewards"].keys()
+    picks = max(len(sessions) * SET_SIZE, 1)
+    return {
+        "reward": statistics.fmean(credited) if credited else float("nan"),
+        "matched": len(credited),
+        "similarity": statistics.fmean(similarity) if similarity else 0.0,
+        "repeats": repeats / picks,
+    }
+
+
+def print_rows(title: str, rows: dict, extra: str = "") -> None:
+    print(f"\n{title}")
+    print(f"  policy                      reward  similarity  repeats{extra}")
+    for name, row in rows.items():
+        line = f"  {name:<24} {row['reward']:>9.4f}  {row['similarity']:>10.3f}  {row['repeats']:>7.1%}"
+        if "matched" in row:
+            line += f"  {row['matched']:>9.0f}"
+        if "duplicates" in row:
+            line += f"  {row['duplicates']:>10.1%}"
+        print(line)
+
+
+def averaged(results: list[dict]) -> dict:
+    return {key: statistics.fmean(r[key] for r in results) for key in results[0]}
+
+
+def policy_grid(diversity: float) -> list[tuple[str, str, float]]:
+    grid = [("random", "random", 0.0)]
+    for policy in POLICIES[:2]:
+        grid += [(f"{policy}", policy, 0.0), (f"{policy} + diversity {diversity}", policy, diversity)]
+    return grid
+
+
+async def load_log(args) -> tuple[SceneIndex, list[dict]]:
+    engine = create_async_engine(args.database_url or settings.DATABASE_URL)
+    try:
+        async with engine.connect() as conn:
+            rows = (await conn.execute(
+                select(
+                    SceneInteraction.session_id, SceneInteraction.user_id, SceneInteraction.scene_id,
+                    SceneInteraction.reading_time, SceneInteraction.response_length, TextScene.sphere_id,
+                )
+                .join(TextScene, TextScene.id == SceneInteraction.scene_id)
+                .order_by(SceneInteraction.created_at, SceneInteraction.id)
+                .limit(args.limit)
+            )).all()
+            logged = {row.scene_id for row in rows}
+            scenes = (await conn.execute(
+                select(
+                    TextScene.id, TextScene.sphere_id, TextScene.archetype_id, TextScene.scene_text,
+                    TextScene.meta_data, TextScene.scene_embedding,
+                ).where(TextScene.id.in_(logged) | (TextScene.is_active == True))
+            )).all()
+    finally:
+        await engine.dispose()
+
+    sessions, rewards = {}, defaultdict(lambda: defaultdict(list))
+    for row in rows:
+        sessions.setdefault(row.session_id, {"user": row.user_id, "sphere": row.sphere_id})
+        rewards[row.session_id][row.scene_id].append(scene_reward(row.reading_time, row.response_length))
+    log = [
+        {**session, "rewards": {scene_id: statistics.fmean(values) for scene_id, values in rewards[session_id].items()}}
+        for session_id, session in sessions.items()
+    ]
+    return SceneIndex.build(scenes, settings.EMBEDDING_DIMENSIONS), log
+
+
+def run_replay(args) -> None:
+    index, log = asyncio.run(load_log(args))
+    if not log:
+        print("no logged interactions")
+        return
+    shows = [reward for session in log for reward in session["rewards"].values()]
+    print(f"{len(log)} logged sessions, {len(shows)} shown scenes, {len(index)} scenes; "
+          f"logged mean reward {statistics.fmean(shows):.4f}")
+    rows = {}
+    for name, policy, diversity in policy_grid(args.diversity):
+        rows[name] = averaged([replay(index, log, policy, diversity, seed) for seed in range(args.runs)])
+    print_rows(f"replay ({args.runs} runs)", rows, "    matched")
+
+
+def synthetic_library(args, rng) -> tuple[SceneIndex, dict[int, float], dict[int, int]]:
+    dims, rows, quality, group_of = 64, [], {}, {}
+    scene_id = 0
+    for sphere in range(1, 13):
+        for group in range(args.scenes_per_sphere // GROUP_SIZE):
+            base = rng.standard_normal(dims)
+            group_quality = rng.beta(2, 3)
+            for _ in range(GROUP_SIZE):
+                scene_id += 1
+                rows.append((scene_id, sphere, None, "", None, base + 0.15 * rng.standard_normal(dims)))
+                quality[scene_id] = float(np.clip(group_quality + 0.05 * rng.standard_normal(), 0, 1))
+                group_of[scene_id] = sphere * 1000 + group
+    return SceneIndex.build(rows, dims), quality, group_of
+
+
+def run_simulate(args) -> None:
+    rng = np.random.default_rng(0)
+    index, quality, group_of = synthetic_library(args, rng)
+    users = rng.integers(0, args.users, args.sessions)
+    spheres = rng.integers(1, 13, args.sessions)
+
+    def reward(scene_id: int) -> float:
+        return float(np.clip(quality[scene_id] + 0.2 * rng.standard_normal(), 0, 1))
+
+    def duplicates(chosen) -> bool:
+        return len({group_of[scene.id] for scene in chosen}) < len(chosen)
+
+    print(f"{len(index)} scenes in groups of {GROUP_SIZE} near-duplicates, {args.sessions} sessions, "
+          f"{args.users} users")
+    online = {}
+    for name, policy, diversity in policy_grid(args.diversity) + [("oracle", "oracle", 0.0)]:
+        results = []
+        for run in range(args.runs):
+            index.shown[:] = 0
+            index.reward[:] = 0
+            if policy == "oracle":
+                index.shown[:] = 1e6
+                index.reward[:] = [quality[scene.id] * 1e6 for scene in index.scenes]
+            policy_rng = np.random.default_rng(run)
+            seen = defaultdict(set)
+            rewards, similarity, repeats, dup = [], [], 0, 0
+            for user, sphere in zip(users, spheres):
+                chosen = index.select(int(sphere), k=SET_SIZE, seen=seen[user],
+                                      policy="ucb" if policy == "oracle" else policy,
+                                      diversity=diversity, rng=policy_rng)
+                for scene in chosen:
+                    repeats += scene.id in seen[user]
+                    r = reward(scene.id)
+                    rewards.append(r)
+                    if policy != "oracle":
+                        index.observe(scene.id, r)
+                    seen[user].add(scene.id)
+                similarity.append(set_similarity(index, chosen))
+                dup += duplicates(chosen)
+            results.append({
+                "reward": statistics.fmean(rewards), "similarity": statistics.fmean(similarity),
+                "repeats": repeats / len(rewards), "duplicates": dup / len(users),
+            })
+        online[name] = averaged(results)
+    print_rows(f"online ({args.runs} runs)", online, "  duplicates")
+
+    # The same sessions logged by the old policy (uniform random sets), then replayed
+    log, seen = [], defaultdict(set)
+    for user, sphere in zip(users, spheres):
+        chosen = index.select(int(sphere), k=SET_SIZE, policy="random", diversity=0.0, rng=rng)
+        log.append({"user": user, "sphere": int(sphere), "rewards": {scene.id: reward(scene.id) for scene in chosen}})
+    rows = {}
+    for name, policy, diversity in policy_grid(args.diversity):
+        rows[name] = averaged([replay(index, log, policy, diversity, seed) for seed in range(args.runs)])
+    print_rows(f"replay of a uniformly random log ({args.runs} runs)", rows, "    matched")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    p = commands.add_parser("replay")
+    p.add_argument("--database-url", default=None)
+    p.add_argument("--limit", type=int, default=200_000)
+    p.add_argument("--diversity", type=float, default=settings.SCENE_DIVERSITY)
+    p.add_argument("--runs", type=int, default=5)
+    p = commands.add_parser("simulate")
+    p.add_argument("--scenes-per-sphere", type=int, default=40)
+    p.add_argument("--sessions", type=int, default=20_000)
+    p.add_argument("--users", type=int, default=3000)
+    p.add_argument("--diversity", type=float, default=settings.SCENE_DIVERSITY)
+    p.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    if args.command == "replay":
+        run_replay(args)
+    else:
+        run_simulate(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,261 @@
+"""
+Offline evaluation of the local somatic classifier (app/agents/somatic_classifier.py)
+against LLM verdicts on exported sync answers.
+
+Usage:
+  python scripts/eval_somatic_classifier.py export --out answers.jsonl [--database-url ...] [--limit 20000]
+  python scripts/eval_somatic_classifier.py label answers.jsonl --out labelled.jsonl [--concurrency 4]
+  python scripts/eval_somatic_classifier.py fit labelled.jsonl [data/somatic_seed.jsonl] [--out PATH]
+  python scripts/eval_somatic_classifier.py eval [labelled.jsonl ...] [--confidence 0.85] [--folds 5]
+
+export   SceneInteraction rows with their labels. An answer is labelled when
+         the LLM judged it: extracted_features.somatic with source "llm", or,
+         for rows logged before the local classifier, the per-layer metrics
+         of the sync session (the last answer of each layer only; "fallback"
+         verdicts are skipped).
+label    asks the LLM (sync_agent.llm_somatic_check) for unlabelled rows and
+         records the latency of every call (llm_ms).
+fit      fits the logistic weights and writes them to SOMATIC_MODEL_PATH,
+         where the app picks them up on start.
+eval     cross-validated (--folds; 0 = the weights the app would use)
+         accuracy, calibration, escalations and per-phase latency of the
+         somatic check. Without files it runs on data/somatic_seed.jsonl.
+         The old check awaited the LLM in every phase; the new one awaits it
+         for escalated answers only. Rows without a measured llm_ms use --llm-ms.
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import statistics
+import sys
+import time
+from collections import defaultdict
+
+import numpy as np
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import create_async_engine
+
+# Ensure backend root is in PYTHONPATH
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.agents.somatic_classifier import (
+    SomaticClassifier, fit_weights, get_classifier, load_weights, response_features,
+)
+from app.config import settings
+from app.models.sync_session import SyncSession
+from app.models.text_diagnostics import SceneInteraction
+
+SEED_PATH = os.path.join(settings.DATA_DIR, "somatic_seed.jsonl")
+
+
+def read_rows(paths: list[str]) -> list[dict]:
+    rows = []
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            rows += [json.loads(line) for line in f if line.strip()]
+    return rows
+
+
+def write_rows(path: str, rows: list[dict]) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        for row in rows:
+            f.write(json.dumps(row, ensure_ascii=False) + "\n")
+
+
+def session_label(phase_data: dict, layer: str):
+    """
+    The LLM verdict of a row logged before the local classifier: the session
+    metrics keep has_body / has_objects of it, and the check prompt calls an
+    answer somatic when it has either.
+    """
+    metrics = ((phase_data or {}).get("metrics") or {}).get(layer)
+    if not metrics or metrics.get("ai_reason") in (None, "fallback") or "somatic_source" in metrics:
+        return None
+    return bool(metrics.get("has_body") or metrics.get("has_objects"))
+
+
+async def export(args) -> None:
+    engine = create_async_engine(args.database_url or settings.DATABASE_URL)
+    try:
+        async with engine.connect() as conn:
+            rows = (await conn.execute(
+                select(
+                    SceneInteraction.id, SceneInteraction.session_id, SceneInteraction.layer_index,
+                    SceneInteraction.response_text, SceneInteraction.extracted_features, SyncSession.phase_data,
+                )
+                .join(SyncSession, SyncSession.id == SceneInteraction.session_id)
+                .where(SceneInteraction.response_text.is_not(None))
+                .order_by(SceneInteraction.id.desc())
+                .limit(args.limit)
+            )).all()
+    finally:
+        await engine.dispose()
+
+    # The session keeps the metrics of the last answer per layer only
+    last_of_layer = {}
+    for row in rows:
+        last_of_layer.setdefault((row.session_id, row.layer_index), row.id)
+    out, labelled = [], 0
+    for row in reversed(rows):
+        layer = str(row.layer_index)
+        somatic = (row.extracted_features or {}).get("somatic") or {}
+        label, source = None, None
+        if somatic.get("source") == "llm":
+            label, source = bool(somatic["is_somatic"]), "interaction"
+        elif not somatic and last_of_layer[(row.session_id, row.layer_index)] == row.id:
+            label = session_label(row.phase_data, layer)
+            source = "session" if label is not None else None
+        scene = (((row.phase_data or {}).get("scenes") or {}).get(layer) or {}).get("text", "")
+        out.append({
+            "id": row.id, "layer": layer, "text": row.response_text, "scene": scene,
+            "is_somatic": label, "label_source": source,
+        })
+        labelled += label is not None
+    write_rows(args.out, out)
+    print(f"{len(out)} answers, {labelled} labelled -> {args.out}")
+
+
+async def label(args) -> None:
+    from app.agents.sync_agent import llm_somatic_check
+
+    rows = read_rows([args.file])
+    todo = [row for row in rows if row.get("is_somatic") is None]
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def run(row):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                verdict = await llm_somatic_check(row["text"], row.get("scene", ""))
+            except Exception as e:
+                print(f"  {row.get('id')}: {e}")
+                return
+            row["llm_ms"] = round((time.perf_counter() - started) * 1000, 1)
+            row["is_somatic"] = bool(verdict.get("is_somatic", False))
+            row["label_source"] = "label"
+
+    await asyncio.gather(*(run(row) for row in todo))
+    write_rows(args.out, rows)
+    print(f"{sum(row.get('label_source') == 'label' for row in rows)} of {len(todo)} labelled -> {args.out}")
+
+
+def fit(args) -> None:
+    rows = [row for row in read_rows(args.files) if row.get("is_somatic") is not None]
+    weights = fit_weights([row["text"] for row in rows], [row["is_somatic"] for row in rows], l2=args.l2)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    with open(args.out, "w", encoding="utf-8") as f:
+        json.dump({"weights": weights, "rows": len(rows), "l2": args.l2}, f, ensure_ascii=False, indent=2)
+    print(json.dumps(weights, ensure_ascii=False))
+    print(f"fitted on {len(rows)} answers -> {args.out}")
+
+
+def predictions(rows: list[dict], folds: int, l2: float) -> list[float]:
+    """P(somatic) per row: from the app's weights, or from a model that did not see the row."""
+    if folds <= 1:
+        classifier = get_classifier()
+        return [classifier.probability(response_features(row["text"])) for row in rows]
+    order = list(range(len(rows)))
+    random.Random(0).shuffle(order)
+    probabilities = [0.0] * len(rows)
+    for fold in range(folds):
+        test = set(order[fold::folds])
+        train = [rows[i] for i in order if i not in test]
+        classifier = SomaticClassifier(fit_weights([r["text"] for r in train], [r["is_somatic"] for r in train], l2=l2))
+        for i in test:
+            probabilities[i] = classifier.probability(response_features(rows[i]["text"]))
+    return probabilities
+
+
+def expected_calibration_error(probabilities: np.ndarray, labels: np.ndarray, bins: int = 10) -> float:
+    edges = np.minimum((probabilities * bins).astype(int), bins - 1)
+    error = 0.0
+    for b in range(bins):
+        mask = edges == b
+        if mask.any():
+            error += mask.mean() * abs(probabilities[mask].mean() - labels[mask].mean())
+    return error
+
+
+def evaluate(args) -> None:
+    rows = [row for row in read_rows(args.files or [SEED_PATH]) if row.get("is_somatic") is not None]
+    if not rows:
+        print("no labelled answers")
+        return
+    labels = np.array([1.0 if row["is_somatic"] else 0.0 for row in rows])
+    p = np.array(predictions(rows, args.folds, args.l2))
+    local = (p >= 0.5) == (labels == 1.0)
+    confidence = np.maximum(p, 1 - p)
+    source = "SOMATIC_MODEL_PATH" if load_weights(settings.SOMATIC_MODEL_PATH) else "built-in"
+    print(f"{len(rows)} labelled answers ({int(labels.sum())} somatic); "
+          f"{'%d-fold cross-validation' % args.folds if args.folds > 1 else source + ' weights'}")
+    print(f"  local only: accuracy {local.mean():.3f}, ECE {expected_calibration_error(p, labels):.3f}")
+
+    print("  confidence  escalated  LLM calls saved  accuracy")
+    for threshold in sorted({0.6, 0.7, 0.8, 0.9, 0.95, args.confidence}):
+        escalated = confidence < threshold
+        # Escalated answers get the LLM verdict, which is the label
+        accuracy = np.where(escalated, True, local).mean()
+        mark = " <- SOMATIC_CONFIDENCE" if threshold == args.confidence else ""
+        saved = (1 - escalated.mean()) * (1 - args.sample_rate)
+        print(f"  {threshold:>10.2f}  {escalated.mean():>9.1%}  {saved:>15.1%}  {accuracy:>8.3f}{mark}")
+
+    # Per-phase latency of the check: local classification always, the LLM on escalation
+    escalated = (confidence < args.confidence) | (np.random.default_rng(0).random(len(rows)) < args.sample_rate)
+    by_layer = defaultdict(lambda: {"old": [], "new": [], "local": []})
+    get_classifier().classify("")
+    for row, escalate in zip(rows, escalated):
+        started = time.perf_counter()
+        get_classifier().classify(row["text"])
+        local_ms = (time.perf_counter() - started) * 1000
+        llm_ms = row.get("llm_ms") or args.llm_ms
+        layer = by_layer[row.get("layer") or "all"]
+        layer["old"].append(llm_ms)
+        layer["new"].append(local_ms + (llm_ms if escalate else 0.0))
+        layer["local"].append(local_ms)
+    print(f"  per-phase somatic check (LLM {'measured' if any(r.get('llm_ms') for r in rows) else f'{args.llm_ms:.0f} ms assumed'}):")
+    print("  layer   answers   local p50    old mean    new mean    new p50")
+    for name in sorted(by_layer):
+        layer = by_layer[name]
+        print(f"  {name:<6}  {len(layer['old']):>7}  {statistics.median(layer['local']) * 1000:>7.0f} us"
+              f"  {statistics.fmean(layer['old']):>8.0f} ms  {statistics.fmean(layer['new']):>8.0f} ms"
+              f"  {statistics.median(layer['new']):>7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+    p = commands.add_parser("export")
+    p.add_argument("--out", required=True)
+    p.add_argument("--database-url", default=None)
+    p.add_argument("--limit", type=int, default=20000)
+    p = commands.add_parser("label")
+    p.add_argument("file")
+    p.add_argument("--out", required=True)
+    p.add_argument("--concurrency", type=int, default=4)
+    p = commands.add_parser("fit")
+    p.add_argument("files", nargs="+")
+    p.add_argument("--out", default=settings.SOMATIC_MODEL_PATH)
+    p.add_argument("--l2", type=float, default=0.003)
+    p = commands.add_parser("eval")
+    p.add_argument("files", nargs="*")
+    p.add_argument("--confidence", type=float, default=settings.SOMATIC_CONFIDENCE)
+    p.add_argument("--sample-rate", type=float, default=settings.SOMATIC_LLM_SAMPLE_RATE)
+    p.add_argument("--folds", type=int, default=5)
+    p.add_argument("--l2", type=float, default=0.003)
+    p.add_argument("--llm-ms", type=float, default=2500.0)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        asyncio.run(export(args))
+    elif args.command == "label":
+        asyncio.run(label(args))
+    elif args.command == "fit":
+        fit(args)
+    else:
+        evaluate(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,96 @@
-"""Pytest configuration."""
+"""Pytest configuration and the fake database session shared by unit tests."""
 import sys
 import os
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from typing import Any
 
 # Add backend directory to path
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+
+class FakeResult(list):
+    """Rows of one statement, readable the ways the code under test reads them."""
+
+    def __init__(self, rows=(), rowcount: int = 1):
+        super().__init__(rows)
+        self.rowcount = rowcount
+
+    def scalars(self):
+        return self
+
+    def mappings(self):
+        return self
+
+    def all(self):
+        return list(self)
+
+    def one(self):
+        return self[0]
+
+
+@dataclass
+class Executed:
+    statement: Any
+    passed: Any = None  # parameters given with the statement: a dict, or a list of rows
+
+    @property
+    def params(self) -> dict:
+        """Values bound in the statement, overridden by the ones passed with it."""
+        compiled = self.statement.compile().params if hasattr(self.statement, "compile") else {}
+        bound = {key: value for key, value in compiled.items() if value is not None}
+        return {**bound, **(self.passed if isinstance(self.passed, dict) else {})}
+
+
+class FakeSession:
+    """
+    Stand-in for AsyncSession / AsyncConnection in unit tests; calling it or
+    begin() yields itself, so it also replaces AsyncSessionLocal or an engine.
+    execute() answers with the next entry of `results` (rows or a FakeResult),
+    then with `rows`; scalar() with `scalar`; get() looks `objects` up by key.
+    Every statement is recorded in `executed`.
+    """
+
+    def __init__(self, rows=(), *, results=(), scalar=None, rowcount: int = 1, objects=None):
+        self.rows = list(rows)
+        self.results = list(results)
+        self.scalar_value = scalar
+        self.rowcount = rowcount
+        self.objects = dict(objects or {})
+        self.executed: list[Executed] = []
+        self.added: list = []
+        self.commits = 0
+
+    async def execute(self, statement, params=None):
+        self.executed.append(Executed(statement, params))
+        result = self.results.pop(0) if self.results else self.rows
+        return result if isinstance(result, FakeResult) else FakeResult(result, self.rowcount)
+
+    async def scalar(self, statement, params=None):
+        self.executed.append(Executed(statement, params))
+        return self.scalar_value
+
+    async def get(self, model, key):
+        return self.objects.get(key)
+
+    def add(self, obj) -> None:
+        self.added.append(obj)
+
+    async def commit(self) -> None:
+        self.commits += 1
+
+    async def rollback(self) -> None:
+        pass
+
+    def __call__(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    @asynccontextmanager
+    async def begin(self):
+        yield self
@@ -0,0 +1,83 @@
+"""
+Tests for the alignment prompt context: dialogue window, history budget,
+one-time summaries of earlier sessions.
+"""
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from app.agents.align_context import AlignmentDialogue, build_history_context, count_tokens
+from app.services.llm_scheduler import Priority
+from tests.conftest import FakeSession
+
+
+def align(index: int, summary: str | None = None, **fields) -> SimpleNamespace:
+    row = dict(
+        id=index, created_at=datetime(2026, 1, 1) + timedelta(days=index), hawkins_entry=100 + index,
+        hawkins_peak=200 + index, context_summary=summary, new_belief=None, integration_plan=None,
+    )
+    return SimpleNamespace(**{**row, **fields})
+
+
+class TestAlignmentDialogue:
+    def test_window_drops_oldest_beyond_budget(self):
+        dialogue = AlignmentDialogue(budget=3 * count_tokens("x" * 30))
+        for i in range(6):
+            dialogue.append("user" if i % 2 else "assistant", str(i) * 30)
+        assert [m["content"][0] for m in dialogue.window()] == ["3", "4", "5"]
+        assert len(dialogue.messages) == 6
+        assert dialogue.window_tokens == sum(count_tokens(m["content"]) for m in dialogue.window())
+
+    def test_newest_message_stays_even_over_budget(self):
+        dialogue = AlignmentDialogue(budget=5)
+        dialogue.append("user", "x" * 300)
+        assert len(dialogue.window()) == 1
+
+
+class TestHistoryContext:
+    def test_newest_summaries_fit_the_budget_in_chronological_order(self):
+        prev = [align(i, summary=f"итог {i} " + "слово " * 20) for i in range(1, 21)]
+        context = build_history_context(None, prev, budget=200)
+        assert count_tokens(context) <= 200 + 20
+        numbers = [int(line.split("#")[1].split()[0]) for line in context.splitlines() if "#" in line]
+        assert numbers == sorted(numbers) and numbers[-1] == 20 and len(numbers) < 20
+        assert f"Более ранних сессий выравнивания: {20 - len(numbers)}" in context
+
+    def test_missing_summary_falls_back_to_row_fields(self):
+        prev = [align(1, new_belief="я в безопасности")]
+        assert "Инсайт: я в безопасности" in build_history_context(None, prev)
+
+
+class TestSummaries:
+    async def test_rows_without_summary_are_queued_not_awaited(self, monkeypatch):
+        from app.routers import session as session_routes
+
+        queued = []
+
+        async def enqueue(db, job_type, payload, **kwargs):
+            queued.append((job_type, payload, kwargs))
+
+        monkeypatch.setattr(session_routes, "enqueue", enqueue)
+        prev = [align(1, summary="готово"), align(2, new_belief="я в безопасности")]
+        assert await session_routes._enqueue_missing_summaries(None, prev) == [2]
+        assert queued == [("align.summarize", {"align_session_id": 2},
+                           {"priority": Priority.BACKGROUND, "coalesce": True})]
+        assert "Инсайт: я в безопасности" in build_history_context(None, prev)
+
+    async def test_summary_job_writes_after_the_save(self, monkeypatch):
+        from app.routers import session as session_routes
+
+        row = align(3, messages_json=[{"role": "user", "content": "ком в горле"}])
+        db = FakeSession(objects={3: row})
+
+        async def summarize_alignment(messages, *args):
+            return f"сжато: {messages[0]['content']}"
+
+        monkeypatch.setattr(session_routes, "AsyncSessionLocal", db)
+        monkeypatch.setattr(session_routes, "summarize_alignment", summarize_alignment)
+        await session_routes._summarize_align_session(align_session_id=3)
+        [write] = db.executed
+        assert write.params["context_summary"] == "сжато: ком в горле" and db.commits == 1
+
+        row.context_summary = "готово"
+        await session_routes._summarize_align_session(align_session_id=3)
+        assert len(db.executed) == 1
@@ -0,0 +1,164 @@
+"""
+Tests for the natal chart engine (scalar and batch paths) and the ephemeris table.
+"""
+import json
+import logging
+import random
+from datetime import datetime
+
+import numpy as np
+import pytest
+import swisseph as swe
+
+from app.core.astrology import ephemeris_table, natal_chart
+from app.core.astrology.ephemeris_table import (
+    CALC_FLAGS, LON, LON_ERR, SPEED, SPEED_ERR, EphemerisTable, calc_position, hermite,
+)
+from app.core.astrology.natal_chart import (
+    assign_houses,
+    calculate_natal_chart,
+    calculate_natal_charts_batch,
+    get_house,
+    to_dict,
+)
+
+BIRTHS = [
+    (datetime(1990, 1, 15), "14:30", 55.7558, 37.6173, "Europe/Moscow"),
+    (datetime(1985, 7, 4), "06:05", 40.7128, -74.0060, "America/New_York"),
+    (datetime(2001, 11, 30), "23:59", -33.8688, 151.2093, "Australia/Sydney"),
+    (datetime(1962, 3, 8), "00:00", 64.1466, -21.9426, "Atlantic/Reykjavik"),
+    (datetime(1977, 9, 21), "12:00", 0.0, 0.0, "UTC"),
+]
+
+
+class TestHermite:
+    def test_exact_on_cubic(self):
+        f = lambda x: 2 * x ** 3 - x ** 2 + 5 * x - 1
+        df = lambda x: 6 * x ** 2 - 2 * x + 5
+        x0, h = 1.5, 2.0
+        for t in (0.0, 0.25, 0.5, 0.9, 1.0):
+            value, derivative = hermite(f(x0), df(x0), f(x0 + h), df(x0 + h), t, h)
+            assert abs(value - f(x0 + t * h)) < 1e-9
+            assert abs(derivative - df(x0 + t * h)) < 1e-9
+
+
+TABLE_CODES = [swe.SUN, swe.MOON]
+TABLE_START = swe.julday(2000, 1, 1, 0.0)
+TABLE_STEP = 0.5
+TOLERANCE = 1e-3
+BAD_INTERVAL = 4  # the Moon's stored error there is over the tolerance
+
+
+def swisseph(jd, code):
+    pos, _ = swe.calc_ut(jd, code, CALC_FLAGS)
+    return pos[0], pos[3]
+
+
+def angle(a, b):
+    return abs((a - b + 180) % 360 - 180)
+
+
+@pytest.fixture
+def table(tmp_path):
+    """Sun and Moon sampled from pyswisseph every 12 hours over four days."""
+    jds = TABLE_START + TABLE_STEP * np.arange(9)
+    data = np.zeros((len(jds), len(TABLE_CODES), 4))
+    for i, jd in enumerate(jds):
+        for j, code in enumerate(TABLE_CODES):
+            data[i, j, LON], data[i, j, SPEED] = swisseph(jd, code)
+    data[..., LON] = np.unwrap(data[..., LON], period=360, axis=0)
+    data[-1, :, LON_ERR] = np.inf  # no interval after the last sample
+    data[BAD_INTERVAL, 1, LON_ERR] = 0.01
+    np.save(tmp_path / "table.npy", data)
+    (tmp_path / "table.json").write_text(json.dumps(
+        {"jd_start": TABLE_START, "step": TABLE_STEP, "body_codes": TABLE_CODES}
+    ))
+    return EphemerisTable(str(tmp_path / "table.npy"), str(tmp_path / "table.json"))
+
+
+class TestEphemerisTable:
+    def test_interpolates_like_swisseph(self, table):
+        jds = TABLE_START + np.array([0.3, 1.1, 2.7, 3.9])
+        lon, speed, ok = table.lookup(jds, TOLERANCE, TOLERANCE)
+        assert ok.all()
+        for i, jd in enumerate(jds):
+            for j, code in enumerate(TABLE_CODES):
+                expected_lon, expected_speed = swisseph(jd, code)
+                assert angle(lon[i, j], expected_lon) < 1e-5
+                assert abs(speed[i, j] - expected_speed) < 1e-3
+                assert table.calc(jd, code, TOLERANCE, TOLERANCE) == pytest.approx((lon[i, j], speed[i, j]))
+
+    def test_not_ok_at_the_range_edge_and_over_tolerance(self, table):
+        in_bad = TABLE_START + TABLE_STEP * (BAD_INTERVAL + 0.5)
+        jds = np.array([TABLE_START - 0.1, table.jd_end, table.jd_end + 1.0, in_bad])
+        _, _, ok = table.lookup(jds, TOLERANCE, TOLERANCE)
+        assert ok.tolist() == [[False, False], [False, False], [False, False], [True, False]]
+        assert table.calc(table.jd_end, swe.SUN, TOLERANCE, TOLERANCE) is None
+        assert table.calc(in_bad, swe.MOON, TOLERANCE, TOLERANCE) is None
+        assert table.calc(in_bad, swe.MARS, TOLERANCE, TOLERANCE) is None  # not in the table
+        assert table.lookup(np.array([in_bad]), 0.1, TOLERANCE)[2].all()
+
+    def test_calc_position_falls_back_to_swisseph(self, table, monkeypatch):
+        monkeypatch.setattr(ephemeris_table, "get_ephemeris_table", lambda: table)
+        monkeypatch.setattr(ephemeris_table.settings, "EPHEMERIS_TABLE_TOLERANCE", TOLERANCE)
+        monkeypatch.setattr(ephemeris_table.settings, "EPHEMERIS_TABLE_SPEED_TOLERANCE", TOLERANCE)
+        in_bad = TABLE_START + TABLE_STEP * (BAD_INTERVAL + 0.5)
+        for jd, code in [(in_bad, swe.MOON), (table.jd_end + 1.0, swe.SUN), (in_bad, swe.MARS)]:
+            assert calc_position(jd, code) == swisseph(jd, code)
+        served = calc_position(in_bad, swe.SUN)
+        assert served == table.calc(in_bad, swe.SUN, TOLERANCE, TOLERANCE) != swisseph(in_bad, swe.SUN)
+
+
+class TestAssignHouses:
+    def test_matches_get_house(self):
+        rnd = random.Random(7)
+        for _ in range(200):
+            cusps = sorted(rnd.uniform(0, 360) for _ in range(12))
+            shift = rnd.randrange(12)
+            cusps = cusps[shift:] + cusps[:shift]
+            degrees = [rnd.uniform(0, 360) for _ in range(30)] + cusps
+            assert assign_houses(degrees, cusps).tolist() == [get_house(d, cusps) for d in degrees]
+
+    def test_batch_shape(self):
+        cusps = [[30.0 * i for i in range(12)], [15.0 + 30.0 * i for i in range(12)]]
+        houses = assign_houses([[0.0, 359.9], [0.0, 359.9]], cusps)
+        assert houses.tolist() == [[1, 12], [12, 12]]
+
+
+class TestNatalChartsBatch:
+    def test_identical_to_scalar(self):
+        batch = calculate_natal_charts_batch(BIRTHS)
+        assert len(batch) == len(BIRTHS)
+        for i, birth in enumerate(BIRTHS):
+            scalar = calculate_natal_chart(*birth)
+            assert batch.chart(i) == scalar
+            assert to_dict(batch.chart(i)) == to_dict(scalar)
+
+    def test_bad_birth_does_not_abort_batch(self):
+        batch = calculate_natal_charts_batch([
+            (datetime(1990, 1, 1), "12:00", 55.0, 37.0, "Not/AZone"),
+            BIRTHS[0],
+        ])
+        assert batch.errors[0] is not None
+        assert batch.errors[1] is None
+        charts = batch.charts()
+        assert charts[0] is None
+        assert charts[1] == calculate_natal_chart(*BIRTHS[0])
+
+    def test_failing_body_is_logged_once_per_batch(self, monkeypatch, caplog):
+        calc_ut = natal_chart.swe.calc_ut
+        moon = natal_chart.swe.MOON
+
+        def failing_moon(jd, code, flags):
+            if code == moon:
+                raise natal_chart.swe.Error("ephemeris file not found")
+            return calc_ut(jd, code, flags)
+
+        monkeypatch.setattr(natal_chart, "get_ephemeris_table", lambda: None)
+        monkeypatch.setattr(natal_chart.swe, "calc_ut", failing_moon)
+        with caplog.at_level(logging.ERROR, logger=natal_chart.__name__):
+            batch = calculate_natal_charts_batch(BIRTHS)
+        assert [r.getMessage() for r in caplog.records] == [
+            f"Error calculating Moon for {len(BIRTHS)} of {len(BIRTHS)} charts: ephemeris file not found"
+        ]
+        assert "Moon" not in {p.name_en for p in batch.chart(0).planets}
@@ -0,0 +1,73 @@
+"""
+Tests for the DSB calculator result cache (in-memory tier).
+"""
+import asyncio
+import datetime
+
+from app.dsb.calculators.base import BirthData, Calculator
+from app.dsb.calculators.cache import CalculatorCache, make_cache_key
+
+
+class CountingCalculator(Calculator):
+    system_name = "counting"
+
+    def __init__(self, fail: bool = False):
+        self.calls = 0
+        self.fail = fail
+        if fail:
+            self.system_name = "failing"
+
+    async def calculate(self, birth_data: BirthData) -> dict:
+        self.calls += 1
+        if self.fail:
+            raise ValueError("boom")
+        return self._base_envelope(birth_data, {"calls": self.calls})
+
+
+def birth(**overrides) -> BirthData:
+    data = {"date": datetime.date(1990, 1, 15), "time": datetime.time(14, 30), "place": "Москва",
+            "lat": 55.7558, "lon": 37.6173, "timezone": "Europe/Moscow"}
+    data.update(overrides)
+    return BirthData(**data)
+
+
+class TestCacheKey:
+    def test_normalized_inputs_share_key(self):
+        calc = CountingCalculator()
+        assert make_cache_key(calc, birth()) == make_cache_key(calc, birth(place="  москва "))
+        assert make_cache_key(calc, birth()) == make_cache_key(calc, birth(lat=55.75580000001))
+        assert make_cache_key(calc, birth()) != make_cache_key(calc, birth(time=datetime.time(14, 31)))
+
+    def test_version_changes_key(self):
+        calc = CountingCalculator()
+        key = make_cache_key(calc, birth())
+        calc.version = "2"
+        assert make_cache_key(calc, birth()) != key
+
+
+class TestCalculatorCache:
+    def test_hits_skip_calculation(self):
+        cache = CalculatorCache()
+        calc = CountingCalculator()
+        first = asyncio.run(cache.calculate_many([("counting", calc)], birth()))
+        second = asyncio.run(cache.calculate_many([("counting", calc)], birth(place="МОСКВА")))
+        assert calc.calls == 1
+        assert first == second
+        assert cache.stats()["memory_hits"] == 1 and cache.stats()["misses"] == 1
+
+    def test_errors_are_returned_not_cached(self):
+        cache = CalculatorCache()
+        bad, good = CountingCalculator(fail=True), CountingCalculator()
+        results = asyncio.run(cache.calculate_many([("failing", bad), ("counting", good)], birth()))
+        assert isinstance(results[0], ValueError) and results[1]["raw_data"] == {"calls": 1}
+        asyncio.run(cache.calculate_many([("failing", bad)], birth()))
+        assert bad.calls == 2
+
+    def test_invalidate_by_version(self):
+        cache = CalculatorCache()
+        calc = CountingCalculator()
+        asyncio.run(cache.calculate_many([("counting", calc)], birth()))
+        assert asyncio.run(cache.invalidate("counting", version="0")) == 0
+        assert asyncio.run(cache.invalidate("counting", version="1")) == 1
+        asyncio.run(cache.calculate_many([("counting", calc)], birth()))
+        assert calc.calls == 2
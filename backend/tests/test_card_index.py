@@ -0,0 +1,138 @@
+"""
+Tests for the in-process AvatarCard index: exact top-k with cosine scores,
+sphere filtering, the memory-mapped file and how the process index is loaded.
+"""
+import numpy as np
+import pytest
+
+from app.config import settings
+from app.core.astrology import card_index, vector_matcher
+from app.core.astrology.card_index import CardIndex
+
+SPHERES = ["IDENTITY", "MONEY", "LOVE"]
+
+
+def make_index(cards: int = 30, dims: int = 16, seed: int = 1) -> CardIndex:
+    rng = np.random.default_rng(seed)
+    rows = [(i // len(SPHERES), SPHERES[i % len(SPHERES)], rng.standard_normal(dims)) for i in range(cards)]
+    return CardIndex.build(rows, "test-model", dims)
+
+
+def brute_force(index: CardIndex, query: np.ndarray, k: int, sphere=None) -> list[int]:
+    query = query / np.linalg.norm(query)
+    scored = [(float(index.vectors[i] @ query), i) for i in range(len(index))
+              if sphere is None or index.spheres[i] == sphere]
+    return [i for _, i in sorted(scored, reverse=True)[:k]]
+
+
+class TestSearch:
+    def test_matches_brute_force_with_cosine_scores(self):
+        index = make_index()
+        queries = np.random.default_rng(2).standard_normal((5, 16))
+        for query, matches in zip(queries, index.search(queries, k=4)):
+            expected = brute_force(index, query, 4)
+            assert [m.archetype_id for m in matches] == [int(index.archetype_ids[i]) for i in expected]
+            cosine = float(index.vectors[expected[0]] @ query / np.linalg.norm(query))
+            assert matches[0].score == pytest.approx(cosine, abs=1e-5)
+            assert [m.score for m in matches] == sorted((m.score for m in matches), reverse=True)
+
+    def test_sphere_per_query(self):
+        index = make_index()
+        queries = np.random.default_rng(3).standard_normal((3, 16))
+        hits = index.search(queries, k=2, spheres=["MONEY", None, "UNKNOWN"])
+        assert {m.sphere for m in hits[0]} == {"MONEY"} and len(hits[0]) == 2
+        assert len(hits[1]) == 2
+        assert hits[2] == []
+
+    def test_k_larger_than_sphere(self):
+        index = make_index(cards=6)
+        assert len(index.search(np.ones(16), k=5, spheres=["LOVE"])[0]) == 2
+
+    def test_several_spheres(self):
+        index = make_index()
+        hits = index.search(np.ones(16), k=30, spheres=[{"LOVE", "MONEY", "UNKNOWN"}])[0]
+        assert len(hits) == 20 and {m.sphere for m in hits} == {"LOVE", "MONEY"}
+
+
+class TestDiversity:
+    def clustered(self) -> CardIndex:
+        # Three archetypes, each as four near-identical cards
+        rng = np.random.default_rng(8)
+        centers = rng.standard_normal((3, 16))
+        rows = [(a, SPHERES[n % 3], centers[a] + 0.05 * rng.standard_normal(16)) for a in range(3) for n in range(4)]
+        return CardIndex.build(rows, "test-model", 16)
+
+    def test_mmr_spreads_over_archetypes(self):
+        index = self.clustered()
+        query = index.vectors[0] + 0.6 * index.vectors[4]
+        plain = index.search(query, k=3)[0]
+        diverse = index.search(query, k=3, diversity=0.5)[0]
+        assert {m.archetype_id for m in plain} == {0}
+        assert len({m.archetype_id for m in diverse}) >= 2
+        assert diverse[0] == plain[0]
+        # Scores remain similarities to the query
+        cosines = index.vectors @ (query / np.linalg.norm(query))
+        assert all(np.isclose(cosines, m.score, atol=1e-5).any() for m in diverse)
+
+    def test_zero_diversity_is_plain_ranking(self):
+        index = make_index()
+        query = np.random.default_rng(9).standard_normal(16)
+        assert index.search(query, k=5, diversity=0.0) == index.search(query, k=5)
+
+
+class TestLoading:
+    def test_saved_index_is_memory_mapped(self, tmp_path):
+        index = make_index()
+        index.save(str(tmp_path))
+        loaded = CardIndex.load(str(tmp_path))
+        assert isinstance(loaded.vectors, np.memmap)
+        query = np.random.default_rng(4).standard_normal(16)
+        assert loaded.search(query, k=3) == index.search(query, k=3)
+
+    async def test_file_of_another_model_falls_back_to_db(self, tmp_path, monkeypatch):
+        make_index().save(str(tmp_path))
+        from_db = make_index(seed=5)
+
+        async def load_from_db(cls, db):
+            return from_db
+
+        monkeypatch.setattr(settings, "CARD_INDEX_PATH", str(tmp_path))
+        monkeypatch.setattr(CardIndex, "from_db", classmethod(load_from_db))
+        monkeypatch.setattr(card_index, "_index", None)
+        assert await card_index.get_card_index(None) is from_db
+
+        monkeypatch.setattr(settings, "EMBEDDING_MODEL", "test-model")
+        monkeypatch.setattr(settings, "EMBEDDING_DIMENSIONS", 16)
+        card_index.reset_card_index()
+        assert isinstance((await card_index.get_card_index(None)).vectors, np.memmap)
+        card_index.reset_card_index()
+
+
+class TestMatchers:
+    @pytest.fixture
+    def index(self, monkeypatch):
+        index = make_index()
+        rng = np.random.default_rng(6)
+        calls = []
+
+        async def embed_many(texts):
+            calls.append(texts)
+            return rng.standard_normal((len(texts), 16)).tolist()
+
+        async def get_index(db):
+            return index
+
+        monkeypatch.setattr(vector_matcher, "embed_many", embed_many)
+        monkeypatch.setattr(vector_matcher, "get_card_index", get_index)
+        index.embed_calls = calls
+        return index
+
+    async def test_text_match_returns_real_scores(self, index):
+        matches = await vector_matcher.match_text_to_archetypes(None, "текст", top_k=3)
+        assert len({m[2] for m in matches}) == 3 and all(m[2] != 0.8 for m in matches)
+        assert [m[2] for m in matches] == sorted((m[2] for m in matches), reverse=True)
+
+    async def test_batch_with_filter_and_blank_text(self, index):
+        results = await vector_matcher.match_texts_to_archetypes(None, ["один", " ", "два"], top_k=2, spheres=["LOVE"])
+        assert index.embed_calls == [["один", "два"]]
+        assert results[1] == [] and all(m[1] == "LOVE" for m in results[0] + results[2])
@@ -0,0 +1,76 @@
+"""
+Tests for DSB pipeline checkpoints (in-memory part; DB writes are best-effort).
+"""
+from app.dsb.pipeline.checkpoints import CheckpointStore, input_hash, summarize_progress
+from app.dsb.storage.models import PortraitCheckpoint
+
+
+def no_db():
+    raise RuntimeError("database unavailable")
+
+
+def checkpoint(layer, unit, inputs, status="done", payload=None, error=None) -> PortraitCheckpoint:
+    return PortraitCheckpoint(
+        portrait_id="p1", layer=layer, unit=unit, status=status,
+        input_hash=inputs, payload=payload, error=error,
+    )
+
+
+class TestInputHash:
+    def test_stable_and_order_insensitive_for_dicts(self):
+        assert input_hash({"a": 1, "b": 2}, [1]) == input_hash({"b": 2, "a": 1}, [1])
+        assert input_hash({"a": 1}) != input_hash({"a": 2})
+        assert len(input_hash("x")) == 64
+
+
+class TestCheckpointStore:
+    async def test_reuses_done_unit_with_same_inputs(self):
+        store = CheckpointStore("p1", no_db, [checkpoint("spheres", "3", "h1", payload={"sphere_num": 3})])
+        calls = []
+
+        async def compute():
+            calls.append(1)
+            return {"sphere_num": 3, "fresh": True}
+
+        assert await store.run("spheres", "3", "h1", compute) == {"sphere_num": 3}
+        assert calls == [] and store.reused == 1
+
+        # Входы изменились (например, подключено новое учение) — пересчёт
+        assert await store.run("spheres", "3", "h2", compute) == {"sphere_num": 3, "fresh": True}
+        assert calls == [1] and store.computed == 1
+
+    async def test_error_checkpoints_are_recomputed(self):
+        store = CheckpointStore("p1", no_db, [checkpoint("meta", "all", "h", status="error", error="boom")])
+
+        async def compute():
+            return {"meta_patterns": []}
+
+        assert await store.run("meta", "all", "h", compute) == {"meta_patterns": []}
+        assert store.computed == 1
+
+    async def test_degraded_payload_passes_through(self):
+        store = CheckpointStore("p1", no_db, [])
+
+        async def compute():
+            return {"overall_brief": "fallback", "error": "timeout"}
+
+        payload = await store.run("compressor", "all", "h", compute, check=lambda p: p.get("error"))
+        assert payload["overall_brief"] == "fallback"
+        assert store.get("compressor", "all", "h") is None
+
+
+class TestProgress:
+    def test_counts_per_layer(self):
+        progress = summarize_progress(
+            [
+                checkpoint("spheres", "1", "h"),
+                checkpoint("spheres", "2", "h", status="error", error="LLM timeout"),
+                checkpoint("meta", "all", "h"),
+            ],
+            {"spheres": 12, "meta": 1},
+        )
+        assert progress["spheres"] == {
+            "total": 12, "done": 1, "error": 1, "failed_units": [{"unit": "2", "error": "LLM timeout"}],
+        }
+        assert progress["meta"]["done"] == 1
+        assert progress["compressor"] == {"total": 0, "done": 0, "error": 0, "failed_units": []}
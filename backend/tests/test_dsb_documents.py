@@ -0,0 +1,122 @@
+"""
+Tests for the materialized DSB portrait document (read model).
+"""
+import json
+
+from app.dsb.storage.documents import (
+    SECTION_BRIEF, SECTION_PORTRAIT, PortraitDocumentCache, build_portrait_sections,
+    decode_document, encode_document, etag_matches, section_etag, sphere_section_name,
+)
+from app.dsb.storage.models import (
+    DigitalPortrait, PortraitFact, PortraitPattern, PortraitSummary,
+)
+from app.dsb.storage.projections import ROW_MODELS, FactRow, SummaryRow, projection
+from app.models.avatar_card import AvatarCard
+from app.models.text_diagnostics import SceneInteraction
+
+
+def fact(fact_id: str, sphere: int, weight: float) -> PortraitFact:
+    return PortraitFact(
+        id=fact_id, portrait_id="p1", source_system="western_astrology", sphere_primary=sphere,
+        spheres_affected=None, position=f"pos {fact_id}", influence_level="high",
+        light_aspect="свет", shadow_aspect="тень", core_theme="тема", triggers=[], weight=weight,
+    )
+
+
+def sections() -> dict:
+    portrait = DigitalPortrait(
+        id="p1", user_id=1, status="ready", systems_used=["western_astrology"], birth_data={"date": "1990-03-15"},
+    )
+    return build_portrait_sections(
+        portrait,
+        facts=[fact("f1", 3, 0.2), fact("f2", 3, 0.9), fact("f3", 5, 0.5)],
+        chains=[],
+        patterns=[PortraitPattern(id="pt1", portrait_id="p1", sphere=3, pattern_name="p", formula="A + B")],
+        recommendations=[],
+        shadows=[],
+        metas=[],
+        summaries=[
+            PortraitSummary(portrait_id="p1", sphere=3, brief_text="бриф 3", is_overall=False),
+            PortraitSummary(portrait_id="p1", sphere=None, brief_text="общий", is_overall=True),
+        ],
+    )
+
+
+class TestSections:
+    def test_full_portrait_groups_layers_by_sphere(self):
+        portrait = sections()[SECTION_PORTRAIT]
+        assert portrait["portrait_id"] == "p1" and portrait["status"] == "ready"
+        assert [f["position"] for f in portrait["spheres"]["3"]["layer1_facts"]] == ["pos f1", "pos f2"]
+        assert portrait["spheres"]["3"]["layer3_patterns"][0]["formula"] == "A + B"
+        assert portrait["spheres"]["1"]["layer1_facts"] == []
+
+    def test_sphere_slice_orders_facts_by_weight_and_has_brief(self):
+        sphere = sections()[sphere_section_name(3)]
+        assert [f["id"] for f in sphere["factors"]] == ["f2", "f1"]
+        assert sphere["factors"][0]["spheres_affected"] == []
+        assert sphere["brief"] == "бриф 3"
+        assert sections()[sphere_section_name(12)]["brief"] == ""
+
+    def test_brief_section(self):
+        assert sections()[SECTION_BRIEF]["brief"] == {"sphere_3_brief": "бриф 3", "overall_brief": "общий"}
+
+
+class TestEncoding:
+    def test_roundtrip_and_stable_etag(self):
+        etag, body, encoded = encode_document(sections())
+        decoded = decode_document(body)
+        assert decoded == encoded and len(decoded) == 14
+        assert json.loads(decoded[SECTION_PORTRAIT]) == sections()[SECTION_PORTRAIT]
+        assert encode_document(sections())[0] == etag
+
+    def test_etag_changes_with_content(self):
+        changed = sections()
+        changed[SECTION_BRIEF]["brief"]["overall_brief"] = "другой"
+        assert encode_document(changed)[0] != encode_document(sections())[0]
+
+    def test_if_none_match(self):
+        tag = section_etag("abc", SECTION_PORTRAIT)
+        assert etag_matches(tag, tag)
+        assert etag_matches(f'"other", W/{tag}', tag)
+        assert etag_matches("*", tag)
+        assert not etag_matches(None, tag)
+        assert not etag_matches(section_etag("abc", SECTION_BRIEF), tag)
+
+
+class TestDocumentCache:
+    def test_lru_and_etag_check(self):
+        cache = PortraitDocumentCache(size=2)
+        cache.put("a", "e1", {"x": b"1"})
+        cache.put("b", "e1", {"x": b"2"})
+        assert cache.get("a", "e1") == {"x": b"1"}
+        assert cache.get("a", "e2") is None  # перегенерирован — устаревшая запись не отдаётся
+        cache.put("c", "e1", {"x": b"3"})
+        assert cache.get("b", "e1") is None  # вытеснен как самый старый
+        assert cache.stats()["hits"] == 1
+
+
+class TestProjections:
+    def test_projections_select_only_dto_columns(self):
+        for row_type in ROW_MODELS:
+            columns = [c.name for c in projection(row_type).selected_columns]
+            assert columns == list(row_type._fields)
+            assert "embedding" not in columns
+
+    def test_vectors_are_deferred_with_raiseload(self):
+        for column in (PortraitFact.embedding, AvatarCard.embedding, SceneInteraction.response_embedding):
+            strategy = dict(column.property.strategy_key)
+            assert strategy == {"deferred": True, "instrument": True, "raiseload": True}
+
+    def test_sections_accept_projected_rows(self):
+        row = FactRow(
+            id="f1", sphere_primary=2, spheres_affected=None, position="pos", source_system="western_astrology",
+            influence_level="high", core_theme=None, light_aspect=None, shadow_aspect=None,
+            energy_description=None, developmental_task=None, integration_key=None, triggers=[], timing=None,
+            weight=0.5,
+        )
+        portrait = DigitalPortrait(id="p1", user_id=1, status="ready", systems_used=[], birth_data={})
+        built = build_portrait_sections(
+            portrait, [row], [], [], [], [], [], [SummaryRow(sphere=2, brief_text="бриф", is_overall=False)],
+        )
+        assert built[sphere_section_name(2)]["factors"][0]["id"] == "f1"
+        assert built[sphere_section_name(2)]["brief"] == "бриф"
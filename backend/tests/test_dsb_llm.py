@@ -0,0 +1,128 @@
+"""
+Tests for the DSB LLM layer: response cache, request coalescing and an
+offline run of layers 2-3 on FakeLLMBackend.
+"""
+import asyncio
+import json
+
+import pytest
+
+from app.dsb.interpreters.base import InterpretationAgent
+from app.dsb.llm.backends import FakeLLMBackend
+from app.dsb.llm.cache import LLMResponseCache
+from app.dsb.llm.client import LLMClient, llm_client
+from app.dsb.synthesis.compressor import Compressor
+from app.dsb.synthesis.merger import Merger
+from app.dsb.synthesis.meta_agent import MetaAgent
+from app.dsb.synthesis.sphere_agent import SphereAgent
+
+INSIGHT = {
+    "source_system": "test_system",
+    "position": "Sun in Aries in 1st House",
+    "primary_sphere": 1,
+    "influence_level": "high",
+    "polarity": "dual",
+    "light_aspect": "a",
+    "shadow_aspect": "b",
+    "energy_description": "c",
+    "core_theme": "d",
+    "developmental_task": "e",
+    "integration_key": "f",
+}
+
+
+def responder(model, messages, params):
+    user = messages[-1]["content"]
+    if "сырые расчётные данные" in user:
+        return json.dumps({"insights": [INSIGHT, {**INSIGHT, "primary_sphere": 7}]})
+    if "СФЕРЫ" in user:
+        return json.dumps({"layer3_patterns": [{"pattern_name": "p", "formula": "f"}]})
+    if "суперпаттерн" in user:
+        return json.dumps({"meta_patterns": [{"name": "m", "description": "d"}]})
+    return json.dumps({"overall_brief": "brief"})
+
+
+class FakeSystemAgent(InterpretationAgent):
+    system_name = "test_system"
+
+    def _build_system_prompt(self) -> str:
+        return "test"
+
+
+@pytest.fixture
+def fake_llm(monkeypatch, tmp_path):
+    backend = FakeLLMBackend(responder)
+    monkeypatch.setattr(llm_client, "backend", backend)
+    monkeypatch.setattr(llm_client, "cache", LLMResponseCache(str(tmp_path / "llm.sqlite3")))
+    llm_client.reset_stats()
+    return backend
+
+
+async def run_layers_2_3(raw_data: dict) -> dict:
+    insights = await FakeSystemAgent().interpret(raw_data)
+    spheres = Merger().merge([insights])
+    sphere_agent = SphereAgent()
+    portraits = await asyncio.gather(*[
+        sphere_agent.synthesize(i, spheres[f"sphere_{i}"], ["test_system"]) for i in range(1, 13)
+    ])
+    meta = await MetaAgent().find_patterns(list(portraits))
+    brief = await Compressor().compress(list(portraits), meta)
+    return {"insights": insights, "portraits": portraits, "meta": meta, "brief": brief}
+
+
+class TestOfflinePipeline:
+    async def test_runs_on_fake_backend_and_regenerates_from_cache(self, fake_llm):
+        first = await run_layers_2_3({"planets": [{"name": "Sun"}]})
+        assert len(first["insights"]) == 2
+        assert first["portraits"][0]["layer3_patterns"][0]["pattern_name"] == "p"
+        assert first["meta"]["meta_patterns"][0]["name"] == "m"
+        assert first["brief"] == {"overall_brief": "brief"}
+        # interpret + 2 non-empty spheres + meta + compressor
+        assert len(fake_llm.calls) == 5
+
+        second = await run_layers_2_3({"planets": [{"name": "Sun"}]})
+        assert len(fake_llm.calls) == 5
+        assert second["brief"] == first["brief"]
+        assert llm_client.stats()["total"]["memory_hits"] == 5
+
+
+class TestLLMClient:
+    async def test_concurrent_identical_requests_coalesce(self, tmp_path):
+        backend = FakeLLMBackend(delay=0.05)
+        client = LLMClient(backend, LLMResponseCache(None))
+        messages = [{"role": "user", "content": "hi"}]
+        results = await asyncio.gather(*[client.complete("m", messages, temperature=0.3) for _ in range(5)])
+        assert results == ["{}"] * 5
+        assert len(backend.calls) == 1
+        assert client.stats()["total"]["coalesced"] == 4
+
+    async def test_cancelled_leader_does_not_cancel_waiters(self):
+        backend = FakeLLMBackend(delay=0.05)
+        client = LLMClient(backend, LLMResponseCache(None))
+        messages = [{"role": "user", "content": "hi"}]
+        leader = asyncio.create_task(client.complete("m", messages))
+        await asyncio.sleep(0.01)
+        waiters = [asyncio.create_task(client.complete("m", messages)) for _ in range(3)]
+        await asyncio.sleep(0.01)
+        leader.cancel()
+        assert await asyncio.gather(*waiters) == ["{}"] * 3
+        assert leader.cancelled()
+        assert len(backend.calls) == 2  # the cancelled call and one reissued by a waiter
+
+    async def test_store_survives_restart(self, tmp_path):
+        path = str(tmp_path / "llm.sqlite3")
+        messages = [{"role": "user", "content": "hi"}]
+        await LLMClient(FakeLLMBackend(), LLMResponseCache(path)).complete("m", messages)
+        backend = FakeLLMBackend()
+        client = LLMClient(backend, LLMResponseCache(path))
+        assert await client.complete("m", messages) == "{}"
+        assert backend.calls == []
+        assert client.stats()["total"]["store_hits"] == 1
+
+    async def test_invalid_json_is_not_cached(self):
+        backend = FakeLLMBackend(lambda model, messages, params: "not json")
+        client = LLMClient(backend, LLMResponseCache(None))
+        messages = [{"role": "user", "content": "hi"}]
+        for _ in range(2):
+            await client.complete("m", messages, response_format={"type": "json_object"})
+        assert len(backend.calls) == 2
@@ -0,0 +1,63 @@
+"""
+Tests for the DSB repository row builders used by the bulk INSERT path.
+"""
+from app.dsb.storage.models import (
+    PortraitAspectChain, PortraitPattern, PortraitRawData, PortraitRecommendation, PortraitShadowAudit,
+)
+from app.dsb.storage.repository import (
+    build_raw_data_rows, build_sphere_rows, build_summary_rows,
+)
+
+RAW = {
+    "planets": [{"name_en": "Sun", "sign": "Pisces"}, {"name_en": "Moon", "sign": "Leo"}],
+    "aspects": [{"planet1": "Sun", "planet2": "Moon", "type": "trine"}],
+    "houses": {"cusps": [10.0, 40.0], "rulers": {"1": "Mars"}},
+    "ascendant": {"sign": "Aries"},
+    "mc_degree": 270.5,
+    "stelliums": [["Sun", "Mercury", "Venus"]],
+}
+
+
+class TestRawDataRows:
+    def test_groups_and_keys(self):
+        rows = build_raw_data_rows("p1", "western_astrology", RAW)
+        keys = [(r["data_group"], r["data_key"]) for r in rows]
+        assert keys == [
+            ("full_output", "engine_results"),
+            ("planets", "Sun"), ("planets", "Moon"),
+            ("aspects", "Sun-Moon-trine"),
+            ("houses", "all_houses"),
+            ("houses_detailed", "House-1"), ("houses_detailed", "House-2"),
+            ("points", "ascendant"), ("points", "mc_degree"),
+            ("stelliums", "collection"),
+        ]
+        assert rows[5]["payload"] == {"house_num": 1, "cusp_degree": 10.0, "ruler": "Mars"}
+        assert rows[-1]["payload"] == {"items": RAW["stelliums"]}
+
+    def test_rows_match_model_columns(self):
+        columns = set(PortraitRawData.__table__.columns.keys())
+        for row in build_raw_data_rows("p1", "bazi", RAW):
+            assert set(row) <= columns
+            assert row["portrait_id"] == "p1" and row["system_name"] == "bazi"
+
+
+class TestSphereRows:
+    def test_layers_by_model(self):
+        rows = build_sphere_rows("p1", {
+            "sphere_num": 3,
+            "layer2_chains": [{"chain_name": "c", "convergence_score": 1.7}],
+            "layer3_patterns": [{"pattern_name": "p"}],
+            "layer4_recommendations": [{"text": "r", "source_system": "bazi"}, {"text": "r2"}],
+        })
+        assert rows[PortraitAspectChain][0]["convergence_score"] == 1.0
+        assert len(rows[PortraitPattern]) == 1
+        assert [r["source_systems"] for r in rows[PortraitRecommendation]] == [["bazi"], []]
+        assert rows[PortraitShadowAudit] == []
+        for model, model_rows in rows.items():
+            for row in model_rows:
+                assert row["sphere"] == 3
+                assert set(row) <= set(model.__table__.columns.keys())
+
+    def test_summaries_overall_last(self):
+        rows = build_summary_rows("p1", {"sphere_2_brief": "b2", "overall_brief": "all", "sphere_1_brief": "b1"})
+        assert [(r["sphere"], r["is_overall"]) for r in rows] == [(1, False), (2, False), (None, True)]
@@ -0,0 +1,137 @@
+"""
+Tests for DSB semantic search: the single UNION ALL statement, the in-memory
+index of hot portraits and how semantic_search() chooses between them.
+"""
+import numpy as np
+import pytest
+from sqlalchemy.dialects.postgresql import asyncpg as asyncpg_dialect
+
+from app.dsb.storage import search
+from app.dsb.storage.search import PortraitSearchIndex, PortraitSearchIndexes, SOURCES, _search_statement
+from tests.conftest import FakeSession
+
+DIMS = 8
+
+
+def row(source, n, vector, sphere=1, influence="high"):
+    return {
+        "id": f"{source}-{n}", "source_table": source, "sphere": sphere, "source_system": None,
+        "position": f"{source} {n}", "core_theme": None, "content": "...", "influence_level": influence,
+        "embedding": vector,
+    }
+
+
+def axis(i, noise=0.0):
+    v = np.zeros(DIMS)
+    v[i] = 1.0
+    v[(i + 1) % DIMS] = noise
+    return v.tolist()
+
+
+@pytest.fixture
+def query_embedding(monkeypatch):
+    async def generate_embedding(text):
+        return axis(0)
+
+    monkeypatch.setattr(search, "generate_embedding", generate_embedding)
+
+
+class TestSearchStatement:
+    def test_vector_is_one_bound_parameter(self):
+        compiled = _search_statement(True, True).compile(dialect=asyncpg_dialect.dialect())
+        sql = str(compiled)
+        assert sql.count("<=>") == len(SOURCES)
+        # Вектор — один параметр на все ветки, в текст SQL он не попадает
+        assert compiled.positiontup.count("query_vector") == 1
+        placeholder = f"${compiled.positiontup.index('query_vector') + 1}"
+        assert sql.count(f"<=> {placeholder})") == len(SOURCES)
+        assert sql.count("AS MATERIALIZED") == len(SOURCES)
+        assert sql.count("LIMIT $") == len(SOURCES) + 1
+        assert sql.count("= ANY (") == len(SOURCES) + 3  # сферы у всех, влияние у трёх типов
+
+    def test_statement_text_is_cached_per_filter_set(self):
+        assert _search_statement(False, False) is _search_statement(False, False)
+        assert "ANY" not in str(_search_statement(False, False).compile(dialect=asyncpg_dialect.dialect()))
+
+
+class TestPortraitSearchIndex:
+    def index(self):
+        return PortraitSearchIndex.build({
+            "fact": [row("fact", 0, axis(0, 0.1)), row("fact", 1, axis(2)), row("fact", 2, axis(3), sphere=5)],
+            "pattern": [row("pattern", 0, axis(0, 0.5), influence="low"), row("pattern", 1, axis(4))],
+            "chain": [row("chain", 0, axis(0, 0.9), influence=None)],
+        })
+
+    def test_ranks_by_relevance_within_type(self):
+        found = self.index().search(axis(0), top_k=10, per_type_k=10)
+        assert {r["source_table"] for r in found} == {"fact", "pattern", "chain"}
+        best = found[0]
+        assert best["relevance"] == max(r["relevance"] for r in found)
+        # Одна запись типа — нулевая дисперсия, relevance 0
+        assert next(r for r in found if r["source_table"] == "chain")["relevance"] == 0.0
+        assert set(found[0]) >= set(search.RESULT_FIELDS) | {"score", "relevance"}
+
+    def test_per_type_k_and_top_k(self):
+        found = self.index().search(axis(0), top_k=10, per_type_k=1)
+        assert sorted(r["id"] for r in found) == ["chain-0", "fact-0", "pattern-0"]
+        assert len(self.index().search(axis(0), top_k=2, per_type_k=10)) == 2
+
+    def test_filters(self):
+        found = self.index().search(axis(0), top_k=10, per_type_k=10, spheres_filter=[5])
+        assert [r["id"] for r in found] == ["fact-2"]
+        found = self.index().search(axis(0), top_k=10, per_type_k=10, influence_filter=["high"])
+        # У цепочек нет уровня влияния — фильтр их не касается
+        assert sorted(r["id"] for r in found) == ["chain-0", "fact-0", "fact-1", "fact-2", "pattern-1"]
+
+
+class TestPortraitSearchIndexes:
+    def test_hot_after_and_version(self):
+        indexes = PortraitSearchIndexes(size=2, hot_after=2)
+        assert not indexes.is_hot("p1")
+        assert indexes.is_hot("p1")
+        index = PortraitSearchIndex({})
+        indexes.put("p1", "v1", index)
+        assert indexes.get("p1", "v1") is index
+        assert indexes.get("p1", "v2") is None
+
+    def test_lru_eviction(self):
+        indexes = PortraitSearchIndexes(size=2, hot_after=1)
+        for portrait_id in ("p1", "p2"):
+            indexes.put(portrait_id, "v", PortraitSearchIndex({}))
+        indexes.get("p1", "v")
+        indexes.put("p3", "v", PortraitSearchIndex({}))
+        assert indexes.get("p2", "v") is None and indexes.get("p1", "v") is not None
+        assert indexes.stats()["size"] == 2
+
+
+class TestSemanticSearch:
+    async def test_sql_path_params(self, query_embedding, monkeypatch):
+        monkeypatch.setattr(search, "search_indexes", PortraitSearchIndexes(size=0))
+        db = FakeSession([{"id": "f1", "score": 0.9, "relevance": 1.2}])
+        found = await search.semantic_search(db, "p1", "работа", top_k=5, spheres_filter=[10])
+        assert found == [{"id": "f1", "score": 0.9, "relevance": 1.2}]
+        [executed] = db.executed
+        assert executed.statement is _search_statement(True, False)
+        assert executed.passed == {"portrait_id": "p1", "query_vector": axis(0), "per_type_k": 5, "top_k": 5, "spheres": [10]}
+
+    async def test_hot_portrait_is_searched_in_memory(self, query_embedding, monkeypatch):
+        monkeypatch.setattr(search, "search_indexes", PortraitSearchIndexes(size=4, hot_after=2))
+        db = FakeSession([row("fact", 0, axis(0)), row("fact", 1, axis(1))])
+
+        await search.semantic_search(db, "p1", "q", version="v1")        # холодный: SQL
+        found = await search.semantic_search(db, "p1", "q", version="v1")  # горячий: загрузка
+        assert len(db.executed) == 2 and found[0]["id"] == "fact-0"
+        await search.semantic_search(db, "p1", "q", version="v1")
+        assert len(db.executed) == 2 and search.search_indexes.hits == 1
+        # Новая версия портрета — индекс перезагружается
+        await search.semantic_search(db, "p1", "q", version="v2")
+        assert len(db.executed) == 3
+
+    async def test_no_embedding(self, monkeypatch):
+        async def generate_embedding(text):
+            return None
+
+        monkeypatch.setattr(search, "generate_embedding", generate_embedding)
+        db = FakeSession()
+        assert await search.semantic_search(db, "p1", "q") == []
+        assert db.executed == []
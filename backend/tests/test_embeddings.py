@@ -0,0 +1,121 @@
+"""
+Tests for the embedding service: micro-batching of concurrent requests,
+deduplication, vector normalization, the persistent cache and the local
+backend.
+"""
+import asyncio
+
+import numpy as np
+import pytest
+
+from app.services.embeddings import EmbeddingService, LocalEmbeddingBackend, normalize_vector
+
+
+class CountingBackend:
+    model = "test-model"
+    dimensions = 8
+
+    def __init__(self, fail: int = 0, size: int = 8):
+        self.calls: list[list[str]] = []
+        self.fail = fail
+        self.size = size
+
+    async def embed(self, texts: list[str]) -> list[list[float]]:
+        self.calls.append(list(texts))
+        await asyncio.sleep(0.001)
+        if self.fail:
+            self.fail -= 1
+            raise RuntimeError("api down")
+        return [[float(len(text))] + [1.0] * (self.size - 1) for text in texts]
+
+
+class DictCacheService(EmbeddingService):
+    """Persistent cache in a dict instead of the embedding_cache table."""
+
+    def __init__(self, backend, store: dict, **kwargs):
+        super().__init__(backend, **kwargs)
+        self.store = store
+
+    async def _load_cached(self, keys):
+        return {key: self.store[key] for key in keys if key in self.store}
+
+    async def _store_cached(self, vectors):
+        self.store.update(vectors)
+
+
+def service(backend=None, **kwargs) -> EmbeddingService:
+    kwargs = {"batch_window": 0.005, "max_batch": 16, "memory_size": 100, **kwargs}
+    return EmbeddingService(backend or CountingBackend(), **kwargs)
+
+
+class TestBatching:
+    async def test_concurrent_requests_share_one_call(self):
+        svc = service()
+        vectors = await asyncio.gather(*[svc.embed(f"text {i}") for i in range(10)])
+        assert len(svc.backend.calls) == 1 and len(svc.backend.calls[0]) == 10
+        assert [v[0] for v in vectors] == pytest.approx(
+            [normalize_vector([len(f"text {i}")] + [1.0] * 7, 8)[0] for i in range(10)]
+        )
+
+    async def test_full_batch_is_sent_without_waiting(self):
+        svc = service(max_batch=4, batch_window=10.0)
+        await asyncio.wait_for(svc.embed_many([f"t{i}" for i in range(8)]), timeout=1.0)
+        assert [len(call) for call in svc.backend.calls] == [4, 4]
+
+    async def test_duplicates_are_requested_once(self):
+        svc = service()
+        first, second = await asyncio.gather(svc.embed("same"), svc.embed("  same "))
+        assert first == second and svc.backend.calls == [["same"]]
+        await svc.embed("same")
+        assert len(svc.backend.calls) == 1 and svc.stats["memory_hits"] == 1
+
+    async def test_failure_reaches_every_caller_and_is_not_cached(self):
+        svc = service(CountingBackend(fail=1))
+        results = await asyncio.gather(svc.embed("a"), svc.embed("b"), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+        assert len(await svc.embed("a")) == 8 and len(svc.backend.calls) == 2
+
+    async def test_empty_text_is_rejected(self):
+        with pytest.raises(ValueError):
+            await service().embed_many(["ok", "   "])
+
+
+class TestPersistentCache:
+    async def test_new_process_reuses_stored_vectors(self):
+        store = {}
+        first = DictCacheService(CountingBackend(), store, batch_window=0.0)
+        vectors = await first.embed_many(["a", "b"])
+
+        second = DictCacheService(CountingBackend(), store, batch_window=0.0)
+        assert (await second.embed_many(["b", "a", "c"]))[:2] == [vectors[1], vectors[0]]
+        assert second.backend.calls == [["c"]] and second.stats["cache_hits"] == 2
+
+    def test_key_depends_on_model_and_dimensions(self):
+        a, b = CountingBackend(), CountingBackend()
+        b.dimensions = 4
+        assert service(a).key("text") != service(b).key("text")
+
+
+class TestNormalization:
+    def test_vectors_are_cut_and_unit_length(self):
+        vector = normalize_vector([3.0, 4.0, 12.0], 2)
+        assert vector.tolist() == pytest.approx([0.6, 0.8])
+
+    async def test_short_vector_is_an_error(self):
+        with pytest.raises(ValueError):
+            await service(CountingBackend(size=4)).embed("text")
+
+
+class TestLocalBackend:
+    async def test_deterministic_and_similarity_preserving(self):
+        svc = service(LocalEmbeddingBackend(256))
+        base, again, near, far = await svc.embed_many([
+            "тревога в груди перед разговором",
+            "тревога в груди перед разговором",
+            "тревога в груди перед встречей",
+            "солнечный день на море",
+        ])
+        fresh = await service(LocalEmbeddingBackend(256)).embed("тревога в груди перед разговором")
+        assert base == again == fresh
+        assert np.dot(base, near) > 0.5 > np.dot(base, far)
+        assert np.linalg.norm(base) == pytest.approx(1.0, abs=1e-5)
@@ -0,0 +1,77 @@
+"""
+Tests for the offline gazetteer behind geocode_place.
+"""
+from app.core.astrology.gazetteer import (
+    SAMPLE_SOURCE,
+    Gazetteer,
+    GeocodeCache,
+    normalize_place,
+    read_places_tsv,
+)
+
+SAMPLE = Gazetteer.build(read_places_tsv(SAMPLE_SOURCE))
+
+
+class TestNormalize:
+    def test_cyrillic_and_latin_share_key(self):
+        assert normalize_place("Москва") == normalize_place("MOSKVA") == "moskva"
+        assert normalize_place("Ростов-на-Дону") == "rostov na donu"
+        assert normalize_place("Кёнигсберг") == "kenigsberg"
+        assert normalize_place("München") == "munchen"
+
+
+class TestGazetteer:
+    def test_exact_aliases(self):
+        moscow = SAMPLE.lookup("Москва")
+        assert moscow.match == "exact"
+        assert moscow.timezone == "Europe/Moscow"
+        assert SAMPLE.lookup("Moscow, Russia") == moscow
+        assert SAMPLE.lookup("Ленинград").lat == SAMPLE.lookup("St. Petersburg").lat
+
+    def test_most_populous_wins(self):
+        # Moscow, Idaho is in the sample too
+        assert SAMPLE.lookup("Moscow").timezone == "Europe/Moscow"
+
+    def test_qualifier_picks_the_place(self):
+        idaho = SAMPLE.lookup("Moscow, Idaho")
+        assert idaho.timezone == "America/Los_Angeles" and idaho.lat < 50
+        assert SAMPLE.lookup("Moscow, ID, USA") == idaho
+        assert SAMPLE.lookup("Москва, Россия").timezone == "Europe/Moscow"
+        assert SAMPLE.lookup("Нижний, РФ").match == "prefix"
+
+    def test_unknown_qualifier_is_a_miss(self):
+        # Paris, Texas is not in the sample: Nominatim answers, not Paris FR
+        assert SAMPLE.lookup("Paris, Texas") is None
+        assert SAMPLE.lookup("Paris, France").timezone == "Europe/Paris"
+        assert SAMPLE.lookup("Екатиринбург, Казахстан") is None
+
+    def test_prefix_and_fuzzy(self):
+        nizhny = SAMPLE.lookup("Нижний")
+        assert nizhny.match == "prefix" and nizhny.timezone == "Europe/Moscow"
+        ekb = SAMPLE.lookup("Екатиринбург")
+        assert ekb.match == "fuzzy" and ekb.timezone == "Asia/Yekaterinburg"
+        # No word-boundary completion of partial words
+        assert SAMPLE.prefix("novosib") is None
+
+    def test_miss(self):
+        assert SAMPLE.lookup("Springfield") is None
+
+    def test_save_and_mmap_load(self, tmp_path):
+        SAMPLE.save(str(tmp_path))
+        loaded = Gazetteer.load(str(tmp_path))
+        assert len(loaded) == len(SAMPLE)
+        for query in ("Киев", "Alma-Ata", "Нью-Йорк", "Novosibirk", "Moscow, Idaho"):
+            assert loaded.lookup(query) == SAMPLE.lookup(query)
+
+
+class TestGeocodeCache:
+    def test_persists_across_instances(self, tmp_path):
+        path = str(tmp_path / "cache.jsonl")
+        GeocodeCache(path).put("Березники, Пермский край", 59.41, 56.80, "Asia/Yekaterinburg")
+        cache = GeocodeCache(path)
+        assert len(cache) == 1
+        hit = cache.get("березники, пермский край")
+        assert (hit.lat, hit.lon, hit.timezone, hit.match) == (59.41, 56.80, "Asia/Yekaterinburg", "cache")
+        assert cache.get("Березники") is None
+        cache.put("Moscow", 55.75, 37.62, "Europe/Moscow")
+        assert cache.get("Moscow, Idaho") is None
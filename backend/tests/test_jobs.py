@@ -0,0 +1,118 @@
+"""
+Tests for the background job queue: retry schedule, handler registry,
+per-type concurrency in claims and the worker's handling of job outcomes.
+"""
+import pytest
+
+from app.config import settings
+from app.services import jobs
+from app.services.jobs import ClaimedJob, JobType, PermanentJobError, job_handler, retry_delay
+from app.worker import Worker
+from tests.conftest import FakeSession
+
+
+def claimed(attempts: int = 1, **payload) -> ClaimedJob:
+    return ClaimedJob(id=7, job_type="test.job", payload=payload, priority=0, attempts=attempts, max_attempts=3)
+
+
+class TestRetryDelay:
+    def test_exponential_with_cap_and_jitter(self, monkeypatch):
+        monkeypatch.setattr(settings, "JOB_RETRY_BASE_DELAY", 10.0)
+        monkeypatch.setattr(settings, "JOB_RETRY_MAX_DELAY", 60.0)
+        for attempts, full in [(1, 10.0), (2, 20.0), (3, 40.0), (4, 60.0), (9, 60.0)]:
+            for _ in range(20):
+                assert full / 2 <= retry_delay(attempts) <= full
+
+
+class TestRegistry:
+    def test_settings_override_concurrency(self, monkeypatch):
+        monkeypatch.setattr(settings, "JOB_CONCURRENCY", {"test.limited": 2})
+        monkeypatch.setattr(jobs, "JOB_TYPES", {})
+
+        @job_handler("test.limited", concurrency=8, max_attempts=2)
+        async def handler():
+            pass
+
+        spec = jobs.JOB_TYPES["test.limited"]
+        assert spec.concurrency == 2 and spec.max_attempts == 2 and spec.handler is handler
+
+    async def test_unknown_type_is_rejected(self, monkeypatch):
+        monkeypatch.setattr(jobs, "JOB_TYPES", {})
+        with pytest.raises(ValueError):
+            await jobs.enqueue(None, "test.missing", {})
+
+    async def test_coalesce_returns_the_waiting_job(self, monkeypatch):
+        monkeypatch.setattr(jobs, "JOB_TYPES", {"test.job": JobType(name="test.job", handler=None)})
+        conn = FakeSession(scalar=41)  # id of the queued job with the same payload
+        assert await jobs.enqueue(conn, "test.job", {"user_id": 7}, delay=15, coalesce=True) == 41
+        [lookup] = conn.executed  # no INSERT after it
+        assert {"job_type_1": "test.job", "payload_1": {"user_id": 7}}.items() <= lookup.params.items()
+
+
+class TestCountPending:
+    async def test_unfinished_jobs_with_the_payload(self):
+        conn = FakeSession(scalar=2)
+        assert await jobs.count_pending(conn, "test.job", session_id=5) == 2
+        assert conn.executed[0].params == {
+            "job_type_1": "test.job", "status_1": ["queued", "running"], "payload_1": {"session_id": 5},
+        }
+
+
+class TestClaim:
+    async def test_capped_type_claims_only_free_capacity(self):
+        spec = JobType(name="test.job", handler=None, concurrency=4)
+        conn = FakeSession(scalar=1)
+        await jobs.claim(conn, spec, "w1", limit=10)
+        lock, running, leased = conn.executed
+        assert lock.params == {"key": f"{jobs.NOTIFY_CHANNEL}:test.job"}
+        assert running.params == {"job_type": "test.job"}
+        assert leased.params["limit"] == 3
+
+    async def test_capped_type_at_limit_claims_nothing(self):
+        spec = JobType(name="test.job", handler=None, concurrency=4)
+        conn = FakeSession(scalar=4)
+        assert await jobs.claim(conn, spec, "w1", limit=10) == []
+        assert len(conn.executed) == 2  # the lock and the running count, nothing leased
+
+
+class TestWorkerExecute:
+    async def run(self, monkeypatch, handler) -> tuple[Worker, list]:
+        calls = []
+
+        async def complete(conn, finished):
+            calls.append(("complete", [job.id for job in finished]))
+            return len(finished)
+
+        async def fail(conn, job, error, retry=True):
+            calls.append(("fail", retry, error))
+            return "queued" if retry else "dead"
+
+        monkeypatch.setattr(jobs, "complete", complete)
+        monkeypatch.setattr(jobs, "fail", fail)
+        worker = Worker(FakeSession(), job_types=[], slots=1)
+        await worker._execute(JobType(name="test.job", handler=handler), claimed(n=1))
+        await worker._cycle(claim=False)
+        return worker, calls
+
+    async def test_success_is_completed_in_the_next_cycle(self, monkeypatch):
+        seen = []
+
+        async def handler(n):
+            seen.append(n)
+
+        worker, calls = await self.run(monkeypatch, handler)
+        assert seen == [1] and calls == [("complete", [7])] and worker.stats["completed"] == 1
+
+    async def test_error_is_retried(self, monkeypatch):
+        async def handler(n):
+            raise RuntimeError("boom")
+
+        worker, calls = await self.run(monkeypatch, handler)
+        assert calls == [("fail", True, "RuntimeError: boom")] and worker.stats["retried"] == 1
+
+    async def test_permanent_error_goes_to_dead(self, monkeypatch):
+        async def handler(n):
+            raise PermanentJobError("gone")
+
+        worker, calls = await self.run(monkeypatch, handler)
+        assert calls[0][:2] == ("fail", False) and worker.stats["dead"] == 1
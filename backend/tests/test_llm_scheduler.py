@@ -0,0 +1,188 @@
+"""
+Tests for the process-wide LLM scheduler: budgets, priorities, retries.
+"""
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from app.config import settings
+from app.services import llm_scheduler
+from app.services.llm_scheduler import (
+    LLMScheduler, ModelBudget, Priority, ScheduledOpenAI, estimate_tokens, priority_scope,
+)
+
+
+def scheduler(max_concurrency=2, rpm=10_000, tpm=10_000_000, **kwargs) -> LLMScheduler:
+    return LLMScheduler(ModelBudget(max_concurrency, rpm, tpm), backoff_base=0.001, **kwargs)
+
+
+def timeout_error() -> openai.APITimeoutError:
+    return openai.APITimeoutError(request=httpx.Request("POST", "https://api.openai.com/v1/chat/completions"))
+
+
+class TestBudgets:
+    async def test_concurrency_is_bounded_per_model(self):
+        s = scheduler(max_concurrency=3)
+        running, peak = 0, 0
+
+        async def call():
+            nonlocal running, peak
+            running += 1
+            peak = max(peak, running)
+            await asyncio.sleep(0.01)
+            running -= 1
+            return "ok"
+
+        results = await asyncio.gather(*[s.run("m", call, 10) for _ in range(12)])
+        assert results == ["ok"] * 12 and peak == 3
+        assert s.stats()["m"]["completed"] == 12 and s.stats()["m"]["in_flight"] == 0
+
+    async def test_token_budget_delays_dispatch(self):
+        # 6000 tokens/min = 100 tokens/s: the bucket is empty after two calls,
+        # the third (10 tokens) waits ~0.1s of refill
+        s = LLMScheduler(ModelBudget(10, 10_000, 6_000))
+        loop = asyncio.get_running_loop()
+        started = loop.time()
+        done = []
+
+        async def call():
+            done.append(loop.time() - started)
+
+        await asyncio.gather(*[s.run("m", call, tokens) for tokens in (3_000, 3_000, 10)])
+        assert done[1] < 0.05
+        assert 0.05 < done[2] < 0.5
+
+    async def test_usage_corrects_token_estimate(self):
+        s = LLMScheduler(ModelBudget(10, 10_000, 1_000))
+
+        async def call():
+            return 100
+
+        await s.run("m", call, 900, count_tokens=lambda used: used)
+        assert s._queues["m"].tokens.level == pytest.approx(900, abs=1)
+
+
+class TestProcessShare:
+    def test_processes_split_the_account_budget(self, monkeypatch):
+        monkeypatch.setattr(settings, "JOB_WORKER_PROCESSES", 2)
+        monkeypatch.setattr(settings, "LLM_PROCESS_SHARE", 0.0)
+        monkeypatch.setattr(settings, "LLM_MAX_CONCURRENCY", 16)
+        monkeypatch.setattr(settings, "LLM_REQUESTS_PER_MINUTE", 500)
+        monkeypatch.setattr(settings, "LLM_TOKENS_PER_MINUTE", 400_000)
+        monkeypatch.setattr(settings, "LLM_MODEL_BUDGETS", {"o3-mini": {"max_concurrency": 2}})
+        s = llm_scheduler._build_default_scheduler()
+        assert s.default_budget == ModelBudget(5, 166, 133_333)
+        assert s.model_budgets["o3-mini"] == ModelBudget(1, 166, 133_333)
+
+    def test_explicit_share(self, monkeypatch):
+        monkeypatch.setattr(settings, "LLM_PROCESS_SHARE", 0.5)
+        assert llm_scheduler.process_share() == 0.5
+        assert llm_scheduler.process_budget(ModelBudget(16, 500, 400_000), 0.5) == ModelBudget(8, 250, 200_000)
+
+
+class TestPriorities:
+    async def test_higher_priority_dispatched_first(self):
+        s = scheduler(max_concurrency=1)
+        release = asyncio.Event()
+        order = []
+
+        async def blocker():
+            await release.wait()
+
+        def call(name):
+            async def run():
+                order.append(name)
+            return run
+
+        first = asyncio.create_task(s.run("m", blocker, 1))
+        await asyncio.sleep(0)
+        tasks = [
+            asyncio.create_task(s.run("m", call("background"), 1, priority=Priority.BACKGROUND)),
+            asyncio.create_task(s.run("m", call("onboarding"), 1, priority=Priority.ONBOARDING)),
+        ]
+        with priority_scope(Priority.INTERACTIVE):
+            tasks.append(asyncio.create_task(s.run("m", call("interactive"), 1)))
+        await asyncio.sleep(0)
+        assert s.stats()["m"]["queue_depth"] == {"interactive": 1, "onboarding": 1, "background": 1}
+
+        release.set()
+        await asyncio.gather(first, *tasks)
+        assert order == ["interactive", "onboarding", "background"]
+
+    async def test_cancelled_waiter_does_not_leak_slot(self):
+        s = scheduler(max_concurrency=1)
+        release = asyncio.Event()
+
+        async def blocker():
+            await release.wait()
+
+        first = asyncio.create_task(s.run("m", blocker, 1))
+        waiter = asyncio.create_task(s.run("m", blocker, 1))
+        await asyncio.sleep(0)
+        waiter.cancel()
+        release.set()
+        await first
+        assert await s.run("m", blocker, 1) is None
+        assert s.stats()["m"]["in_flight"] == 0
+
+
+class TestRetries:
+    async def test_transient_errors_are_retried(self):
+        s = scheduler(max_retries=3)
+        attempts = []
+
+        async def flaky():
+            attempts.append(1)
+            if len(attempts) < 3:
+                raise timeout_error()
+            return "ok"
+
+        assert await s.run("m", flaky, 1) == "ok"
+        assert s.stats()["m"]["retries"] == 2
+
+    async def test_gives_up_after_max_retries(self):
+        s = scheduler(max_retries=1)
+
+        async def failing():
+            raise timeout_error()
+
+        with pytest.raises(openai.APITimeoutError):
+            await s.run("m", failing, 1)
+        assert s.stats()["m"]["failed"] == 1 and s.stats()["m"]["in_flight"] == 0
+
+    async def test_other_errors_are_not_retried(self):
+        s = scheduler()
+        attempts = []
+
+        async def broken():
+            attempts.append(1)
+            raise ValueError("bad request")
+
+        with pytest.raises(ValueError):
+            await s.run("m", broken, 1)
+        assert attempts == [1]
+
+
+class TestScheduledOpenAI:
+    def test_estimate_tokens(self):
+        messages = [{"role": "user", "content": "x" * 400}]
+        assert estimate_tokens(messages, {"max_tokens": 50}) == 150
+        assert estimate_tokens(messages, {}) == 100 + 1024
+
+    async def test_chat_goes_through_scheduler(self):
+        s = scheduler()
+        client = ScheduledOpenAI(openai.AsyncOpenAI(api_key="test"), s)
+        calls = []
+
+        async def create(**kwargs):
+            calls.append(kwargs)
+            return "response"
+
+        client._chat_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+        assert await client.chat.completions.create(model="m", messages=[]) == "response"
+        assert calls == [{"model": "m", "messages": []}]
+        assert s.stats()["m"]["completed"] == 1
+        assert client.embeddings is client._client.embeddings
@@ -0,0 +1,121 @@
+"""
+Tests for the in-process scene library: layout of the index, the bandit
+policies, diversity, seen scenes and how get_scene_index() refreshes.
+"""
+import numpy as np
+import pytest
+
+from app.core import scene_index
+from app.core.scene_index import SceneIndex, scene_reward
+from tests.conftest import FakeSession
+
+DIMS = 8
+
+
+def axis(i, noise=0.0):
+    v = np.zeros(DIMS)
+    v[i % DIMS] = 1.0
+    v[(i + 1) % DIMS] = noise
+    return v.tolist()
+
+
+def make_index(spheres=(1, 2), per_sphere=6) -> SceneIndex:
+    rows = [
+        (sphere * 100 + n, sphere, 1, f"сцена {sphere}-{n}", {"n": n}, axis(n))
+        for sphere in reversed(spheres) for n in range(per_sphere)
+    ]
+    return SceneIndex.build(rows, DIMS)
+
+
+def with_stats(index: SceneIndex, stats: dict) -> SceneIndex:
+    for scene_id, (shown, reward) in stats.items():
+        index.shown[index._rows[scene_id]] = shown
+        index.reward[index._rows[scene_id]] = reward
+    return index
+
+
+class TestSceneIndex:
+    def test_spheres_are_contiguous_slices(self):
+        index = make_index()
+        assert [scene.sphere_id for scene in index.scenes] == [1] * 6 + [2] * 6
+        assert index._spheres == {1: slice(0, 6), 2: slice(6, 12)}
+        assert np.allclose(np.linalg.norm(index.vectors, axis=1), 1.0)
+
+    def test_scene_without_embedding(self):
+        index = SceneIndex.build([(1, 1, None, None, None, None), (2, 1, None, "x", None, axis(0))], DIMS)
+        assert not index.vectors[0].any() and index.scenes[0].text == ""
+        assert len(index.select(1, k=5, rng=np.random.default_rng(0))) == 2
+
+    def test_reward(self):
+        assert scene_reward(15.0, 200) == 1.0
+        assert scene_reward(15.0, 50) == 0.25
+        assert scene_reward(0.0, 400) == 0.5
+        assert scene_reward(None, None) == 0.0
+
+
+class TestSelect:
+    def test_five_scenes_of_the_sphere(self):
+        chosen = make_index().select(2, rng=np.random.default_rng(0))
+        assert len(chosen) == 5 and len({s.id for s in chosen}) == 5
+        assert {s.sphere_id for s in chosen} == {2}
+
+    def test_thompson_prefers_rewarded_scenes(self):
+        index = with_stats(make_index(), {100: (200, 190), 101: (200, 10), 102: (200, 10), 103: (200, 10)})
+        picks = [index.select(1, k=1, diversity=0.0, rng=np.random.default_rng(seed))[0].id for seed in range(50)]
+        # 104 and 105 were never shown: the prior keeps them in play
+        assert picks.count(100) > 20 and set(picks) <= {100, 104, 105}
+
+    def test_ucb_explores_unshown_scenes(self):
+        index = with_stats(make_index(), {100 + n: (50, 40) for n in range(5)})
+        chosen = index.select(1, k=1, policy="ucb", diversity=0.0)
+        assert chosen[0].id == 105
+
+    def test_diversity_skips_near_duplicates(self):
+        rows = [(1, 1, 1, "a", None, axis(0)), (2, 1, 1, "b", None, axis(0, 0.01)), (3, 1, 1, "c", None, axis(3))]
+        index = with_stats(SceneIndex.build(rows, DIMS), {1: (100, 95), 2: (100, 94), 3: (100, 60)})
+        assert [s.id for s in index.select(1, k=2, policy="ucb", diversity=0.0)] == [1, 2]
+        assert [s.id for s in index.select(1, k=2, policy="ucb", diversity=0.5)] == [1, 3]
+
+    def test_seen_scenes_come_last(self):
+        index = make_index()
+        seen = {100, 101, 102}
+        chosen = index.select(1, seen=seen, rng=np.random.default_rng(1))
+        assert {s.id for s in chosen[:3]} == {103, 104, 105}
+        assert {s.id for s in chosen[3:]} <= seen
+
+    def test_small_sphere_falls_back_to_others(self):
+        index = make_index(per_sphere=3)
+        chosen = index.select(1, rng=np.random.default_rng(0))
+        assert [s.sphere_id for s in chosen[:3]] == [1, 1, 1] and [s.sphere_id for s in chosen[3:]] == [2, 2]
+        assert len(index.select(7, rng=np.random.default_rng(0))) == 5
+
+    def test_unknown_policy(self):
+        with pytest.raises(ValueError):
+            make_index().select(1, policy="greedy")
+
+
+class TestGetSceneIndex:
+    @pytest.fixture(autouse=True)
+    def reset(self, monkeypatch):
+        monkeypatch.setattr(scene_index.settings, "EMBEDDING_DIMENSIONS", DIMS)
+        scene_index.reset_scene_index()
+        yield
+        scene_index.reset_scene_index()
+
+    async def test_refresh_reloads_stats_then_scenes_on_change(self, monkeypatch):
+        # Answers in query order: library signature, then scenes and/or their stats
+        db = FakeSession(results=[[(1, 1, 1)], [(1, 1, 1, "a", None, axis(0))], [(1, 3, 2.0)]])
+        index = await scene_index.get_scene_index(db)
+        assert len(db.executed) == 3 and index.shown.tolist() == [3.0] and index.reward.tolist() == [2.0]
+
+        monkeypatch.setattr(scene_index.settings, "SCENE_INDEX_REFRESH", 3600.0)
+        assert await scene_index.get_scene_index(db) is index and len(db.executed) == 3
+
+        monkeypatch.setattr(scene_index.settings, "SCENE_INDEX_REFRESH", 0.0)
+        db.results = [[(1, 1, 1)], [(1, 4, 2.5)]]  # same signature: only the stats are read
+        assert await scene_index.get_scene_index(db) is index
+        assert len(db.executed) == 5 and index.shown.tolist() == [4.0] and index.reward.tolist() == [2.5]
+
+        db.results = [[(2, 2, 2)], [(1, 1, 1, "a", None, axis(0)), (2, 1, 1, "b", None, axis(1))], []]
+        fresh = await scene_index.get_scene_index(db)
+        assert fresh is not index and len(fresh) == 2 and len(db.executed) == 8
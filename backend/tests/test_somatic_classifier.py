@@ -0,0 +1,100 @@
+"""
+Tests for the local somatic classifier and the LLM escalation of the sync
+somatic check.
+"""
+import json
+import os
+
+from app.agents import sync_agent
+from app.agents.somatic_classifier import (
+    LEXICON, SomaticClassifier, StemAutomaton, fit_weights, get_classifier, response_features,
+)
+from app.config import settings
+
+SEED = os.path.join(settings.DATA_DIR, "somatic_seed.jsonl")
+
+
+class TestStemAutomaton:
+    def test_longest_stem_and_exact_forms(self):
+        automaton = StemAutomaton({"body": "рук ног", "place": "=пол =полу", "stop": "рукопис"})
+        assert automaton.match("руки") == "body"
+        assert automaton.match("рукопись") == "stop"
+        assert automaton.match("полу") == "place"
+        assert automaton.match("получил") is None
+        assert automaton.match("много") is None  # stems match from the first letter
+
+    def test_lexicon_words(self):
+        counts = response_features("Руководитель много говорит, я получил задание")
+        assert counts["body"] == counts["place"] == 0 and counts["thought"] == 1
+        counts = response_features("Стою на полу у двери, в груди тепло")
+        assert (counts["body"], counts["sensation"], counts["place"]) == (1, 1, 2)
+
+    def test_negation_is_clause_local(self):
+        assert response_features("Не чувствую ничего в теле")["negated"] == 1
+        counts = response_features("Ничего не вижу, но слышу шаги")
+        assert counts["negated"] == 1 and counts["perception"] == 1
+
+    def test_lexicon_categories(self):
+        assert set(LEXICON) == {"body", "sensation", "perception", "place", "thought", "emotion", "negation", "stop"}
+
+
+class TestSomaticClassifier:
+    def test_seed_verdicts(self):
+        with open(SEED, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f]
+        classifier = get_classifier()
+        correct = sum(classifier.classify(row["text"])["is_somatic"] == row["is_somatic"] for row in rows)
+        assert correct / len(rows) > 0.95
+
+    def test_verdict_shape(self):
+        verdict = get_classifier().classify("Плечи напряжены, в животе холод")
+        assert verdict["is_somatic"] and verdict["has_body"] and not verdict["has_objects"]
+        assert verdict["confidence"] == max(verdict["probability"], 1 - verdict["probability"])
+        assert verdict["reason"].startswith("local: body 2")
+        assert not get_classifier().classify("Думаю, это про мою работу")["is_somatic"]
+
+    def test_fit_weights_separates_classes(self):
+        texts = ["в груди тепло", "руки дрожат", "думаю о работе", "наверное это символ"] * 5
+        weights = fit_weights(texts, [True, True, False, False] * 5)
+        assert weights["body"] > 0 > weights["thought"]
+        classifier = SomaticClassifier(weights)
+        assert classifier.classify("ноги тяжёлые")["probability"] > 0.5
+
+
+class TestSomaticCheck:
+    def llm(self, monkeypatch, verdict=None, error=None):
+        calls = []
+
+        async def llm_somatic_check(user_message, scene_context):
+            calls.append(user_message)
+            if error:
+                raise error
+            return verdict
+
+        monkeypatch.setattr(sync_agent, "llm_somatic_check", llm_somatic_check)
+        monkeypatch.setattr(settings, "SOMATIC_LLM_SAMPLE_RATE", 0.0)
+        return calls
+
+    async def test_confident_answer_stays_local(self, monkeypatch):
+        calls = self.llm(monkeypatch)
+        result = await sync_agent.autonomous_somatic_check("В груди сжимается, руки холодные", "сцена")
+        assert calls == [] and result["source"] == "local" and result["is_somatic"]
+
+    async def test_uncertain_answer_goes_to_llm(self, monkeypatch):
+        calls = self.llm(monkeypatch, {"is_somatic": True, "has_body": True, "has_objects": False, "reason": "тело"})
+        monkeypatch.setattr(settings, "SOMATIC_CONFIDENCE", 1.01)
+        result = await sync_agent.autonomous_somatic_check("Руководитель давит", "сцена")
+        assert calls == ["Руководитель давит"]
+        assert result["source"] == "llm" and result["is_somatic"] and result["reason"] == "тело"
+        assert 0.5 <= result["confidence"] <= 1.0
+
+    async def test_llm_failure_falls_back_to_local(self, monkeypatch):
+        self.llm(monkeypatch, error=RuntimeError("timeout"))
+        monkeypatch.setattr(settings, "SOMATIC_CONFIDENCE", 1.01)
+        result = await sync_agent.autonomous_somatic_check("Думаю о деньгах", "сцена")
+        assert result["source"] == "local" and result["reason"] == "fallback" and not result["is_somatic"]
+
+    def test_response_metrics(self):
+        assert sync_agent.get_response_metrics("Много думаю о работе")["has_body"] is False
+        assert sync_agent.get_response_metrics("Вижу дверь") == {"length": 10, "has_body": False, "has_objects": True}
+        assert sync_agent.is_abstract_response("ок")
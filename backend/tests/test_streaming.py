@@ -0,0 +1,136 @@
+"""
+Tests for streamed LLM replies: incremental JSON field extraction, the
+WebSocket delta sender and streamed completions through the scheduler.
+"""
+import asyncio
+import json
+from types import SimpleNamespace
+
+import httpx
+import openai
+import pytest
+
+from app.services.llm_scheduler import (
+    LLMScheduler, ModelBudget, ScheduledOpenAI, StreamInterruptedError,
+)
+from app.services.streaming import DeltaSender, JsonFieldStream
+
+
+def feed_in_chunks(stream: JsonFieldStream, document: str, size: int) -> str:
+    return "".join(stream.feed(document[i:i + size]) for i in range(0, len(document), size))
+
+
+class TestJsonFieldStream:
+    def test_decodes_escapes_across_any_chunking(self):
+        reply = 'Дыши. "Где" в теле?\n\\ 🌿'
+        document = json.dumps({"ai_response": reply, "hawkins_score_estimation": 150}, ensure_ascii=True)
+        for size in (1, 2, 5, 64):
+            stream = JsonFieldStream("ai_response")
+            assert feed_in_chunks(stream, document, size) == reply
+            assert stream.done and stream.value == reply
+
+    def test_only_top_level_key_counts(self):
+        document = '{"meta": {"ai_response": "nested"}, "note": "ai_response", "list": ["ai_response"], "ai_response": "ok"}'
+        assert JsonFieldStream("ai_response").feed(document) == "ok"
+
+    def test_non_string_value_yields_nothing(self):
+        stream = JsonFieldStream("final_insight")
+        assert stream.feed('{"final_insight": null, "ai_response": "x"}') == ""
+        assert not stream.done
+
+
+class SlowWebSocket:
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.sent: list[dict] = []
+
+    async def send_json(self, data: dict):
+        await asyncio.sleep(self.delay)
+        self.sent.append(data)
+
+
+class TestDeltaSender:
+    async def test_slow_client_gets_coalesced_deltas(self):
+        websocket = SlowWebSocket(delay=0.02)
+        sender = DeltaSender(websocket)
+        for token in ["a", "b", "c", "d", "e"]:
+            await sender.push(token)
+            await asyncio.sleep(0.005)
+        await sender.flush()
+        assert "".join(m["content"] for m in websocket.sent) == "abcde"
+        assert all(m["type"] == "delta" for m in websocket.sent)
+        assert len(websocket.sent) < 5
+
+    async def test_flush_reraises_send_error(self):
+        class Closed:
+            async def send_json(self, data):
+                raise RuntimeError("closed")
+
+        sender = DeltaSender(Closed())
+        await sender.push("x")
+        with pytest.raises(RuntimeError):
+            await sender.flush()
+
+
+class FakeStream:
+    def __init__(self, parts: list[str], fail_after: int | None = None):
+        self.parts = parts
+        self.fail_after = fail_after
+        self.closed = False
+
+    async def __aiter__(self):
+        for i, part in enumerate(self.parts):
+            if i == self.fail_after:
+                raise openai.APITimeoutError(request=httpx.Request("POST", "https://api.openai.com"))
+            yield SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=SimpleNamespace(content=part))])
+        yield SimpleNamespace(usage=SimpleNamespace(total_tokens=42), choices=[])
+
+    async def close(self):
+        self.closed = True
+
+
+def streaming_client(streams: list[FakeStream]) -> tuple[ScheduledOpenAI, LLMScheduler]:
+    s = LLMScheduler(ModelBudget(2, 10_000, 10_000_000), backoff_base=0.001)
+    client = ScheduledOpenAI(openai.AsyncOpenAI(api_key="test"), s)
+    attempts = iter(streams)
+
+    async def create(**kwargs):
+        assert kwargs["stream"] is True
+        return next(attempts)
+
+    client._chat_client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=create)))
+    return client, s
+
+
+class TestStreamedCompletion:
+    async def test_chunks_are_forwarded_and_joined(self):
+        stream = FakeStream(['{"ai_', 'response": "hi"}'])
+        client, s = streaming_client([stream])
+        seen = []
+
+        async def on_text(text):
+            seen.append(text)
+
+        result = await client.stream_chat_completion(model="m", messages=[], on_text=on_text)
+        assert result.content == '{"ai_response": "hi"}' and result.usage.total_tokens == 42
+        assert seen == ['{"ai_', 'response": "hi"}'] and stream.closed
+        assert s.stats()["m"]["completed"] == 1 and s.stats()["m"]["in_flight"] == 0
+
+    async def test_failure_before_first_chunk_is_retried(self):
+        client, s = streaming_client([FakeStream(["a"], fail_after=0), FakeStream(["a", "b"])])
+
+        async def on_text(text):
+            pass
+
+        result = await client.stream_chat_completion(model="m", messages=[], on_text=on_text)
+        assert result.content == "ab" and s.stats()["m"]["retries"] == 1
+
+    async def test_failure_mid_stream_is_not_retried(self):
+        client, s = streaming_client([FakeStream(["a", "b"], fail_after=1), FakeStream(["a", "b"])])
+
+        async def on_text(text):
+            pass
+
+        with pytest.raises(StreamInterruptedError):
+            await client.stream_chat_completion(model="m", messages=[], on_text=on_text)
+        assert s.stats()["m"]["retries"] == 0 and s.stats()["m"]["failed"] == 1
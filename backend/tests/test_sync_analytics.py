@@ -0,0 +1,87 @@
+"""
+Tests for incremental post-sync analytics: sessions folded one by one into
+the running aggregates give what the full rebuild computes.
+"""
+from datetime import datetime
+
+from app.core.sync_analytics import (
+    core_pattern_tags, fold_completed_sessions, fold_into_portrait, fold_into_sphere_knowledge,
+)
+from app.models import SphereKnowledge, SyncSession, UserPortrait
+from app.services import jobs
+from tests.conftest import FakeSession
+
+
+def completed(archetype_id: int, hawkins: int, tags=(), anchor="", pattern=None) -> SyncSession:
+    return SyncSession(
+        user_id=7, sphere="IDENTITY", archetype_id=archetype_id, hawkins_score=hawkins,
+        extracted_tags=list(tags), extracted_body_anchor=anchor, core_pattern=pattern,
+        created_at=datetime(2026, 10, 18, 10, 0),
+    )
+
+
+class TestPatternTags:
+    def test_words_longer_than_three_letters(self):
+        assert core_pattern_tags("Страх отвержения, под контролем") == ["страх", "отвержения", "контролем"]
+        assert core_pattern_tags(None) == [] and core_pattern_tags("") == []
+
+
+class TestFoldIntoPortrait:
+    def test_running_hawkins_ignore_unscored_sessions(self):
+        portrait = UserPortrait(user_id=7, sphere="IDENTITY")
+        for session in [completed(1, 200), completed(2, 0), completed(3, 150), completed(4, 310)]:
+            fold_into_portrait(portrait, session)
+        assert portrait.sessions_count == 4 and portrait.hawkins_count == 3
+        assert portrait.avg_hawkins == 220 and portrait.min_hawkins == 150
+        assert [e["score"] for e in portrait.hawkins_timeline] == [200, 150, 310]
+        assert [c["archetype_id"] for c in portrait.cards_data] == [1, 2, 3, 4]
+
+    def test_patterns_and_body_map_accumulate(self):
+        portrait = UserPortrait(user_id=7, sphere="IDENTITY", tag_counts={"контроль": 1})
+        fold_into_portrait(portrait, completed(1, 200, tags=["контроль", "страх"], anchor="грудь"))
+        fold_into_portrait(portrait, completed(2, 200, tags=["страх"], anchor="грудь"))
+        assert portrait.tag_counts == {"контроль": 2, "страх": 2}
+        assert {p["tag"] for p in portrait.patterns_json} == {"контроль", "страх"}
+        assert portrait.body_map_json == {"грудь": [1, 2]}
+
+    def test_card_listed_by_a_rebuild_is_counted_not_repeated(self):
+        session = completed(1, 200, anchor="грудь")
+        portrait = UserPortrait(user_id=7, sphere="IDENTITY")
+        fold_into_portrait(portrait, session)
+        portrait.sessions_count = portrait.hawkins_sum = portrait.hawkins_count = 0  # as the backfill left it
+        fold_into_portrait(portrait, session)
+        assert len(portrait.cards_data) == 1 and len(portrait.hawkins_timeline) == 1
+        assert portrait.body_map_json == {"грудь": [1]}
+        assert portrait.sessions_count == 1 and portrait.avg_hawkins == 200
+
+
+class TestFoldCompletedSessions:
+    async def test_sessions_still_logging_answers_are_left_pending(self):
+        db = FakeSession()
+        assert await fold_completed_sessions(db, 7) == 0
+        lock, pending = db.executed
+        assert lock.params == {"key": "sync.analytics:7"}
+        assert pending.params["user_id_1"] == 7
+        assert pending.params["job_type_1"] == "sync.log_interaction"
+        assert pending.params["status_1"] == ["queued", "running"]
+
+
+class TestFoldIntoSphereKnowledge:
+    def test_average_over_sessions_and_three_patterns(self):
+        portrait = UserPortrait(user_id=7, sphere="IDENTITY")
+        knowledge = SphereKnowledge(user_id=7, sphere="IDENTITY")
+        for n, score in enumerate([200, 100, 300, 400], start=1):
+            session = completed(n % 3, score, pattern=f"паттерн {n}")
+            fold_into_portrait(portrait, session)
+            fold_into_sphere_knowledge(knowledge, portrait, session)
+        assert knowledge.sphere_hawkins == 250
+        assert knowledge.sphere_pattern == "паттерн 1 / паттерн 2 / паттерн 3"
+        assert knowledge.cards_completed == [1, 2, 0]
+        assert knowledge.sphere_picture == "Сводная картина по 4 архетипам."
+
+
+class TestJobs:
+    def test_post_process_jobs_still_run(self):
+        import app.routers.sync  # noqa: F401 — registers the handlers
+
+        assert {"sync.analytics", "sync.post_process"} <= set(jobs.JOB_TYPES)
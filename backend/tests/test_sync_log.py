@@ -0,0 +1,106 @@
+"""
+Tests for the event log of sync sessions: folding events into transcript and
+phase state, the per-process cache and optimistic phase transitions.
+"""
+import pytest
+
+from app.core import sync_log
+from app.core.sync_log import SessionConflict, SessionLog, append_events, apply_event, load_session_log
+from app.models import SyncSession
+from tests.conftest import FakeSession
+
+
+def turn(kind, content, layer, sub_phase=0, at="2026-10-18T10:00:00"):
+    return kind, {"role": kind, "content": content, "created_at": at, "layer": layer, "sub_phase": sub_phase}
+
+
+def session(**kwargs) -> SyncSession:
+    values = {"id": 1, "user_id": 7, "event_seq": 0, "is_complete": False,
+              "phase_data": {"current_layer": "intro", "sub_phase": 0, "scenes": {"1": {"id": 5}}}}
+    values.update(kwargs)
+    return SyncSession(**values)
+
+
+class TestFold:
+    def test_phase_data_as_phases_wrote_it(self):
+        transcript, state = [], {"current_layer": "intro", "sub_phase": 0}
+        for kind, payload in [
+            turn("assistant", "вход", "intro", at="t0"),
+            turn("user", "[Войти]", "intro", at="t1"),
+            turn("assistant", "сцена 1", "1", at="t2"),
+            turn("user", "думаю", "1", at="t3"),
+            ("state", {"metrics": {"1": {"length": 5}}}),
+            turn("assistant", "вернись в тело", "1", sub_phase=1, at="t4"),
+        ]:
+            apply_event(transcript, state, kind, payload)
+        assert [m["content"] for m in transcript] == ["вход", "[Войти]", "сцена 1", "думаю", "вернись в тело"]
+        assert state["current_layer"] == "1" and state["sub_phase"] == 1
+        assert state["timing"] == {"intro_0": "t0", "intro_0_user": "t1", "1_0": "t2", "1_0_user": "t3", "1_1": "t4"}
+        assert state["metrics"] == {"1": {"length": 5}}
+
+    def test_state_events_merge_one_level(self):
+        state = {"metrics": {"1": {"length": 1}}, "scenes": {"1": {}}}
+        apply_event([], state, "state", {"metrics": {"2": {"length": 2}}, "portrait_context": {"facts": []}})
+        assert state["metrics"] == {"1": {"length": 1}, "2": {"length": 2}}
+        assert state["portrait_context"] == {"facts": []} and state["scenes"] == {"1": {}}
+
+    def test_unknown_kind(self):
+        with pytest.raises(ValueError):
+            apply_event([], {}, "note", {"role": "user", "content": "x"})
+
+
+class TestLoad:
+    @pytest.fixture(autouse=True)
+    def reset(self):
+        sync_log.reset_session_logs()
+        yield
+        sync_log.reset_session_logs()
+
+    async def test_legacy_row_with_events_folded_over(self):
+        row = session(event_seq=2, session_transcript=[{"role": "assistant", "content": "вход"}, None])
+        db = FakeSession([turn("user", "[Войти]", "intro"), turn("assistant", "сцена 1", "1")])
+        log = await load_session_log(db, row)
+        assert [m["content"] for m in log.transcript] == ["вход", "[Войти]", "сцена 1"]
+        assert log.seq == 2 and log.state["current_layer"] == "1" and log.state["scenes"] == {"1": {"id": 5}}
+
+    async def test_cached_until_the_seq_moves(self):
+        row = session(event_seq=1)
+        db = FakeSession([turn("assistant", "вход", "intro")])
+        first = await load_session_log(db, row)
+        first.transcript.append({"role": "user", "content": "не записано"})
+        again = await load_session_log(db, row)
+        assert len(db.executed) == 1 and [m["content"] for m in again.transcript] == ["вход"]
+
+        row.event_seq = 2  # another process appended
+        db.rows.append(turn("user", "ответ", "intro"))
+        assert len((await load_session_log(db, row)).transcript) == 2 and len(db.executed) == 2
+
+    async def test_complete_session_is_its_row(self):
+        row = session(event_seq=9, is_complete=True, session_transcript=[{"role": "user", "content": "всё"}])
+        db = FakeSession()
+        log = await load_session_log(db, row)
+        assert db.executed == [] and log.transcript == [{"role": "user", "content": "всё"}]
+
+
+class TestAppend:
+    async def test_events_follow_the_expected_seq(self):
+        log = SessionLog(seq=4, transcript=[], state={})
+        log.add(*turn("user", "ответ", "2"))
+        log.add(*turn("assistant", "сцена 3", "3"))
+        db = FakeSession()
+        await append_events(db, 1, log, current_phase=3)
+        moved, written = db.executed
+        assert moved.params == {"id_1": 1, "event_seq_1": 4, "event_seq": 6, "current_phase": 3}
+        assert [(r["session_id"], r["seq"], r["kind"]) for r in written.passed] == [(1, 5, "user"), (1, 6, "assistant")]
+        assert log.seq == 6 and log.pending == []
+
+    async def test_conflict_writes_nothing(self):
+        sync_log.remember_session_log(1, SessionLog(seq=4, transcript=[], state={}))
+        log = SessionLog(seq=4, transcript=[], state={})
+        log.add(*turn("user", "ответ", "2"))
+        db = FakeSession(rowcount=0)
+        with pytest.raises(SessionConflict):
+            await append_events(db, 1, log)
+        [moved] = db.executed  # the seq check failed, no event was written
+        assert moved.params["event_seq_1"] == 4
+        assert log.seq == 4 and 1 not in sync_log._cache
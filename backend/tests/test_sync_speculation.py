@@ -0,0 +1,79 @@
+"""
+Tests for speculative generation of the next sync layer and the per-session
+portrait context.
+"""
+import asyncio
+
+from app.agents import sync_agent
+from app.agents.sync_agent import SpeculativeLayer
+from app.core.sync_log import SessionLog
+from app.routers import sync as sync_routes
+from app.services.jobs import JOB_TYPES
+
+
+class TestSpeculativeLayer:
+    def layer(self, monkeypatch, latency=0.0):
+        calls = []
+
+        async def run_avatar_layer(**kwargs):
+            calls.append(kwargs["layer"])
+            await asyncio.sleep(latency)
+            return f"слой {kwargs['layer']}"
+
+        monkeypatch.setattr(sync_agent, "run_avatar_layer", run_avatar_layer)
+        monkeypatch.setattr(sync_agent, "speculation_stats", sync_agent.Counter())
+        return calls
+
+    async def test_commit_returns_the_layer(self, monkeypatch):
+        calls = self.layer(monkeypatch)
+        advance = SpeculativeLayer(layer="2")
+        assert await advance.commit() == "слой 2"
+        assert calls == ["2"] and sync_agent.speculation_stats == {"committed": 1}
+
+    async def test_discard_before_yield_never_starts(self, monkeypatch):
+        calls = self.layer(monkeypatch)
+        advance = SpeculativeLayer(layer="3")
+        advance.discard()  # a local verdict: the event loop never ran
+        await asyncio.sleep(0)
+        assert calls == [] and advance.task.cancelled()
+        assert sync_agent.speculation_stats == {"discarded": 1}
+
+    async def test_discard_after_llm_wait_is_wasted(self, monkeypatch):
+        calls = self.layer(monkeypatch, latency=1.0)
+        advance = SpeculativeLayer(layer="4")
+        await asyncio.sleep(0)  # the check awaits the LLM, the layer is being generated
+        advance.discard()
+        await asyncio.sleep(0)
+        assert calls == ["4"] and advance.task.cancelled()
+        assert sync_agent.speculation_stats == {"discarded": 1, "wasted": 1}
+
+    async def test_discard_after_the_layer_finished_is_counted(self, monkeypatch):
+        calls = self.layer(monkeypatch)
+        advance = SpeculativeLayer(layer="5")
+        await asyncio.sleep(0.01)  # the verdict came after the layer
+        assert advance.task.done()
+        advance.discard()
+        assert calls == ["5"] and sync_agent.speculation_stats == {"discarded": 1, "wasted": 1}
+
+
+class TestSessionPortraitContext:
+    async def test_fetched_once_and_kept_in_state(self, monkeypatch):
+        fetched = []
+
+        async def get_portrait_context(db, user_id, sphere):
+            fetched.append((user_id, sphere))
+            return {"facts": ["x"]}
+
+        monkeypatch.setattr(sync_routes, "_get_portrait_context", get_portrait_context)
+        session = sync_routes.SyncSession(user_id=7, sphere="IDENTITY")
+        log = SessionLog(seq=3, transcript=[], state={})
+        assert await sync_routes._session_portrait_context(None, session, log) == {"facts": ["x"]}
+        assert await sync_routes._session_portrait_context(None, session, log) == {"facts": ["x"]}
+        assert fetched == [(7, "IDENTITY")] and log.state["portrait_context"] == {"facts": ["x"]}
+        # Kept for the session: written with the phase as a state event
+        assert log.pending == [("state", {"portrait_context": {"facts": ["x"]}})]
+
+    def test_interaction_logging_is_a_job(self):
+        spec = JOB_TYPES["sync.log_interaction"]
+        assert spec.handler is sync_routes._log_scene_interaction
+        assert spec.max_attempts == 3
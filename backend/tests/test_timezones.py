@@ -0,0 +1,43 @@
+"""
+Tests for the shared timezone service.
+"""
+from datetime import datetime
+
+import pytz
+
+from app.core.astrology.timezones import to_utc, to_utc_many, utc_offset
+
+
+def pytz_utc(local_dt: datetime, tz_name: str) -> datetime:
+    return pytz.timezone(tz_name).localize(local_dt).astimezone(pytz.utc).replace(tzinfo=None)
+
+
+class TestToUtc:
+    CASES = [
+        (datetime(1990, 1, 15, 14, 30), "Europe/Moscow"),
+        (datetime(1981, 4, 1, 0, 30), "Europe/Moscow"),        # Soviet DST start at midnight
+        (datetime(2021, 3, 14, 2, 30), "America/New_York"),    # non-existent local time
+        (datetime(2021, 11, 7, 1, 30), "America/New_York"),    # ambiguous local time
+        (datetime(1900, 6, 1, 12, 0), "Asia/Almaty"),          # LMT era
+        (datetime(2001, 11, 30, 23, 59), "Australia/Sydney"),
+    ]
+
+    def test_matches_pytz_localize(self):
+        for local_dt, tz_name in self.CASES:
+            assert to_utc(local_dt, tz_name) == pytz_utc(local_dt, tz_name)
+
+    def test_offsets_are_memoized(self):
+        local_dt, tz_name = self.CASES[0]
+        to_utc(local_dt, tz_name)
+        hits = utc_offset.cache_info().hits
+        to_utc(local_dt, tz_name)
+        assert utc_offset.cache_info().hits == hits + 1
+
+    def test_many_isolates_errors(self):
+        local_dts = [case[0] for case in self.CASES] + [datetime(1990, 1, 1), None]
+        tz_names = [case[1] for case in self.CASES] + ["Not/AZone", "UTC"]
+        results, errors = to_utc_many(local_dts, tz_names)
+        assert results[:-2] == [pytz_utc(*case) for case in self.CASES]
+        assert results[-2:] == [None, None]
+        assert errors[-2] is not None
+        assert errors[:-2] == [None] * len(self.CASES) and errors[-1] is None
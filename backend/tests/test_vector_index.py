@@ -0,0 +1,41 @@
+"""
+Tests for scoped nearest-neighbour statements (app/services/vector_index.py).
+"""
+from sqlalchemy.dialects import postgresql
+
+from app.agents import assistant_agent
+from app.models.user_memory import UserMemory
+from app.services.vector_index import nearest_in_scope
+from tests.conftest import FakeSession
+
+
+def compile_sql(stmt) -> str:
+    return str(stmt.compile(dialect=postgresql.dialect()))
+
+
+class TestScopedSearch:
+    def test_scope_is_materialized_and_ranked_exactly(self):
+        sql = compile_sql(nearest_in_scope(
+            [UserMemory.content], UserMemory.embedding, [0.1] * 1536,
+            scope=[UserMemory.user_id == 7], limit=5,
+        ))
+        assert "WITH scope AS MATERIALIZED" in sql
+        cte, outer = sql.split("\n SELECT", 1)
+        assert "user_memory.user_id = %(user_id_1)s" in cte and "user_memory.embedding IS NOT NULL" in cte
+        assert "<=>" not in cte
+        assert "ORDER BY scope.scope_embedding <=>" in outer and "LIMIT" in outer
+
+    async def test_user_memory_search(self, monkeypatch):
+        async def embed(text):
+            return [0.0] * 1536
+
+        monkeypatch.setattr(assistant_agent, "embed", embed)
+        db = FakeSession(["Пользователь любит горы"])
+        context = await assistant_agent.search_user_memory(db, 3, "горы", limit=2)
+        assert "Пользователь любит горы" in context
+        expected = nearest_in_scope(
+            [UserMemory.content], UserMemory.embedding, [0.0] * 1536, scope=[UserMemory.user_id == 3], limit=2,
+        )
+        assert compile_sql(db.executed[0].statement) == compile_sql(expected)
+        assert db.executed[0].params == expected.compile().params
+
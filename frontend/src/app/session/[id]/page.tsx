@@ -15,6 +15,7 @@ interface Message {
     content: string;
     stage?: number;
     hawkins?: number;
+    streaming?: boolean;
 }
 
 export default function SessionPage() {
@@ -72,7 +73,20 @@ export default function SessionPage() {
                 }
 
                 setIsAiTyping(false);
-                setMessages(prev => [...prev, {
+
+                if (data.type === "delta") {
+                    setMessages(prev => {
+                        const last = prev[prev.length - 1];
+                        if (last?.streaming) {
+                            return [...prev.slice(0, -1), { ...last, content: last.content + data.content }];
+                        }
+                        return [...prev, { role: "ai", content: data.content, streaming: true }];
+                    });
+                    return;
+                }
+
+                // The final message replaces the streamed draft of the same reply
+                setMessages(prev => [...prev.filter(m => !m.streaming), {
                     role: "ai",
                     content: data.content,
                     stage: data.stage,
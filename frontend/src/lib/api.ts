@@ -147,5 +147,6 @@ export const dsbAPI = {
 // WebSocket helper
 export function createSessionWS(userId: number, cardProgressId: number): WebSocket {
     const wsBase = API_BASE.replace("http", "ws");
-    return new WebSocket(`${wsBase}/api/session/${userId}/${cardProgressId}`);
+    // stream=true: the reply arrives as "delta" messages before the final "response"
+    return new WebSocket(`${wsBase}/api/session/${userId}/${cardProgressId}?stream=true`);
 }
@@ -35,6 +35,11 @@ echo "⚡ FastAPI запущен на http://localhost:8000"
 uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload &
 FASTAPI_PID=$!
 
+# Воркер фоновых задач (DSB-пайплайн, пост-обработка синхронизаций)
+echo "🧵 Запускаем воркер фоновых задач..."
+python -m app.worker --processes 1 &
+WORKER_PID=$!
+
 # Запускаем Telegram Bot в фоне
 echo "🤖 Запускаем Telegram Bot..."
 cd "${PROJECT_ROOT}/bot"
@@ -49,5 +54,5 @@ echo ""
 echo "Нажмите Ctrl+C для остановки"
 
 # Ждём прерывания
-trap "kill $FASTAPI_PID $BOT_PID 2>/dev/null; echo '🛑 Остановлено'" SIGINT SIGTERM
+trap "kill $FASTAPI_PID $WORKER_PID $BOT_PID 2>/dev/null; echo '🛑 Остановлено'" SIGINT SIGTERM
 wait